@@ -33,11 +33,13 @@ States, other countries, or both.
 ###############################################################################################
 from poweradm.poweradm import main_poweradm
 import poweradm.config
-import commands
+import poweradm.hmc
 
 print "\nChecking HMC connection..."
-chk_hmc_connection = commands.getstatusoutput('ssh -l poweradm %s lshmc -V' %
-        poweradm.config.hmcserver)
+for hmc_server in poweradm.hmc.servers():
+    chk_hmc_connection = poweradm.hmc.get(hmc_server).getstatusoutput('lshmc -V')
+    if chk_hmc_connection[0] != 0:
+        break
 
 if chk_hmc_connection[0] == 0:
     print "\nConnection to HMC passed!"
@@ -48,4 +50,4 @@ if chk_hmc_connection[0] == 0:
         print ("\n\nCtrl+C pressed! Exiting without save.\n")
 else:
     print "\nConnection to HMC failed!"
-    print "  Error:\n\t %s\n" % chk_hmc_connection[1]
+    print "  Error (%s):\n\t %s\n" % (hmc_server, chk_hmc_connection[1])
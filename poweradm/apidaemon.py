@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+PowerAdm
+apidaemon.py
+
+Copyright (c) 2016 Kairo Araujo
+
+It was created for personal use. There are no guarantees of the author.
+Use at your own risk.
+
+Permission to use, copy, modify, and distribute this software for any
+purpose with or without fee is hereby granted, provided that the above
+copyright notice and this permission notice appear in all copies.
+
+THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+IBM, Power, PowerVM (a.k.a. VIOS) are registered trademarks of IBM Corporation in
+the United States, other countries, or both.
+VMware, vCenter, vCenter Orchestrator are registered trademarks of VWware Inc in the United
+States, other countries, or both.
+'''
+
+# Imports
+###############################################################################################
+import os
+import sys
+import time
+import json
+import socket
+import urlparse
+import threading
+import traceback
+import SocketServer
+import BaseHTTPServer
+from StringIO import StringIO
+import globalvar
+import config
+import stats
+##############################################################################################
+#
+# API daemon
+#
+# 'apimain.py -daemon' keeps the API running with the configs, caches and HMC
+# sessions loaded. The apimain.py options (as used by vCO) are sent to the
+# daemon by the Unix socket, when it is running, and the output is returned.
+# The daemon can listen on HTTP too:
+#
+#   GET  /apimain?arg=-sp&arg=0
+#   POST /apimain  {"argv": ["-sp", "0"]}
+#
+# The output is returned as text/plain and the exit status on the header
+# X-PowerAdm-Status.
+##############################################################################################
+
+# options that change the environment run one at time
+serial_options = ['-mklparcfg', '-nimdeploy']
+serial_lock = threading.Lock()
+
+
+def socketFile():
+    ''' Returns the Unix socket of the daemon or None if disabled. '''
+
+    if config.api_socket != 'enable':
+        return None
+    return '%s/poweradm/tmp/apimain.sock' % (config.pahome)
+
+
+class ThreadStdout:
+    ''' sys.stdout that writes the output of each request thread on its buffer.
+
+        The buffer goes to the threads started by the request by stats.bind()
+        (parallel.pmap, changeplan and cache updates). The output after the
+        end of the request goes to the stdout of the daemon.
+    '''
+
+    def __init__(self, stdout):
+        self.stdout = stdout
+        self.local = threading.local()
+        stats.thread_values.append((self.local, 'buffer'))
+
+    def write(self, data):
+        buffer = getattr(self.local, 'buffer', None)
+        if buffer is None or buffer.closed:
+            self.stdout.write(data)
+        else:
+            buffer.write(data)
+
+    def flush(self):
+        buffer = getattr(self.local, 'buffer', None)
+        if buffer is None or buffer.closed:
+            self.stdout.flush()
+
+    def capture(self):
+        ''' Start to capture the output of this thread. '''
+        self.local.buffer = StringIO()
+
+    def release(self):
+        ''' Stop to capture and returns the output of this thread. '''
+        output = self.local.buffer.getvalue()
+        self.local.buffer.close()
+        self.local.buffer = None
+        return output
+
+
+def run(argv):
+    ''' Run an apimain option on the daemon. Returns (status, output).
+
+        Args:
+          argv (list): the arguments without the program name.
+    '''
+
+    import apimain
+
+    argv = ['apimain.py'] + list(argv)
+    serial = len(argv) > 1 and argv[1] in serial_options
+
+    if serial:
+        serial_lock.acquire()
+    # the change files and tmp files use the time of the request
+    globalvar.setTimestr(time.strftime("%m%d%Y-%H%M%S"))
+
+    sys.stdout.capture()
+    status = 0
+    try:
+        try:
+            apimain.main(argv)
+        except SystemExit, exit_status:
+            if exit_status.code is None:
+                status = 0
+            elif isinstance(exit_status.code, int):
+                status = exit_status.code
+            else:
+                print exit_status.code
+                status = 1
+        except Exception:
+            traceback.print_exc(file=sys.stdout)
+            status = 1
+    finally:
+        output = sys.stdout.release()
+        globalvar.setTimestr(None)
+        if serial:
+            serial_lock.release()
+
+    return (status, output)
+
+
+class UnixHandler(SocketServer.StreamRequestHandler):
+    ''' Request on the Unix socket: one JSON line {"argv": [...]} and the
+        response is one JSON line {"status": 0, "output": "..."}.
+    '''
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            status, output = run([str(arg) for arg in request['argv']])
+        except (ValueError, KeyError, TypeError):
+            status, output = (1, 'Invalid request.\n')
+        self.wfile.write('%s\n' % json.dumps({'status': status, 'output': output}))
+
+
+class UnixServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+
+class HTTPHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    ''' Request by HTTP (GET with arg parameters or POST with JSON). '''
+
+    def reply(self, argv):
+        if argv is None:
+            status, output = (1, 'Invalid request.\n')
+            code = 400
+        else:
+            status, output = run(argv)
+            code = 200
+        self.send_response(code)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(output)))
+        self.send_header('X-PowerAdm-Status', str(status))
+        self.end_headers()
+        self.wfile.write(output)
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        if url.path != '/apimain':
+            self.send_error(404)
+            return
+        self.reply(urlparse.parse_qs(url.query).get('arg', []))
+
+    def do_POST(self):
+        if self.path != '/apimain':
+            self.send_error(404)
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.getheader('Content-Length', 0))))
+            argv = [str(arg) for arg in request['argv']]
+        except (ValueError, KeyError, TypeError):
+            argv = None
+        self.reply(argv)
+
+    def log_message(self, format, *args):
+        if config.api_debug == 'yes':
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class HTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def serve():
+    ''' Run the daemon (foreground) on the Unix socket and HTTP (if enabled). '''
+
+    sys.stdout = ThreadStdout(sys.stdout)
+    # the time of the request goes to its threads too
+    stats.thread_values.append((globalvar.local, 'timestr'))
+
+    servers = []
+    socket_file = socketFile()
+    if socket_file is not None:
+        if os.path.exists(socket_file):
+            os.remove(socket_file)
+        servers.append(UnixServer(socket_file, UnixHandler))
+        os.chmod(socket_file, 0600)
+        print ('PowerAdm API daemon listening on %s' % (socket_file))
+
+    if int(config.api_http_port) > 0:
+        servers.append(HTTPServer((config.api_http_address, int(config.api_http_port)), HTTPHandler))
+        print ('PowerAdm API daemon listening on http://%s:%s/apimain' %
+               (config.api_http_address, config.api_http_port))
+
+    if not servers:
+        print ('The API daemon is disabled. Check api_socket and api_http_port on config.')
+        sys.exit(1)
+
+    threads = []
+    for server in servers:
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in servers:
+            server.shutdown()
+        if socket_file is not None and os.path.exists(socket_file):
+            os.remove(socket_file)
+
+
+def call(argv):
+    ''' Send an apimain option to the daemon and print the output.
+
+        Args:
+          argv (list): the arguments, as sys.argv.
+
+        Returns the exit status or None if the daemon isn't running.
+    '''
+
+    socket_file = socketFile()
+    if socket_file is None or not os.path.exists(socket_file):
+        return None
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            client.settimeout(2)
+            client.connect(socket_file)
+            client.settimeout(None)
+        except socket.error:
+            return None
+        client.sendall('%s\n' % json.dumps({'argv': argv[1:]}))
+        f_client = client.makefile('r')
+        response = json.loads(f_client.readline())
+        f_client.close()
+    finally:
+        client.close()
+
+    sys.stdout.write(response['output'].encode('utf-8'))
+    sys.stdout.flush()
+    return response['status']
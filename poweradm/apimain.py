@@ -32,6 +32,7 @@ States, other countries, or both.
 import os
 import commands
 import sys
+import json
 import globalvar
 import config
 import newid
@@ -41,50 +42,38 @@ import nim
 import mklparconf
 import mkosdeploy
 import npiv
+import apidaemon
+import catalog
+import healthcheck
 ##############################################################################################
 
-#
-# Pre load variables
-#
-##############################################################################################
-#
-
-# NIM available files/LPARs configs to deploy
-cfgdeploylist = nim.NIMFileFind()
-deploy_list = cfgdeploylist.listDeploy()
-
-# NIM available OS versions
-osdeploylist = nim.NIMGetVer()
-os_list = osdeploylist.listOSVersion()
-
-# NIM available Servers
-
-nimserverlist = nim.NIMServer()
-nim_list = nimserverlist.listNIM()
-
+def command(argv):
+    ''' Execute the API option.
 
-try:
+        Args:
+          argv (list): the arguments, as sys.argv.
+    '''
 
 #
 # Systems hosts
 #
 ##############################################################################################
 
-    if sys.argv[1] == "-sn":
+    if argv[1] == "-sn":
         ''' Number of systems '''
         lensystems = (len(config.systems))
         print lensystems
 
-    elif sys.argv[1] == "-sp":
+    elif argv[1] == "-sp":
         ''' Print system [position] in array'''
         systems = list(config.systems.keys())
 
-        if len(sys.argv) < 3:
+        if len(argv) < 3:
             print('-sp requires the position in array. Use -sn to show number of systems')
             exit(1)
         else:
             try:
-                system_option = int(sys.argv[2])
+                system_option = int(argv[2])
                 print(systems[system_option])
             except(IndexError,ValueError):
                 print('The -sp [position] is a number existent on the array.\n'
@@ -99,11 +88,11 @@ try:
 ##############################################################################################
 
 
-    elif sys.argv[1] == "-sspstatus":
+    elif argv[1] == "-sspstatus":
         ''' Show if Shared Storage Pool is enabled or disabled '''
         print (config.active_ssp)
 
-    elif sys.argv[1] == "-pooln":
+    elif argv[1] == "-pooln":
         ''' List shared storage pools array size (number of shared storage pools)'''
 
         ssp_len = (len(config.storage_pools))
@@ -112,15 +101,15 @@ try:
         else:
             print (ssp_len)
 
-    elif sys.argv[1] == "-poolp":
+    elif argv[1] == "-poolp":
         ''' Print shared storage pool [position] name in array'''
 
-        if len(sys.argv) < 3:
+        if len(argv) < 3:
             print('-poolp requires the position in array. Use -pooln to show number of systems')
             exit(1)
         else:
             try:
-                ssp_option = int(sys.argv[2])
+                ssp_option = int(argv[2])
                 print(config.storage_pools[ssp_option])
             except(IndexError,ValueError):
                 print('The -poolp [position] is a number existent on the array.\n'
@@ -131,20 +120,20 @@ try:
 #
 ##############################################################################################
 
-    elif sys.argv[1] == "-vswn":
+    elif argv[1] == "-vswn":
         ''' List Virtual Switches array size (number of virtual switches) '''
         lenvsw = (len(config.virtual_switches))
         print lenvsw
 
-    elif sys.argv[1] == "-vswp":
+    elif argv[1] == "-vswp":
         ''' Print virtual switch [position] '''
 
-        if len(sys.argv) < 3:
+        if len(argv) < 3:
             print('-vswp requires the position in array. Use -vswn to show number of systems')
             exit(1)
         else:
             try:
-                vsw_option = int(sys.argv[2])
+                vsw_option = int(argv[2])
                 print(config.virtual_switches[vsw_option])
             except(IndexError,ValueError):
                 print('The -vswp [position] is a number existent on the array.\n'
@@ -155,102 +144,142 @@ try:
 #
 ##############################################################################################
 
-    elif sys.argv[1] == "-npiv1":
+    elif argv[1] == "-npiv1":
         ''' Print lsnports and NPIV Notes (if you are using) from VIOS #1 of NPIV. '''
 
-        if len(sys.argv) < 3:
+        if len(argv) < 3:
             print('-npiv1 [system]. Requeries the name of system.')
         else:
             npivs = npiv.NPIV()
-            npivs.lsnportsVIO(sys.argv[2], 'vio1')
+            npivs.lsnportsVIO(argv[2], 'vio1')
 
-    elif sys.argv[1] == "-npiv2":
+    elif argv[1] == "-npiv2":
         ''' Print lsnports and NPIV Notes (if you are using) from VIOS #2 of NPIV. '''
 
-        if len(sys.argv) < 3:
+        if len(argv) < 3:
             print('-npiv1 [system]. Requeries the name of system.')
         else:
             npivs = npiv.NPIV()
-            npivs.lsnportsVIO(sys.argv[2], 'vio2')
+            npivs.lsnportsVIO(argv[2], 'vio2')
 
-    elif sys.argv[1] == "-npiv1n":
+    elif argv[1] == "-npiv1n":
         ''' Print the number of NPIVs FCs available from VIOS #1 NPIV '''
 
-        if len(sys.argv) < 3:
+        if len(argv) < 3:
             print('-npiv1n [system]. Requeries the name of system.')
         else:
             npivs = npiv.NPIV()
-            npivs.numberFCVIO(sys.argv[2], 'vio1')
+            npivs.numberFCVIO(argv[2], 'vio1')
 
-    elif sys.argv[1] == "-npiv2n":
+    elif argv[1] == "-npiv2n":
         ''' Print the number of NPIVs FCs available from VIOS #2 NPIV '''
 
-        if sys.argv[2] < 3:
+        if argv[2] < 3:
             print('-npiven [system]. Requeries the name of system.')
 
         else:
             npivs = npiv.NPIV()
-            npivs.numberFCVIO(sys.argv[2], 'vio2')
+            npivs.numberFCVIO(argv[2], 'vio2')
 
 
-    elif sys.argv[1] == "-npiv1p":
+    elif argv[1] == "-npiv1p":
         ''' Print the FC on specific position on array of VIOS #1 NPIV.
             Use the -npiv1n to see the size of the array '''
 
-        if len(sys.argv) < 4:
+        if len(argv) < 4:
             print('-npiv1p [system] [position]. Requeries the name of system and position.')
         else:
             npivs = npiv.NPIV()
-            print npivs.printFCVIO(sys.argv[2], 'vio1')[int(sys.argv[3])]
+            print npivs.printFCVIO(argv[2], 'vio1')[int(argv[3])]
 
-    elif sys.argv[1] == "-npiv2p":
+    elif argv[1] == "-npiv2p":
         ''' Print the FC on specific position on array of VIOS #1 NPIV.
             Use the -npiv1n to see the size of the array '''
 
-        if len(sys.argv) < 4:
+        if len(argv) < 4:
             print('-npiv1 [system] [position]. Requeries the name of system and position.')
         else:
             npivs = npiv.NPIV()
-            print npivs.printFCVIO(sys.argv[2], 'vio2')[int(sys.argv[3])]
+            print npivs.printFCVIO(argv[2], 'vio2')[int(argv[3])]
 
 
+#
+# Catalog (JSON)
+#
+##############################################################################################
+
+    elif argv[1] in ("-json", "-catalog"):
+        ''' Print all the lists (or one list) as JSON document.
+            -catalog is the same as -json all.
+        '''
+
+        what = 'all'
+        system = None
+        if argv[1] == "-json" and len(argv) > 2:
+            what = argv[2]
+        if len(argv) > 3:
+            system = argv[3]
+        try:
+            print json.dumps(catalog.collect(what, system), indent=1, sort_keys=True)
+        except(ValueError):
+            print('-json requires [%s] (default all).' % ('|'.join(['all'] + catalog.items)))
+            exit(1)
+
+#
+# Health check (JSON)
+#
+##############################################################################################
+
+    elif argv[1] == "-healthcheck":
+        ''' Check the vSCSI, vFC and vNetwork of many LPARs (IDs or names) or
+            of all the LPARs of frames and print the report of failures as JSON.
+        '''
+
+        try:
+            items, frames, checks = healthcheck.parseArgs(argv[2:])
+        except(ValueError):
+            print('-healthcheck requires [-frame system,...] [-checks %s] [LPAR ID or name ...]' %
+                  (','.join(healthcheck.check_names)))
+            exit(1)
+        print json.dumps(healthcheck.run(items, frames, checks), indent=1, sort_keys=True)
+
 #
 # Make Config lpar
 #
 ##############################################################################################
 
-    elif sys.argv[1] == "-mklparcfg":
-        change = sys.argv[2]
-        prefix = sys.argv[3]
-        lparname = sys.argv[4]
-        nim_deploy = sys.argv[5]
-        lparmem = sys.argv[6]
-        lparentcpu = sys.argv[7]
-        lparvcpu = sys.argv[8]
-        vscsi = sys.argv[9]
-        add_disk = sys.argv[10]
-        stgpool = sys.argv[11]
-        disk_size = sys.argv[12]
-        vfc = sys.argv[13]
-        npiv_vio1 = sys.argv[14]
-        npiv_vio2 = sys.argv[15]
-        vlan_deploy = sys.argv[16]
-        vsw_deploy = sys.argv[17]
-        net_vlan1 = sys.argv[18]
-        net_vlan2_1 = sys.argv[19]
-        net_vlan2_2 = sys.argv[20]
-        net_vlan3_1 = sys.argv[21]
-        net_vlan3_2 = sys.argv[22]
-        net_vlan3_3 = sys.argv[23]
-        net_vsw1 = sys.argv[24]
-        net_vsw2_1 = sys.argv[25]
-        net_vsw2_2 = sys.argv[26]
-        net_vsw3_1 = sys.argv[27]
-        net_vsw3_2 = sys.argv[28]
-        net_vsw3_3 = sys.argv[29]
-        net_length = sys.argv[30]
-        system_option = sys.argv[31]
-        action = sys.argv[32]
+    elif argv[1] == "-mklparcfg":
+        change = argv[2]
+        prefix = argv[3]
+        lparname = argv[4]
+        nim_deploy = argv[5]
+        lparmem = argv[6]
+        lparentcpu = argv[7]
+        lparvcpu = argv[8]
+        vscsi = argv[9]
+        add_disk = argv[10]
+        stgpool = argv[11]
+        disk_size = argv[12]
+        vfc = argv[13]
+        npiv_vio1 = argv[14]
+        npiv_vio2 = argv[15]
+        vlan_deploy = argv[16]
+        vsw_deploy = argv[17]
+        net_vlan1 = argv[18]
+        net_vlan2_1 = argv[19]
+        net_vlan2_2 = argv[20]
+        net_vlan3_1 = argv[21]
+        net_vlan3_2 = argv[22]
+        net_vlan3_3 = argv[23]
+        net_vsw1 = argv[24]
+        net_vsw2_1 = argv[25]
+        net_vsw2_2 = argv[26]
+        net_vsw3_1 = argv[27]
+        net_vsw3_2 = argv[28]
+        net_vsw3_3 = argv[29]
+        net_length = argv[30]
+        system_option = argv[31]
+        action = argv[32]
 
         if config.api_debug == "yes" :
             print('The parameters send is:\n'
@@ -456,7 +485,7 @@ try:
 #
 ##############################################################################################
 
-    elif sys.argv[1] == "-nimstatus":
+    elif argv[1] == "-nimstatus":
         ''' Show if NIM is enabled or disabled '''
         print (config.enable_nim_deploy)
 
@@ -466,20 +495,20 @@ try:
 ##############################################################################################
 
 # Avaiable LPAR configs to deploy
-    elif sys.argv[1] == "-osn":
+    elif argv[1] == "-osn":
          ''' Get array size of available files/LPAR to NIM deploy '''
 
-         print (len(deploy_list))
+         print (len(nim.NIMFileFind().listDeploy()))
 
-    elif sys.argv[1] == "-osp":
+    elif argv[1] == "-osp":
         ''' Print config deploy [position] in array'''
 
-        if len(sys.argv) < 3:
+        if len(argv) < 3:
             print('-osp requires the position in array. Use -osn to show number of config deploys')
             exit(1)
         else:
             try:
-                print(deploy_list[int(sys.argv[2])])
+                print(nim.NIMFileFind().listDeploy()[int(argv[2])])
             except(IndexError,ValueError):
                 print('The -osp [position] is a number existent on the array.\n'
                       'The number starts with 0.\n'
@@ -488,20 +517,20 @@ try:
 
 # Get NIM Server OS Versions available
 
-    elif sys.argv[1] == '-osvn':
+    elif argv[1] == '-osvn':
         ''' Get array size of available OS versions on NIM Deploy '''
 
-        print(len(os_list))
+        print(len(nim.NIMGetVer().listOSVersion()))
 
-    elif sys.argv[1] == '-osvp':
+    elif argv[1] == '-osvp':
         ''' Print OS NIM Deploys version in array. Use osvl to show number of OS version '''
 
-        if len(sys.argv) < 3:
+        if len(argv) < 3:
             print('-osvp requires the position in array. Use -osvn to show number available size')
             exit(1)
         else:
             try:
-                print(os_list[int(sys.argv[2])])
+                print(nim.NIMGetVer().listOSVersion()[int(argv[2])])
             except(IndexError,ValueError):
                 print('The -osvp [position] is a number existent on the array.\n'
                       'The number starts with 0.\n'
@@ -509,20 +538,20 @@ try:
                 exit(1)
 
 # Get NIM Server informations
-    elif sys.argv[1] == '-nimn':
+    elif argv[1] == '-nimn':
         ''' Get array size of available NIM Servers '''
 
-        print (len(nim_list))
+        print (len(nim.NIMServer().listNIM()))
 
-    elif sys.argv[1] == '-nimp':
+    elif argv[1] == '-nimp':
         ''' Print OS NIM Server in array. Use -nimn to show number of NIM Servers '''
 
-        if len(sys.argv) < 3:
+        if len(argv) < 3:
             print('-nimp requires the position in array. Use -nimn to show number available size')
             exit(1)
         else:
             try:
-                print(nim_list[int(sys.argv[2])])
+                print(nim.NIMServer().listNIM()[int(argv[2])])
             except(IndexError,ValueError):
                 print('The -nimp [position] is a number existent on the array.\n'
                       'The number starts with 0.\n'
@@ -530,7 +559,7 @@ try:
                 exit(1)
 
 # Deploy OS
-    elif sys.argv[1] == '-nimdeploy':
+    elif argv[1] == '-nimdeploy':
         ''' Deploy OS using NIM.
             This command require full parameters.
             apimain.py -nimosdeploy 'NIM File' 'NIM OS Version' 'NIM Server' 'y or n'
@@ -546,13 +575,13 @@ try:
             apimain.py -nimdeploy 'foo-bar.nim' 'AIX 7.1 TL03 SP04' 'nimsrv01' 'y'
         '''
 
-        if len(sys.argv) < 5:
+        if len(argv) < 5:
             print('-nimdeploy requires \'NIM File\' \'NIM OS Version\' \'NIM Server\' \'y or n\'\n'
                   'Use -h to help')
             exit(1)
         else:
             nimfile = nim.NIMFileFind()
-            nim_file = ('%s/poweradm/nim/%s' % (config.pahome, sys.argv[2]))
+            nim_file = ('%s/poweradm/nim/%s' % (config.pahome, argv[2]))
             nimfile.fileData(nim_file)
             # get variables
             lparprefix = nimfile.returnDeployPrefix()
@@ -563,7 +592,7 @@ try:
             # select version to install
             #
             nimcfg = nim.NIMGetVer()
-            nimcfg.OSVersion(sys.argv[3])
+            nimcfg.OSVersion(argv[3])
             nim_cfg_ver = nimcfg.getOSVersion()
             nim_cfg_spot = nimcfg.getSpot()
             nim_cfg_mksysbspot = nimcfg.getMksysbLpp()
@@ -572,7 +601,7 @@ try:
             # select nim and get variables
             #
             nimvars = nim.NIMServer()
-            nimvars.getNIM(sys.argv[4])
+            nimvars.getNIM(argv[4])
             nim_address = nimvars.getNIMAddress()
             nim_ipstart = nimvars.getIPStart()
             nim_ipend = nimvars.getIPEnd()
@@ -581,7 +610,7 @@ try:
             nim_ipdeploy = nimvars.getNIMIPDeploy()
 
             # Deploy
-            deploy = sys.argv[5]
+            deploy = argv[5]
 
             ''' Convert boolean to y/n '''
             if deploy == 'true':
@@ -624,7 +653,7 @@ try:
 # HELP
 #
 ##############################################################################################
-    elif sys.argv[1] == "-h":
+    elif argv[1] == "-h":
         print('%s is part of PowerAdm %s - http://www.poweradm.org\n'
               'This is a project of API for Web Interface and VMware vCenter Orchestrator.\n\n'
               'usage: %s [options]\n\n'
@@ -673,10 +702,40 @@ try:
               '\t\t\t\tArguments in order:\n'
               '\t\t\t\tnim_file os_version nim_server y|n\n'
               '\t\t\t\tCheck the documentation about API in http://poweradm.org/apimain.html\n'
-              % (sys.argv[0], globalvar.version, sys.argv[0]))
+              '-json [item] [system]\t\tPrint the item (or all items) as JSON, in one call.\n'
+              ' \t\t\t\tItems: all systems nimstatus sspstatus pools vswitches npiv deploys\n'
+              ' \t\t\t\tosversions nimservers. The npiv item can be filtered by system.\n'
+              '-catalog \t\t\tSame as -json all.\n'
+              '-healthcheck [arguments]\tCheck vSCSI, vFC and vNetwork of many LPARs and print the\n'
+              ' \t\t\t\tfailures as JSON. Arguments: [-frame system,...] [-checks vscsi,vfc,vnet]\n'
+              ' \t\t\t\t[LPAR ID or name ...] (IDs and names can be separated by comma).\n'
+              '-daemon \t\t\tRun the API as a daemon (Unix socket and/or HTTP, check config).\n'
+              ' \t\t\t\tWhile it is running the options are answered by the daemon.\n'
+              % (argv[0], globalvar.version, argv[0]))
     else:
         print ('Option not found. Use -h to help.')
 
-except(AttributeError,IndexError):
-    print ('Please use %s [option] [parameters]. Use -h to help.' % sys.argv[0])
-    exit(1)
+
+def main(argv):
+    ''' Execute the API option (argv as sys.argv) showing the usage on errors. '''
+
+    try:
+        command(argv)
+    except(AttributeError,IndexError):
+        print ('Please use %s [option] [parameters]. Use -h to help.' % argv[0])
+        exit(1)
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) > 1 and sys.argv[1] == '-daemon':
+        # run the API daemon (foreground)
+        apidaemon.serve()
+
+    else:
+        # use the API daemon if it is running, else run here
+        status = apidaemon.call(sys.argv)
+        if status is None:
+            main(sys.argv)
+        else:
+            sys.exit(status)
@@ -0,0 +1,394 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+PowerAdm
+benchmark.py
+
+Copyright (c) 2016 Kairo Araujo
+
+It was created for personal use. There are no guarantees of the author.
+Use at your own risk.
+
+Permission to use, copy, modify, and distribute this software for any
+purpose with or without fee is hereby granted, provided that the above
+copyright notice and this permission notice appear in all copies.
+
+THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+IBM, Power, PowerVM (a.k.a. VIOS) are registered trademarks of IBM Corporation in
+the United States, other countries, or both.
+VMware, vCenter, vCenter Orchestrator are registered trademarks of VWware Inc in the United
+States, other countries, or both.
+'''
+
+# Imports
+###############################################################################################
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import tempfile
+import subprocess
+import __builtin__
+from StringIO import StringIO
+import config
+import stats
+import simulator
+import hmc
+import cachefile
+import newid
+import lsnpivs
+import tblpar
+import healthcheck
+import nim
+import mklparconf
+##############################################################################################
+#
+# Benchmark
+#
+# The workflows of PowerAdm are measured on synthetic fleets of the
+# simulator (see simulator.py): wall time, round trips (HMC, VIOS and NIM
+# commands), bytes returned by the commands and peak RSS. Each workflow runs
+# on its own process, with an empty PowerAdm home (no caches).
+#
+# The results are compared with the budgets of data/benchmark_budgets.json
+# (round trips and time by fleet size and workflow) and the benchmark fails
+# (exit 1) when a workflow is over its budget:
+#
+#   python benchmark.py [-sizes 10x600,50x3000] [-workflows mkid,npiv] [-update]
+#
+# The sizes are FRAMESxLPARS. -update writes the budgets from the results
+# (the time with budget_slack). The latency of the simulator is the one of
+# the budgets file, so the times are the same in any config.
+##############################################################################################
+
+# fleet sizes (FRAMESxLPARS) measured by default
+default_sizes = ['10x600', '50x3000']
+
+# the time budget is the time measured with this slack
+budget_slack = 1.5
+
+# latency of the simulator when the budgets file doesn't have it
+default_latency = {'sim_hmc_latency': '0.05', 'sim_vios_latency': '0.5',
+                   'sim_nim_latency': '0.1', 'sim_jitter': '0'}
+
+
+def budgetsFile():
+    ''' Returns the budgets file (data/benchmark_budgets.json of this PowerAdm). '''
+
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'benchmark_budgets.json')
+
+
+def loadBudgets(filename):
+    ''' Returns the budgets: {'latency': {config: value},
+                              'budgets': {size: {workflow: {'round_trips', 'time'}}}}
+    '''
+
+    try:
+        f_budgets = open(filename, 'r')
+        try:
+            return cachefile.decode(json.load(f_budgets))
+        finally:
+            f_budgets.close()
+    except (IOError, ValueError):
+        return {'latency': dict(default_latency), 'budgets': {}}
+
+
+def saveBudgets(filename, budgets):
+    ''' Write the budgets file. '''
+
+    f_budgets = open(filename, 'w')
+    json.dump(budgets, f_budgets, indent=1, sort_keys=True)
+    f_budgets.write('\n')
+    f_budgets.close()
+
+
+#
+# Workflows
+#
+
+def target():
+    ''' Returns the LPAR used by the workflows: the last LPAR with VSCSI and
+        NPIV of the last frame (the worst case to the searches).
+    '''
+
+    fleet = simulator.get()
+    system = fleet.systemNames()[-1]
+    frame = fleet.frames[system]
+    for lpar_id in sorted(frame['lpars'].keys(), reverse=True):
+        lpar = frame['lpars'][lpar_id]
+        if lpar['virtual_scsi_adapters'] and lpar['virtual_fc_adapters'] and lpar['lpar_env'] != 'vioserver':
+            return {'system': system, 'vios': frame['vios'], 'lpar_id': str(lpar_id), 'name': lpar['name']}
+    raise ValueError('the fleet has no LPAR with VSCSI and NPIV on %s' % (system))
+
+
+def benchMkID(lpar):
+    ''' ID allocation (NewID.mkID). '''
+
+    newid.NewID().mkID()
+
+
+def benchNPIV(lpar):
+    ''' NPIV listing of a VIOS (lsnpivs.run). '''
+
+    lsnpivs.run(hmc.route(lpar['system']), lpar['system'], lpar['vios'][0], 'all')
+
+
+def benchSearchID(lpar):
+    ''' LPAR search by ID (tblpar info). '''
+
+    tblpar.run(lpar['lpar_id'], 'by_id', 'info')
+
+
+def benchSearchName(lpar):
+    ''' LPAR search by name (tblpar info), the first LPAR found is selected. '''
+
+    old_raw_input = __builtin__.raw_input
+    __builtin__.raw_input = lambda prompt='': '0'
+    try:
+        tblpar.run(lpar['name'], 'by_str', 'info')
+    finally:
+        __builtin__.raw_input = old_raw_input
+
+
+def benchTblpar(lpar):
+    ''' Full diagnostics of an LPAR (tblpar all). '''
+
+    tblpar.run(lpar['lpar_id'], 'by_id', 'all')
+
+
+def benchHealthCheck(lpar):
+    ''' Health check of all the LPARs of the frame of the LPAR. '''
+
+    healthcheck.run(frames=[lpar['system']])
+
+
+def benchNIMIP(lpar):
+    ''' NIM IP allocation (NIMNewIP.getNewIP) on the first NIM server. '''
+
+    address, ipdeploy, gateway, iprange = config.nimservers[sorted(config.nimservers.keys())[0]]
+    ipnet, iprange = iprange.rsplit('.', 1)
+    ipstart, ipend = iprange.split('-')
+    nim.NIMNewIP().getNewIP(address, ipstart, ipend, '%s.' % (ipnet))
+
+
+def benchChange(lpar):
+    ''' Change generation: ID allocation and the change file (as the web
+        interface and the API).
+    '''
+
+    lparid = newid.NewID().mkID()
+    veth = '10/0/%s//0/0/%s' % (simulator.vswitches['VSW-MANAGER-01'][0], 'VSW-MANAGER-01')
+    change = mklparconf.MakeLPARConf('BENCH', 'bench', 'lpar%s' % (lparid), lparid, 'n', 4, 0.5, 1,
+                                     'y', 'n', '', 0, 'y', 'fcs0', 'fcs1', veth, veth, lpar['system'],
+                                     lpar['vios'][0], lpar['vios'][1])
+    change.headerchange()
+    change.writechange()
+    change.closechange()
+
+
+# workflows (in the order of the report)
+workflows = [('mkid', benchMkID), ('npiv', benchNPIV), ('search_id', benchSearchID),
+             ('search_name', benchSearchName), ('tblpar_all', benchTblpar),
+             ('healthcheck', benchHealthCheck), ('nim_ip', benchNIMIP),
+             ('change', benchChange)]
+
+
+#
+# Execution
+#
+
+def setup(size, latency):
+    ''' Configure the simulator with a fleet of size (FRAMESxLPARS) and an
+        empty PowerAdm home. Returns the home (temporary directory).
+    '''
+
+    frames, lpars = size.split('x')
+    pahome = tempfile.mkdtemp(prefix='poweradm-benchmark.')
+    for directory in ('data', 'tmp', 'changes', 'changes_executed', 'nim', 'npiv_cache'):
+        os.makedirs(os.path.join(pahome, 'poweradm', directory))
+    open(os.path.join(pahome, 'poweradm', 'data', 'reserved_ips'), 'w').close()
+
+    config.pahome = pahome
+    config.hmc_backend = 'simulator'
+    config.sim_frames = frames
+    config.sim_lpars = lpars
+    for name in latency.keys():
+        setattr(config, name, latency[name])
+    config.stats = 'disable'
+    simulator.fleet = None
+    simulator.install()
+    return pahome
+
+
+def measure(name):
+    ''' Run a workflow and returns the result: {'time', 'round_trips',
+        'bytes', 'rss' (peak RSS in KB)}.
+    '''
+
+    function = dict(workflows)[name]
+    lpar = target()
+
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    operation = stats.Operation('benchmark %s' % (name), summary=False)
+    start = time.time()
+    try:
+        function(lpar)
+    finally:
+        elapsed = time.time() - start
+        operation.end()
+        sys.stdout = stdout
+
+    round_trips = 0
+    for count, total in operation.calls.values():
+        round_trips += count
+    return {'time': elapsed, 'round_trips': round_trips, 'bytes': operation.bytes,
+            'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+def runWorkflow(size, name, result_file, budgets_file):
+    ''' Run a workflow on this process (child of run()) and write the result
+        (JSON) on result_file.
+    '''
+
+    pahome = setup(size, loadBudgets(budgets_file).get('latency', default_latency))
+    try:
+        result = measure(name)
+    finally:
+        shutil.rmtree(pahome, True)
+    f_result = open(result_file, 'w')
+    json.dump(result, f_result)
+    f_result.close()
+
+
+def run(size, name, budgets_file, verbose=False):
+    ''' Run a workflow on a new process. Returns the result or None if it failed. '''
+
+    fd, result_file = tempfile.mkstemp(prefix='poweradm-benchmark.')
+    os.close(fd)
+    try:
+        output = None
+        if not verbose:
+            output = open(os.devnull, 'w')
+        status = subprocess.call([sys.executable, os.path.abspath(__file__), '-run', size, name,
+                                  result_file, budgets_file], stdout=output, stderr=output)
+        if output is not None:
+            output.close()
+        if status != 0:
+            return None
+        f_result = open(result_file, 'r')
+        try:
+            return json.load(f_result)
+        finally:
+            f_result.close()
+    finally:
+        os.remove(result_file)
+
+
+def check(result, budget):
+    ''' Returns the list of budgets exceeded by the result. '''
+
+    exceeded = []
+    if budget is None:
+        return exceeded
+    if result['round_trips'] > budget['round_trips']:
+        exceeded.append('round trips %s > %s' % (result['round_trips'], budget['round_trips']))
+    if result['time'] > budget['time']:
+        exceeded.append('time %.2fs > %.2fs' % (result['time'], budget['time']))
+    return exceeded
+
+
+def main(argv):
+    ''' Run the benchmark. Returns the exit status (1 if some workflow is
+        over its budget or failed).
+    '''
+
+    sizes = default_sizes
+    names = [name for name, function in workflows]
+    update = False
+    verbose = False
+    budgets_file = budgetsFile()
+
+    args = list(argv[1:])
+    while args:
+        arg = args.pop(0)
+        if arg == '-sizes' and args:
+            sizes = args.pop(0).split(',')
+        elif arg == '-workflows' and args:
+            names = args.pop(0).split(',')
+        elif arg == '-budgets' and args:
+            budgets_file = args.pop(0)
+        elif arg == '-update':
+            update = True
+        elif arg == '-verbose':
+            verbose = True
+        else:
+            print ('Usage: %s [-sizes 10x600,50x3000] [-workflows %s] [-budgets file] [-update] '
+                   '[-verbose]' % (argv[0], ','.join([name for name, function in workflows])))
+            return 2
+
+    for name in names:
+        if name not in dict(workflows):
+            print ('Unknown workflow %s.' % (name))
+            return 2
+
+    budgets = loadBudgets(budgets_file)
+    budgets.setdefault('latency', dict(default_latency))
+    failed = False
+
+    print ('%-10s %-12s %9s %9s %7s %7s %10s %8s  %s' % ('SIZE', 'WORKFLOW', 'TIME', 'BUDGET', 'CALLS',
+                                                      'BUDGET', 'BYTES', 'RSS(MB)', 'STATUS'))
+    for size in sizes:
+        for name in names:
+            result = run(size, name, budgets_file, verbose)
+            if result is None:
+                print ('%-10s %-12s %s' % (size, name, 'FAILED (run with -verbose)'))
+                failed = True
+                continue
+
+            budget = budgets['budgets'].get(size, {}).get(name)
+            exceeded = check(result, budget)
+            if update:
+                budgets['budgets'].setdefault(size, {})[name] = {'round_trips': result['round_trips'],
+                                                                 'time': round(result['time'] * budget_slack, 2)}
+                status = 'updated'
+            elif budget is None:
+                status = 'no budget'
+            elif exceeded:
+                status = 'OVER BUDGET: %s' % (', '.join(exceeded))
+                failed = True
+            else:
+                status = 'ok'
+
+            budget_time = '-'
+            budget_calls = '-'
+            if budget is not None:
+                budget_time = '%.2f' % (budget['time'])
+                budget_calls = budget['round_trips']
+            print ('%-10s %-12s %9.2f %9s %7s %7s %10s %8.1f  %s' % (size, name, result['time'], budget_time,
+                   result['round_trips'], budget_calls, result['bytes'], result['rss'] / 1024.0, status))
+            sys.stdout.flush()
+
+    if update:
+        saveBudgets(budgets_file, budgets)
+        print ('\nBudgets written on %s' % (budgets_file))
+    if failed:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) == 6 and sys.argv[1] == '-run':
+        runWorkflow(*sys.argv[2:])
+    else:
+        sys.exit(main(sys.argv))
@@ -31,21 +31,83 @@ States, other countries, or both.
 ###############################################################################################
 import os
 import time
+import json
+import fcntl
+import tempfile
+import threading
+from collections import OrderedDict
+import config
 ###############################################################################################
 
+# in-process LRU of the cache files {filename: (update time, value)}
+memory = OrderedDict()
+memory_lock = threading.Lock()
+
+# cache files being refreshed by this process
+refreshing = set()
+
+def memoryGet(filename):
+    ''' Returns the (update time, value) from the memory or None. '''
+
+    memory_lock.acquire()
+    try:
+        if filename not in memory:
+            return None
+        entry = memory.pop(filename)
+        memory[filename] = entry
+        return entry
+    finally:
+        memory_lock.release()
+
+def memorySet(filename, entry):
+    ''' Store (update time, value) on memory, removing the least recently used. '''
+
+    memory_lock.acquire()
+    try:
+        if filename in memory:
+            del memory[filename]
+        memory[filename] = entry
+        while len(memory) > max(int(config.cache_memory_entries), 1):
+            memory.popitem(last=False)
+    finally:
+        memory_lock.release()
+
+def decode(value):
+    ''' Convert the unicode strings loaded from JSON to str. '''
+
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    elif isinstance(value, list):
+        return [decode(item) for item in value]
+    elif isinstance(value, dict):
+        return dict([(decode(key), decode(item)) for key, item in value.items()])
+    return value
+
+
 class CacheFile():
     '''It's is a simple cache file.
 
+       The value returned by cmd_update can be a string, number, list or dict
+       and it's stored as JSON. The file is written using a temporary file
+       and rename (readers never see a truncated file) and the update is done
+       only by one process/thread at time (lock on <filename>.lock).
+
+       When the cache is expired the old value is used and the update is
+       executed on background. Only if the cache is older than
+       config.cache_max_stale (or don't exists) the caller waits the update.
+
+       The entries are kept in memory too (LRU of config.cache_memory_entries).
+
        Attributes:
        filename         the file you want store
        time_refresh     time of the refresh in seconds
-       cmd_update       the output you want store in the cache file
+       cmd_update       the function that returns the value you want store
        return_type      t_return to return and t_print to print
 
        Sample to use:
 
        def lsnports_cmd():
-           lsnports_data = commands.getoutput('ssh -l xxxx command_foo_bar')
+           return hmc.getSystem(system).viosvrcmd(system, vios, 'lsnports')
 
        lsnports = cachefile.CacheFile('lsnports.cache', '600', lsnports_cmd, 't_print')
        lsnports.cache()
@@ -57,47 +119,127 @@ class CacheFile():
         self.cmd_update = cmd_update
         self.return_type = return_type
 
-    def cache(self):
-        ''' Main of Class CacheFile.
-            It's get the cache or update if cache don't exists or depracieted
+    def lock(self, blocking=True):
+        ''' Get the update lock. Returns the lock file or None if not blocking
+            and other process/thread is updating.
         '''
 
-        def cacheUpdate():
-            ''' Update the file cache '''
-
-            global text_file
-            self.cmd_update
-            text_file = open(self.filename, 'w')
-            text_file.write('%s ' % self.cmd_update())
-            text_file.close()
-
-        def readCache():
-            ''' Read the file cache content '''
-
-            with open(self.filename, 'r') as content_file:
-                content = content_file.read()
-            if self.return_type == 't_print':
-                print content
-            elif self.return_type == 't_return':
-                return content
-            else:
-                print 'Return type error'
+        f_lock = open('%s.lock' % (self.filename), 'a')
+        flags = fcntl.LOCK_EX
+        if not blocking:
+            flags = flags | fcntl.LOCK_NB
+        try:
+            fcntl.flock(f_lock.fileno(), flags)
+        except IOError:
+            f_lock.close()
+            return None
+        return f_lock
+
+    def unlock(self, f_lock):
+        ''' Release the update lock. '''
+
+        fcntl.flock(f_lock.fileno(), fcntl.LOCK_UN)
+        f_lock.close()
+
+    def readCache(self):
+        ''' Read the file cache. Returns (update time, value) or None. '''
+
+        try:
+            content_file = open(self.filename, 'r')
+            try:
+                content = json.load(content_file)
+            finally:
+                content_file.close()
+            entry = (content['time'], decode(content['value']))
+        except (IOError, ValueError, KeyError, TypeError):
+            return None
+        memorySet(self.filename, entry)
+        return entry
+
+    def writeCache(self, value):
+        ''' Write the file cache (atomic using rename). '''
+
+        entry = (time.time(), value)
+        fd, tmp_file = tempfile.mkstemp(prefix='.%s.' % (os.path.basename(self.filename)),
+                                        dir=os.path.dirname(os.path.abspath(self.filename)))
+        text_file = os.fdopen(fd, 'w')
+        json.dump({'time': entry[0], 'value': entry[1]}, text_file)
+        text_file.close()
+        os.rename(tmp_file, self.filename)
+        memorySet(self.filename, entry)
+        return entry
+
+    def cacheUpdate(self, blocking=True):
+        ''' Update the file cache. Only one process/thread runs cmd_update,
+            the others wait and use the new value.
+        '''
 
+        f_lock = self.lock(blocking)
+        if f_lock is None:
+            return None
+        try:
+            # other process can update it while waiting the lock
+            entry = self.readCache()
+            if entry is not None and not self.expired(entry):
+                return entry
+            return self.writeCache(self.cmd_update())
+        finally:
+            self.unlock(f_lock)
+
+    def backgroundUpdate(self):
+        ''' Update the file cache on a thread (the process waits it on exit). '''
+
+        memory_lock.acquire()
+        try:
+            if self.filename in refreshing:
+                return
+            refreshing.add(self.filename)
+        finally:
+            memory_lock.release()
+
+        def update():
+            try:
+                self.cacheUpdate(blocking=False)
+            finally:
+                memory_lock.acquire()
+                refreshing.discard(self.filename)
+                memory_lock.release()
+
+        # stats imports cachefile
+        import stats
+        threading.Thread(target=stats.bind(update), name='cache-%s' % (self.filename)).start()
+
+    def expired(self, entry):
+        ''' Returns True if the entry is older than time_refresh '''
+
+        return (time.time() - entry[0]) > self.time_refresh
+
+    def returnValue(self, value):
+        ''' Print or return the value, based on return_type '''
+
+        if self.return_type == 't_print':
+            print value
+        elif self.return_type == 't_return':
+            return value
+        else:
+            print 'Return type error'
 
-        # verify if cache file exists
-        if os.path.isfile(self.filename):
+    def cache(self):
+        ''' Main of Class CacheFile.
+            It's get the cache or update if cache don't exists or depracieted
+        '''
 
-            if (time.time() - os.path.getmtime(self.filename)) > self.time_refresh:
-                # if time to refresh is > then file it'll be updated
-                cacheUpdate()
-                return readCache()
+        # memory, then file
+        entry = memoryGet(self.filename)
+        if entry is None or self.expired(entry):
+            entry = self.readCache()
 
-            else:
-                # if time to refresh is < just use the file
-                return readCache()
+        if entry is None or (time.time() - entry[0]) > (self.time_refresh + int(config.cache_max_stale)):
+            # don't exists or too old, wait the update
+            entry = self.cacheUpdate()
 
-        # if file don't exists the file is created
-        else:
-            cacheUpdate()
-            return readCache()
+        elif self.expired(entry):
+            # use the old value and update on background
+            self.backgroundUpdate()
 
+        return self.returnValue(entry[1])
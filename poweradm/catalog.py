@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+PowerAdm
+catalog.py
+
+Copyright (c) 2016 Kairo Araujo
+
+It was created for personal use. There are no guarantees of the author.
+Use at your own risk.
+
+Permission to use, copy, modify, and distribute this software for any
+purpose with or without fee is hereby granted, provided that the above
+copyright notice and this permission notice appear in all copies.
+
+THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+IBM, Power, PowerVM (a.k.a. VIOS) are registered trademarks of IBM Corporation in
+the United States, other countries, or both.
+VMware, vCenter, vCenter Orchestrator are registered trademarks of VWware Inc in the United
+States, other countries, or both.
+'''
+
+# Imports
+###############################################################################################
+import config
+import nim
+import npiv
+import parallel
+import hmc
+##############################################################################################
+#
+# Catalog
+#
+# All the lists used by the API (apimain.py -json/-catalog) in one document,
+# instead of one call for the size and one call for each position.
+##############################################################################################
+
+# items of the catalog
+items = ['systems', 'nimstatus', 'sspstatus', 'pools', 'vswitches', 'npiv', 'deploys',
+         'osversions', 'nimservers']
+
+
+def npivPorts(systems=None):
+    ''' Returns the NPIV port model of the two VIOS of the systems
+        {system: {'vio1': npiv model, 'vio2': npiv model}}, collected
+        concurrently.
+
+        Args:
+          systems (list): the systems (default all).
+    '''
+
+    if systems is None:
+        systems = list(config.systems.keys())
+
+    tasks = []
+    for system in systems:
+        tasks.append((system, 'vio1'))
+        tasks.append((system, 'vio2'))
+
+    npivs = npiv.NPIV()
+    def ports(task):
+        return npivs.ports(task[0], task[1])
+
+    npiv_ports = {}
+    for task, ports_vios in zip(tasks, parallel.pmap(ports, tasks, key=lambda task: hmc.route(task[0]))):
+        npiv_ports.setdefault(task[0], {})[task[1]] = ports_vios
+    return npiv_ports
+
+
+def collect(what='all', system=None):
+    ''' Returns the catalog as a dict.
+
+        Args:
+          what (str): one of the items or 'all'.
+          system (str): the system of the npiv item (default all systems).
+    '''
+
+    if what != 'all' and what not in items:
+        raise ValueError('the catalog item needs be all or one of: %s' % (', '.join(items)))
+
+    catalog = {}
+    if what in ('all', 'systems'):
+        catalog['systems'] = list(config.systems.keys())
+    if what in ('all', 'nimstatus'):
+        catalog['nimstatus'] = config.enable_nim_deploy
+    if what in ('all', 'sspstatus'):
+        catalog['sspstatus'] = config.active_ssp
+    if what in ('all', 'pools'):
+        catalog['pools'] = list(config.storage_pools)
+    if what in ('all', 'vswitches'):
+        catalog['vswitches'] = list(config.virtual_switches)
+    if what in ('all', 'npiv'):
+        if system is None:
+            catalog['npiv'] = npivPorts()
+        else:
+            catalog['npiv'] = npivPorts([system])
+    if what in ('all', 'deploys'):
+        catalog['deploys'] = nim.NIMFileFind().listDeploy()
+    if what in ('all', 'osversions'):
+        catalog['osversions'] = nim.NIMGetVer().listOSVersion()
+    if what in ('all', 'nimservers'):
+        catalog['nimservers'] = nim.NIMServer().listNIM()
+    return catalog
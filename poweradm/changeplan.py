@@ -0,0 +1,495 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+PowerAdm
+changeplan.py
+
+Copyright (c) 2016 Kairo Araujo
+
+It was created for personal use. There are no guarantees of the author.
+Use at your own risk.
+
+Permission to use, copy, modify, and distribute this software for any
+purpose with or without fee is hereby granted, provided that the above
+copyright notice and this permission notice appear in all copies.
+
+THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+IBM, Power, PowerVM (a.k.a. VIOS) are registered trademarks of IBM Corporation in
+the United States, other countries, or both.
+VMware, vCenter, vCenter Orchestrator are registered trademarks of VWware Inc in the United
+States, other countries, or both.
+'''
+
+# Imports
+###############################################################################################
+import os
+import json
+import time
+import fcntl
+import shlex
+import Queue
+import string
+import threading
+import subprocess
+import config
+import hmc
+import viosmap
+import stats
+##############################################################################################
+#
+# Change plan
+#
+# The change is a DAG of typed steps. The steps are stored on the change file
+# as '#STEP {json}' lines (as the '#LPARID' line) and the shell script body is
+# written from the same steps, so the file still can be executed by 'sh'.
+# execchange.Exe runs the steps with ChangePlan.run(): a step starts when all
+# the steps on its 'after' list are done, so the steps of VIO1 and VIO2 run at
+# the same time.
+#
+# Types of steps:
+#   hmc       cmd on the HMC (cmd is the shell form of the ssh arguments).
+#   adapter   find the server adapter (vhost/vfchost) of a slot on the VIOS
+#             and keep it on the variable var (used as $var on next steps).
+#   saveprof  save the current configuration of a partition on its profile.
+#   wwnget    write the WWPNs of the physical FC ports (VIOS/fcs on ports) and
+#             of the virtual FC adapters of the LPAR (target) on filename.
+#   shell     cmd executed on the local shell.
+#
+# Each step executed is recorded on the journal of the change (<change>.journal)
+# with its result and the variables set by it. When the change runs again the
+# steps done are skipped and the run resumes at the step that failed.
+##############################################################################################
+
+# marker of the steps on the change file
+step_marker = '#STEP '
+
+# types of steps
+step_kinds = ['hmc', 'adapter', 'saveprof', 'wwnget', 'shell']
+
+# line around the WWPNs written by wwnget
+wwn_separator = '*' * 61
+
+# messages of the check of each step (same of the shell script)
+msg_ok = 'Command OK. Continuing'
+msg_error = 'An error has occurred. Check the actions taken.'
+
+
+class Step:
+    ''' A step of the change.
+
+        Args:
+          name (str): unique name of the step on the plan.
+          kind (str): type of the step (step_kinds).
+          msg (str): message showed when the step starts.
+          after (list): names of the steps that need be done before.
+          system (str): the system (frame) for adapter, saveprof and wwnget. On
+                        the other steps, the frame of the change (its HMC).
+          target (str): the partition (VIOS) for adapter and saveprof, the
+                        LPAR for wwnget.
+          cmd (str): the command for hmc and shell.
+          var (str): the variable name for adapter.
+          dev_type (str): vscsi or vfc for adapter.
+          slot (str): the slot number for adapter.
+          ports (list): the physical FC ports ('VIOS/fcs') for wwnget.
+          filename (str): the file where wwnget writes the WWPNs.
+          check (bool): check the exit status of the command.
+    '''
+
+    def __init__(self, name, kind, msg='', after=None, system=None, target=None, cmd=None, var=None,
+                 dev_type=None, slot=None, ports=None, filename=None, check=True):
+        if kind not in step_kinds:
+            raise ValueError('the step kind needs be one of: %s' % (', '.join(step_kinds)))
+        self.name = name
+        self.kind = kind
+        self.msg = msg
+        self.after = list(after or [])
+        self.system = system
+        self.target = target
+        self.cmd = cmd
+        self.var = var
+        self.dev_type = dev_type
+        self.slot = slot
+        self.ports = ports
+        self.filename = filename
+        self.check = check
+
+    def toDict(self):
+        ''' Returns the step as dict (to JSON). '''
+
+        step = {}
+        for attr in ('name', 'kind', 'msg', 'after', 'system', 'target', 'cmd', 'var',
+                     'dev_type', 'slot', 'ports', 'filename', 'check'):
+            if getattr(self, attr) is not None:
+                step[attr] = getattr(self, attr)
+        return step
+
+    def shell(self, hmc_server):
+        ''' Returns the step as shell script. '''
+
+        script = ''
+        if self.msg:
+            script += "\n\necho '%s'" % (self.msg)
+
+        if self.kind == 'hmc':
+            script += "\n\nssh %s -l poweradm %s" % (hmc_server, self.cmd)
+
+        elif self.kind == 'adapter':
+            script += ("\n\n%s=$(ssh -l poweradm %s viosvrcmd -m %s -p %s -c \"\'%s\'\""
+                       "| grep \"\\-C%s \" | awk \'{ print $1 }\')" %
+                       (self.var, hmc_server, self.system, self.target,
+                        viosmap.lsmap_cmds[self.dev_type], self.slot))
+
+        elif self.kind == 'saveprof':
+            script += ("\n\nssh %s -l poweradm mksyscfg -r prof -m %s -o save -p %s -n $(ssh %s -l poweradm "
+                       "lssyscfg -r lpar -m %s --filter \"lpar_names=%s\" -F curr_profile) --force" %
+                       (hmc_server, self.system, self.target, hmc_server, self.system, self.target))
+
+        elif self.kind == 'wwnget':
+            script += ("\n\necho '' >> %s\n"
+                       "echo '%s' >> %s\n"
+                       "echo 'Physical HBA and LPAR %s NPIV (date: %s)'" %
+                       (self.filename, wwn_separator, self.filename, self.target, time.strftime("%m%d%Y-%H%M%S")))
+            for index in range(len(self.ports)):
+                vios, fcs = self.ports[index].split('/')
+                script += ("\necho 'Physical Adapter to LPAR fcs%s: '$(ssh -l poweradm %s viosvrcmd -m %s -p %s "
+                           "-c \"\'lsdev -dev %s -vpd\'\" | grep \'Network Address\' | cut -d. -f14) >> %s" %
+                           (index, hmc_server, self.system, vios, fcs, self.filename))
+            script += ("\nssh -l poweradm %s lssyscfg -r prof -m %s -F virtual_fc_adapters --filter "
+                       "lpar_names=\'%s\' | awk -F \'/\' \'{ print \"fcs0 (active,inactive):\\t\"$6\"\\nfcs1 "
+                       "(active,inactive):\\t\"$12 }\' >> %s\n"
+                       "echo '%s' >> %s\n"
+                       "echo '' >> %s\n"
+                       "cat %s" % (hmc_server, self.system, self.target, self.filename, wwn_separator,
+                                   self.filename, self.filename, self.filename))
+
+        elif self.kind == 'shell':
+            script += "\n\n%s" % (self.cmd)
+
+        if self.check:
+            script += ("\nif [ $? != 0 ];"
+                       "then\n"
+                       "\techo '%s'; \n"
+                       "\texit;\n"
+                       "else\n"
+                       "\techo '%s';\n"
+                       "fi\n" % (msg_error, msg_ok))
+
+        return script
+
+    def execute(self, hmc_client, variables):
+        ''' Execute the step. Returns (ok, output).
+
+            Args:
+              hmc_client (hmc.HMCClient): the HMC of the change.
+              variables (dict): variables of the plan ($var), updated by adapter.
+        '''
+
+        if self.kind == 'hmc':
+            cmd = string.Template(self.cmd).safe_substitute(variables)
+            # the command as the ssh sends to HMC after the shell parse
+            result = hmc_client.run(' '.join(shlex.split(cmd)))
+            return (result.ok(), result.output)
+
+        elif self.kind == 'adapter':
+            result = hmc_client.run("viosvrcmd -m %s -p %s -c '%s'" % (self.system, self.target,
+                                                                        viosmap.lsmap_cmds[self.dev_type]))
+            if not result.ok():
+                return (False, result.output)
+            # update the shared index with the new devices
+            vios_map = viosmap.get(self.system, self.target, hmc_client.host)
+            vios_map.setSlots(self.dev_type, result.output)
+            adapter = vios_map.adapter(self.dev_type, self.slot)
+            if adapter == '':
+                return (False, 'Server adapter of slot %s not found on %s' % (self.slot, self.target))
+            variables[self.var] = adapter
+            return (True, '')
+
+        elif self.kind == 'saveprof':
+            result = hmc_client.run('lssyscfg -r lpar -m %s --filter "lpar_names=%s" -F curr_profile' %
+                                    (self.system, self.target))
+            if not result.ok():
+                return (False, result.output)
+            result = hmc_client.run('mksyscfg -r prof -m %s -o save -p %s -n %s --force' %
+                                    (self.system, self.target, result.output.strip()))
+            return (result.ok(), result.output)
+
+        elif self.kind == 'wwnget':
+            header = 'Physical HBA and LPAR %s NPIV (date: %s)' % (self.target, time.strftime("%m%d%Y-%H%M%S"))
+            lines = ['', wwn_separator]
+            ok = True
+            for index in range(len(self.ports)):
+                vios, fcs = self.ports[index].split('/')
+                result = hmc_client.run("viosvrcmd -m %s -p %s -c 'lsdev -dev %s -vpd'" % (self.system, vios, fcs))
+                wwpn = ''
+                for line in result.output.split('\n'):
+                    if 'Network Address' in line:
+                        wwpn = line.split('Network Address', 1)[1].lstrip('.').strip()
+                ok = ok and result.ok()
+                lines.append('Physical Adapter to LPAR fcs%s: %s' % (index, wwpn))
+
+            result = hmc_client.run("lssyscfg -r prof -m %s -F virtual_fc_adapters --filter lpar_names='%s'" %
+                                    (self.system, self.target))
+            ok = ok and result.ok()
+            for line in result.output.split('\n'):
+                if not line.strip():
+                    continue
+                # the WWPNs of the two client adapters (as awk -F / $6 and $12)
+                fields = line.split('/') + [''] * 12
+                lines.append('fcs0 (active,inactive):\t%s\nfcs1 (active,inactive):\t%s' % (fields[5], fields[11]))
+            lines.extend([wwn_separator, ''])
+
+            f_wwn = open(self.filename, 'a')
+            f_wwn.write('%s\n' % ('\n'.join(lines)))
+            f_wwn.close()
+            return (ok, '%s\n%s' % (header, '\n'.join(lines)))
+
+        elif self.kind == 'shell':
+            cmd = string.Template(self.cmd).safe_substitute(variables)
+            proc = subprocess.Popen(['sh', '-c', cmd], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            output = proc.communicate()[0]
+            return (proc.returncode == 0, output.rstrip('\n'))
+
+
+def stepFromDict(step):
+    ''' Returns the Step of a dict (from JSON). '''
+
+    args = {}
+    for attr, value in step.items():
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        elif isinstance(value, list):
+            value = [str(item) for item in value]
+        args[str(attr)] = value
+    return Step(**args)
+
+
+class Journal:
+    ''' Journal of the steps executed of a change.
+
+        Journal syntax (one JSON per line):
+            {"step": name, "ok": true/false, "time": epoch, "vars": {var: value}}
+
+        Args:
+          filename (str): the journal file (<change>.journal).
+    '''
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.f_journal = None
+        self.lock = threading.Lock()
+
+    def open(self):
+        ''' Open the journal to record. Returns False if the change is
+            running by other process.
+        '''
+
+        self.f_journal = open(self.filename, 'a')
+        try:
+            fcntl.flock(self.f_journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            self.f_journal.close()
+            self.f_journal = None
+            return False
+        return True
+
+    def close(self):
+        ''' Close the journal opened by open(). '''
+
+        if self.f_journal is not None:
+            fcntl.flock(self.f_journal.fileno(), fcntl.LOCK_UN)
+            self.f_journal.close()
+            self.f_journal = None
+
+    def read(self):
+        ''' Returns (done, variables): the names of the steps done and the
+            variables set by them.
+        '''
+
+        done = set()
+        variables = {}
+        if not os.path.isfile(self.filename):
+            return (done, variables)
+
+        f_journal = open(self.filename, 'r')
+        for line in f_journal.readlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # the last line can be incomplete (interrupted run)
+                continue
+            if record.get('ok'):
+                done.add(str(record['step']))
+                for var, value in record.get('vars', {}).items():
+                    variables[str(var)] = str(value)
+            else:
+                done.discard(str(record['step']))
+        f_journal.close()
+        return (done, variables)
+
+    def record(self, step, ok, variables):
+        ''' Record the result of a step (written to disk before return). '''
+
+        record = {'step': step.name, 'ok': ok, 'time': int(time.time()), 'vars': {}}
+        if ok and step.var is not None and step.var in variables:
+            record['vars'][step.var] = variables[step.var]
+
+        self.lock.acquire()
+        try:
+            self.f_journal.write('%s\n' % (json.dumps(record, sort_keys=True)))
+            self.f_journal.flush()
+            os.fsync(self.f_journal.fileno())
+        finally:
+            self.lock.release()
+
+
+class ChangePlan:
+    ''' The DAG of steps of a change.
+
+        Args:
+          hmc_server (str): HMC address (default config.hmcserver).
+    '''
+
+    def __init__(self, hmc_server=None):
+        if hmc_server is None:
+            hmc_server = config.hmcserver
+        self.hmc_server = hmc_server
+        self.steps = []
+        self.names = {}
+
+    def add(self, step):
+        ''' Add a step. The steps on step.after need be added before. '''
+
+        if step.name in self.names:
+            raise ValueError('the step %s already exists' % (step.name))
+        for name in step.after:
+            if name not in self.names:
+                raise ValueError('the step %s needs the unknown step %s' % (step.name, name))
+        self.names[step.name] = step
+        self.steps.append(step)
+        return step
+
+    def write(self, file_change):
+        ''' Write the steps (#STEP lines) and the shell script of the steps. '''
+
+        file_change.write('\n')
+        for step in self.steps:
+            file_change.write('\n%s%s' % (step_marker, json.dumps(step.toDict(), sort_keys=True)))
+        for step in self.steps:
+            file_change.write(step.shell(self.hmc_server))
+
+    def run(self, output=None, journal=None, cancel=None):
+        ''' Execute the steps. The independent steps run concurrently (up to
+            config.max_threads). After a failure (or cancel) no new step starts.
+
+            Args:
+              output: function called with each line of output (default print).
+              journal (Journal): the steps done on it are skipped and the
+                                 steps executed are recorded.
+              cancel (threading.Event): when set, the steps running finish and
+                                        no new step starts.
+
+            Returns True if all the steps are done.
+        '''
+
+        if output is None:
+            def output(line):
+                print line
+
+        hmc_client = hmc.get(self.hmc_server)
+        variables = {}
+        done = set()
+        failed = []
+        pending = list(self.steps)
+        running = set()
+        results = Queue.Queue()
+
+        if journal is not None:
+            if not journal.open():
+                output('The change is running by other process. Exiting.')
+                return False
+
+        try:
+            if journal is not None:
+                done, variables = journal.read()
+                for step in list(pending):
+                    if step.name in done:
+                        pending.remove(step)
+                if done:
+                    output('Resuming the change: %s of %s steps already done.' % (len(self.steps) - len(pending),
+                                                                              len(self.steps)))
+
+            def worker(step):
+                try:
+                    ok, step_output = step.execute(hmc_client, variables)
+                except Exception, error:
+                    ok, step_output = (False, str(error))
+                results.put((step, ok, step_output))
+
+            while pending or running:
+                if cancel is not None and cancel.is_set() and pending and 'cancel' not in failed:
+                    output('The change was cancelled. Waiting the steps running.')
+                    failed.append('cancel')
+                if not failed:
+                    for step in list(pending):
+                        if len(running) >= int(config.max_threads):
+                            break
+                        if set(step.after).issubset(done):
+                            pending.remove(step)
+                            running.add(step.name)
+                            thread = threading.Thread(target=stats.bind(worker), args=(step,))
+                            thread.daemon = True
+                            thread.start()
+
+                if not running:
+                    break
+
+                step, ok, step_output = results.get()
+                running.discard(step.name)
+
+                # the output of each step is showed together
+                if step.msg:
+                    output(step.msg)
+                if step_output:
+                    for line in step_output.split('\n'):
+                        output(line)
+                if ok or not step.check:
+                    if step.check:
+                        output(msg_ok)
+                    done.add(step.name)
+                else:
+                    output(msg_error)
+                    failed.append(step.name)
+                if journal is not None:
+                    journal.record(step, ok or not step.check, variables)
+        finally:
+            if journal is not None:
+                journal.close()
+
+        return not failed and not pending
+
+
+def load(changefile):
+    ''' Returns the ChangePlan of a change file or None if the file has no
+        steps (old change files, executed by sh).
+    '''
+
+    plan = None
+    f_change = open(changefile, 'r')
+    for line in f_change.readlines():
+        if line.startswith(step_marker):
+            step = stepFromDict(json.loads(line[len(step_marker):]))
+            if plan is None:
+                plan = ChangePlan()
+            # the change runs on the HMC of its frame
+            if step.system is not None and plan.hmc_server == config.hmcserver:
+                plan.hmc_server = hmc.route(step.system)
+            plan.add(step)
+    f_change.close()
+    return plan
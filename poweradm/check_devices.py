@@ -29,19 +29,16 @@ in the United States, other countries, or both.
 
 # Imports
 ###############################################################################
-import commands
-import globalvar
-import config
-import os.path
+import viosmap
 
 
-def check(dev_type, hmc, psystem, vio, dev_id):
+def check(dev_type, hmc_server, psystem, vio, dev_id):
     '''
         This function check if a ID is used by devices in Virtual I/O (VIOS).
         This requires some arguments:
 
         dev_type    : vscsi for Virtual SCSI or vfc for Virtual Fiber Channel
-        hmc         : Hardware Management (HMC) address
+        hmc_server  : Hardware Management (HMC) address
         psystem     : pSystem name (frame name)
         vio         : Virtual I/O name (the same name on HMC)
         dev_id      : The device ID, example: 201
@@ -51,53 +48,12 @@ def check(dev_type, hmc, psystem, vio, dev_id):
         free -> The device id is free.
     '''
 
-    # Verify the dev type is vscsi or vfc
-    if dev_type == 'vscsi':
-
-        cmd_check = ('ssh -l poweradm %s viosvrcmd -m %s -p %s -c '
-                     '\"\'lsmap -all\'\"' % (hmc, psystem, vio))
-
-    elif dev_type == 'vfc':
-
-        cmd_check = ('ssh -l poweradm %s viosvrcmd -m %s -p %s -c '
-                     '\"\'lsmap -all -npiv\'\"' % (hmc, psystem, vio))
-
+    # The lsmap of the VIOS is collected only once per session and parsed in
+    #an index of the used slots (viosmap.py), so checking many IDs doesn't
+    #need read all the lsmap lines again. The dev_type is validated there.
+    if viosmap.get(psystem, vio, hmc_server).isUsed(dev_type, dev_id):
+        dev_status = 'used'
     else:
-
-        print 'Error: the dev_type needs be vscsi or vfc'
-
-    # This a type of cache file per session.
-    # All the time the PowerAdm runs a time string is generated in timestr in
-    #globalvar.py and the files are created by session.
-    # First it checks if exist a file with name frame-vio-device_type-timestr
-    #and if not exists ir collected by this function. Else the timestr is the
-    #same it doesn't need collect again. It's works well :)
-    #
-    if os.path.isfile('%s/poweradm/tmp/%s-%s-%s-%s.lst' %
-            (config.pahome, psystem, vio, dev_type, globalvar.timestr)):
-
-        check_output = commands.getoutput('cat %s/poweradm/tmp/%s-%s-%s-%s.lst'
-                % (config.pahome, psystem, vio, dev_type, globalvar.timestr))
-
-    else:
-
-        check_output = commands.getoutput(cmd_check)
-        vscsi_file = open('%s/poweradm/tmp/%s-%s-%s-%s.lst' %
-                (config.pahome, psystem, vio, dev_type, globalvar.timestr), 'w')
-        vscsi_file.write(check_output + '\n')
-        vscsi_file.close()
-
-    # check if exist some virtual device with the ID. If exist returns used,
-    #else free.
-    dev_status = 'free'
-    for l_output in check_output.split('\n'):
-        if ('-C1%s ' % dev_id) in l_output:
-            dev_status = 'used'
-        elif ('-C2%s ' % dev_id) in l_output:
-            dev_status = 'used'
-        elif ('-C3%s ' % dev_id) in l_output:
-            dev_status = 'used'
-        elif ('-C4%s ' % dev_id) in l_output:
-            dev_status = 'used'
+        dev_status = 'free'
 
     return dev_status
@@ -41,6 +41,93 @@ pahome='/home/poweradm/PowerAdm'
 # hmc server
 hmcserver = 'myhmcserver'
 
+# Many HMCs
+#
+# when the frames are managed by many HMCs, each frame is routed to its HMC:
+# the one of hmc_systems or, if the frame is not there, the HMC that lists
+# the frame (discovered on hmcserver and hmcservers at the same time).
+#
+# other HMCs. Syntax: ['hmc2', 'hmc3']
+hmcservers = []
+# HMC of each frame. Syntax: {'SYSTEM NAME': 'hmc2'}
+hmc_systems = {}
+# discover the frames of the HMCs: enable or disable (all on hmcserver)
+hmc_discovery = 'enable'
+# time in seconds to use the frames discovered (data/hmc_routes.json)
+hmc_routes_time = '86400'
+# max number of commands at the same time of some HMCs (default
+# hmc_max_concurrency). Syntax: {'hmc2': '16'}
+hmc_concurrency = {}
+
+# HMC sessions
+#
+# PowerAdm keeps ssh sessions opened to the HMC (OpenSSH ControlMaster) and
+# runs all the commands through them, without a new ssh login per command.
+#
+# number of persistent sessions per HMC
+hmc_sessions = '2'
+# time in seconds to keep an idle session opened
+hmc_session_persist = '600'
+# timeout in seconds to each command on HMC (0 to disable)
+hmc_cmd_timeout = '600'
+# max number of commands running at the same time on each HMC
+hmc_max_concurrency = '8'
+# max number of threads to collect informations of frames and VIOS
+max_threads = '16'
+
+# Command backend
+#
+# ssh runs the commands on the HMCs and NIM servers. simulator answers them
+# from a synthetic fleet in memory (poweradm/simulator.py), to test and
+# benchmark without HMCs. With the simulator the systems, virtual_switches
+# and nimservers below are replaced by the ones of the fleet.
+# record runs them as replay_source and writes them on the replay archive,
+# replay answers them from the archive (poweradm/replay.py).
+hmc_backend = 'ssh'
+# size of the synthetic fleet: frames, VIOS per frame (2 or 4) and LPARs
+sim_frames = '50'
+sim_vios_per_frame = '4'
+sim_lpars = '3000'
+# number of HMCs (the frames are split between simhmc01, simhmc02, ...)
+sim_hmcs = '1'
+# the same seed makes the same fleet
+sim_seed = '1'
+# latency in seconds of each HMC command, of each viosvrcmd (added to the
+# HMC command) and of each NIM command. The latency varies +/- sim_jitter.
+sim_hmc_latency = '0.05'
+sim_vios_latency = '0.5'
+sim_nim_latency = '0.1'
+sim_jitter = '0.2'
+
+# Record and replay
+#
+# archive of the commands (default poweradm/data/replay.jsonl.gz)
+replay_archive = ''
+# backend of the commands recorded: ssh or simulator
+replay_source = 'ssh'
+# time of the commands on replay: original (the time recorded) or zero
+replay_timing = 'original'
+# regular expressions of secrets removed from the commands and outputs on
+# the record (besides passwords and ssh keys). The group 1 is kept.
+# Ex: [r'(community\s+)\S+']
+replay_scrub = []
+
+# LPAR IDs leases
+#
+# The next free LPAR ID is reserved (lease) to the session that got it, then
+# to the change file created and it is released when the change is executed.
+#
+# time in seconds of the session lease (if no change file is created)
+id_lease_time = '3600'
+
+# VIOS mappings
+#
+# The lsmap of each VIOS (slots and mappings of the server adapters) is kept
+# in memory by each PowerAdm process and dropped when a change is executed.
+#
+# time in seconds to use the lsmap kept in memory
+viosmap_cache_time = '300'
+
 # Put here the minimum and maximum memory percent to lpars
 mem_min = 50
 mem_max = 50
@@ -153,6 +240,18 @@ conn_monitoring = '1'
 # Debug api parser
 api_debug = 'no'
 
+# API daemon
+#
+# 'apimain.py -daemon' runs the API as a service, with configs, caches and
+# HMC sessions always loaded. When it is running, the apimain.py options are
+# answered by it.
+#
+# Unix socket (poweradm/tmp/apimain.sock) enable or disable
+api_socket = 'enable'
+# HTTP address and port (port 0 to disable)
+api_http_address = '127.0.0.1'
+api_http_port = '0'
+
 # NPIV Chache
 #
 # running the 'lsnports' in some VIOS can take a few long seconds.
@@ -163,9 +262,57 @@ npiv_cache = 'enable'
 # time to update the cache files in seconds
 npiv_cache_time = '86400'
 
+# Cache files
+#
+# after the time to update, the old value is still used (and updated on
+# background) until this time in seconds, after that the update is waited.
+cache_max_stale = '86400'
+# number of cache entries kept in memory by each PowerAdm process
+cache_memory_entries = '128'
+
+# LPAR index
+#
+# index of the LPAR IDs of all the frames (frame, name and profile) used on
+# the searches by ID, collected with one 'lssyscfg -r lpar' per frame at
+# the same time. It's collected again when an ID is not found on it.
+#
+# time in seconds to use the index without refresh
+lpar_index_refresh = '3600'
+
+# Change execution
+#
+# the output of the changes is written on changes/<change>.log and showed
+# line by line (CLI and web). Only the last lines are kept in memory.
+change_output_lines = '1000'
+# Jobs
+#
+# the LPAR creations and NIM deploys of the web interface run on background
+# workers. Number of workers:
+job_workers = '4'
+# jobs running at same time on each HMC and on each NIM server
+job_hmc_limit = '2'
+job_nim_limit = '1'
+# number of finished jobs kept on data/jobs.json
+job_history = '200'
+# Statistics
+#
+# time and number of the HMC, VIOS and NIM commands (data/stats.json and
+# web page /stats). enable or disable
+stats = 'enable'
+# print (stderr) the summary of commands at the end of each operation
+stats_summary = 'enable'
 # Web Interface
 #
 # Web port to listen
 web_port = '8080'
 # web IP to listen (0.0.0.0 listening all IPs)
 web_address = '0.0.0.0'
+# mode: development (bottle debug and reloader, threaded server) or
+# production (web_server, without debug and reloader)
+web_mode = 'development'
+# server of the production mode: threaded (one thread per request) or other
+# server supported by bottle (as paste, cherrypy or waitress), with only one
+# process because the sessions and jobs are in memory
+web_server = 'threaded'
+# time in seconds to expire the web sessions (LPAR configuration)
+web_session_time = '3600'
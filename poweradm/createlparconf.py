@@ -29,7 +29,6 @@ States, other countries, or both.
 # Imports
 ###############################################################################################
 import os.path
-import commands
 import globalvar
 import config
 import newid
@@ -38,6 +37,8 @@ import verify
 import execchange
 import fields
 import mklparconf
+import hmc
+import npiv
 
 ###############################################################################################
 #### FRONTEND                                                                              ####
@@ -245,8 +246,11 @@ def lparconfig():
         net_vlan.append(input("Ethernet VLAN (%s): " % config.virtual_switches[vsw_option]))
 
         # Check if VLAN exists on VIOs
-        vlan_list = commands.getoutput('ssh -l poweradm %s lshwres  -r virtualio --rsubtype vswitch -m %s -F | grep %s' %
-                (config.hmcserver, system, config.virtual_switches[vsw_option]))
+        vlan_list = []
+        for l_vswitch in hmc.getSystem(system).getoutput('lshwres -r virtualio --rsubtype vswitch -m %s -F' % (system)).split('\n'):
+            if config.virtual_switches[vsw_option] in l_vswitch:
+                vlan_list.append(l_vswitch)
+        vlan_list = '\n'.join(vlan_list)
 
         if '%s' % (net_vlan[-1]) not in vlan_list:
             print ("\033[1;31mImportant: VLAN %s need to be registered on VIOS!\033[1;00m" % (net_vlan[-1]))
@@ -267,6 +271,8 @@ def lparconfig():
 
     if vfc == 'y':
         # VIOs NPIV selection
+        npivs = npiv.NPIV()
+
         print ("\nFinding on %s the NPIVs availabe.\n"
                "This might take a few minutes...\n" % (vio1))
 
@@ -277,12 +283,8 @@ def lparconfig():
         #          system, vio1))
         # // simulation
 
-        os.system('ssh -l poweradm %s viosvrcmd -m %s -p %s -c \"\'lsnports\'\"' % (config.hmcserver,
-                  system, vio1))
-
-        """ get the file with comments if exists """
-        if os.path.isfile('npiv/%s-%s' % ( system, vio1)):
-            os.system('cat npiv/%s-%s' % ( system, vio1))
+        # lsnports and NPIV notes from the NPIV port model
+        npivs.lsnportsVIO(system, 'vio1')
 
         npiv_vio1 = raw_input('\nWhat HBA (ex: fcs0) you want to use for NPIV to %s?: ' % (vio1))
 
@@ -296,13 +298,8 @@ def lparconfig():
         #          system, vio2))
         # // simulation
 
-        os.system('ssh -l poweradm %s viosvrcmd -m %s -p %s -c \"\'lsnports\'\"' % (config.hmcserver,
-                  system, vio2))
-
-
-        """ get the file with comments if exists """
-        if os.path.isfile('npiv/%s-%s' % ( system, vio2)):
-            os.system('cat npiv/%s-%s' % ( system, vio2))
+        # lsnports and NPIV notes from the NPIV port model
+        npivs.lsnportsVIO(system, 'vio2')
 
         npiv_vio2 = raw_input('\nWhat HBA (ex: fcs0) you want to use for NPIV to %s?: ' % (vio2))
 
@@ -427,18 +424,18 @@ def exec_createlparconf():
 
                 # if not end.
                 if newconfiglpar.answerCheck() == 'n':
-                    print ('Closing the file changes/%s-%s' % (change, globalvar.timestr))
+                    print ('Closing the file changes/%s-%s' % (change, globalvar.getTimestr()))
 
     newchange.closechange()
 
     # check if you want executes the change/ticket after creation
     check_exec_createlpar = verify.CheckOK('\nDo you want execute this change/ticket now %s-%s? (y/n): ' %
-            (change, globalvar.timestr), 'n')
+            (change, globalvar.getTimestr()), 'n')
     check_exec_createlpar.mkCheck()
     if check_exec_createlpar.answerCheck() == 'y':
-        print ('Runing changes/ticket %s-%s' % (change, globalvar.timestr))
-        exec_change_after_creation = execchange.Exe('%s/poweradm/changes/%s_%s.sh' % (config.pahome, change, globalvar.timestr))
+        print ('Runing changes/ticket %s-%s' % (change, globalvar.getTimestr()))
+        exec_change_after_creation = execchange.Exe('%s/poweradm/changes/%s_%s.sh' % (config.pahome, change, globalvar.getTimestr()))
         exec_change_after_creation.runChange()
     else:
         print ('Change/Ticket not executed. Storing %s-%s...\nExiting!' %
-                (change, globalvar.timestr))
+                (change, globalvar.getTimestr()))
@@ -30,16 +30,87 @@ States, other countries, or both.
 
 # Imports
 ###############################################################################################
+import sys
 import time
 import os
+import threading
+import subprocess
+import collections
 import globalvar
 import config
-import commands
+import idalloc
+import changeplan
+import viosmap
+import stats
 ##############################################################################################
 #
 # Class ExecChange
+#
+# The output of the change is sent line by line (print on CLI) and written on
+# the log of the change (<change>.log). Only the last config.change_output_lines
+# lines are kept in memory, so a long change doesn't keep all the log in RAM.
+# The web interface runs the change as a job (jobs.py) and reads the output
+# of the OutputStream while it runs.
 ##############################################################################################
 
+class OutputStream:
+    ''' Bounded buffer of output lines of a change (or job) running on background.
+
+        The lines have sequence numbers, readers keep their position and
+        the lines older than the buffer are skipped.
+
+        Args:
+          size (int): number of lines kept (default config.change_output_lines).
+    '''
+
+    def __init__(self, size=None):
+        if size is None:
+            size = int(config.change_output_lines)
+        self.lines = collections.deque(maxlen=size)
+        self.first = 0
+        self.finished = False
+        self.condition = threading.Condition()
+
+    def write(self, line):
+        ''' Add a line. '''
+
+        self.condition.acquire()
+        try:
+            if len(self.lines) == self.lines.maxlen:
+                self.first += 1
+            self.lines.append(line)
+            self.condition.notifyAll()
+        finally:
+            self.condition.release()
+
+    def close(self):
+        ''' Mark the change as finished. '''
+
+        self.condition.acquire()
+        try:
+            self.finished = True
+            self.condition.notifyAll()
+        finally:
+            self.condition.release()
+
+    def read(self, position, timeout=None):
+        ''' Returns (lines, skipped, position, finished): the lines from the
+            position (waits up to timeout seconds for new lines), the number
+            of lines lost (older than the buffer) and the new position.
+        '''
+
+        self.condition.acquire()
+        try:
+            if position >= self.first + len(self.lines) and not self.finished:
+                self.condition.wait(timeout)
+            skipped = max(0, self.first - position)
+            position = max(position, self.first)
+            lines = list(self.lines)[position - self.first:]
+            return (lines, skipped, position + len(lines), self.finished)
+        finally:
+            self.condition.release()
+
+
 class Exe:
     ''' Execute LPAR change/ticket creation.
 
@@ -50,27 +121,80 @@ class Exe:
     def __init__(self, changefile):
         ''' Initial function to get changefile argument. '''
         self.changefile = changefile
+        self.completed = False
+
+    def runChange(self, output=None, cancel=None):
+        ''' execute the change (changefile arg).
+
+            Args:
+              output: function called with each line of output (default print).
+              cancel (threading.Event): cancel the change (no new step starts).
+
+            Returns the last config.change_output_lines lines of the output.
+        '''
+
+        if output is None:
+            def output(line):
+                print line
+                sys.stdout.flush()
+
+        tail = collections.deque(maxlen=int(config.change_output_lines))
+        f_log = open('%s.log' % (self.changefile), 'a')
+        f_log.write('\n# %s\n' % (time.strftime("%m%d%Y-%H%M%S")))
+
+        def change_output(line):
+            output(line)
+            tail.append(line)
+            f_log.write('%s\n' % (line))
+            f_log.flush()
+
+        operation = stats.Operation('change')
+        try:
+            change_output("Runing change/ticket %s" % (self.changefile))
+            if not self.execute(change_output, cancel):
+                # the ID stays reserved to resume the change
+                return '\n'.join(tail)
+            self.completed = True
+
+            # release the leases of the LPAR IDs of the change, after the
+            #execution the ID is on HMC or the creation failed and it is free.
+            lparids = []
+            f_change_executed = open(self.changefile, 'r')
+            for line in f_change_executed.readlines():
+                if line.startswith('#LPARID'):
+                    lparids.append(line.split()[1])
+            f_change_executed.close()
+            if lparids:
+                change_output('Releasing ID(s) %s from reserved ids' % (' '.join(lparids)))
+                allocator = idalloc.IDAllocator()
+                allocator.release(lparids)
+        finally:
+            # the change (or part of it) was done on the VIOS, the lsmap kept
+            #in memory is old
+            viosmap.invalidate()
+            f_log.close()
+            operation.end()
+
+        return '\n'.join(tail)
+
+    def execute(self, output, cancel=None):
+        ''' Execute the steps of the change (or the shell script of old
+            change files). Returns False if the change was not completed.
+        '''
+
+        plan = changeplan.load(self.changefile)
+        if plan is None:
+            # change files without steps (old versions) are shell scripts
+            proc = subprocess.Popen(['sh', self.changefile], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            for line in iter(proc.stdout.readline, ''):
+                output(line.rstrip('\n'))
+            proc.wait()
+            return True
 
-    def runChange(self):
-        ''' execute the change (changefile arg). '''
-
-        print ("\nRuning change/ticket %s" % (self.changefile))
-        exec_output = commands.getoutput("sh %s" % (self.changefile))
-        print exec_output
-        return exec_output
-        f_change_executed = open(self.changefile, 'r')
-        os.system('mv %s %s/poweradm/changes_executed/' % (self.changefile, config.pahome))
-        print ('Change/ticket %s finished. Verfify configs on your environment.\nExiting!'
-                % (self.changefile))
-        for line in f_change_executed.readlines():
-            if line.startswith('#LPARID'):
-                lparidcreated = line.split()
-                print ('Removing ID %s from reserved ids' % (lparidcreated[1]))
-                file_reservedids = open('%s/poweradm/data/reserved_ids' % (config.pahome))
-                line_reservedids = file_reservedids.readlines()
-                file_reservedids.close()
-                file_reservedids = open('%s/poweradm/data/reserved_ids' % (config.pahome), 'w')
-                for lineids in line_reservedids:
-                    file_reservedids.write(lineids.replace((lparidcreated[1]), "0"))
-                file_reservedids.close()
-        f_change_executed.close()
+        # the journal of the steps, a new run resumes at the step that failed
+        journal = changeplan.Journal('%s.journal' % (self.changefile))
+        if not plan.run(output, journal, cancel):
+            output('The change %s was not completed. Run it again to resume at the step that failed.' %
+                   (self.changefile))
+            return False
+        return True
@@ -30,8 +30,27 @@ States, other countries, or both.
 # Imports
 ###############################################################################################
 import time
+import threading
 ##############################################################################################
 #
 # Global Variables
 timestr = time.strftime("%m%d%Y-%H%M%S")
+# time of the execution of each thread (each request of the API daemon)
+local = threading.local()
 version = '0.11.1-beta'
+
+
+def getTimestr():
+    ''' Returns the time of the execution, used on the names of the change
+        and tmp files: the time of this thread (setTimestr()) or of the process.
+    '''
+
+    return getattr(local, 'timestr', None) or timestr
+
+
+def setTimestr(value):
+    ''' Set the time of the execution of this thread (None to use the time
+        of the process).
+    '''
+
+    local.timestr = value
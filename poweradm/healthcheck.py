@@ -0,0 +1,519 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+PowerAdm
+healthcheck.py
+
+Copyright (c) 2016 Kairo Araujo
+
+It was created for personal use. There are no guarantees of the author.
+Use at your own risk.
+
+Permission to use, copy, modify, and distribute this software for any
+purpose with or without fee is hereby granted, provided that the above
+copyright notice and this permission notice appear in all copies.
+
+THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+IBM, Power, PowerVM (a.k.a. VIOS) are registered trademarks of IBM Corporation in
+the United States, other countries, or both.
+VMware, vCenter, vCenter Orchestrator are registered trademarks of VWware Inc in the United
+States, other countries, or both.
+'''
+
+# Imports
+###############################################################################################
+import re
+import sys
+import json
+import time
+import config
+import hmc
+import viosmap
+import parallel
+import lparprofile
+import lparindex
+import systemvios
+import stats
+##############################################################################################
+#
+# Bulk health check
+#
+# Checks the virtual SCSI, virtual FC and virtual network of many LPARs (a
+# list of IDs or names, or all the LPARs of frames) without questions, for
+# the incidents. The VIOS data is collected once and shared by all the
+# LPARs: the profiles with one 'lssyscfg -r prof' per frame and, per VIOS,
+# one batch with 'lsmap -all', 'lsmap -all -npiv' and 'lsdev -type adapter'
+# and one batch with the 'entstat -all' of all its SEAs (the SEA dump). All
+# the VIOS are collected at the same time (a pool per HMC).
+#
+# The result is a report of the failures: server adapters missing,
+# virtual target devices without backing device, vfchosts NOT_LOGGED_IN or
+# without FC port and VLANs without SEA or with SEA in a bad state.
+#
+# Usage (also apimain.py -healthcheck and the web page /healthcheck):
+#   healthcheck.py [-frame system,...] [-checks vscsi,vfc,vnet] [-json] [LPAR ID or name ...]
+##############################################################################################
+
+# checks of the health check (in the order of the report)
+check_names = ['vscsi', 'vfc', 'vnet']
+
+# SEA states without problem (High Availability)
+sea_states = ['PRIMARY', 'BACKUP', 'PRIMARY_SH', 'BACKUP_SH']
+
+# the VLANs of a trunk adapter on entstat ('    ent4: 1 100 200')
+re_sea_vlans = re.compile(r'^\s+ent\d+:((?:\s+\d+)+)\s*$')
+
+
+def parseSEA(entstat_output):
+    ''' Parse the output of entstat -all of a SEA.
+
+        Returns {'vswitches': [virtual switches], 'vlans': [VLAN IDs (str)],
+                 'state': High Availability state or ''}.
+    '''
+
+    sea = {'vswitches': [], 'vlans': [], 'state': ''}
+    for l_entstat in entstat_output.split('\n'):
+        vlans = re_sea_vlans.match(l_entstat)
+        if vlans is not None:
+            sea['vlans'].extend(vlans.group(1).split())
+        elif l_entstat.strip().startswith('Switch ID:'):
+            sea['vswitches'].append(l_entstat.split(':', 1)[1].strip())
+        elif l_entstat.strip().startswith('State:') and not sea['state']:
+            sea['state'] = l_entstat.split(':', 1)[1].strip()
+    return sea
+
+
+def parseArgs(args):
+    ''' Parse the arguments of the health check (without the program name).
+
+        Returns (items, frames, checks). Raises ValueError on errors.
+    '''
+
+    items = []
+    frames = []
+    selected = list(check_names)
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg == '-frame' and args:
+            frames.extend([frame for frame in args.pop(0).split(',') if frame])
+        elif arg == '-checks' and args:
+            selected = [check for check in args.pop(0).split(',') if check]
+            for check in selected:
+                if check not in check_names:
+                    raise ValueError('unknown check %s' % (check))
+        elif arg.startswith('-'):
+            raise ValueError('unknown option %s' % (arg))
+        else:
+            items.extend([item.strip() for item in arg.split(',') if item.strip()])
+
+    for frame in frames:
+        if frame not in config.systems:
+            raise ValueError('unknown frame %s' % (frame))
+    if not items and not frames:
+        raise ValueError('no LPAR or frame')
+    return (items, frames, selected)
+
+
+class HealthCheck:
+    ''' Health check of many LPARs.
+
+        Args:
+          checks (list): the checks (default all: vscsi, vfc and vnet).
+          threads (int): max number of VIOS collected at the same time on
+                         each HMC (default config.max_threads).
+
+        Attributes:
+          lpars (list): the LPARs checked, {'system', 'lpar_id', 'name', 'adapters'}.
+          not_found (list): the IDs and names not found.
+          vios (dict): the data of each VIOS, {(system, vios): {'vscsi': mappings,
+                       'vfc': mappings, 'seas': {SEA: parseSEA()}, 'error': error
+                       of the collection or ''}}.
+          failures (list): the failures, {'system', 'lpar_id', 'name', 'check',
+                           'adapter', 'vios', 'problem', 'detail'}.
+          vios_errors (list): the VIOS not collected, {'system', 'vios',
+                              'problem': 'COLLECT_ERROR', 'detail'}.
+    '''
+
+    def __init__(self, checks=None, threads=None):
+        if checks is None:
+            checks = check_names
+        self.checks = list(checks)
+        self.threads = threads
+        self.lpars = []
+        self.not_found = []
+        self.vios = {}
+        self.failures = []
+        self.vios_errors = []
+
+    def resolve(self, items=None, frames=None):
+        ''' Find the LPARs (IDs or names) and the LPARs of the frames on the
+            LPAR index. Returns {system: {lpar_id: curr_profile}}.
+        '''
+
+        lpar_index = lparindex.get()
+        lpar_index.ensure()
+
+        selected = {}
+        for frame in frames or []:
+            for lpar_id, entry in lpar_index.index['systems'].get(frame, {}).items():
+                selected.setdefault(frame, {})[lpar_id] = entry[1]
+
+        for item in items or []:
+            found = []
+            if item.isdigit():
+                for system, name, curr_profile, state in lpar_index.entries(item):
+                    found.append((lparindex.statePriority(state), system, item, curr_profile))
+            else:
+                for system, lpar_id, lpar in lpar_index.findName(item):
+                    if lpar['match'] == 'exact':
+                        found.append((lparindex.statePriority(lpar['state']), system, lpar_id,
+                                      lpar['curr_profile']))
+            if not found:
+                self.not_found.append(item)
+                continue
+            # an LPAR on many frames (LPM) is checked where it's running
+            found.sort()
+            priority, system, lpar_id, curr_profile = found[0]
+            selected.setdefault(system, {})[lpar_id] = curr_profile
+        return selected
+
+    def collectProfiles(self, selected):
+        ''' Collect the current profiles of the LPARs selected (one command
+            per frame) and fill self.lpars. The VIOS are not checked.
+        '''
+
+        systems = sorted(selected.keys())
+
+        def profiles(system):
+            # all the LPARs of the frame without filter
+            lpar_ids = sorted(selected[system].keys(), key=int)
+            if len(lpar_ids) == len(lparindex.get().index['systems'].get(system, {})):
+                lpar_ids = None
+            return lparprofile.profiles(system, lpar_ids)
+
+        for system, lpar_profiles in zip(systems, parallel.pmap(profiles, systems, self.threads,
+                                                                key=hmc.route)):
+            if lpar_profiles is None:
+                lpar_profiles = {}
+            for lpar_id in sorted(selected[system].keys(), key=int):
+                attrs = None
+                for line in lpar_profiles.get(lpar_id, []):
+                    attrs = lparprofile.parseAttrs(line)
+                    if attrs.get('name') == selected[system][lpar_id]:
+                        break
+                if attrs is None:
+                    continue
+                if attrs.get('lpar_env') == 'vioserver' or attrs.get('lpar_name') in config.systems[system]:
+                    continue
+                adapters = {}
+                for adapter_type in lparprofile.adapters_fields.keys():
+                    adapters[adapter_type] = lparprofile.parseAdapters(
+                        attrs.get(lparprofile.adapters_fields[adapter_type], ''))
+                self.lpars.append({'system': system, 'lpar_id': lpar_id,
+                                   'name': attrs.get('lpar_name', ''), 'adapters': adapters})
+
+    def neededVIOS(self):
+        ''' Returns {(system, vios): set of data needed (vscsi, vfc and net)}. '''
+
+        needed = {}
+        net_vio = systemvios.SystemVios()
+        for lpar in self.lpars:
+            for adapter_type in ('vscsi', 'vfc'):
+                if adapter_type not in self.checks:
+                    continue
+                for adapter in lpar['adapters'][adapter_type]:
+                    vios = adapter.split('/')[3]
+                    needed.setdefault((lpar['system'], vios), set()).add(adapter_type)
+            if 'vnet' in self.checks and lpar['adapters']['veth']:
+                for vios in (net_vio.returnNetVio1(lpar['system']), net_vio.returnNetVio2(lpar['system'])):
+                    needed.setdefault((lpar['system'], vios), set()).add('net')
+        return needed
+
+    def collectVIOS(self, task):
+        ''' Collect the data of a VIOS: task is ((system, vios), data needed).
+            A command failed stops the collection and sets the error.
+        '''
+
+        (system, vios), needed = task
+        client = hmc.getSystem(system)
+        data = {'vscsi': {}, 'vfc': {}, 'seas': {}, 'error': ''}
+
+        def failed(vios_cmds, results):
+            for vios_cmd, (status, output) in zip(vios_cmds, results):
+                if status != 0:
+                    data['error'] = '%s: %s' % (vios_cmd, (output.strip().split('\n') + [''])[0] or
+                                                'exit status %s' % (status))
+                    return True
+            return False
+
+        vios_cmds = []
+        for dev_type in ('vscsi', 'vfc'):
+            if dev_type in needed:
+                vios_cmds.append(viosmap.lsmap_cmds[dev_type])
+        if 'net' in needed:
+            vios_cmds.append('lsdev -type adapter')
+        results = client.viosvrcmdBatchStatus(system, vios, vios_cmds)
+        if failed(vios_cmds, results):
+            return data
+        outputs = {}
+        for vios_cmd, (status, output) in zip(vios_cmds, results):
+            outputs[vios_cmd] = output
+
+        for dev_type in ('vscsi', 'vfc'):
+            if dev_type in needed:
+                data[dev_type] = viosmap.parseMappings(dev_type, outputs[viosmap.lsmap_cmds[dev_type]])
+
+        # SEA dump: the entstat of all the SEAs in one batch
+        if 'net' in needed:
+            seas = []
+            for l_lsdev in outputs['lsdev -type adapter'].split('\n'):
+                if 'Shared Ethernet Adapter' in l_lsdev:
+                    seas.append(l_lsdev.split()[0])
+            if seas:
+                entstat_cmds = ['entstat -all %s' % (sea) for sea in seas]
+                results = client.viosvrcmdBatchStatus(system, vios, entstat_cmds)
+                if failed(entstat_cmds, results):
+                    return data
+                for sea, (status, entstat) in zip(seas, results):
+                    data['seas'][sea] = parseSEA(entstat)
+        return data
+
+    def fail(self, lpar, check, adapter, vios, problem, detail=''):
+        ''' Add a failure. '''
+
+        self.failures.append({'system': lpar['system'], 'lpar_id': lpar['lpar_id'], 'name': lpar['name'],
+                              'check': check, 'adapter': adapter, 'vios': vios, 'problem': problem,
+                              'detail': detail})
+
+    def checkVSCSI(self, lpar):
+        ''' Check the virtual SCSI adapters of an LPAR. '''
+
+        for adapter in lpar['adapters']['vscsi']:
+            scsi_configs = adapter.split('/')
+            slot, vios, vios_slot = scsi_configs[0], scsi_configs[3], scsi_configs[4]
+            if self.vios[(lpar['system'], vios)]['error']:
+                continue
+            mapping = self.vios[(lpar['system'], vios)]['vscsi'].get(vios_slot)
+            if mapping is None:
+                self.fail(lpar, 'vscsi', 'C%s' % (slot), vios, 'NO_VHOST',
+                          'no vhost on the VIOS slot %s' % (vios_slot))
+                continue
+            if not mapping['vtds']:
+                self.fail(lpar, 'vscsi', 'C%s' % (slot), vios, 'NO_VTD',
+                          '%s without virtual target device' % (mapping['adapter']))
+            for vtd in mapping['vtds']:
+                if not vtd['backing']:
+                    self.fail(lpar, 'vscsi', 'C%s' % (slot), vios, 'NO_BACKING_DEVICE',
+                              '%s %s without backing device' % (mapping['adapter'], vtd['vtd']))
+                elif vtd['status'] != 'Available':
+                    self.fail(lpar, 'vscsi', 'C%s' % (slot), vios, 'VTD_NOT_AVAILABLE',
+                              '%s %s (%s) is %s' % (mapping['adapter'], vtd['vtd'], vtd['backing'],
+                                                    vtd['status'] or 'unknown'))
+
+    def checkVFC(self, lpar):
+        ''' Check the virtual FC adapters of an LPAR. '''
+
+        for adapter in lpar['adapters']['vfc']:
+            fcs_configs = adapter.split('/')
+            slot, vios, vios_slot = fcs_configs[0], fcs_configs[3], fcs_configs[4]
+            if self.vios[(lpar['system'], vios)]['error']:
+                continue
+            mapping = self.vios[(lpar['system'], vios)]['vfc'].get(vios_slot)
+            if mapping is None:
+                self.fail(lpar, 'vfc', 'C%s' % (slot), vios, 'NO_VFCHOST',
+                          'no vfchost on the VIOS slot %s' % (vios_slot))
+            elif not mapping['fc_name']:
+                self.fail(lpar, 'vfc', 'C%s' % (slot), vios, 'NO_FC_PORT',
+                          '%s not mapped to a FC port' % (mapping['adapter']))
+            elif mapping['status'] != 'LOGGED_IN':
+                self.fail(lpar, 'vfc', 'C%s' % (slot), vios, 'NOT_LOGGED_IN',
+                          '%s (%s) is %s, ports logged in: %s' % (mapping['adapter'], mapping['fc_name'],
+                                                                  mapping['status'] or 'unknown',
+                                                                  mapping['ports_logged'] or '0'))
+
+    def checkVNet(self, lpar):
+        ''' Check the SEAs of the VLANs of the virtual ethernet adapters of an LPAR. '''
+
+        net_vio = systemvios.SystemVios()
+        net_vios = [net_vio.returnNetVio1(lpar['system'])]
+        if net_vio.returnNetVio2(lpar['system']) != net_vios[0]:
+            net_vios.append(net_vio.returnNetVio2(lpar['system']))
+
+        for adapter in lpar['adapters']['veth']:
+            eth_configs = adapter.split('/')
+            slot, vlan, vswitch = eth_configs[0], eth_configs[2], eth_configs[6]
+            states = []
+            for vios in net_vios:
+                if self.vios[(lpar['system'], vios)]['error']:
+                    continue
+                found = None
+                seas = self.vios[(lpar['system'], vios)]['seas']
+                for sea in sorted(seas.keys()):
+                    if vswitch in seas[sea]['vswitches'] and vlan in seas[sea]['vlans']:
+                        found = sea
+                        break
+                if found is None:
+                    self.fail(lpar, 'vnet', 'C%s' % (slot), vios, 'NO_SEA',
+                              'no SEA with the VLAN %s on %s' % (vlan, vswitch))
+                    continue
+                state = seas[found]['state']
+                states.append(state)
+                if len(net_vios) > 1 and state not in sea_states:
+                    self.fail(lpar, 'vnet', 'C%s' % (slot), vios, 'SEA_STATE',
+                              '%s (VLAN %s on %s) is %s' % (found, vlan, vswitch, state or 'unknown'))
+            # one of the SEAs of the failover needs to be the primary
+            if len(net_vios) > 1 and len(states) == len(net_vios):
+                primary = False
+                for state in states:
+                    if state.startswith('PRIMARY'):
+                        primary = True
+                if not primary:
+                    self.fail(lpar, 'vnet', 'C%s' % (slot), ', '.join(net_vios), 'NO_PRIMARY_SEA',
+                              'no primary SEA to the VLAN %s on %s (%s)' % (vlan, vswitch, ', '.join(states)))
+
+    def run(self, items=None, frames=None):
+        ''' Run the health check of the LPARs (IDs or names) and of all the
+            LPARs of the frames. Returns the report (see report()).
+        '''
+
+        start = time.time()
+        self.collectProfiles(self.resolve(items, frames))
+
+        needed = self.neededVIOS()
+        tasks = sorted(needed.items())
+        for task, data in zip(tasks, parallel.pmap(self.collectVIOS, tasks, self.threads,
+                                                   key=lambda task: hmc.route(task[0][0]))):
+            self.vios[task[0]] = data
+            if data['error']:
+                self.vios_errors.append({'system': task[0][0], 'vios': task[0][1], 'problem': 'COLLECT_ERROR',
+                                         'detail': data['error']})
+
+        for lpar in self.lpars:
+            if 'vscsi' in self.checks:
+                self.checkVSCSI(lpar)
+            if 'vfc' in self.checks:
+                self.checkVFC(lpar)
+            if 'vnet' in self.checks:
+                self.checkVNet(lpar)
+        return self.report(time.time() - start)
+
+    def report(self, elapsed=0.0):
+        ''' Returns the report: {'time', 'checks', 'lpars': [{'system', 'lpar_id',
+            'name', 'failures'}], 'vios', 'not_found', 'failures', 'vios_errors',
+            'problems': {problem: number of failures}}.
+        '''
+
+        problems = {}
+        if self.vios_errors:
+            problems['COLLECT_ERROR'] = len(self.vios_errors)
+        by_lpar = {}
+        for failure in self.failures:
+            problems[failure['problem']] = problems.get(failure['problem'], 0) + 1
+            key = (failure['system'], failure['lpar_id'])
+            by_lpar[key] = by_lpar.get(key, 0) + 1
+
+        lpars = []
+        for lpar in self.lpars:
+            lpars.append({'system': lpar['system'], 'lpar_id': lpar['lpar_id'], 'name': lpar['name'],
+                          'failures': by_lpar.get((lpar['system'], lpar['lpar_id']), 0)})
+        return {'time': round(elapsed, 2), 'checks': self.checks, 'lpars': lpars,
+                'vios': ['%s/%s' % (system, vios) for system, vios in sorted(self.vios.keys())],
+                'not_found': self.not_found, 'failures': self.failures, 'vios_errors': self.vios_errors,
+                'problems': problems}
+
+
+def run(items=None, frames=None, checks=None, threads=None):
+    ''' Run the health check (see HealthCheck.run()) as an operation. '''
+
+    operation = stats.Operation('healthcheck')
+    try:
+        return HealthCheck(checks, threads).run(items, frames)
+    finally:
+        operation.end()
+
+
+def render(report, output=None):
+    ''' Write the consolidated report of the failures.
+
+        Args:
+          report (dict): the report of run().
+          output (function): called with each line (default print).
+    '''
+
+    if output is None:
+        def output(line):
+            print line
+
+    output('[Health check: %s]' % (', '.join(report['checks'])))
+    output('%s LPARs and %s VIOS checked in %.2fs, %s failures on %s LPARs.' %
+           (len(report['lpars']), len(report['vios']), report['time'], len(report['failures']),
+            len([lpar for lpar in report['lpars'] if lpar['failures']])))
+    if report['not_found']:
+        output('Not found: %s' % (', '.join(report['not_found'])))
+
+    # the adapters on these VIOS were not checked
+    if report['vios_errors']:
+        output('\n[VIOS not collected]')
+        for vios_error in report['vios_errors']:
+            output('%-24s %-20s %-18s %s' % (vios_error['system'], vios_error['vios'], vios_error['problem'],
+                                            vios_error['detail']))
+
+    if not report['failures'] and not report['vios_errors']:
+        output('\nNo failures found.')
+        return
+
+    output('\n[Failures by problem]')
+    for problem in sorted(report['problems'].keys(), key=lambda problem: -report['problems'][problem]):
+        output('%-18s %s' % (problem, report['problems'][problem]))
+
+    if not report['failures']:
+        return
+
+    output('\n[Failures]')
+    output('%-24s %-20s %-6s %-6s %-7s %-18s %s' % ('SYSTEM', 'LPAR', 'ID', 'CHECK', 'ADAPTER', 'PROBLEM',
+                                                   'VIOS: DETAIL'))
+    for failure in sorted(report['failures'], key=lambda failure: (failure['system'], int(failure['lpar_id']),
+                                                                   check_names.index(failure['check']))):
+        output('%-24s %-20s %-6s %-6s %-7s %-18s %s: %s' % (failure['system'], failure['name'],
+                                                           failure['lpar_id'], failure['check'],
+                                                           failure['adapter'], failure['problem'],
+                                                           failure['vios'], failure['detail']))
+
+
+def main(argv):
+    ''' Run the health check from the command line. Returns the exit status
+        (1 if some failure was found).
+    '''
+
+    args = list(argv[1:])
+    as_json = '-json' in args
+    if as_json:
+        args.remove('-json')
+    try:
+        items, frames, selected = parseArgs(args)
+    except ValueError, error:
+        print ('%s.\nUsage: %s [-frame system,...] [-checks %s] [-json] [LPAR ID or name ...]' %
+               (error, argv[0], ','.join(check_names)))
+        return 2
+
+    report = run(items, frames, selected)
+    if as_json:
+        print json.dumps(report, indent=1, sort_keys=True)
+    else:
+        render(report)
+    if report['failures'] or report['vios_errors'] or report['not_found']:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+
+    sys.exit(main(sys.argv))
@@ -0,0 +1,505 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+PowerAdm
+hmc.py
+
+Copyright (c) 2016 Kairo Araujo
+
+It was created for personal use. There are no guarantees of the author.
+Use at your own risk.
+
+Permission to use, copy, modify, and distribute this software for any
+purpose with or without fee is hereby granted, provided that the above
+copyright notice and this permission notice appear in all copies.
+
+THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+IBM, Power, PowerVM (a.k.a. VIOS) are registered trademarks of IBM Corporation in
+the United States, other countries, or both.
+VMware, vCenter, vCenter Orchestrator are registered trademarks of VWware Inc in the United
+States, other countries, or both.
+'''
+
+# Imports
+###############################################################################################
+import os
+import tempfile
+import threading
+import subprocess
+import time
+import json
+import config
+import stats
+import parallel
+##############################################################################################
+#
+# Persistent HMC sessions
+#
+# All the commands to the HMC (and VIOS using viosvrcmd) are executed using
+# the OpenSSH multiplexing (ControlMaster). The first command opens a master
+# connection per session slot and the next commands only open a new channel
+# on it, without a new handshake/login. The master connections are kept by
+# 'hmc_session_persist' seconds after the last use, so the next PowerAdm
+# process (as the apimain.py called by vCO) reuses them too.
+#
+# The commands are executed by a backend (config.hmc_backend): 'ssh' on the
+# real HMCs and NIM servers, 'simulator' on a synthetic fleet (see
+# simulator.py), to test and benchmark PowerAdm without HMCs, or 'record' and
+# 'replay' to record the commands of the HMCs and answer them again from the
+# archive (see replay.py).
+#
+# Each frame is managed by one HMC (route()): the HMC of config.hmc_systems
+# or the one that lists the frame (discovered on all the HMCs at the same
+# time). Each HMC has its own client, with its own sessions and
+# max_concurrency, so a slow HMC doesn't hold the commands of the others.
+##############################################################################################
+
+# ssh user used on HMCs
+ssh_user = 'poweradm'
+
+# line printed between the outputs of viosvrcmdBatch() and, with the exit
+# status, after each command
+batch_marker = '@@POWERADM-BATCH'
+batch_status_marker = '@@POWERADM-BATCH-STATUS'
+
+class HMCResult:
+    ''' The result of a command executed on the HMC.
+
+        Attributes:
+          cmd (str): the command executed.
+          status (int): exit status of the command (-1 if timed out).
+          output (str): stdout and stderr of the command.
+          elapsed (float): time in seconds of the execution.
+          timed_out (bool): True if the command was killed by timeout.
+    '''
+
+    def __init__(self, cmd, status, output, elapsed, timed_out=False):
+        self.cmd = cmd
+        self.status = status
+        self.output = output
+        self.elapsed = elapsed
+        self.timed_out = timed_out
+
+    def ok(self):
+        ''' Returns True if the command exit status is 0. '''
+        return self.status == 0
+
+
+class SSHBackend:
+    ''' Backend that runs the commands by ssh (persistent sessions of the client).
+
+        Args:
+          client (HMCClient): the client of the host.
+    '''
+
+    def __init__(self, client):
+        self.client = client
+
+    def execute(self, cmd, timeout):
+        ''' Run the command. Returns (status, output, timed_out). '''
+
+        args = ['ssh'] + self.client.sshOptions(self.client.nextSlot()) + [self.client.host, cmd]
+
+        null = open(os.devnull)
+        proc = subprocess.Popen(args, stdin=null, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT)
+        null.close()
+
+        killed = []
+        def kill():
+            killed.append(True)
+            try:
+                proc.kill()
+            except OSError:
+                pass
+
+        timer = None
+        if timeout > 0:
+            timer = threading.Timer(timeout, kill)
+            timer.start()
+        try:
+            output = proc.communicate()[0]
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+        if killed:
+            return (-1, output, True)
+        return (proc.returncode, output, False)
+
+
+def newBackend(client, name=None):
+    ''' Returns the backend of a client.
+
+        Args:
+          client (HMCClient): the client of the host.
+          name (str): 'ssh', 'simulator', 'record' or 'replay' (default
+                      config.hmc_backend).
+    '''
+
+    if name is None:
+        name = config.hmc_backend
+    if name == 'ssh':
+        return SSHBackend(client)
+    elif name == 'simulator':
+        import simulator
+        return simulator.Backend(client)
+    elif name == 'record':
+        import replay
+        return replay.RecordBackend(client)
+    elif name == 'replay':
+        import replay
+        return replay.ReplayBackend(client)
+    raise ValueError('the hmc_backend needs be ssh, simulator, record or replay')
+
+
+class HMCClient:
+    ''' Client to run commands on a HMC using a pool of persistent ssh sessions.
+
+        Args:
+          host (str): HMC address or hostname.
+          user (str): ssh user (default poweradm).
+          sessions (int): number of persistent sessions (master connections).
+          persist (int): seconds the idle sessions are kept open.
+          timeout (int): default timeout in seconds for each command (0 disable).
+          max_concurrency (int): max number of commands running at the same time.
+          kind (str): 'hmc' or 'nim' (the NIM servers use the same sessions).
+          backend (str): 'ssh', 'simulator', 'record' or 'replay' (default
+                         config.hmc_backend).
+    '''
+
+    def __init__(self, host, user=ssh_user, sessions=None, persist=None, timeout=None,
+                 max_concurrency=None, kind='hmc', backend=None):
+        self.host = host
+        self.user = user
+        self.kind = kind
+        if sessions is None:
+            sessions = config.hmc_sessions
+        if persist is None:
+            persist = config.hmc_session_persist
+        if timeout is None:
+            timeout = config.hmc_cmd_timeout
+        self.sessions = max(int(sessions), 1)
+        self.persist = int(persist)
+        self.timeout = int(timeout)
+        if max_concurrency is None:
+            max_concurrency = config.hmc_max_concurrency
+        self.running = threading.BoundedSemaphore(max(int(max_concurrency), 1))
+        self.slot = 0
+        self.lock = threading.Lock()
+        self.backend = newBackend(self, backend)
+
+    def controlPath(self, slot):
+        ''' Returns the ssh ControlPath (socket) of the session slot. '''
+
+        # unix sockets have a short path limit, so it's not on pahome.
+        control_dir = os.path.join(tempfile.gettempdir(), 'poweradm-%s' % os.getuid())
+        if not os.path.isdir(control_dir):
+            try:
+                os.makedirs(control_dir, 0700)
+            except OSError:
+                pass
+        return os.path.join(control_dir, '%s@%s.%s' % (self.user, self.host, slot))
+
+    def nextSlot(self):
+        ''' Round robin between the sessions of the pool. '''
+
+        self.lock.acquire()
+        try:
+            slot = self.slot
+            self.slot = (self.slot + 1) % self.sessions
+        finally:
+            self.lock.release()
+        return slot
+
+    def sshOptions(self, slot):
+        ''' Returns the list of ssh options to use the session slot. '''
+
+        return ['-o', 'ControlMaster=auto',
+                '-o', 'ControlPath=%s' % self.controlPath(slot),
+                '-o', 'ControlPersist=%s' % self.persist,
+                '-o', 'BatchMode=yes',
+                '-l', self.user]
+
+    def sshCmd(self):
+        ''' Returns the ssh command line (string) to use on shell scripts. '''
+
+        return 'ssh %s %s' % (' '.join(self.sshOptions(self.nextSlot())), self.host)
+
+    def run(self, cmd, timeout=None):
+        ''' Execute a command on HMC and returns HMCResult.
+
+            Args:
+              cmd (str): the command as typed in the HMC shell.
+              timeout (int): timeout in seconds. Default is the client timeout.
+        '''
+
+        if timeout is None:
+            timeout = self.timeout
+
+        start = time.time()
+
+        # wait a free place on the HMC (max_concurrency)
+        self.running.acquire()
+        try:
+            status, output, timed_out = self.backend.execute(cmd, timeout)
+        finally:
+            self.running.release()
+
+        if output.endswith('\n'):
+            output = output[:-1]
+
+        result = HMCResult(cmd, status, output, time.time() - start, timed_out)
+        stats.record(self.kind, self.host, cmd, result.elapsed, len(output), status)
+        return result
+
+    def getoutput(self, cmd, timeout=None):
+        ''' Same as commands.getoutput() but running the cmd on the HMC. '''
+
+        return self.run(cmd, timeout).output
+
+    def getstatusoutput(self, cmd, timeout=None):
+        ''' Same as commands.getstatusoutput() but running the cmd on the HMC. '''
+
+        result = self.run(cmd, timeout)
+        return (result.status, result.output)
+
+    def viosvrcmd(self, system, vios, vios_cmd, timeout=None):
+        ''' Run a command on a VIOS using viosvrcmd and returns the output.
+
+            Args:
+              system (str): the system name (frame).
+              vios (str): the VIOS name (the same name on HMC).
+              vios_cmd (str): the VIOS (padmin) command, ex: 'lsmap -all'.
+              timeout (int): timeout in seconds.
+        '''
+
+        return self.getoutput("viosvrcmd -m %s -p %s -c '%s'" % (system, vios, vios_cmd), timeout)
+
+    def viosvrcmdBatch(self, system, vios, vios_cmds, timeout=None):
+        ''' Run many commands on a VIOS using only one ssh round trip.
+
+            Each command is executed by its own viosvrcmd on the HMC shell,
+            separated by marker lines, and the output is split again here.
+
+            Args:
+              system (str): the system name (frame).
+              vios (str): the VIOS name (the same name on HMC).
+              vios_cmds (list): the VIOS (padmin) commands.
+              timeout (int): timeout in seconds to all the commands.
+
+            Returns the list of outputs in the same order of vios_cmds.
+        '''
+
+        outputs = []
+        for status, output in self.viosvrcmdBatchStatus(system, vios, vios_cmds, timeout):
+            outputs.append(output)
+        return outputs
+
+    def viosvrcmdBatchStatus(self, system, vios, vios_cmds, timeout=None):
+        ''' Same as viosvrcmdBatch() but returns the list of (status, output)
+            of the commands. A command not executed (ex: the ssh failed) has
+            the status of the ssh and its error as output.
+        '''
+
+        hmc_cmds = []
+        for index in range(len(vios_cmds)):
+            hmc_cmds.append("echo '%s %s'" % (batch_marker, index))
+            hmc_cmds.append("viosvrcmd -m %s -p %s -c '%s'" % (system, vios, vios_cmds[index]))
+            hmc_cmds.append('echo "%s $?"' % (batch_status_marker))
+
+        result = self.run('; '.join(hmc_cmds), timeout)
+        error = result.output
+        outputs = [None] * len(vios_cmds)
+        statuses = [None] * len(vios_cmds)
+        index = None
+        lines = []
+        for line in (result.output + '\n').split('\n'):
+            if line.startswith(batch_marker + ' '):
+                if index is not None:
+                    outputs[index] = '\n'.join(lines).rstrip('\n')
+                elif lines:
+                    # output before the first command (the error of the ssh)
+                    error = '\n'.join(lines).rstrip('\n')
+                index = int(line.split()[1])
+                lines = []
+            elif line.startswith(batch_status_marker + ' ') and index is not None:
+                statuses[index] = int(line.split()[1])
+            else:
+                lines.append(line)
+        if index is not None:
+            outputs[index] = '\n'.join(lines).rstrip('\n')
+
+        results = []
+        for index in range(len(vios_cmds)):
+            if statuses[index] is None:
+                results.append((result.status or 1, outputs[index] or error))
+            else:
+                results.append((statuses[index], outputs[index]))
+        return results
+
+    def close(self):
+        ''' Close all the persistent sessions of this HMC. '''
+
+        null = open(os.devnull, 'w')
+        for slot in range(self.sessions):
+            if os.path.exists(self.controlPath(slot)):
+                subprocess.call(['ssh'] + self.sshOptions(slot) + ['-O', 'exit', self.host],
+                                stdout=null, stderr=null)
+        null.close()
+
+
+# the clients are shared by all the modules in the process
+clients = {}
+clients_lock = threading.Lock()
+
+def get(host=None):
+    ''' Returns the shared HMCClient of a host (default config.hmcserver). '''
+
+    if host is None:
+        host = config.hmcserver
+
+    clients_lock.acquire()
+    try:
+        if host not in clients:
+            clients[host] = HMCClient(host, max_concurrency=config.hmc_concurrency.get(host))
+        return clients[host]
+    finally:
+        clients_lock.release()
+
+
+def getSystem(system):
+    ''' Returns the shared HMCClient of the HMC of a system (frame). '''
+
+    return get(route(system))
+
+
+def servers():
+    ''' Returns the list of HMCs (config.hmcserver, config.hmcservers and the
+        HMCs of config.hmc_systems).
+    '''
+
+    hosts = [config.hmcserver]
+    for host in list(config.hmcservers) + sorted(set(config.hmc_systems.values())):
+        if host not in hosts:
+            hosts.append(host)
+    return hosts
+
+
+# frames discovered on the HMCs: {system: hmc}
+routes = {}
+routes_state = {'time': 0, 'discovered': False}
+routes_lock = threading.Lock()
+
+def routesFile():
+    ''' Returns the file of the frames discovered (data/hmc_routes.json). '''
+
+    return '%s/poweradm/data/hmc_routes.json' % (config.pahome)
+
+
+def discover():
+    ''' Discover the frames of all the HMCs (lssyscfg -r sys on all the HMCs
+        at the same time) and save them. Returns {system: hmc}. Use it with
+        routes_lock.
+    '''
+
+    hosts = servers()
+    def systems(host):
+        result = get(host).run('lssyscfg -r sys -F name')
+        if not result.ok():
+            return []
+        return [line.strip() for line in result.output.split('\n') if line.strip()]
+
+    found = {}
+    # the first HMC listed wins (a frame can be managed by two HMCs)
+    for host, host_systems in reversed(zip(hosts, parallel.pmap(systems, hosts))):
+        for system in host_systems:
+            found[system] = host
+
+    routes.clear()
+    routes.update(found)
+    routes_state['time'] = time.time()
+    routes_state['discovered'] = True
+    try:
+        fd, tmp_file = tempfile.mkstemp(prefix='.hmc_routes.', dir=os.path.dirname(routesFile()))
+        f_routes = os.fdopen(fd, 'w')
+        json.dump({'time': routes_state['time'], 'routes': routes}, f_routes, indent=1, sort_keys=True)
+        f_routes.close()
+        os.rename(tmp_file, routesFile())
+    except (IOError, OSError):
+        pass
+    return routes
+
+
+def loadRoutes():
+    ''' Load the frames discovered of the file. Use it with routes_lock. '''
+
+    try:
+        f_routes = open(routesFile(), 'r')
+        try:
+            saved = json.load(f_routes)
+        finally:
+            f_routes.close()
+        routes.clear()
+        for system, host in saved['routes'].items():
+            routes[str(system)] = str(host)
+        routes_state['time'] = saved['time']
+    except (IOError, ValueError, KeyError):
+        pass
+
+
+def route(system):
+    ''' Returns the HMC of a system (frame): config.hmc_systems, the HMC
+        discovered (config.hmc_discovery) or config.hmcserver.
+
+        The discovery is done again after config.hmc_routes_time seconds or
+        when the system is unknown (once per process).
+    '''
+
+    if system in config.hmc_systems:
+        return config.hmc_systems[system]
+    if len(servers()) == 1 or config.hmc_discovery != 'enable':
+        return config.hmcserver
+
+    routes_lock.acquire()
+    try:
+        if not routes_state['time']:
+            loadRoutes()
+        expired = time.time() - routes_state['time'] > int(config.hmc_routes_time)
+        if expired or (system not in routes and not routes_state['discovered']):
+            discover()
+        return routes.get(system, config.hmcserver)
+    finally:
+        routes_lock.release()
+
+
+# the NIM servers have their own clients (and statistics as nim)
+nim_clients = {}
+
+def getNIM(host):
+    ''' Returns the shared HMCClient of a NIM server. '''
+
+    clients_lock.acquire()
+    try:
+        if host not in nim_clients:
+            nim_clients[host] = HMCClient(host, kind='nim')
+        return nim_clients[host]
+    finally:
+        clients_lock.release()
+
+
+# the synthetic fleet (or the fleet recorded) replaces the systems of the config
+if config.hmc_backend == 'simulator' or (config.hmc_backend == 'record' and
+                                         config.replay_source == 'simulator'):
+    import simulator
+    simulator.install()
+elif config.hmc_backend == 'replay':
+    import replay
+    replay.install()
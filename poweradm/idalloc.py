@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+PowerAdm
+idalloc.py
+
+Copyright (c) 2016 Kairo Araujo
+
+It was created for personal use. There are no guarantees of the author.
+Use at your own risk.
+
+Permission to use, copy, modify, and distribute this software for any
+purpose with or without fee is hereby granted, provided that the above
+copyright notice and this permission notice appear in all copies.
+
+THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+IBM, Power, PowerVM (a.k.a. VIOS) are registered trademarks of IBM Corporation in
+the United States, other countries, or both.
+VMware, vCenter, vCenter Orchestrator are registered trademarks of VWware Inc in the United
+States, other countries, or both.
+'''
+
+# Imports
+###############################################################################################
+import os
+import time
+import fcntl
+import tempfile
+import globalvar
+import config
+import hmc
+import viosmap
+import parallel
+##############################################################################################
+#
+# Class IDAllocator
+##############################################################################################
+
+# the minimum LPAR ID
+min_id = 10
+
+class IDAllocator:
+    ''' Allocate free LPAR IDs on all systems (frames) of the config.
+
+        The used IDs are collected from all frames at the same time and the
+        free IDs are reserved with leases on data/id_leases. The leases file
+        is protected by a file lock, so the text interface, the web interface
+        and the API never get the same ID.
+
+        Leases file syntax (one per line):
+            ID EXPIRES OWNER
+            - EXPIRES: epoch time when the lease expires or 0 for never.
+            - OWNER: the session or the change file that holds the ID.
+
+        The data/reserved_ids file still can be used to reserve IDs by hand
+        (one ID per line).
+    '''
+
+    def __init__(self):
+        self.leases_file = '%s/poweradm/data/id_leases' % (config.pahome)
+        self.lock_file = '%s/poweradm/data/id_leases.lock' % (config.pahome)
+        self.reserved_file = '%s/poweradm/data/reserved_ids' % (config.pahome)
+
+    def lock(self):
+        ''' Get the exclusive lock of the leases file. Returns the lock file. '''
+
+        f_lock = open(self.lock_file, 'a')
+        fcntl.flock(f_lock.fileno(), fcntl.LOCK_EX)
+        return f_lock
+
+    def unlock(self, f_lock):
+        ''' Release the lock got by lock(). '''
+
+        fcntl.flock(f_lock.fileno(), fcntl.LOCK_UN)
+        f_lock.close()
+
+    def readLeases(self):
+        ''' Returns the active leases as dict {ID: (expires, owner)}.
+            Expired leases are discarded. Use it with the lock.
+        '''
+
+        leases = {}
+        if not os.path.isfile(self.leases_file):
+            return leases
+
+        now = time.time()
+        f_leases = open(self.leases_file, 'r')
+        for line in f_leases.readlines():
+            lease = line.split(None, 2)
+            if len(lease) < 3 or not lease[0].isdigit():
+                continue
+            expires = float(lease[1])
+            if expires != 0 and expires < now:
+                continue
+            leases[int(lease[0])] = (expires, lease[2].strip())
+        f_leases.close()
+        return leases
+
+    def writeLeases(self, leases):
+        ''' Write the leases file (atomic using rename). Use it with the lock. '''
+
+        fd, tmp_file = tempfile.mkstemp(prefix='.id_leases.', dir=os.path.dirname(self.leases_file))
+        f_leases = os.fdopen(fd, 'w')
+        for lparid in sorted(leases.keys()):
+            f_leases.write('%s %d %s\n' % (lparid, leases[lparid][0], leases[lparid][1]))
+        f_leases.close()
+        os.rename(tmp_file, self.leases_file)
+
+    def getReservedIDs(self):
+        ''' Returns the set of IDs reserved by hand in data/reserved_ids. '''
+
+        reserved = set()
+        if os.path.isfile(self.reserved_file):
+            f_reserved = open(self.reserved_file, 'r')
+            for line in f_reserved.readlines():
+                line = line.strip()
+                if line.isdigit() and int(line) != 0:
+                    reserved.add(int(line))
+            f_reserved.close()
+        return reserved
+
+    def getSystemIDs(self, system):
+        ''' Returns the set of LPAR IDs used on a system (frame). '''
+
+        ids = set()
+        lpar_ids = hmc.getSystem(system).run('lssyscfg -m %s -r lpar -F lpar_id' % (system))
+        if not lpar_ids.ok():
+            raise IOError('Cannot get the LPAR IDs of %s: %s' % (system, lpar_ids.output))
+        for line in lpar_ids.output.split('\n'):
+            if line.strip().isdigit():
+                ids.add(int(line))
+        return ids
+
+    def collect(self, task):
+        ''' Execute one task of the collection, used by getUsedIDs().
+
+            Args:
+              task (tuple): ('ids', system) or ('lsmap', system, vios, dev_type).
+        '''
+
+        if task[0] == 'ids':
+            return self.getSystemIDs(task[1])
+
+        # the lsmap stays on the VIOSMap index used by isDeviceUsed()
+        viosmap.get(task[1], task[2]).getSlots(task[3])
+        return set()
+
+    def getUsedIDs(self):
+        ''' Returns the set of LPAR IDs used on all systems plus reserved IDs.
+
+            The LPAR IDs of each frame and the lsmap of each VIOS are
+            collected on a bounded thread pool (parallel.pmap), so the time
+            is about the time of the slowest frame (a pool per HMC).
+        '''
+
+        tasks = []
+        for system in config.systems.keys():
+            tasks.append(('ids', system))
+            for vios in config.systems[system][:2]:
+                tasks.append(('lsmap', system, vios, 'vscsi'))
+                tasks.append(('lsmap', system, vios, 'vfc'))
+
+        used = self.getReservedIDs()
+        for ids in parallel.pmap(self.collect, tasks, key=lambda task: hmc.route(task[1])):
+            used.update(ids)
+        return used
+
+    def isDeviceUsed(self, lparid):
+        ''' Returns True if some VIOS has a virtual device using the LPAR ID. '''
+
+        for system in config.systems.keys():
+            for vios in config.systems[system][:2]:
+                vios_map = viosmap.get(system, vios)
+                if vios_map.isUsed('vscsi', lparid) or vios_map.isUsed('vfc', lparid):
+                    return True
+        return False
+
+    def allocate(self, count=1, owner=None, ttl=None):
+        ''' Find and reserve the next free LPAR IDs.
+
+            Args:
+              count (int): number of IDs to allocate in one pass.
+              owner (str): the owner of the leases (default is the session).
+              ttl (int): lease time in seconds (default config.id_lease_time).
+                         0 is a lease without expiration.
+
+            Returns the list of IDs allocated.
+        '''
+
+        if owner is None:
+            owner = 'session-%s-%s' % (globalvar.getTimestr(), os.getpid())
+        if ttl is None:
+            ttl = int(config.id_lease_time)
+
+        # the HMC is consulted without the lock, the leases protect the IDs
+        #allocated by other sessions meanwhile.
+        used = self.getUsedIDs()
+
+        f_lock = self.lock()
+        try:
+            leases = self.readLeases()
+
+            # bitmap of the used IDs
+            bitmap = bytearray(max(list(used) + list(leases.keys()) + [min_id]) + 2)
+            for lparid in used:
+                bitmap[lparid] = 1
+            for lparid in leases.keys():
+                bitmap[lparid] = 1
+
+            ids = []
+            lparid = min_id
+            while len(ids) < count:
+                if (lparid >= len(bitmap) or bitmap[lparid] == 0) and not self.isDeviceUsed(lparid):
+                    ids.append(lparid)
+                lparid += 1
+
+            expires = 0
+            if ttl > 0:
+                expires = time.time() + ttl
+            for lparid in ids:
+                leases[lparid] = (expires, owner)
+            self.writeLeases(leases)
+        finally:
+            self.unlock(f_lock)
+
+        return ids
+
+    def renew(self, ids, owner, ttl=0):
+        ''' Renew (or take) the leases of the IDs to a new owner.
+
+            Args:
+              ids (list): the LPAR IDs.
+              owner (str): the new owner, as a change file.
+              ttl (int): lease time in seconds. 0 is a lease without expiration.
+        '''
+
+        expires = 0
+        if ttl > 0:
+            expires = time.time() + ttl
+
+        f_lock = self.lock()
+        try:
+            leases = self.readLeases()
+            for lparid in ids:
+                leases[int(lparid)] = (expires, owner)
+            self.writeLeases(leases)
+        finally:
+            self.unlock(f_lock)
+
+    def release(self, ids):
+        ''' Release the leases of the IDs. '''
+
+        f_lock = self.lock()
+        try:
+            leases = self.readLeases()
+            for lparid in ids:
+                if int(lparid) in leases:
+                    del leases[int(lparid)]
+            self.writeLeases(leases)
+        finally:
+            self.unlock(f_lock)
@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+PowerAdm
+jobs.py
+
+Copyright (c) 2016 Kairo Araujo
+
+It was created for personal use. There are no guarantees of the author.
+Use at your own risk.
+
+Permission to use, copy, modify, and distribute this software for any
+purpose with or without fee is hereby granted, provided that the above
+copyright notice and this permission notice appear in all copies.
+
+THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+IBM, Power, PowerVM (a.k.a. VIOS) are registered trademarks of IBM Corporation in
+the United States, other countries, or both.
+VMware, vCenter, vCenter Orchestrator are registered trademarks of VWware Inc in the United
+States, other countries, or both.
+'''
+
+# Imports
+###############################################################################################
+import os
+import time
+import json
+import tempfile
+import threading
+import traceback
+import config
+import cachefile
+import execchange
+import mkosdeploy
+##############################################################################################
+#
+# Background jobs
+#
+# The LPAR creations (changes) and NIM deploys of the web interface are
+# submitted as jobs and executed by a pool of workers (config.job_workers).
+# The job table is stored on data/jobs.json. Each job uses resources (the HMC,
+# the NIM server) and the number of jobs running on each resource is limited
+# (config.job_hmc_limit and config.job_nim_limit); a job waiting for a
+# resource doesn't block the jobs of other resources.
+#
+# Job states: queued -> running -> done, failed or cancelled.
+##############################################################################################
+
+job_states = ['queued', 'running', 'done', 'failed', 'cancelled']
+
+
+class Job:
+    ''' A job of the queue.
+
+        Args:
+          job_id (int): the job ID.
+          kind (str): 'change' or 'deploy'.
+          args (dict): the arguments of the job (see JobQueue.runners).
+          resources (list): the resources used, as 'hmc:<server>' or 'nim:<server>'.
+    '''
+
+    def __init__(self, job_id, kind, args, resources):
+        self.job_id = job_id
+        self.kind = kind
+        self.args = args
+        self.resources = resources
+        self.state = 'queued'
+        self.created = time.time()
+        self.started = 0
+        self.finished = 0
+        self.lines = 0
+        self.last_line = ''
+        self.stream = execchange.OutputStream()
+        self.cancel = threading.Event()
+
+    def output(self, line):
+        ''' Output of the job, kept on the stream and progress. '''
+
+        self.lines += 1
+        if line.strip():
+            self.last_line = line
+        self.stream.write(line)
+
+    def toDict(self):
+        ''' Returns the job as dict (to JSON). '''
+
+        job = {}
+        for attr in ('job_id', 'kind', 'args', 'resources', 'state', 'created', 'started',
+                     'finished', 'lines', 'last_line'):
+            job[attr] = getattr(self, attr)
+        return job
+
+
+def jobFromDict(job_dict):
+    ''' Returns the Job of a dict (from JSON). '''
+
+    job = Job(job_dict['job_id'], job_dict['kind'], job_dict['args'], job_dict['resources'])
+    for attr in ('state', 'created', 'started', 'finished', 'lines', 'last_line'):
+        setattr(job, attr, job_dict[attr])
+    if job.state not in ('queued', 'running'):
+        job.stream.close()
+    return job
+
+
+def runChange(job):
+    ''' Run a change job. args: {'changefile': path}. Returns the final state. '''
+
+    change = execchange.Exe(job.args['changefile'])
+    change.runChange(job.output, job.cancel)
+    if change.completed:
+        return 'done'
+    if job.cancel.is_set():
+        return 'cancelled'
+    return 'failed'
+
+
+def runDeploy(job):
+    ''' Run a NIM deploy job. args: the arguments of mkosdeploy.MakeNIMDeploy. '''
+
+    args = job.args
+    deploy_os = mkosdeploy.MakeNIMDeploy(args['lparprefix'], args['lparname'], args['lparframe'],
+                                         args['lparvlans'], args['nim_file'], args['nim_cfg_ver'],
+                                         args['nim_cfg_spot'], args['nim_cfg_mksysbspot'],
+                                         args['nim_address'], args['nim_ipstart'], args['nim_ipend'],
+                                         args['nim_ipnet'], args['nim_server'], args['nim_ipdeploy'],
+                                         args['deploy'])
+    deploy_os.createNIMDeploy(job.output)
+    return 'done'
+
+
+class JobQueue:
+    ''' Job table and workers.
+
+        Args:
+          filename (str): the job table (default data/jobs.json).
+          workers (int): number of workers (default config.job_workers).
+    '''
+
+    # functions that run each kind of job
+    runners = {'change': runChange, 'deploy': runDeploy}
+
+    def __init__(self, filename=None, workers=None):
+        if filename is None:
+            filename = '%s/poweradm/data/jobs.json' % (config.pahome)
+        if workers is None:
+            workers = int(config.job_workers)
+        self.filename = filename
+        self.jobs = {}
+        self.next_id = 1
+        self.using = {}
+        self.condition = threading.Condition()
+        self.load()
+
+        for worker in range(workers):
+            thread = threading.Thread(target=self.worker)
+            thread.daemon = True
+            thread.start()
+
+    def load(self):
+        ''' Load the job table. The jobs running when the process stopped are
+            failed (a change can be resumed by its journal) and the jobs
+            queued are queued again.
+        '''
+
+        try:
+            f_jobs = open(self.filename, 'r')
+            try:
+                table = cachefile.decode(json.load(f_jobs))
+            finally:
+                f_jobs.close()
+        except (IOError, ValueError):
+            return
+
+        self.next_id = table['next_id']
+        for job_dict in table['jobs']:
+            job = jobFromDict(job_dict)
+            if job.state == 'running':
+                job.state = 'failed'
+                job.last_line = 'Interrupted (PowerAdm stopped).'
+                job.stream.close()
+            self.jobs[job.job_id] = job
+
+    def save(self):
+        ''' Save the job table (atomic using rename). Use it with the condition.
+            Only the last config.job_history finished jobs are kept.
+        '''
+
+        finished = []
+        for job in self.jobs.values():
+            if job.state not in ('queued', 'running'):
+                finished.append((job.finished, job.job_id))
+        for job_finished, job_id in sorted(finished)[:-int(config.job_history)]:
+            del self.jobs[job_id]
+
+        table = {'next_id': self.next_id, 'jobs': []}
+        for job_id in sorted(self.jobs.keys()):
+            table['jobs'].append(self.jobs[job_id].toDict())
+
+        fd, tmp_file = tempfile.mkstemp(prefix='.jobs.', dir=os.path.dirname(self.filename))
+        f_jobs = os.fdopen(fd, 'w')
+        json.dump(table, f_jobs)
+        f_jobs.close()
+        os.rename(tmp_file, self.filename)
+
+    def limit(self, resource):
+        ''' Returns the number of jobs that can run at same time on the resource. '''
+
+        if resource.startswith('nim:'):
+            return int(config.job_nim_limit)
+        return int(config.job_hmc_limit)
+
+    def submit(self, kind, args, resources):
+        ''' Add a job to the queue. Returns the job ID.
+
+            Args:
+              kind (str): 'change' or 'deploy'.
+              args (dict): the arguments of the job.
+              resources (list): the resources used ('hmc:<server>', 'nim:<server>').
+        '''
+
+        if kind not in self.runners:
+            raise ValueError('the job kind needs be one of: %s' % (', '.join(self.runners.keys())))
+
+        self.condition.acquire()
+        try:
+            job = Job(self.next_id, kind, args, resources)
+            self.next_id += 1
+            self.jobs[job.job_id] = job
+            self.save()
+            self.condition.notifyAll()
+            return job.job_id
+        finally:
+            self.condition.release()
+
+    def get(self, job_id):
+        ''' Returns the Job or None. '''
+
+        return self.jobs.get(int(job_id))
+
+    def list(self):
+        ''' Returns the list of jobs (as dict), the newest first. '''
+
+        self.condition.acquire()
+        try:
+            jobs = []
+            for job_id in sorted(self.jobs.keys(), reverse=True):
+                jobs.append(self.jobs[job_id].toDict())
+            return jobs
+        finally:
+            self.condition.release()
+
+    def cancel(self, job_id):
+        ''' Cancel a job. A queued job is cancelled at once; on a change
+            running no new step starts. Returns False if the job can't be
+            cancelled.
+        '''
+
+        self.condition.acquire()
+        try:
+            job = self.jobs.get(int(job_id))
+            if job is None:
+                return False
+            if job.state == 'queued':
+                job.state = 'cancelled'
+                job.finished = time.time()
+                job.stream.close()
+                self.save()
+                return True
+            if job.state == 'running' and job.kind == 'change':
+                job.cancel.set()
+                return True
+            return False
+        finally:
+            self.condition.release()
+
+    def nextJob(self):
+        ''' Wait and returns the next queued job with its resources free. '''
+
+        self.condition.acquire()
+        try:
+            while True:
+                for job_id in sorted(self.jobs.keys()):
+                    job = self.jobs[job_id]
+                    if job.state != 'queued':
+                        continue
+                    free = True
+                    for resource in job.resources:
+                        if self.using.get(resource, 0) >= self.limit(resource):
+                            free = False
+                    if free:
+                        for resource in job.resources:
+                            self.using[resource] = self.using.get(resource, 0) + 1
+                        job.state = 'running'
+                        job.started = time.time()
+                        self.save()
+                        return job
+                self.condition.wait()
+        finally:
+            self.condition.release()
+
+    def worker(self):
+        ''' Worker: run the jobs of the queue. '''
+
+        while True:
+            job = self.nextJob()
+            try:
+                state = self.runners[job.kind](job)
+            except Exception:
+                for line in traceback.format_exc().split('\n'):
+                    job.output(line)
+                state = 'failed'
+
+            self.condition.acquire()
+            try:
+                for resource in job.resources:
+                    self.using[resource] -= 1
+                job.state = state
+                job.finished = time.time()
+                job.stream.close()
+                self.save()
+                self.condition.notifyAll()
+            finally:
+                self.condition.release()
+
+
+# the job queue is shared by all the modules in the process
+queue = None
+queue_lock = threading.Lock()
+
+def get():
+    ''' Returns the shared JobQueue (the workers start on the first call). '''
+
+    global queue
+    queue_lock.acquire()
+    try:
+        if queue is None:
+            queue = JobQueue()
+        return queue
+    finally:
+        queue_lock.release()
@@ -0,0 +1,389 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+PowerAdm
+lparindex.py
+
+Copyright (c) 2016 Kairo Araujo
+
+It was created for personal use. There are no guarantees of the author.
+Use at your own risk.
+
+Permission to use, copy, modify, and distribute this software for any
+purpose with or without fee is hereby granted, provided that the above
+copyright notice and this permission notice appear in all copies.
+
+THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+IBM, Power, PowerVM (a.k.a. VIOS) are registered trademarks of IBM Corporation in
+the United States, other countries, or both.
+VMware, vCenter, vCenter Orchestrator are registered trademarks of VWware Inc in the United
+States, other countries, or both.
+'''
+
+# Imports
+###############################################################################################
+import os
+import json
+import time
+import tempfile
+import threading
+import config
+import hmc
+import parallel
+import cachefile
+import lparprofile
+##############################################################################################
+#
+# LPAR index
+#
+# Index of the LPARs of all the frames: LPAR ID -> (frame, LPAR name,
+# current profile), stored on data/lpar_index.json. It's collected with
+# one cheap 'lssyscfg -r lpar -F lpar_id,name,curr_profile' per frame, all
+# the frames at the same time (a pool per HMC).
+#
+# A search by ID asks the profile only to the frame of the index (one
+# command). If the LPAR is not there anymore (moved or removed) or the ID
+# is not on the index (new LPAR, if the index is older than refresh_min_age)
+# the index is collected again and the search is repeated once.
+#
+# The searches by name are answered from the names of the index (in memory,
+# by trigrams): exact name, prefix, substring and similar names (fuzzy), in
+# this order. An LPAR on two frames (LPM) is showed once, on the frame where
+# it's running, and the profile is asked only to that frame.
+##############################################################################################
+
+# fields of lssyscfg -r lpar on the index
+index_fields = ['lpar_id', 'name', 'curr_profile', 'state']
+
+# an index newer than this (seconds) is not collected again when an ID is not on it
+refresh_min_age = 60
+
+# min similarity (trigrams of the search found on the name) of the fuzzy matches
+fuzzy_min = 0.5
+
+# ranks of the matches of a search by name
+match_ranks = ['exact', 'prefix', 'substring', 'fuzzy']
+
+
+def trigrams(text):
+    ''' Returns the set of trigrams of a text (with the borders). '''
+
+    text = '  %s ' % (text.lower())
+    grams = set()
+    for index in range(len(text) - 2):
+        grams.add(text[index:index + 3])
+    return grams
+
+
+def statePriority(state):
+    ''' Returns the priority of an LPAR state to choose between the LPM
+        duplicates (lower is better).
+    '''
+
+    if 'Running' in state:
+        return 0
+    if 'Not Activated' in state:
+        return 2
+    return 1
+
+
+class LPARIndex:
+    ''' Index of the LPAR IDs of the fleet (all systems on config.systems).
+
+        Args:
+          filename (str): the index file (default data/lpar_index.json).
+
+        Attributes:
+          index (dict): {'time': last refresh, 'fields': index_fields,
+                         'systems': {system: {lpar_id: [name, curr_profile, state]}}}
+          names (dict): the names index (see buildNames()), None to build.
+          refresh_start (float): start time of the last refresh of all the systems.
+    '''
+
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = '%s/poweradm/data/lpar_index.json' % (config.pahome)
+        self.filename = filename
+        self.index = {'time': 0, 'fields': index_fields, 'systems': {}}
+        self.names = None
+        self.lock = threading.Lock()
+        # only one refresh() at time
+        self.refresh_lock = threading.Lock()
+        self.refresh_start = 0
+        self.load()
+
+    def load(self):
+        ''' Load the index from the file (if exists). '''
+
+        try:
+            f_index = open(self.filename, 'r')
+            try:
+                index = cachefile.decode(json.load(f_index))
+            finally:
+                f_index.close()
+        except (IOError, ValueError):
+            return
+        # an index of other version is collected again
+        if index.get('fields') == index_fields:
+            self.index = index
+            self.names = None
+
+    def save(self):
+        ''' Save the index on the file (atomic using rename). '''
+
+        try:
+            fd, tmp_file = tempfile.mkstemp(prefix='.lpar_index.', dir=os.path.dirname(self.filename))
+            f_index = os.fdopen(fd, 'w')
+            json.dump(self.index, f_index)
+            f_index.close()
+            os.rename(tmp_file, self.filename)
+        except (IOError, OSError):
+            # without the file the index is only in memory
+            pass
+
+    def collect(self, system):
+        ''' Returns {lpar_id: [name, curr_profile, state]} of a system from the HMC
+            or None if the command failed.
+        '''
+
+        result = hmc.getSystem(system).run('lssyscfg -r lpar -m %s -F %s' % (system, ','.join(index_fields)))
+        if not result.ok():
+            return None
+        lpars = {}
+        for line in result.output.split('\n'):
+            values = line.split(',')
+            if len(values) == len(index_fields) and values[0].isdigit():
+                lpars[values[0]] = values[1:]
+        return lpars
+
+    def refresh(self, systems=None):
+        ''' Collect the index of the systems (default all) at the same time.
+            Only one refresh runs at time: a caller that waited for a refresh
+            of all the systems started after its call uses it and doesn't
+            collect again (ex: many findID() of new IDs at the same time).
+        '''
+
+        requested = time.time()
+        self.refresh_lock.acquire()
+        try:
+            if self.refresh_start >= requested:
+                return
+
+            start = time.time()
+            if systems is None:
+                systems = list(config.systems.keys())
+
+            collected = parallel.pmap(self.collect, systems, key=hmc.route)
+
+            self.lock.acquire()
+            try:
+                for system, lpars in zip(systems, collected):
+                    # a frame that failed keeps the old index
+                    if lpars is not None:
+                        self.index['systems'][system] = lpars
+                for system in self.index['systems'].keys():
+                    if system not in config.systems:
+                        del self.index['systems'][system]
+                self.index['time'] = time.time()
+                self.names = None
+                self.save()
+            finally:
+                self.lock.release()
+
+            if sorted(systems) == sorted(config.systems.keys()):
+                self.refresh_start = start
+        finally:
+            self.refresh_lock.release()
+
+    def ensure(self, max_age=None):
+        ''' Refresh the index if it is older than max_age seconds (default
+            config.lpar_index_refresh). Returns True if refreshed.
+        '''
+
+        if max_age is None:
+            max_age = config.lpar_index_refresh
+        if time.time() - self.index.get('time', 0) > int(max_age):
+            # other process can have a newer index
+            self.load()
+        if time.time() - self.index.get('time', 0) > int(max_age):
+            self.refresh()
+            return True
+        return False
+
+    def entries(self, lpar_id):
+        ''' Returns the list of (system, name, curr_profile, state) of an LPAR ID on the index. '''
+
+        found = []
+        self.lock.acquire()
+        try:
+            for system in sorted(self.index['systems'].keys()):
+                entry = self.index['systems'][system].get(str(lpar_id))
+                if entry is not None:
+                    found.append((system, entry[0], entry[1], entry[2]))
+        finally:
+            self.lock.release()
+        return found
+
+    def profiles(self, system, lpar_id, curr_profile=None):
+        ''' Returns the profiles (lssyscfg -r prof lines) of an LPAR, the
+            current profile first. Only one command on the HMC of the system.
+        '''
+
+        result = hmc.getSystem(system).run('lssyscfg -r prof -m %s --filter "lpar_ids=%s"' % (system, lpar_id))
+        if not result.ok():
+            return []
+        profiles = []
+        for line in result.output.split('\n'):
+            attrs = lparprofile.parseAttrs(line)
+            if attrs.get('lpar_id') == str(lpar_id):
+                if attrs.get('name') == curr_profile:
+                    profiles.insert(0, line)
+                else:
+                    profiles.append(line)
+        return profiles
+
+    def lpar(self, system, lpar_id, lpar):
+        ''' Returns the LPAR of a search (findID() or findName()) with its
+            profiles, asked only to the system, or None if it's not there.
+
+            Args:
+              system (str): the system name (frame).
+              lpar_id (str): the LPAR ID.
+              lpar (dict): the LPAR of the search ({'name', 'curr_profile', ...}).
+        '''
+
+        profiles = self.profiles(system, lpar_id, lpar['curr_profile'])
+        if not profiles:
+            return None
+        lpar = dict(lpar)
+        lpar['name'] = lparprofile.parseAttrs(profiles[0]).get('lpar_name', lpar['name'])
+        lpar['profiles'] = profiles
+        return lpar
+
+    def findID(self, lpar_id):
+        ''' Returns the list of (system, lpar_id, LPAR) with the ID. The LPAR
+            is {'name', 'curr_profile', 'state', 'profiles'}.
+        '''
+
+        lpar_id = str(lpar_id)
+        refreshed = self.ensure()
+
+        while True:
+            found = []
+            entries = self.entries(lpar_id)
+            for system, name, curr_profile, state in entries:
+                lpar = self.lpar(system, lpar_id, {'name': name, 'curr_profile': curr_profile,
+                                                   'state': state})
+                if lpar is not None:
+                    found.append((system, lpar_id, lpar))
+            if found:
+                return found
+            # the index is old (LPAR moved or removed, or new if the index
+            # is not too new)
+            if refreshed or (not entries and time.time() - self.index.get('time', 0) < refresh_min_age):
+                break
+            self.refresh()
+            refreshed = True
+        return []
+
+    def buildNames(self):
+        ''' Build the names index (use it with the lock): {'lpars': [(name
+            lower, system, lpar_id, name, curr_profile, state)], 'trigrams':
+            {trigram: set of positions on lpars}}. The LPM duplicates (same
+            name on many frames) are only once, the running one.
+        '''
+
+        best = {}
+        for system in sorted(self.index['systems'].keys()):
+            for lpar_id, entry in self.index['systems'][system].items():
+                name, curr_profile, state = entry
+                key = name.lower()
+                if key not in best or statePriority(state) < statePriority(best[key][5]):
+                    best[key] = (key, system, lpar_id, name, curr_profile, state)
+
+        lpars = [best[key] for key in sorted(best.keys())]
+        grams = {}
+        for position in range(len(lpars)):
+            for gram in trigrams(lpars[position][0]):
+                grams.setdefault(gram, set()).add(position)
+        self.names = {'lpars': lpars, 'trigrams': grams}
+
+    def findName(self, text, limit=None):
+        ''' Returns the list of (system, lpar_id, LPAR) with names like the
+            text, the best first (exact, prefix, substring and fuzzy). The
+            LPAR is {'name', 'curr_profile', 'state', 'match'}, without the
+            profiles (see lpar()).
+
+            Args:
+              text (str): the name or part of the name (case insensitive).
+              limit (int): max number of LPARs returned (default all).
+        '''
+
+        self.ensure()
+        text = text.lower().strip()
+
+        self.lock.acquire()
+        try:
+            if self.names is None:
+                self.buildNames()
+            lpars = self.names['lpars']
+
+            # the candidates have some trigram of the text (short texts on all)
+            text_grams = trigrams(text)
+            if len(text) < 3:
+                candidates = range(len(lpars))
+            else:
+                shared = {}
+                for gram in text_grams:
+                    for position in self.names['trigrams'].get(gram, ()):
+                        shared[position] = shared.get(position, 0) + 1
+                candidates = shared.keys()
+
+            matches = []
+            for position in candidates:
+                key, system, lpar_id, name, curr_profile, state = lpars[position]
+                similarity = len(text_grams & trigrams(key)) / float(len(text_grams))
+                if key == text:
+                    match = 'exact'
+                elif key.startswith(text):
+                    match = 'prefix'
+                elif text in key:
+                    match = 'substring'
+                elif similarity >= fuzzy_min:
+                    match = 'fuzzy'
+                else:
+                    continue
+                matches.append((match_ranks.index(match), -similarity, key, system, lpar_id,
+                                {'name': name, 'curr_profile': curr_profile, 'state': state,
+                                 'match': match}))
+        finally:
+            self.lock.release()
+
+        matches.sort(key=lambda match: match[:3])
+        if limit is not None:
+            matches = matches[:int(limit)]
+        return [(system, lpar_id, lpar) for rank, similarity, key, system, lpar_id, lpar in matches]
+
+
+# the index is shared by all the modules in the process
+lpar_index = None
+lpar_index_lock = threading.Lock()
+
+def get():
+    ''' Returns the shared LPARIndex. '''
+
+    global lpar_index
+    lpar_index_lock.acquire()
+    try:
+        if lpar_index is None:
+            lpar_index = LPARIndex()
+        return lpar_index
+    finally:
+        lpar_index_lock.release()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+PowerAdm
+lparprofile.py
+
+Copyright (c) 2016 Kairo Araujo
+
+It was created for personal use. There are no guarantees of the author.
+Use at your own risk.
+
+Permission to use, copy, modify, and distribute this software for any
+purpose with or without fee is hereby granted, provided that the above
+copyright notice and this permission notice appear in all copies.
+
+THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+IBM, Power, PowerVM (a.k.a. VIOS) are registered trademarks of IBM Corporation in
+the United States, other countries, or both.
+VMware, vCenter, vCenter Orchestrator are registered trademarks of VWware Inc in the United
+States, other countries, or both.
+'''
+
+# Imports
+###############################################################################################
+import csv
+import hmc
+##############################################################################################
+#
+# LPAR profiles
+#
+# Profiles and virtual adapters of the LPARs, collected from the HMC with
+# 'lssyscfg -r prof'. The lookups of the LPARs (ID, name, frame) are served
+# by the LPAR index (lparindex.py) and the slots of the VIOS by viosmap.py.
+##############################################################################################
+
+# virtual adapters on the profile
+adapters_fields = {'vscsi': 'virtual_scsi_adapters',
+                   'vfc': 'virtual_fc_adapters',
+                   'veth': 'virtual_eth_adapters'}
+
+
+def parseAttrs(line):
+    ''' Parse a line of lssyscfg (attr=value,"attr=value,value") to a dict. '''
+
+    attrs = {}
+    for field in csv.reader([line]).next():
+        if '=' in field:
+            attr, value = field.split('=', 1)
+            attrs[attr] = value
+    return attrs
+
+
+def parseAdapters(value):
+    ''' Parse a list of virtual adapters of the profile to a list. '''
+
+    adapters = []
+    for adapter in csv.reader([value]).next():
+        if adapter not in ('', 'none'):
+            adapters.append(adapter)
+    return adapters
+
+
+def profiles(system, lpar_ids=None):
+    ''' Returns {lpar_id: [profiles lines]} of a system from the HMC or
+        None if the command failed.
+
+        Args:
+          system (str): the system name (frame).
+          lpar_ids (list): only the profiles of these LPARs (default all).
+    '''
+
+    cmd = 'lssyscfg -r prof -m %s' % (system)
+    if lpar_ids is not None:
+        cmd = '%s --filter "lpar_ids=%s"' % (cmd, ','.join(lpar_ids))
+
+    status, output = hmc.getSystem(system).getstatusoutput(cmd)
+    if status != 0:
+        return None
+
+    profiles = {}
+    for line in output.split('\n'):
+        lpar_id = parseAttrs(line).get('lpar_id')
+        if lpar_id is not None:
+            profiles.setdefault(lpar_id, []).append(line)
+    return profiles
@@ -29,139 +29,238 @@ States, other countries, or both.
 
 # Imports
 ###############################################################################################
-import os
-import commands
+import hmc
+import npiv
+import parallel
+import stats
 ##############################################################################################
+#
+# The collection (collect) is separated from the output (render), so the same
+# informations can be used by the text interface, web and JSON.
+##############################################################################################
+
+def collect(hmcserver, system, vios, fc):
+    ''' Collect the NPIV informations of the VIOS FC ports.
+
+        All the commands are executed in two batches (hmc.viosvrcmdBatch):
+        the first gets lsnports, errlog and lsmap, the second gets the
+        informations of all the FC ports.
+
+        Args:
+          hmcserver (str): HMC Address or hostname (None to the HMC of the system).
+          system (str): exactly system name of Power System.
+          vios (str): exactly name of VIOS LPAR.
+          fc (str): 'all' for all FCs or specific FC (sample: fcs0).
+
+        Returns a dict:
+            {'system': system, 'vios': vios,
+             'ports': [{'name', 'physloc', 'fabric', 'tports', 'aports',
+                        'swwpns', 'awwpns' (as npiv.parseLsnports),
+                        'clients': [[vfchost/ID, ID/FC], ...],
+                        'errlog': [last five errlog lines],
+                        'fscsi': fscsi device, 'attach': [attach lines],
+                        'attention': [fcstat -e Attention Type],
+                        'speed_supported': [speed, unit],
+                        'speed_running': [speed, unit],
+                        'wwpn': World Wide Port Name line}, ...]}
+    '''
+
+    if hmcserver is None:
+        hmcserver = hmc.route(system)
+    hmc_client = hmc.get(hmcserver)
+
+    # first batch: physical FCs, errlog and NPIV clients
+    lsnports, errlog, lsmap = hmc_client.viosvrcmdBatch(system, vios, ['lsnports', 'errlog',
+                              'lsmap -all -npiv -field ClntID "FC name" -fmt :'])
+
+    ports = []
+    for port in npiv.parseLsnports(lsnports):
+        if fc == 'all' or port['name'] == fc:
+            ports.append(port)
+
+    # second batch: child device (fscsi), attach, fcstat -e and fcstat of
+    #each port. The fscsi usually has the same number of fcs.
+    vios_cmds = []
+    for port in ports:
+        vios_cmds.extend(['lsdev -dev %s -child' % (port['name']),
+                          'lsdev -dev %s -attr attach' % (port['name'].replace('fcs', 'fscsi', 1)),
+                          'fcstat -e %s' % (port['name']),
+                          'fcstat %s' % (port['name'])])
+    ports_output = []
+    if vios_cmds:
+        ports_output = hmc_client.viosvrcmdBatch(system, vios, vios_cmds)
+
+    for index in range(len(ports)):
+        port = ports[index]
+        lsdev_child, attach, fcstat_e, fcstat = ports_output[index * 4:(index + 1) * 4]
+
+        # NPIV clients of the port
+        port['clients'] = []
+        for l_lsmap in lsmap.split('\n'):
+            if port['name'] in l_lsmap.split(':'):
+                port['clients'].append(l_lsmap.split(':')[:2])
+
+        # last five FC errors
+        port['errlog'] = []
+        for l_errlog in errlog.split('\n'):
+            if port['name'] in l_errlog.split():
+                port['errlog'].append(l_errlog)
+        port['errlog'] = port['errlog'][:5]
+
+        # link status
+        port['fscsi'] = ''
+        for l_fscsi in lsdev_child.split('\n'):
+            if 'fscsi' in l_fscsi:
+                port['fscsi'] = l_fscsi.split()[0]
+        if port['fscsi'] not in ('', port['name'].replace('fcs', 'fscsi', 1)):
+            attach = hmc_client.viosvrcmd(system, vios, 'lsdev -dev %s -attr attach' % (port['fscsi']))
+        port['attach'] = []
+        for l_fc_link in attach.split('\n'):
+            if l_fc_link.startswith('al') or l_fc_link.startswith('switch'):
+                port['attach'].append(l_fc_link)
+        port['attention'] = []
+        for l_fc_stat in fcstat_e.split('\n'):
+            if 'Attention Type:' in l_fc_stat:
+                port['attention'].append(l_fc_stat.split(':')[1])
+
+        # other fc informations
+        port['speed_supported'] = ['', '']
+        port['speed_running'] = ['', '']
+        port['wwpn'] = ''
+        for l_fcstat in fcstat.split('\n'):
+            if "Port Speed (supported)" in l_fcstat:
+                port['speed_supported'] = (l_fcstat.split() + ['', '', '', '', ''])[3:5]
+            if "Port Speed (running):" in l_fcstat:
+                port['speed_running'] = (l_fcstat.split() + ['', '', '', '', ''])[3:5]
+            if "World Wide Port Name" in l_fcstat:
+                port['wwpn'] = l_fcstat
+
+    return {'system': system, 'vios': vios, 'ports': ports}
+
+
+def collectVIOS(hmcserver, system, vios_list, fc):
+    ''' Run collect() on the VIOS of vios_list concurrently. Returns the list
+        of the collections in the same order.
+    '''
+
+    def collect_vios(vios):
+        return collect(hmcserver, system, vios, fc)
+
+    return parallel.pmap(collect_vios, vios_list)
+
+
+def render(npiv_info, output=None):
+    ''' Print the NPIV informations collected by collect().
+
+        Args:
+          npiv_info (dict): the informations of collect().
+          output: function called with each line of output (default print).
+    '''
+
+    if output is None:
+        def output(line):
+            print line
+
+    for port in npiv_info['ports']:
+        column = []
+        for field in npiv.lsnports_fields:
+            column.append(str(port[field]))
+        info_npiv = ''
+        info_use = ''
+
+        # get number of clients
+        num_client = (64-port['aports'])
+
+        lpar_id_list = []
+        for lparid_split in port['clients']:
+            if len(lparid_split) > 1:
+                lpar_id_list.append('%s(%s)' % (lparid_split[0], lparid_split[1]))
+
+        last_errlog = '\n'.join(port['errlog'])
+        fc_link = '\n'.join(port['attach'])
+        fc_stat = '\n'.join(port['attention'])
+        speed_port = port['speed_supported']
+        speed_running = port['speed_running']
+
+        if port['fabric'] == 0 and port['aports'] == 64:
+            column[0] = ("\033[1;33m%s\033[1;00m" % column[0])
+            column[2] = ("\033[1;33m%s\033[1;00m" % column[2])
+            info_npiv = info_npiv.join("\033[1;33m`-\033[1;00m don't enabled to NPIV but don't has connections configured!")
+
+        elif port['fabric'] == 0 and port['aports'] != 64:
+            column[0] = ("\033[1;31m%s\033[1;00m" % column[0])
+            column[2] = ("\033[1;31m%s\033[1;00m" % column[2])
+            info_npiv = info_npiv.join("\033[1;31m`-\033[1;00m don't enabled to NPIV and has connections configured!")
+
+        if  port['aports'] in (7, 8, 9, 10, 11, 12):
+            column[0] = ("\033[1;33m%s\033[1;00m" % column[0])
+            column[4] = ("\033[1;33m%s\033[1;00m" % column[4])
+            info_use = info_use.join("\033[1;33m`-\033[1;00m between 10% and 20% free for new connections")
+
+        elif port['aports'] in (0, 1, 2, 3, 4, 5, 6):
+            column[0] = ("\033[1;31m%s\033[1;00m" % column[0])
+            column[4] = ("\033[1;31m%s\033[1;00m" % column[4])
+            info_use = info_use.join("\033[1;31m`-\033[1;00m between 0% and 10% free for new connections")
+
+        output("=" * 80)
+        output("NAME\tPHYSLOC\t\t\t\tFABRIC\tTPORTS\tAPORTS\tSWWPNS\tAWWPNS")
+        output("=" * 80)
+
+        output('\t'.join(column))
+
+        if info_npiv != '':
+            output(info_npiv)
+
+        if info_use != '':
+            output(info_use)
+
+        output("\nUse of NPIV")
+        output("--- -- ----")
+        output("Number of clients using this port: %s" % num_client)
+
+        if len(lpar_id_list) > 0:
+            output("LPAR clients ID(vfchost): %s" % ', '.join(lpar_id_list))
+        else:
+            output("LPAR clients ID(vfchost): none")
+
+        output("\nAdapter Status")
+        output("------- ------")
+        if fc_link == 'al' or '   Link Down' == fc_stat:
+            fc_link = "\033[1;31mDOWN\033[1;00m"
+        elif fc_link == 'switch' or '   Link Up' == fc_stat:
+            fc_link = "\033[1;32mUP\033[1;00m"
+        output("Link Status: %s" % fc_link)
+
+        if speed_port[0] != speed_running[0]:
+            output("Speed Port (supported): \033[1;34m%s\033[1;00m %s" % (speed_port[0], speed_port[1]))
+            output("Speed Port (running): \033[1;33m%s\033[1;00m %s" % (speed_running[0], speed_running[1]))
+        else:
+            output("Speed Port (supported): \033[1;34m%s\033[1;00m %s" % (speed_port[0], speed_port[1]))
+            output("Speed Port (running): \033[1;34m%s\033[1;00m %s" % (speed_running[0], speed_running[1]))
+
+        output(port['wwpn'])
+
+        if last_errlog != '':
+            output("\nLast Adapter Erros in ERRPT/ERRLOG:")
+            output("----- ------- ----  -- -------------")
+            output("CODE\t   MMDDHHMMYY T C RESOURCE	 DESCRIPTION")
+            output(last_errlog+"\n")
+        else:
+            output('\n')
+
 
 def run(hmcserver, system, vios, fc):
     ''' Run NPIV check on VIOS.
 
         Args:
-          hmcserver (str): HMC Address or hostname.
+          hmcserver (str): HMC Address or hostname (None to the HMC of the system).
           system (str): exactly system name of Power System.
           VIOS (str): exactly name of VIOS LPAR.
           fc (str): 'all' for all FCs or specific FC (sample: fcs0).
     '''
-    if fc == 'all':
-        os.system("ssh -l poweradm %s viosvrcmd -m %s -p %s -c "'lsnports'" | grep fcs > /tmp/%s.%s.lsnports" % (hmcserver, system, vios, system, vios))
-        os.system("ssh -l poweradm %s viosvrcmd -m %s -p %s -c "'errlog'" | grep fcs > /tmp/%s.%s.fcs.errlog" % (hmcserver, system, vios, system, vios))
-    else:
-        os.system("ssh -l poweradm %s viosvrcmd -m %s -p %s -c "'lsnports'" | grep '%s ' > /tmp/%s.%s.lsnports" % (hmcserver, system, vios, fc, system, vios))
-        os.system("ssh -l poweradm %s viosvrcmd -m %s -p %s -c "'errlog'" | grep '%s ' > /tmp/%s.%s.fcs.errlog" % (hmcserver, system, vios, fc, system, vios))
-
-
-    with open('/tmp/%s.%s.lsnports' % (system, vios)) as lsnports:
-        for line in lsnports:
-            line.replace('\n', '')
-            column=line.split()
-            info_npiv = ''
-            info_use = ''
-
-            # get number of clients
-            num_client = (64-int(column[4]))
-            # clintes IDs
-            os.system("ssh -l poweradm %s viosvrcmd -m %s -p %s -c \"\'lsmap -all -npiv -field ClntID \"FC name\" -fmt :\'\" |"
-                      " grep %s > /tmp/%s.%s.lsparids.%s"
-                      % (hmcserver, system, vios, column[0], system, vios, column[0]))
-
-	        # get last five FC erros
-            last_errlog = commands.getoutput("cat /tmp/%s.%s.fcs.errlog | grep %s | head -n 5" % (system, vios, column[0]))
-
-            # get link status
-            fscsi = commands.getoutput("ssh -l poweradm %s viosvrcmd -m %s -p %s -c \"\'lsdev -dev %s -child\'\" | grep fscsi | awk \'{ print $1 }\'" %
-                    (hmcserver, system, vios, column[0]))
-            fc_link = commands.getoutput("ssh -l poweradm %s viosvrcmd -m %s -p %s -c \"\'lsdev -dev %s -attr attach\'\" | grep -E \'^al|^switch\'" %
-                    (hmcserver, system, vios, fscsi))
-            fc_stat = commands.getoutput("ssh -l poweradm %s viosvrcmd -m %s "
-            "-p %s -c \"\'fcstat -e %s\'\" | grep \"Attention Type:\" "
-            "| awk -F: \'{ print $2 }\'" % (hmcserver, system, vios, column[0]))
-
-            # get other fc informations
-            os.system("ssh -l poweradm %s viosvrcmd -m %s -p %s -c \"\'fcstat %s\'\" > /tmp/%s.%s.fcstat.%s" %
-                    (hmcserver, system, vios, column[0], system, vios, column[0]))
-
-            with open('/tmp/%s.%s.fcstat.%s' % (system, vios, column[0])) as fcstat:
-                for l_fcstat in fcstat:
-                    if "Port Speed (supported)" in l_fcstat:
-                        speed_port = l_fcstat.replace('\n', '')
-                        speed_port = speed_port.split()
-
-                    if "Port Speed (running):" in l_fcstat:
-                        speed_running = l_fcstat.replace('\n', '')
-                        speed_running = speed_running.split()
-
-                    if "World Wide Port Name" in l_fcstat:
-                        wwpn = l_fcstat.replace('\n', '')
-
-            lpar_id_list = []
-            with open('/tmp/%s.%s.lsparids.%s' % (system, vios, column[0])) as lparidslist:
-                for l_lparidslist in lparidslist:
-                    lparid_split = l_lparidslist.split(':')
-                    lpar_id_list.append('%s(%s)' % (lparid_split[0], lparid_split[1]))
-
-            if column[2] in ('0') and column[4] in ('64'):
-                column[0] = ("\033[1;33m%s\033[1;00m" % column[0])
-                column[2] = ("\033[1;33m%s\033[1;00m" % column[2])
-                info_npiv = info_npiv.join("\033[1;33m`-\033[1;00m don't enabled to NPIV but don't has connections configured!")
-
-            elif column[2] in ('0') and column[4] != ('64'):
-                column[0] = ("\033[1;31m%s\033[1;00m" % column[0])
-                column[2] = ("\033[1;31m%s\033[1;00m" % column[2])
-                info_npiv = info_npiv.join("\033[1;31m`-\033[1;00m don't enabled to NPIV and has connections configured!")
-
-            if  column[4] in ('7','8','9','10','11','12'):
-                column[0] = ("\033[1;33m%s\033[1;00m" % column[0])
-                column[4] = ("\033[1;33m%s\033[1;00m" % column[4])
-                info_use = info_use.join("\033[1;33m`-\033[1;00m between 10% and 20% free for new connections")
-
-            elif column[4] in ('0','1','2','3','4','5','6'):
-                column[0] = ("\033[1;31m%s\033[1;00m" % column[0])
-                column[4] = ("\033[1;31m%s\033[1;00m" % column[4])
-                info_use = info_use.join("\033[1;31m`-\033[1;00m between 0% and 10% free for new connections")
-
-            print "=" * 80
-            print ("NAME\tPHYSLOC\t\t\t\tFABRIC\tTPORTS\tAPORTS\tSWWPNS\tAWWPNS")
-            print "=" * 80
-
-            print '\t'.join(column)
-
-            if info_npiv != '':
-                print info_npiv
-
-            if info_use != '':
-                print info_use
-
-            print ("\nUse of NPIV")
-            print ("--- -- ----")
-            print ("Number of clients using this port: %s" % num_client)
-
-            if len(lpar_id_list) > 0:
-                print ("LPAR clients ID(vfchost): %s" % ', '.join(lpar_id_list))
-            else:
-                print ("LPAR clients ID(vfchost): none")
-
-            print "\nAdapter Status"
-            print "------- ------"
-            if fc_link == 'al' or '   Link Down' == fc_stat:
-                fc_link = "\033[1;31mDOWN\033[1;00m"
-            elif fc_link == 'switch' or '   Link Up' == fc_stat:
-                fc_link = "\033[1;32mUP\033[1;00m"
-            print "Link Status: %s" % fc_link
-
-            if speed_port[3] != speed_running[3]:
-                print ("Speed Port (supported): \033[1;34m%s\033[1;00m %s" % (speed_port[3], speed_port[4]))
-                print ("Speed Port (running): \033[1;33m%s\033[1;00m %s" % (speed_running[3], speed_running[4]))
-            else:
-                print ("Speed Port (supported): \033[1;34m%s\033[1;00m %s" % (speed_port[3], speed_port[4]))
-                print ("Speed Port (running): \033[1;34m%s\033[1;00m %s" % (speed_running[3], speed_running[4]))
-
-            print wwpn
-
-            if last_errlog != '':
-                print "\nLast Adapter Erros in ERRPT/ERRLOG:"
-                print "----- ------- ----  -- -------------"
-                print "CODE\t   MMDDHHMMYY T C RESOURCE	 DESCRIPTION"
-                print last_errlog+"\n"
-            else:
-                print '\n'
 
+    operation = stats.Operation('lsnpivs')
+    try:
+        render(collect(hmcserver, system, vios, fc))
+    finally:
+        operation.end()
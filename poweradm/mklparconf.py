@@ -34,6 +34,9 @@ import commands
 import globalvar
 import config
 import check_devices
+import idalloc
+import changeplan
+import hmc
 
 class MakeLPARConf():
     ''' Create on config.pahome/poweradm/changes/ the shell script file to create LPAR.
@@ -94,33 +97,29 @@ class MakeLPARConf():
         # Minimal and Maximum CPU and Memory
         #
 
-        # global variables
-        global lparmenmin, lparmenmax, lparentcpumin, lparentcpumax, lparvcpumin, lparvcpumax
-
         # calcule the lpar memory min and max
-        lparmenmin = self.lparmem-(self.lparmem*config.mem_min/100)
-        lparmenmax = (self.lparmem*config.mem_max/100)+self.lparmem
+        self.lparmenmin = self.lparmem-(self.lparmem*config.mem_min/100)
+        self.lparmenmax = (self.lparmem*config.mem_max/100)+self.lparmem
 
         # verify entitle cpu and set min and maximum
-        lparentcpumin = self.lparentcpu-(self.lparentcpu*config.cpu_min/100)
-        lparentcpumin = round(lparentcpumin, 1)
-        if lparentcpumin < 0.10:
-            lparentcpumin = 0.1
-        lparentcpumax = (self.lparentcpu*config.cpu_max/100)+self.lparentcpu
+        self.lparentcpumin = self.lparentcpu-(self.lparentcpu*config.cpu_min/100)
+        self.lparentcpumin = round(self.lparentcpumin, 1)
+        if self.lparentcpumin < 0.10:
+            self.lparentcpumin = 0.1
+        self.lparentcpumax = (self.lparentcpu*config.cpu_max/100)+self.lparentcpu
 
         # verify virtual cpu (if min cpu is < 1) and set min and max
-        lparvcpumin = self.lparvcpu-(self.lparvcpu*config.cpu_min/100)
-        if lparvcpumin < 1:
-            lparvcpumin = 1
-        lparvcpumax = (self.lparvcpu*config.cpu_max/100)+self.lparvcpu
+        self.lparvcpumin = self.lparvcpu-(self.lparvcpu*config.cpu_min/100)
+        if self.lparvcpumin < 1:
+            self.lparvcpumin = 1
+        self.lparvcpumax = (self.lparvcpu*config.cpu_max/100)+self.lparvcpu
 
 
         #
         # set default values vscsi
         #
-        global vscsi_vio1, vscsi_vio2
-        vscsi_vio1 = ("21/client//%s/1%s/0" % (self.vio1, self.lparid))
-        vscsi_vio2 = ("22/client//%s/2%s/0" % (self.vio2, self.lparid))
+        self.vscsi_vio1 = ("21/client//%s/1%s/0" % (self.vio1, self.lparid))
+        self.vscsi_vio2 = ("22/client//%s/2%s/0" % (self.vio2, self.lparid))
 
         #
         # Check if devices is free to creation using check_devices.py
@@ -131,13 +130,13 @@ class MakeLPARConf():
 
 
         # uses the check_devices
-        vscsi_devices_vio1 = check_devices.check('vscsi', config.hmcserver,
+        vscsi_devices_vio1 = check_devices.check('vscsi', hmc.route(self.system),
                 self.system, self.vio1, self.lparid)
-        vscsi_devices_vio2 = check_devices.check('vscsi', config.hmcserver,
+        vscsi_devices_vio2 = check_devices.check('vscsi', hmc.route(self.system),
                 self.system, self.vio2, self.lparid)
-        vfc_devices_vio1 = check_devices.check('vfc', config.hmcserver,
+        vfc_devices_vio1 = check_devices.check('vfc', hmc.route(self.system),
                 self.system, self.vio1, self.lparid)
-        vfc_devices_vio2 = check_devices.check('vfc', config.hmcserver,
+        vfc_devices_vio2 = check_devices.check('vfc', hmc.route(self.system),
                 self.system, self.vio2, self.lparid)
 
         # if some device ID is in used, just exit with error.
@@ -165,217 +164,169 @@ class MakeLPARConf():
     def headerchange(self):
         ''' Write the header of file. '''
 
-        global file_change
+        # the time of the file name is the same until closechange()
+        self.timestr = globalvar.getTimestr()
 
-        file_change = open("%s/poweradm/tmp/%s_%s.sh" % (config.pahome, self.change, globalvar.timestr) , 'w')
-        file_change.write("#!/bin/sh\n")
+        self.file_change = open("%s/poweradm/tmp/%s_%s.sh" % (config.pahome, self.change, self.timestr) , 'w')
+        self.file_change.write("#!/bin/sh\n")
 
 
     def writechange(self):
-        ''' Write the body of file. '''
+        ''' Write the body of file.
+
+            The change is built as a DAG of steps (changeplan.ChangePlan): all
+            the steps wait for mksyscfg (the server adapters point to the new
+            LPAR) and then the steps of VIO1 and VIO2 run at the same time,
+            without depending on each other.
+        '''
+
+        plan = changeplan.ChangePlan(hmc.route(self.system))
 
         #
         # config functions to write correct action to lpar
         #
 
-        def wchg_checksh():
-            ''' Write the test of commands. '''
-            file_change.write("\nif [ $? != 0 ];"
-                              "then\n"
-                              "\techo 'An error has occurred. Check the actions taken.'; \n"
-                              "\texit;\n"
-                              "else\n"
-                              "\techo 'Command OK. Continuing';\n"
-                              "fi\n")
+        def wchg_creating_lpar(cmd): # message information creating LPAR
+            ''' Add the LPAR creation (mksyscfg). '''
 
-        def wchg_creating_lpar(): # message information creating LPAR
-            ''' Write the message of creating LPAR. '''
-
-            file_change.write("\n\necho 'Creating LPAR %s-%s on %s ...'\n" % (self.prefix, self.lparname,
-                self.system))
+            # the system of the step routes the change to the HMC of the frame (changeplan.load())
+            plan.add(changeplan.Step('mksyscfg', 'hmc', msg='Creating LPAR %s-%s on %s ...' %
+                     (self.prefix, self.lparname, self.system), system=self.system, cmd=cmd))
 
 
         def wchg_vio_mkscsi(): # create SCSI on VIO Servers via DLPAR
-            ''' Write the SCSI creation on VIO using DLPAR. '''
-
-            file_change.write("\n\necho 'Making DLPAR on %s to create VSCSI'" % (self.vio1))
-            file_change.write("\n\nssh %s -l poweradm chhwres -r virtualio -m %s -o a -p %s --rsubtype scsi "
-                             "-s 1%s -a \'adapter_type=server,remote_lpar_name=%s-%s,remote_lpar_id=%s,remote_slot_num=21\'"
-                             % (config.hmcserver, self.system, self.vio1, self.lparid,
-                             self.prefix, self.lparname, self.lparid))
-
-            wchg_checksh()
+            ''' Add the SCSI creation on VIO using DLPAR. '''
 
-            file_change.write("\n\necho 'Making DLPAR on %s to create VSCSI'" %
-                         (self.vio2))
+            plan.add(changeplan.Step('vio1_mkscsi', 'hmc', msg='Making DLPAR on %s to create VSCSI' % (self.vio1),
+                     after=vio_last('vio1'),
+                     cmd="chhwres -r virtualio -m %s -o a -p %s --rsubtype scsi "
+                         "-s 1%s -a \'adapter_type=server,remote_lpar_name=%s-%s,remote_lpar_id=%s,remote_slot_num=21\'"
+                         % (self.system, self.vio1, self.lparid, self.prefix, self.lparname, self.lparid)))
 
-            file_change.write("\n\nssh %s -l poweradm chhwres -r virtualio -m %s -o a -p %s --rsubtype scsi "
-                             "-s 2%s -a \'adapter_type=server,remote_lpar_name=%s-%s,remote_lpar_id=%s,remote_slot_num=22\'"
-                             % (config.hmcserver, self.system, self.vio2, self.lparid,
-                             self.prefix, self.lparname, self.lparid))
-
-            wchg_checksh()
+            plan.add(changeplan.Step('vio2_mkscsi', 'hmc', msg='Making DLPAR on %s to create VSCSI' % (self.vio2),
+                     after=vio_last('vio2'),
+                     cmd="chhwres -r virtualio -m %s -o a -p %s --rsubtype scsi "
+                         "-s 2%s -a \'adapter_type=server,remote_lpar_name=%s-%s,remote_lpar_id=%s,remote_slot_num=22\'"
+                         % (self.system, self.vio2, self.lparid, self.prefix, self.lparname, self.lparid)))
 
         def wchg_vio_mknpiv(): # create NPIV on VIO Servers via DLPAR
-            ''' Write the FC/NPIV creation on VIO using DLPAR. '''
-
-            file_change.write("\n\necho 'Making DLPAR on %s to create FCs'" %
-                             (self.vio1))
-
-            file_change.write("\n\nssh %s -l poweradm chhwres -r virtualio -m %s -o a -p %s --rsubtype fc "
-                              "-s 3%s -a \'adapter_type=server,remote_lpar_name=%s-%s, remote_slot_num=33\'"
-                              % (config.hmcserver, self.system, self.vio1, self.lparid,
-                              self.prefix, self.lparname ))
-            wchg_checksh()
+            ''' Add the FC/NPIV creation on VIO using DLPAR. '''
 
-            file_change.write("\n\necho 'Making DLPAR on %s to create FCs'" %
-                             (self.vio2))
+            plan.add(changeplan.Step('vio1_mknpiv', 'hmc', msg='Making DLPAR on %s to create FCs' % (self.vio1),
+                     after=vio_last('vio1'),
+                     cmd="chhwres -r virtualio -m %s -o a -p %s --rsubtype fc "
+                         "-s 3%s -a \'adapter_type=server,remote_lpar_name=%s-%s, remote_slot_num=33\'"
+                         % (self.system, self.vio1, self.lparid, self.prefix, self.lparname)))
 
-            file_change.write("\n\nssh %s -l poweradm chhwres -r virtualio -m %s -o a -p %s --rsubtype fc "
-                              "-s 4%s -a \'adapter_type=server,remote_lpar_name=%s-%s, remote_slot_num=34\'"
-                              % (config.hmcserver, self.system, self.vio2, self.lparid,
-                              self.prefix, self.lparname ))
-            wchg_checksh()
+            plan.add(changeplan.Step('vio2_mknpiv', 'hmc', msg='Making DLPAR on %s to create FCs' % (self.vio2),
+                     after=vio_last('vio2'),
+                     cmd="chhwres -r virtualio -m %s -o a -p %s --rsubtype fc "
+                         "-s 4%s -a \'adapter_type=server,remote_lpar_name=%s-%s, remote_slot_num=34\'"
+                         % (self.system, self.vio2, self.lparid, self.prefix, self.lparname)))
 
         def wchg_vio_cfgdev(): # make cfgdev on VIOs
-            ''' Write the cfgdev on VIO. '''
-
-            file_change.write("\n\necho 'Making cfgdev on %s to reconize new devices'" %
-                             (self.vio1))
-
-            file_change.write("\n\nssh %s -l poweradm viosvrcmd -m %s -p %s -c \"\'cfgdev -dev vio0\'\"" %
-                             (config.hmcserver, self.system, self.vio1))
+            ''' Add the cfgdev on VIO. '''
 
-            wchg_checksh()
-
-            file_change.write("\n\necho 'Making cfgdev on %s to reconize new devices'" %
-                             (self.vio2))
-
-            file_change.write("\n\nssh %s -l poweradm viosvrcmd -m %s -p %s -c \"\'cfgdev -dev vio0\'\"" %
-                             (config.hmcserver, self.system, self.vio2))
-
-            wchg_checksh()
+            for vio, vio_name in (('vio1', self.vio1), ('vio2', self.vio2)):
+                plan.add(changeplan.Step('%s_cfgdev' % (vio), 'hmc',
+                         msg='Making cfgdev on %s to reconize new devices' % (vio_name),
+                         after=vio_last(vio),
+                         cmd="viosvrcmd -m %s -p %s -c \"\'cfgdev -dev vio0\'\"" % (self.system, vio_name)))
 
 
         def wchg_vio_vfcmap(): # make vfcmap on VIOS
-            ''' Write the vfcmap on VIO.'''
-
-            file_change.write("\n\necho 'Getting vfchost on %s to connect the NPIV'" %
-                             (self.vio1))
-
-            file_change.write("\n\nvfchost_vio1=$(ssh -l poweradm %s viosvrcmd -m %s -p %s -c \"\'lsmap -all -npiv\'\""
-                              "| grep \"\\-C3%s \" | awk \'{ print $1 }\')" % (config.hmcserver, self.system,
-                              self.vio1, self.lparid))
-            wchg_checksh()
-
-
-            file_change.write("\n\necho 'Getting vfchost on %s to connect the NPIV'" %
-                             (self.vio2))
-
-            file_change.write("\n\nvfchost_vio2=$(ssh -l poweradm %s viosvrcmd -m %s -p %s -c \"\'lsmap -all -npiv\'\""
-                              "| grep \"\\-C4%s \" | awk \'{ print $1 }\')" % (config.hmcserver, self.system,
-                              self.vio2, self.lparid))
-            wchg_checksh()
-
-
-            file_change.write("\n\necho 'Making vfcmap on %s to connect the NPIV'" %
-                             ( self.vio1))
+            ''' Add the vfcmap on VIO.'''
 
-            file_change.write("\n\nssh %s -l poweradm viosvrcmd -m %s -p %s -c \"\'vfcmap -vadapter "
-                              "$vfchost_vio1 -fcp %s\'\"" % (config.hmcserver, self.system,
-                              self.vio1, self.npiv_vio1))
-            wchg_checksh()
+            for vio, vio_name, slot in (('vio1', self.vio1, '3%s' % (self.lparid)),
+                                        ('vio2', self.vio2, '4%s' % (self.lparid))):
+                plan.add(changeplan.Step('%s_vfchost' % (vio), 'adapter',
+                         msg='Getting vfchost on %s to connect the NPIV' % (vio_name),
+                         after=vio_last(vio), system=self.system, target=vio_name,
+                         var='vfchost_%s' % (vio), dev_type='vfc', slot=slot))
 
-            file_change.write("\n\necho 'Making vfcmap on %s to connect the NPIV'" %
-                             (self.vio2))
-
-            file_change.write("\n\nssh %s -l poweradm viosvrcmd -m %s -p %s -c \"\'vfcmap -vadapter "
-                              "$vfchost_vio2 -fcp %s\'\"" % (config.hmcserver, self.system,
-                              self.vio2, self.npiv_vio2))
-            wchg_checksh()
+            # the vfcmap needs the client adapter (LPAR created, see vio_last())
+            for vio, vio_name, npiv in (('vio1', self.vio1, self.npiv_vio1),
+                                        ('vio2', self.vio2, self.npiv_vio2)):
+                plan.add(changeplan.Step('%s_vfcmap' % (vio), 'hmc',
+                         msg='Making vfcmap on %s to connect the NPIV' % (vio_name),
+                         after=vio_last(vio),
+                         cmd="viosvrcmd -m %s -p %s -c \"\'vfcmap -vadapter $vfchost_%s -fcp %s\'\"" %
+                             (self.system, vio_name, vio, npiv)))
 
 
         def wchg_vio_mkbdsp(): # add disk LPAR
-            ''' Write the disk add on LPAR.'''
-
-            file_change.write("\n\necho 'Adding disk with %s to %s-%s via %s ONLY'" %
-                             (self.disk_size, self.prefix, self.lparname, self.vio1))
-
-            file_change.write("\n\nvhost_vio1=$(ssh -l poweradm %s viosvrcmd -m %s -p %s -c \"\'lsmap -all\'\""
-                              "| grep \"\\-C1%s \" | awk \'{ print $1 }\')" % (config.hmcserver, self.system,
-                              self.vio1, self.lparid))
-            wchg_checksh()
+            ''' Add the disk add on LPAR.'''
 
-            file_change.write("\n\nvhost_vio2=$(ssh -l poweradm %s viosvrcmd -m %s -p %s -c \"\'lsmap -all\'\""
-                              "| grep \"\\-C2%s \" | awk \'{ print $1 }\')" % (config.hmcserver, self.system,
-                              self.vio2, self.lparid))
-            wchg_checksh()
+            plan.add(changeplan.Step('vio1_vhost', 'adapter',
+                     msg='Adding disk with %s to %s-%s via %s ONLY' % (self.disk_size, self.prefix,
+                                                                       self.lparname, self.vio1),
+                     after=vio_last('vio1'), system=self.system, target=self.vio1,
+                     var='vhost_vio1', dev_type='vscsi', slot='1%s' % (self.lparid)))
 
-            file_change.write("\n\nssh -l poweradm %s viosvrcmd -m %s -p %s -c \"\'mkbdsp -clustername "
-                              "%s -sp %s %sG -bd %s_lu1 -thick -vadapter $vhost_vio1 -tn %s_rootvg\'\"" %
-                              (config.hmcserver, self.system, self.vio1, config.cluster_name,
-                               self.stgpool, self.disk_size, self.lparname,
-                               self.lparname))
-            wchg_checksh()
+            plan.add(changeplan.Step('vio1_mkbdsp', 'hmc', after=vio_last('vio1'),
+                     cmd="viosvrcmd -m %s -p %s -c \"\'mkbdsp -clustername "
+                         "%s -sp %s %sG -bd %s_lu1 -thick -vadapter $vhost_vio1 -tn %s_rootvg\'\"" %
+                         (self.system, self.vio1, config.cluster_name, self.stgpool, self.disk_size,
+                          self.lparname, self.lparname)))
 
         def wchg_lpar(): # LPAR with Ethernet Only
-            ''' Write LPAR (with Ethernet Only) creation. '''
+            ''' Add LPAR (with Ethernet Only) creation. '''
 
-            file_change.write("\nssh %s -l poweradm mksyscfg -r lpar -m %s -i \'name=%s-%s, "
+            wchg_creating_lpar("mksyscfg -r lpar -m %s -i \'name=%s-%s, "
                     "lpar_id=%s, profile_name=%s, lpar_env=aixlinux, min_mem=%s, "
                     "desired_mem=%s, max_mem=%s, proc_mode=%s, min_procs=%s,"
                     "desired_procs=%s, max_procs=%s, min_proc_units=%s, desired_proc_units=%s, "
                     "max_proc_units=%s, sharing_mode=%s, uncap_weight=%s, conn_monitoring=%s, "
                     "boot_mode=%s, max_virtual_slots=40, "
-                    "\\\"virtual_eth_adapters=%s\\\"'\n"
-                    % ( config.hmcserver, self.system, self.prefix, self.lparname, self.lparid,
-                        self.lparname, lparmenmin*1024, self.lparmem*1024, lparmenmax*1024, config.proc_mode, lparvcpumin,
-                        self.lparvcpu, lparvcpumax, lparentcpumin, self.lparentcpu, lparentcpumax, config.sharing_mode,
+                    "\\\"virtual_eth_adapters=%s\\\"'"
+                    % ( self.system, self.prefix, self.lparname, self.lparid,
+                        self.lparname, self.lparmenmin*1024, self.lparmem*1024, self.lparmenmax*1024,
+                        config.proc_mode, self.lparvcpumin, self.lparvcpu, self.lparvcpumax, self.lparentcpumin,
+                        self.lparentcpu, self.lparentcpumax, config.sharing_mode,
                         config.uncap_weight, config.conn_monitoring, config.boot_mode, self.veth))
-            wchg_checksh()
 
 
         def wchg_lpar_fc(): # LPAR with Ethernet and Fiber Channel
-            ''' Write LPAR (Ethernet and Fiber Channel) creation. '''
+            ''' Add LPAR (Ethernet and Fiber Channel) creation. '''
 
-            file_change.write("\nssh %s -l poweradm mksyscfg -r lpar -m %s -i \'name=%s-%s, "
+            wchg_creating_lpar("mksyscfg -r lpar -m %s -i \'name=%s-%s, "
                     "lpar_id=%s, profile_name=%s, lpar_env=aixlinux, min_mem=%s, "
                     "desired_mem=%s, max_mem=%s, proc_mode=%s, min_procs=%s,"
                     "desired_procs=%s, max_procs=%s, min_proc_units=%s, desired_proc_units=%s, "
                     "max_proc_units=%s, sharing_mode=%s, uncap_weight=%s, conn_monitoring=%s, "
                     "boot_mode=%s, max_virtual_slots=40, "
                     "\\\"virtual_eth_adapters=%s\\\","
-                    "\\\"virtual_fc_adapters=33/client//%s/3%s//0,34/client//%s/4%s//0\\\"'\n"
-                    % ( config.hmcserver, self.system, self.prefix, self.lparname, self.lparid,
-                        self.lparname, lparmenmin*1024, self.lparmem*1024, lparmenmax*1024, config.proc_mode, lparvcpumin,
-                        self.lparvcpu, lparvcpumax, lparentcpumin, self.lparentcpu, lparentcpumax, config.sharing_mode,
+                    "\\\"virtual_fc_adapters=33/client//%s/3%s//0,34/client//%s/4%s//0\\\"'"
+                    % ( self.system, self.prefix, self.lparname, self.lparid,
+                        self.lparname, self.lparmenmin*1024, self.lparmem*1024, self.lparmenmax*1024,
+                        config.proc_mode, self.lparvcpumin, self.lparvcpu, self.lparvcpumax, self.lparentcpumin,
+                        self.lparentcpu, self.lparentcpumax, config.sharing_mode,
                         config.uncap_weight, config.conn_monitoring, config.boot_mode, self.veth,
                         self.vio1, self.lparid, self.vio2, self.lparid))
-            wchg_checksh()
 
 
         def wchg_lpar_scsi(): # LPAR with Ethernet and SCSI
-            ''' Write LPAR (Ethernet and SCSI) creation. '''
+            ''' Add LPAR (Ethernet and SCSI) creation. '''
 
-            file_change.write("\nssh %s -l poweradm mksyscfg -r lpar -m %s -i \'name=%s-%s, "
+            wchg_creating_lpar("mksyscfg -r lpar -m %s -i \'name=%s-%s, "
                     "lpar_id=%s, profile_name=%s, lpar_env=aixlinux, min_mem=%s, "
                     "desired_mem=%s, max_mem=%s, proc_mode=%s, min_procs=%s,"
                     "desired_procs=%s, max_procs=%s, min_proc_units=%s, desired_proc_units=%s, "
                     "max_proc_units=%s, sharing_mode=%s, uncap_weight=%s, conn_monitoring=%s, "
                     "boot_mode=%s, max_virtual_slots=40, "
                     "\\\"virtual_eth_adapters=%s\\\","
-                    "\\\"virtual_scsi_adapters=%s,%s\\\"'\n"
-                    % ( config.hmcserver, self.system, self.prefix, self.lparname, self.lparid,
-                        self.lparname, lparmenmin*1024, self.lparmem*1024, lparmenmax*1024, config.proc_mode, lparvcpumin,
-                        self.lparvcpu, lparvcpumax, lparentcpumin, self.lparentcpu, lparentcpumax, config.sharing_mode,
-                        config.uncap_weight, config.conn_monitoring, config.boot_mode, self.veth, vscsi_vio1, vscsi_vio2))
-
-            wchg_checksh()
+                    "\\\"virtual_scsi_adapters=%s,%s\\\"'"
+                    % ( self.system, self.prefix, self.lparname, self.lparid,
+                        self.lparname, self.lparmenmin*1024, self.lparmem*1024, self.lparmenmax*1024,
+                        config.proc_mode, self.lparvcpumin, self.lparvcpu, self.lparvcpumax, self.lparentcpumin,
+                        self.lparentcpu, self.lparentcpumax, config.sharing_mode,
+                        config.uncap_weight, config.conn_monitoring, config.boot_mode, self.veth, self.vscsi_vio1,
+                        self.vscsi_vio2))
 
         def wchg_lpar_fc_scsi(): # Ethernet, SCSI and Fiber Channel
-            ''' Write LPAR (Ethernet, Fiber Channel and SCSI) creation. '''
+            ''' Add LPAR (Ethernet, Fiber Channel and SCSI) creation. '''
 
-            file_change.write("\nssh %s -l poweradm mksyscfg -r lpar -m %s -i \'name=%s-%s, "
+            wchg_creating_lpar("mksyscfg -r lpar -m %s -i \'name=%s-%s, "
                     "lpar_id=%s, profile_name=%s, lpar_env=aixlinux, min_mem=%s, "
                     "desired_mem=%s, max_mem=%s, proc_mode=%s, min_procs=%s,"
                     "desired_procs=%s, max_procs=%s, min_proc_units=%s, desired_proc_units=%s, "
@@ -383,95 +334,57 @@ class MakeLPARConf():
                     "boot_mode=%s, max_virtual_slots=40, "
                     "\\\"virtual_eth_adapters=%s\\\","
                     "\\\"virtual_fc_adapters=33/client//%s/3%s//0,34/client//%s/4%s//0\\\","
-                    "\\\"virtual_scsi_adapters=%s,%s\\\"'\n"
-                    % ( config.hmcserver, self.system, self.prefix, self.lparname, self.lparid,
-                        self.lparname, lparmenmin*1024, self.lparmem*1024, lparmenmax*1024, config.proc_mode, lparvcpumin,
-                        self.lparvcpu, lparvcpumax, lparentcpumin, self.lparentcpu, lparentcpumax, config.sharing_mode,
+                    "\\\"virtual_scsi_adapters=%s,%s\\\"'"
+                    % ( self.system, self.prefix, self.lparname, self.lparid,
+                        self.lparname, self.lparmenmin*1024, self.lparmem*1024, self.lparmenmax*1024,
+                        config.proc_mode, self.lparvcpumin, self.lparvcpu, self.lparvcpumax, self.lparentcpumin,
+                        self.lparentcpu, self.lparentcpumax, config.sharing_mode,
                         config.uncap_weight, config.conn_monitoring, config.boot_mode, self.veth,
-                        self.vio1, self.lparid, self.vio2, self.lparid, vscsi_vio1,
-                        vscsi_vio2))
-            wchg_checksh()
+                        self.vio1, self.lparid, self.vio2, self.lparid, self.vscsi_vio1,
+                        self.vscsi_vio2))
 
         def wchg_hmc_savecurrentconf():
-            ''' Write save current configuration '''
-
-            file_change.write("\n\necho 'Saving %s current configuration'" %
-                             (self.vio1))
+            ''' Add save current configuration '''
 
-            file_change.write("\n\nssh %s -l poweradm mksyscfg -r prof -m %s -o save -p %s -n $(ssh %s -l poweradm "
-                              "lssyscfg -r lpar -m %s --filter \"lpar_names=%s\" -F curr_profile) --force" %
-                             (config.hmcserver, self.system, self.vio1, config.hmcserver, self.system,
-                              self.vio1))
-            wchg_checksh()
-
-            file_change.write("\n\necho 'Saving %s current configuration'" %
-                             ( self.vio2))
-
-            file_change.write("\n\nssh %s -l poweradm mksyscfg -r prof -m %s -o save -p %s -n $(ssh %s -l poweradm "
-                              "lssyscfg -r lpar -m %s --filter \"lpar_names=%s\" -F curr_profile) --force" %
-                             (config.hmcserver, self.system, self.vio2, config.hmcserver, self.system,
-                              self.vio2))
-            wchg_checksh()
+            for vio, vio_name in (('vio1', self.vio1), ('vio2', self.vio2)):
+                plan.add(changeplan.Step('%s_saveprof' % (vio), 'saveprof',
+                         msg='Saving %s current configuration' % (vio_name),
+                         after=vio_last(vio), system=self.system, target=vio_name))
 
         def wchg_lpar_deploy_nim_enable():
-            ''' Write NIM enabled to future deploy '''
-
-            file_change.write("\n\necho 'Enabling Deploy to %s-%s'" % (self.prefix, self.lparname))
-
-            file_change.write("\n\necho '#PREFIX %s' > %s/poweradm/nim/%s-%s.nim" % (self.prefix, config.pahome, self.prefix,
-                                self.lparname))
-            wchg_checksh()
-
-            file_change.write("\n\necho '#LPARNAME %s' >> %s/poweradm/nim/%s-%s.nim" % (self.lparname, config.pahome,
-                                self.prefix, self.lparname))
-            wchg_checksh()
-
-            file_change.write("\n\necho '#FRAME %s' >> %s/poweradm/nim/%s-%s.nim" % (self.system, config.pahome,
-                                self.prefix, self.lparname))
-            wchg_checksh()
-
-            file_change.write("\n\necho '#VLAN_FINAL %s' >> %s/poweradm/nim/%s-%s.nim" % ( self.veth_final, config.pahome,
-                                self.prefix, self.lparname))
-            wchg_checksh()
+            ''' Add NIM enabled to future deploy '''
+
+            plan.add(changeplan.Step('nim_enable', 'shell', msg='Enabling Deploy to %s-%s' %
+                     (self.prefix, self.lparname), after=['mksyscfg'],
+                     cmd="echo '#PREFIX %s' > %s/poweradm/nim/%s-%s.nim &&\n"
+                         "echo '#LPARNAME %s' >> %s/poweradm/nim/%s-%s.nim &&\n"
+                         "echo '#FRAME %s' >> %s/poweradm/nim/%s-%s.nim &&\n"
+                         "echo '#VLAN_FINAL %s' >> %s/poweradm/nim/%s-%s.nim" %
+                         (self.prefix, config.pahome, self.prefix, self.lparname,
+                          self.lparname, config.pahome, self.prefix, self.lparname,
+                          self.system, config.pahome, self.prefix, self.lparname,
+                          self.veth_final, config.pahome, self.prefix, self.lparname)))
 
         def wchg_lpar_fc_wwnget(): # Get physical and LPAR NPIV wwn
-            ''' Write the get informations about NPIV WWNs'''
-
-            file_change.write("\n\necho 'Getting Physical and LPAR %s-%s NPIV'" %
-                             (self.prefix, self.lparname))
-
-            file_change.write("\n\necho '' >> %s/poweradm/data/NPIV_%s_%s.txt" % (config.pahome, self.prefix, self.lparname))
-
-            file_change.write("\n\necho '*************************************************************'"
-                              " >> %s/poweradm/data/NPIV_%s_%s.txt" % (config.pahome, self.prefix, self.lparname))
+            ''' Add the get informations about NPIV WWNs'''
 
-            file_change.write("\n\necho 'Physical HBA and LPAR %s-%s NPIV (date: %s)'" %
-                             (self.prefix, self.lparname, globalvar.timestr))
+            npiv_file = '%s/poweradm/data/NPIV_%s_%s.txt' % (config.pahome, self.prefix, self.lparname)
 
-            file_change.write("\n\necho 'Physical Adapter to LPAR fcs0: '$(ssh -l poweradm %s viosvrcmd -m %s -p %s "
-                             "-c \"\'lsdev -dev %s -vpd\'\" | grep \'Network Address\' | cut -d. -f14) >> "
-                             "%s/poweradm/data/NPIV_%s_%s.txt" %
-            		    	 (config.hmcserver, self.system, self.vio1, self.npiv_vio1, config.pahome, self.prefix,
-                              self.lparname))
+            plan.add(changeplan.Step('wwnget', 'wwnget', msg='Getting Physical and LPAR %s-%s NPIV' %
+                     (self.prefix, self.lparname), after=['mksyscfg', 'vio1_vfcmap', 'vio2_vfcmap'], check=False,
+                     system=self.system, target='%s-%s' % (self.prefix, self.lparname),
+                     ports=['%s/%s' % (self.vio1, self.npiv_vio1), '%s/%s' % (self.vio2, self.npiv_vio2)],
+                     filename=npiv_file))
 
-            file_change.write("\n\necho 'Physical Adapter to LPAR fcs1: '$(ssh -l poweradm %s viosvrcmd -m %s -p %s "
-                             "-c \"\'lsdev -dev %s -vpd\'\" | grep \'Network Address\' | cut -d. -f14) >> "
-                             "%s/poweradm/data/NPIV_%s_%s.txt" %
-                             (config.hmcserver, self.system, self.vio2, self.npiv_vio2, config.pahome, self.prefix,
-                              self.lparname))
-
-            file_change.write("\n\nssh -l poweradm %s lssyscfg -r prof -m %s -F virtual_fc_adapters --filter "
-                              "lpar_names=\'%s-%s\' | awk -F \'/\' \'{ print \"fcs0 (active,inactive):\\t\"$6\"\\nfcs1 "
-                              "(active,inactive):\\t\"$12 }\' >> %s/poweradm/data/NPIV_%s_%s.txt" % (config.hmcserver,
-                               self.system, self.prefix, self.lparname, config.pahome, self.prefix, self.lparname))
-
-            file_change.write("\n\necho '*************************************************************'"
-                              " >> %s/poweradm/data/NPIV_%s_%s.txt" % (config.pahome, self.prefix, self.lparname))
-
-            file_change.write("\n\necho '' >> %s/poweradm/data/NPIV_%s_%s.txt" % (config.pahome, self.prefix, self.lparname))
-
-            file_change.write("\n\ncat %s/poweradm/data/NPIV_%s_%s.txt" % (config.pahome, self.prefix, self.lparname))
+        def vio_last(vio):
+            ''' Returns the last step added of a VIO (vio1/vio2) as after list,
+                the LPAR creation (mksyscfg) for the first step of the VIO.
+            '''
 
+            for step in reversed(plan.steps):
+                if step.name.startswith('%s_' % (vio)):
+                    return [step.name]
+            return ['mksyscfg']
 
         #
         # End Of wchg_...
@@ -481,13 +394,12 @@ class MakeLPARConf():
         # Function writechange() starts here
         #
 
-        print ('Writing file %s-%s.sh ... ' % (self.change, globalvar.timestr))
+        print ('Writing file %s-%s.sh ... ' % (self.change, self.timestr))
 
-        file_change.write("\n\n#LPARID %s" % (self.lparid))
+        self.file_change.write("\n\n#LPARID %s" % (self.lparid))
 
         if self.vscsi == 'y' and self.vfc == 'y':
 
-            wchg_creating_lpar()
             wchg_lpar_fc_scsi()
             wchg_vio_mkscsi()
             wchg_vio_mknpiv()
@@ -503,7 +415,6 @@ class MakeLPARConf():
 
         if self.vscsi == 'y' and self.vfc == 'n':
 
-            wchg_creating_lpar()
             wchg_lpar_scsi()
             wchg_vio_mkscsi()
             wchg_vio_cfgdev()
@@ -516,7 +427,6 @@ class MakeLPARConf():
 
         if self.vscsi == 'n' and self.vfc == 'y':
 
-            wchg_creating_lpar()
             wchg_lpar_fc()
             wchg_vio_mknpiv()
             wchg_vio_cfgdev()
@@ -528,26 +438,26 @@ class MakeLPARConf():
 
         if self.vscsi == 'n' and self.vfc == 'n':
 
-            wchg_creating_lpar()
             wchg_lpar()
             if self.nim_deploy == 'y':
                 wchg_lpar_deploy_nim_enable()
 
-        file_reservedids_tmp = open('%s/poweradm/tmp/reserved_ids_%s' %(config.pahome, globalvar.timestr), 'ab')
-        file_reservedids_tmp.write('%s\n' % (self.lparid))
-        file_reservedids_tmp.close()
+        plan.write(self.file_change)
 
     def closechange(self):
         ''' Close the file and move to correct directory '''
 
-        file_change.write('\n\n# File closed with success by PowerAdm\n')
-        file_change.close()
-        os.system('mv %s/poweradm/tmp/%s_%s.sh %s/poweradm/changes/' % (config.pahome, self.change, globalvar.timestr, config.pahome))
-        os.system('cat %s/poweradm/tmp/reserved_ids_%s >> %s/poweradm/data/reserved_ids' % (config.pahome, globalvar.timestr, config.pahome))
+        self.file_change.write('\n\n# File closed with success by PowerAdm\n')
+        self.file_change.close()
+        os.system('mv %s/poweradm/tmp/%s_%s.sh %s/poweradm/changes/' % (config.pahome, self.change, self.timestr, config.pahome))
+
+        # the ID lease is now of the change file until it is executed
+        allocator = idalloc.IDAllocator()
+        allocator.renew([self.lparid], self.returnChange())
 
 
     def returnChange(self):
         ''' return the change file '''
 
-        return('%s/poweradm/changes/%s_%s.sh' % (config.pahome, self.change, globalvar.timestr))
+        return('%s/poweradm/changes/%s_%s.sh' % (config.pahome, self.change, self.timestr))
 
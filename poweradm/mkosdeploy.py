@@ -32,6 +32,8 @@ States, other countries, or both.
 import os
 import nim
 import config
+import hmc
+import stats
 ##############################################################################################
 
 class MakeNIMDeploy():
@@ -80,8 +82,15 @@ class MakeNIMDeploy():
         else:
             self.bosinst_data = 'bosinst_data=%s' % (config.nim_bosinst_data_res)
 
-    def createNIMDeploy(self):
-        """ Do OS NIM Deploy """
+    def createNIMDeploy(self, output=None):
+        """ Do OS NIM Deploy
+
+            output: function called with each line of output (default print).
+        """
+
+        if output is None:
+            def output(line):
+                print line
 
         if self.deploy == 'y':
 
@@ -94,93 +103,115 @@ class MakeNIMDeploy():
             f_nim_reserved_ips.write('%s\n' % (self.new_ip))
             f_nim_reserved_ips.close()
 
-            f_nim_exe = open('%s/poweradm/changes/deploy_nim_%s-%s.nim' % (config.pahome, self.lparprefix,
-                         self.lparname), 'w')
-
-            def f_nimexe_chksh():
-                f_nim_exe.write("\nif [ $? != 0 ];"
-                                "then\n"
-                                "\techo 'An error has occurred. Check the actions taken.'; \n"
-                                "\texit;\n"
-                                "else\n"
-                                "\techo 'Command OK. Continuing';\n"
-                                "fi\n")
-
-            f_nim_exe.write('#!/bin/sh\n')
-
-            f_nim_exe.write('\n\necho "Adding host %s-%s on NIM Server /etc/hosts"\n' % (self.lparprefix,
-                        self.lparname))
-
-            f_nim_exe.write('\n\nssh -l poweradm %s sudo hostent -a %s -h %s' % (self.nim_address,
-                        self.new_ip, self.lparname))
-            f_nimexe_chksh()
-
-            f_nim_exe.write('\n\necho "Creating machine %s-%s on NIM Server"\n' % (self.lparprefix,
-                            self.lparname))
-
-            f_nim_exe.write('\n\nssh -l poweradm %s sudo nim -o define -t standalone -a platform=chrp '
-                    '-a netboot_kernel=mp -a if1=\\"$(ssh -l poweradm %s sudo lsnim -t ent | awk \'{ print $1 }\' '
-                    '| head  -1) %s 0\\" -a cable_type1=tp %s\n' % (self.nim_address, self.nim_address,
-                        self.lparname, self.lparname))
-            f_nimexe_chksh()
-
-            f_nim_exe.write('\n\necho "Resource alocations and perform operations to %s-%s on NIM Server"\n' %
-                    (self.lparprefix, self.lparname))
-
-            if config.nim_deploy_mode.lower() == 'mksysb':
-
-                f_nim_exe.write('\n\nssh -l poweradm %s sudo nim -o bos_inst -a source=mksysb -a spot=%s '
-                    '-a mksysb=%s -a no_client_boot=yes %s -a accept_licenses=yes %s\n' % (self.nim_address,
-                        self.nim_cfg_spot, self.nim_cfg_mksysbspot, self.bosinst_data, self.lparname))
-
-                f_nimexe_chksh()
-
-            elif nim_deploy_mode.lower() == 'lpp':
-
-                f_nim_exe.write('\n\nssh -l poweradm %s sudo nim -o bos_inst -a source=spot -a spot=%s '
-                    '-a lpp_source=%s -a no_client_boot=yes %s -a accept_licenses=yes %s\n' %
-                    (self.nim_address, self.nim_cfg_spot, self.nim_cfg_mksysbspot, self.bosinst_data, self.lparname))
-                f_nimexe_chksh()
-
-            f_nim_exe.write('\n\necho "Getting the Mac Address from %s-%s"\n' % (self.lparprefix, self.lparname))
-            f_nim_exe.write('echo "This might take a few minutes..."\n')
-
-            f_nim_exe.write('\n\nmac_address=$(ssh -l poweradm %s lpar_netboot -M -A -n -T off -t '
-                            'ent %s-%s %s %s | grep C10-T1 | awk \'{ print $3 }\')\n' % (config.hmcserver,
-                                self.lparprefix, self.lparname, self.lparname, self.lparframe))
-            f_nimexe_chksh()
-
-            f_nim_exe.write('\n\necho "Booting LPAR %s-%s on NIM Server"\n' % (self.lparprefix, self.lparname))
-            f_nim_exe.write('echo "This might take a few minutes..."\n')
-            f_nim_exe.write('\n\nssh -l poweradm %s lpar_netboot -m $mac_address -T off -t ent -s '
-                    'auto -d auto -S %s -C %s %s-%s %s %s\n' % (config.hmcserver, self.nim_ipdeploy, self.new_ip,
-                        self.lparprefix, self.lparname, self.lparname, self.lparframe))
-            f_nimexe_chksh()
-
-            print ('\n\nChange VLAN on profile to final config')
-            f_nim_exe.write('\n\nssh -l poweradm %s chsyscfg -r prof -m %s -i \'lpar_name=%s-%s, name=%s, '
-                            '\\\"virtual_eth_adapters=%s\\\"\'' % (config.hmcserver, self.lparframe, self.lparprefix,
-                                self.lparname, self.lparname, self.lparvlans))
-
-            f_nim_exe.close()
-
-            print ('\n\nInitializing deploy OS...')
-
             f_nim_deploy = open(self.nim_file, 'a')
             f_nim_deploy.write('#IP %s\n' % (self.new_ip))
             f_nim_deploy.write('#NIMSERVER %s\n' % (self.nim_server))
             f_nim_deploy.write('#NIMADDRESS %s\n' % (self.nim_address))
             f_nim_deploy.close()
 
-            os.system('sh %s/poweradm/changes/deploy_nim_%s-%s.nim' %
-                     (config.pahome, self.lparprefix, self.lparname))
+            output('\n\nInitializing deploy OS...')
+
+            operation = stats.Operation('deploy')
+            try:
+                self.runDeploy(output)
+            finally:
+                operation.end()
 
             os.system('mv %s/poweradm/nim/%s-%s.nim %s/poweradm/nim_executed/' % (config.pahome, self.lparprefix,
                 self.lparname, config.pahome))
             os.system('mv %s/poweradm/changes/deploy_nim_%s-%s.nim %s/poweradm/changes_executed/' % (config.pahome,
                 self.lparprefix, self.lparname, config.pahome))
 
-            print ('\nPlease, access HMC %s and run command below to finish OS install. '
-                   '\n\t\'mkvterm -m %s -p %s-%s\' ' % (config.hmcserver, self.lparframe, self.lparprefix,
+            output('\nPlease, access HMC %s and run command below to finish OS install. '
+                   '\n\t\'mkvterm -m %s -p %s-%s\' ' % (hmc.route(self.lparframe), self.lparframe, self.lparprefix,
                                                         self.lparname))
 
+    def runCmd(self, client, cmd, output, timeout=None):
+        """ Run a command of the deploy on the NIM server or on the HMC (timed
+            and counted on the statistics), record it on the deploy file and
+            show its output. Returns the hmc.HMCResult.
+        """
+
+        self.f_nim_exe.write('\n\nssh -l poweradm %s %s\n' % (client.host, cmd))
+        self.f_nim_exe.flush()
+        result = client.run(cmd, timeout)
+        for line in result.output.split('\n'):
+            if line:
+                output(line)
+        if result.ok():
+            output('Command OK. Continuing')
+        else:
+            output('An error has occurred. Check the actions taken.')
+        return result
+
+    def runDeploy(self, output):
+        """ Run the deploy commands on the NIM server and on the HMC of the
+            frame, recorded on changes/deploy_nim_<prefix>-<name>.nim. Stops on
+            the first command failed. Returns True if all were done.
+
+            output: function called with each line of output.
+        """
+
+        nim_client = hmc.getNIM(self.nim_address)
+        hmc_client = hmc.getSystem(self.lparframe)
+
+        self.f_nim_exe = open('%s/poweradm/changes/deploy_nim_%s-%s.nim' % (config.pahome, self.lparprefix,
+                              self.lparname), 'w')
+        try:
+            self.f_nim_exe.write('#!/bin/sh\n')
+
+            output('\n\nAdding host %s-%s on NIM Server /etc/hosts' % (self.lparprefix, self.lparname))
+            if not self.runCmd(nim_client, 'sudo hostent -a %s -h %s' % (self.new_ip, self.lparname),
+                               output).ok():
+                return False
+
+            output('\n\nCreating machine %s-%s on NIM Server' % (self.lparprefix, self.lparname))
+            result = self.runCmd(nim_client, 'sudo lsnim -t ent', output)
+            if not result.ok() or not result.output.split():
+                return False
+            nim_network = result.output.split()[0]
+            if not self.runCmd(nim_client, 'sudo nim -o define -t standalone -a platform=chrp '
+                               '-a netboot_kernel=mp -a if1="%s %s 0" -a cable_type1=tp %s' %
+                               (nim_network, self.lparname, self.lparname), output).ok():
+                return False
+
+            output('\n\nResource alocations and perform operations to %s-%s on NIM Server' %
+                   (self.lparprefix, self.lparname))
+            if config.nim_deploy_mode.lower() == 'mksysb':
+                bos_inst = ('sudo nim -o bos_inst -a source=mksysb -a spot=%s -a mksysb=%s -a no_client_boot=yes '
+                            '%s -a accept_licenses=yes %s' % (self.nim_cfg_spot, self.nim_cfg_mksysbspot,
+                                                              self.bosinst_data, self.lparname))
+            else:
+                bos_inst = ('sudo nim -o bos_inst -a source=spot -a spot=%s -a lpp_source=%s -a no_client_boot=yes '
+                            '%s -a accept_licenses=yes %s' % (self.nim_cfg_spot, self.nim_cfg_mksysbspot,
+                                                              self.bosinst_data, self.lparname))
+            if not self.runCmd(nim_client, bos_inst, output).ok():
+                return False
+
+            # lpar_netboot takes minutes, without the timeout of the client
+            output('\n\nGetting the Mac Address from %s-%s' % (self.lparprefix, self.lparname))
+            output('This might take a few minutes...')
+            result = self.runCmd(hmc_client, 'lpar_netboot -M -A -n -T off -t ent %s-%s %s %s' %
+                                 (self.lparprefix, self.lparname, self.lparname, self.lparframe), output, 0)
+            mac_address = ''
+            for line in result.output.split('\n'):
+                if 'C10-T1' in line and len(line.split()) > 2:
+                    mac_address = line.split()[2]
+                    break
+            if not result.ok() or mac_address == '':
+                return False
+
+            output('\n\nBooting LPAR %s-%s on NIM Server' % (self.lparprefix, self.lparname))
+            output('This might take a few minutes...')
+            if not self.runCmd(hmc_client, 'lpar_netboot -m %s -T off -t ent -s auto -d auto -S %s -C %s %s-%s %s %s' %
+                               (mac_address, self.nim_ipdeploy, self.new_ip, self.lparprefix, self.lparname,
+                                self.lparname, self.lparframe), output, 0).ok():
+                return False
+
+            output('\n\nChange VLAN on profile to final config')
+            self.runCmd(hmc_client, 'chsyscfg -r prof -m %s -i \'lpar_name=%s-%s, name=%s, '
+                        '"virtual_eth_adapters=%s"\'' % (self.lparframe, self.lparprefix, self.lparname,
+                                                         self.lparname, self.lparvlans), output)
+            return True
+        finally:
+            self.f_nim_exe.close()
@@ -33,6 +33,7 @@ import os.path
 import fnmatch
 import globalvar
 import config
+import hmc
 
 ##############################################################################################
 #
@@ -370,15 +371,16 @@ class NIMNewIP():
         '''
 
         # find next IP on the range
-        os.system("ssh -l poweradm %s cat /etc/hosts >> %s/poweradm/tmp/hosts_%s" %
-                 (nim_address, config.pahome, globalvar.timestr))
+        f_nim_hosts = open("%s/poweradm/tmp/hosts_%s" % (config.pahome, globalvar.getTimestr()), 'a')
+        f_nim_hosts.write('%s\n' % (hmc.getNIM(nim_address).getoutput('cat /etc/hosts')))
+        f_nim_hosts.close()
         os.system("cat %s/poweradm/data/reserved_ips >> %s/poweradm/tmp/hosts_%s" %
-                 (config.pahome, config.pahome, globalvar.timestr))
+                 (config.pahome, config.pahome, globalvar.getTimestr()))
 
         # verify ip (get IP and find in unique host file create before)
         def verifyIP(ipaddress):
             ''' Verify IPs '''
-            f_nim_hosts = open("%s/poweradm/tmp/hosts_%s" % (config.pahome, globalvar.timestr), 'r')
+            f_nim_hosts = open("%s/poweradm/tmp/hosts_%s" % (config.pahome, globalvar.getTimestr()), 'r')
             for line_hosts in f_nim_hosts.readlines():
                 if line_hosts.startswith('%s' % (ipaddress)):
                     f_nim_hosts.close()
@@ -34,6 +34,8 @@ import os
 import globalvar
 import verify
 import nim
+import hmc
+import stats
 ##############################################################################################
 
 def clear():
@@ -67,48 +69,41 @@ def clear():
 
     if rmhostnim.answerCheck() == 'y':
 
-        f_nim_rm = open('poweradm/changes/nim_rm_%s-%s_%s.nim' % (lparprefix, lparname, globalvar.timestr), 'w')
-
-        def f_nimrm_chksh():
-            ''' Check if command is ok -- write in sh file '''
-
-            f_nim_rm.write("\nif [ $? != 0 ];"
-                            "then\n"
-                            "\techo 'An error has occurred. Check the actions taken.'; \n"
-                            "\texit;\n"
-                            "else\n"
-                            "\techo 'Command OK. Continuing';\n"
-                            "fi\n")
-
+        # the record of the commands on the NIM server (changes_executed)
+        f_nim_rm = open('poweradm/changes/nim_rm_%s-%s_%s.nim' % (lparprefix, lparname, globalvar.getTimestr()), 'w')
         f_nim_rm.write("#!/bin/sh")
 
-        f_nim_rm.write("\n\necho 'Reseting machine %s in NIM Server'\n" % (lparname))
-        f_nim_rm.write("\n\nssh -l poweradm %s sudo nim -o reset -a force=yes -a force=yes \'%s\'\n"
-                % (lparnimaddress, lparname))
-        f_nimrm_chksh()
-
-        f_nim_rm.write("\n\necho 'Deallocate resources from machine %s in NIM Server'\n" % (lparname))
-        f_nim_rm.write("\n\nssh -l poweradm %s sudo nim -Fo deallocate -a subclass=all -a force=yes \'%s\'\n" %
-                (lparnimaddress, lparname))
-        f_nimrm_chksh()
-
-        f_nim_rm.write("\n\necho 'Removing machine %s from NIM Server'\n" % (lparname))
-        f_nim_rm.write("\n\nssh -l poweradm %s sudo nim -o remove \'-F\' \'%s\'\n" % (lparnimaddress, lparname))
-        f_nimrm_chksh()
-
-        f_nim_rm.write("\n\necho 'Removing host %s from NIM Server /etc/hosts'\n" % (lparname))
-        f_nim_rm.write("\n\nssh -l poweradm %s sudo hostent -d %s" % (lparnimaddress, lparip))
-        f_nimrm_chksh()
-
-        f_nim_rm.write("\n\nrm poweradm/nim_executed/%s" % (nimrm.getDeploy()))
-        f_nimrm_chksh()
-
-        f_nim_rm.close()
+        nim_client = hmc.getNIM(lparnimaddress)
+        nim_cmds = [('Reseting machine %s in NIM Server' % (lparname),
+                     "sudo nim -o reset -a force=yes -a force=yes '%s'" % (lparname)),
+                    ('Deallocate resources from machine %s in NIM Server' % (lparname),
+                     "sudo nim -Fo deallocate -a subclass=all -a force=yes '%s'" % (lparname)),
+                    ('Removing machine %s from NIM Server' % (lparname),
+                     "sudo nim -o remove '-F' '%s'" % (lparname)),
+                    ('Removing host %s from NIM Server /etc/hosts' % (lparname),
+                     'sudo hostent -d %s' % (lparip))]
 
         print ('\n\nRemoving server %s-%s from NIM...' % (lparprefix, lparname))
-        os.system('sh poweradm/changes/nim_rm_%s-%s_%s.nim' % (lparprefix, lparname, globalvar.timestr))
+        operation = stats.Operation('nimclear')
+        try:
+            for msg, cmd in nim_cmds:
+                print (msg)
+                f_nim_rm.write("\n\nssh -l poweradm %s %s\n" % (lparnimaddress, cmd))
+                result = nim_client.run(cmd)
+                if result.output:
+                    print (result.output)
+                if not result.ok():
+                    print ('An error has occurred. Check the actions taken.')
+                    break
+                print ('Command OK. Continuing')
+            else:
+                os.remove('poweradm/nim_executed/%s' % (nimrm.getDeploy()))
+        finally:
+            operation.end()
+            f_nim_rm.close()
+
         os.system('mv poweradm/changes/nim_rm_%s-%s_%s.nim poweradm/changes_executed/' % (lparprefix,
-            lparname, globalvar.timestr))
+            lparname, globalvar.getTimestr()))
 
         print ('Removing ID %s from reserved IPs' % (lparip))
         file_reservedips = open('poweradm/data/reserved_ips', 'r')
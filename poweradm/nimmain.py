@@ -33,7 +33,7 @@ import config
 import verify
 import nim
 import mkosdeploy
-import commands
+import hmc
 ##############################################################################################
 
 def main():
@@ -80,7 +80,7 @@ def main():
 
     # try nim connections
     print ('\n\nTesting the NIM Server connections!')
-    chk_nim_connections = commands.getstatusoutput('ssh -l poweradm %s sudo lsnim' % nim_server)
+    chk_nim_connections = hmc.getNIM(nim_server).getstatusoutput('sudo lsnim')
     if chk_nim_connections[0] != 0:
         print ('\nConnect to NIM Server failed!')
         exit("\tError: "+chk_nim_connections[1])
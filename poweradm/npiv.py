@@ -31,67 +31,63 @@ States, other countries, or both.
 import os
 import config
 import systemvios
-import commands
 import cachefile
+import hmc
 ##############################################################################################
 #
 # Class NPIV
 ##############################################################################################
 
-class NPIV:
-    ''' Get informations about NPIV on the VIOS. '''
+# columns of the lsnports output
+lsnports_fields = ['name', 'physloc', 'fabric', 'tports', 'aports', 'swwpns', 'awwpns']
 
-    def lsnportsVIO(self, systemp, vio_server):
-        ''' Get the 'lsnports' and NPIV notes (if have).
+def parseLsnports(lsnports):
+    ''' Parse the lsnports output and returns a list of ports (dict with the
+        lsnports_fields as keys, the numbers as int).
+    '''
 
-            Attributes:
-            systemp     the system p name.
-            vio_server  the vio do you want use:
-                        options:
-                            vio1 for #1 VIOS NPIV
-                            vio2 for #2 VIOS NPIV
-                            * this informations is used from the config file.
-        '''
+    ports = []
+    for line in lsnports.split('\n'):
+        columns = line.split()
+        if len(columns) != len(lsnports_fields) or not columns[0].startswith('fcs'):
+            continue
+        port = dict(zip(lsnports_fields, columns))
+        for field in lsnports_fields[2:]:
+            if port[field].isdigit():
+                port[field] = int(port[field])
+        ports.append(port)
+    return ports
 
-        # get informations about the VIOS from config file
-        find_vios = systemvios.SystemVios()
-        if vio_server == 'vio1':
-            vios = find_vios.returnVio1('%s' % (systemp))
-        elif vio_server == 'vio2':
-            vios = find_vios.returnVio2('%s' % (systemp))
-        else:
-            print 'Option for VIO invalid. Use vio1 or vio2.'
+def formatLsnports(ports):
+    ''' Returns the ports as the lsnports output. '''
 
-        def lsnports_cmd():
-            ''' Command to get the lsnports and NPIV notes '''
+    lines = ['%-16s %-27s %6s %6s %6s %6s %6s' % tuple(lsnports_fields)]
+    for port in ports:
+        lines.append('%-16s %-27s %6s %6s %6s %6s %6s' % tuple([port[field] for field in lsnports_fields]))
+    return '\n'.join(lines)
 
-            # get information on hmc
-            lsnports = commands.getoutput('ssh -l poweradm %s viosvrcmd -m %s -p %s -c \"\'lsnports\'\"' %
-                    (config.hmcserver, systemp, vios))
 
-            # if exists file npiv notes get
-            if os.path.isfile('%s/npiv/%s-%s' % ( config.pahome, systemp, vios)):
-                npiv_notes = commands.getoutput('cat %s/npiv/%s-%s' % ( config.pahome, systemp, vios))
-            else:
-                npiv_notes = ""
-
-
-            return  ("%s \n %s" % (lsnports, npiv_notes))
+class NPIV:
+    ''' Get informations about NPIV on the VIOS.
 
-        # if cache file (CacheFile()) is enabled use that
-        if config.npiv_cache == 'enable':
+        The lsnports of each VIOS is executed and parsed only once (and cached
+        when config.npiv_cache is enabled) on the NPIV port model returned by
+        ports(). All the other informations are from this model.
+    '''
 
-            lsnports = cachefile.CacheFile('%s/poweradm/npiv_cache/lsnports_%s_%s.cache' % (config.pahome,
-                systemp, vios), config.npiv_cache_time, lsnports_cmd, 't_print')
-            lsnports.cache()
+    def findVIO(self, systemp, vio_server):
+        ''' Returns the VIOS name of vio_server (vio1 or vio2) from config file. '''
 
+        find_vios = systemvios.SystemVios()
+        if vio_server == 'vio1':
+            return find_vios.returnVio1('%s' % (systemp))
+        elif vio_server == 'vio2':
+            return find_vios.returnVio2('%s' % (systemp))
         else:
+            print 'Option for VIO invalid. Use vio1 or vio2.'
 
-            print lsnports_cmd()
-
-
-    def numberFCVIO(self, systemp, vio_server):
-        ''' Get the number of FCs available to the vios.
+    def ports(self, systemp, vio_server):
+        ''' Get the NPIV port model of the VIOS.
 
             Attributes:
             systemp     the system p name.
@@ -100,84 +96,73 @@ class NPIV:
                             vio1 for #1 VIOS NPIV
                             vio2 for #2 VIOS NPIV
                             * this informations is used from the config file.
+
+            Returns a dict:
+                {'vios': VIOS name,
+                 'ports': [{'name': 'fcs0', 'physloc': ..., 'fabric': 1,
+                            'tports': 64, 'aports': 62, 'swwpns': 2048,
+                            'awwpns': 2032}, ...],
+                 'notes': NPIV notes (config.pahome/npiv/<system>-<vios>)}
         '''
 
-        # get informations about the VIOS from config file
-        find_vios = systemvios.SystemVios()
-        if vio_server == 'vio1':
-            vios = find_vios.returnVio1('%s' % (systemp))
-        elif vio_server == 'vio2':
-            vios = find_vios.returnVio2('%s' % (systemp))
-        else:
-            print 'Option for VIO invalid. Use vio1 or vio2.'
+        vios = self.findVIO(systemp, vio_server)
 
-        def numfc_cmd():
-            ''' The command to get the number of FCs available '''
+        def ports_cmd():
+            ''' Command to get the lsnports and NPIV notes '''
 
-            # get information on hmc from VIO
-            lsnports = commands.getoutput('ssh -l poweradm %s viosvrcmd -m %s -p %s -c \"\'lsnports\'\"'
-                    '| grep ^fcs | awk \'{ print $1 }\' | wc -l' %
-                    (config.hmcserver, systemp, vios))
+            # get information on hmc
+            lsnports = hmc.getSystem(systemp).viosvrcmd(systemp, vios, 'lsnports')
+
+            # if exists file npiv notes get
+            npiv_notes = ''
+            if os.path.isfile('%s/npiv/%s-%s' % (config.pahome, systemp, vios)):
+                f_notes = open('%s/npiv/%s-%s' % (config.pahome, systemp, vios), 'r')
+                npiv_notes = f_notes.read()
+                f_notes.close()
 
-            return int(lsnports)
+            return {'vios': vios, 'ports': parseLsnports(lsnports), 'notes': npiv_notes}
 
         # if cache file (CacheFile()) is enabled use that
         if config.npiv_cache == 'enable':
 
-            lsnports = cachefile.CacheFile('%s/poweradm/npiv_cache/num_fc_%s_%s.cache' % (config.pahome,
-                systemp, vios), config.npiv_cache_time, numfc_cmd, 't_print')
-            lsnports.cache()
+            npiv_ports = cachefile.CacheFile('%s/poweradm/npiv_cache/ports_%s_%s.cache' % (config.pahome,
+                systemp, vios), config.npiv_cache_time, ports_cmd, 't_return')
+            return npiv_ports.cache()
 
         else:
 
-            print numfc_cmd()
+            return ports_cmd()
 
-
-    def printFCVIO(self, systemp, vio_server):
-        ''' Get the array with FCs available from the VIO.
+    def lsnportsVIO(self, systemp, vio_server):
+        ''' Print the 'lsnports' and NPIV notes (if have).
 
             Attributes:
             systemp     the system p name.
-            vio_server  the vio do you want use:
-                        options:
-                            vio1 for #1 VIOS NPIV
-                            vio2 for #2 VIOS NPIV
-                            * this informations is used from the config file.
+            vio_server  vio1 or vio2 (see ports()).
         '''
 
-        # get informations about the VIOS from config file
-        find_vios = systemvios.SystemVios()
-        if vio_server == 'vio1':
-            vios = find_vios.returnVio1('%s' % (systemp))
-        elif vio_server == 'vio2':
-            vios = find_vios.returnVio2('%s' % (systemp))
-        else:
-            print 'Option for VIO invalid. Use vio1 or vio2.'
-
-        def printfc_cmd():
-            ''' The command to get the list of FCs available '''
+        npiv_ports = self.ports(systemp, vio_server)
+        print ('%s \n %s' % (formatLsnports(npiv_ports['ports']), npiv_ports['notes']))
 
-            # get information on hmc
-            lsnports = commands.getoutput('ssh -l poweradm %s viosvrcmd -m %s -p %s -c \"\'lsnports\'\"'
-                    '| grep ^fcs | awk \'{ print $1 }\'' %
-                    (config.hmcserver, systemp, vios))
-            lsnports_fc_list = lsnports
-            return lsnports_fc_list
+    def numberFCVIO(self, systemp, vio_server):
+        ''' Print the number of FCs available to the vios.
 
-        # if cache file (CacheFile()) is enabled use that
-        if config.npiv_cache == 'enable':
+            Attributes:
+            systemp     the system p name.
+            vio_server  vio1 or vio2 (see ports()).
+        '''
 
-            lsnports = cachefile.CacheFile('%s/poweradm/npiv_cache/list_fcs_%s_%s.cache' % (config.pahome,
-                systemp, vios), config.npiv_cache_time, printfc_cmd, 't_return')
-            lsnports_fc_list = lsnports.cache()
+        print len(self.ports(systemp, vio_server)['ports'])
 
-        else:
+    def printFCVIO(self, systemp, vio_server):
+        ''' Get the array with FCs available from the VIO.
 
-            lsnports_fc_list = printfc_cmd()
+            Attributes:
+            systemp     the system p name.
+            vio_server  vio1 or vio2 (see ports()).
+        '''
 
-        # make the array and returns
         list_fcs = []
-        for line in lsnports_fc_list.split('\n'):
-            list_fcs.append(line)
+        for port in self.ports(systemp, vio_server)['ports']:
+            list_fcs.append(port['name'])
         return list_fcs
-
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+PowerAdm
+parallel.py
+
+Copyright (c) 2016 Kairo Araujo
+
+It was created for personal use. There are no guarantees of the author.
+Use at your own risk.
+
+Permission to use, copy, modify, and distribute this software for any
+purpose with or without fee is hereby granted, provided that the above
+copyright notice and this permission notice appear in all copies.
+
+THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+IBM, Power, PowerVM (a.k.a. VIOS) are registered trademarks of IBM Corporation in
+the United States, other countries, or both.
+VMware, vCenter, vCenter Orchestrator are registered trademarks of VWware Inc in the United
+States, other countries, or both.
+'''
+
+# Imports
+###############################################################################################
+from multiprocessing.pool import ThreadPool
+import config
+import stats
+##############################################################################################
+#
+# Parallel execution
+#
+# The collections from many frames and VIOS are executed on a bounded thread
+# pool (a pool per HMC when the frames are on many HMCs). The number of
+# commands executed at the same time on each HMC is limited by
+# hmc.HMCClient (config.hmc_max_concurrency).
+##############################################################################################
+
+def pmap(function, items, threads=None, key=None):
+    ''' Same as map(), but executing the function on a thread pool.
+
+        Args:
+          function: the function called with each item.
+          items (list): the items.
+          threads (int): max number of threads (default config.max_threads).
+          key: function that returns the group of an item (as the HMC of the
+               frame). Each group runs on its own pool, so the items of a
+               slow group don't hold the threads of the others.
+
+        Returns the list of results in the same order of items. If some call
+        raises an exception it is raised again here.
+    '''
+
+    items = list(items)
+    if threads is None:
+        threads = config.max_threads
+
+    if key is not None:
+        groups = {}
+        for index in range(len(items)):
+            groups.setdefault(key(items[index]), []).append(index)
+        if len(groups) > 1:
+            return pmapGroups(function, items, groups.values(), threads)
+
+    threads = min(max(int(threads), 1), len(items))
+    if threads <= 1:
+        return map(function, items)
+
+    pool = ThreadPool(threads)
+    try:
+        # the commands of the threads are counted on the operation of the caller
+        return pool.map(stats.bind(function), items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def pmapGroups(function, items, groups, threads):
+    ''' pmap() of the groups of items (lists of indexes), a pool by group. '''
+
+    function = stats.bind(function)
+    pools = []
+    try:
+        pending = []
+        for group in groups:
+            pool = ThreadPool(min(max(int(threads), 1), len(group)))
+            pools.append(pool)
+            pending.append((group, pool.map_async(function, [items[index] for index in group])))
+
+        results = [None] * len(items)
+        for group, async_result in pending:
+            for index, result in zip(group, async_result.get()):
+                results[index] = result
+        return results
+    finally:
+        for pool in pools:
+            pool.close()
+            pool.join()
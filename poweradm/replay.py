@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+PowerAdm
+replay.py
+
+Copyright (c) 2016 Kairo Araujo
+
+It was created for personal use. There are no guarantees of the author.
+Use at your own risk.
+
+Permission to use, copy, modify, and distribute this software for any
+purpose with or without fee is hereby granted, provided that the above
+copyright notice and this permission notice appear in all copies.
+
+THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+IBM, Power, PowerVM (a.k.a. VIOS) are registered trademarks of IBM Corporation in
+the United States, other countries, or both.
+VMware, vCenter, vCenter Orchestrator are registered trademarks of VWware Inc in the United
+States, other countries, or both.
+'''
+
+# Imports
+###############################################################################################
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import hashlib
+import threading
+import config
+import cachefile
+##############################################################################################
+#
+# Record and replay of the commands
+#
+# The backend 'record' (config.hmc_backend) runs the commands on the
+# backend of config.replay_source (ssh or simulator) and writes each command,
+# its exit status, output and time on the archive (config.replay_archive).
+# The secrets (passwords, ssh keys and the patterns of config.replay_scrub)
+# are removed from the commands and outputs before they are written.
+#
+# The backend 'replay' answers the commands from the archive, without HMCs,
+# with the time of the record (replay_timing original) or without wait
+# (zero). A command recorded many times (as lssyscfg before and after a
+# mksyscfg) is answered in the same order of the record.
+#
+# The archive is a gzip of JSON lines: the config of the fleet (systems,
+# virtual switches and NIM servers), the outputs (each different output only
+# once, by its hash) and the commands.
+##############################################################################################
+
+# patterns always removed (the group 1 is kept)
+default_scrub = [r'(passw(?:or)?d\S*\s*[=:]\s*)\S+',
+                 r'((?:ssh-(?:rsa|dss|ed25519)|ecdsa-sha2-\S+)\s+)[A-Za-z0-9+/=]+',
+                 r'(-----BEGIN [A-Z ]*PRIVATE KEY-----)[^-]+(?=-----END)']
+
+# text put in place of the secrets
+scrub_mark = '*****'
+
+# status and output of the commands not recorded
+missing_status = 255
+missing_output = 'poweradm replay: command not recorded: %s'
+
+
+def archiveFile():
+    ''' Returns the archive file (config.replay_archive or data/replay.jsonl.gz). '''
+
+    if config.replay_archive:
+        return config.replay_archive
+    return '%s/poweradm/data/replay.jsonl.gz' % (config.pahome)
+
+
+class Scrubber:
+    ''' Remove the secrets of the commands and outputs.
+
+        Args:
+          patterns (list): regular expressions of the secrets (default
+                           default_scrub + config.replay_scrub). The group 1,
+                           if any, is kept.
+    '''
+
+    def __init__(self, patterns=None):
+        if patterns is None:
+            patterns = default_scrub + list(config.replay_scrub)
+        self.patterns = []
+        for pattern in patterns:
+            self.patterns.append(re.compile(pattern, re.IGNORECASE | re.DOTALL))
+
+    def scrub(self, text):
+        ''' Returns the text without the secrets. '''
+
+        for pattern in self.patterns:
+            if pattern.groups:
+                text = pattern.sub(lambda match: match.group(1) + scrub_mark, text)
+            else:
+                text = pattern.sub(scrub_mark, text)
+        return text
+
+
+def outputHash(output):
+    ''' Returns the key of an output on the archive. '''
+
+    return hashlib.sha1(output).hexdigest()[:16]
+
+
+class Recorder:
+    ''' Write the commands on the archive (appended, the archive can be
+        recorded by many processes).
+
+        Args:
+          filename (str): the archive (default archiveFile()).
+    '''
+
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = archiveFile()
+        self.filename = filename
+        self.scrubber = Scrubber()
+        self.written = set()
+        self.lock = threading.Lock()
+
+        # a new archive starts with the config of the fleet
+        if not os.path.exists(self.filename):
+            self.write([{'config': {'systems': config.systems,
+                                    'virtual_switches': config.virtual_switches,
+                                    'nimservers': config.nimservers}}])
+
+    def write(self, records):
+        ''' Append records to the archive (a gzip member by write). '''
+
+        f_archive = gzip.open(self.filename, 'ab')
+        try:
+            for record in records:
+                f_archive.write(json.dumps(record, sort_keys=True) + '\n')
+        finally:
+            f_archive.close()
+
+    def record(self, kind, host, cmd, status, output, elapsed, timed_out):
+        ''' Write a command executed. '''
+
+        cmd = self.scrubber.scrub(cmd)
+        output = self.scrubber.scrub(output)
+        key = outputHash(output)
+
+        self.lock.acquire()
+        try:
+            records = []
+            if key not in self.written:
+                records.append({'output': key, 'text': output})
+                self.written.add(key)
+            records.append({'kind': kind, 'host': host, 'cmd': cmd, 'status': status,
+                            'out': key, 'time': round(elapsed, 4), 'timed_out': timed_out})
+            self.write(records)
+        finally:
+            self.lock.release()
+
+
+class Archive:
+    ''' The commands of an archive, to answer them on the replay.
+
+        Args:
+          filename (str): the archive (default archiveFile()).
+    '''
+
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = archiveFile()
+        self.filename = filename
+        self.scrubber = Scrubber()
+        self.config = {}
+        self.answers = {}
+        self.used = {}
+        self.missing = set()
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        ''' Read the archive. '''
+
+        outputs = {}
+        f_archive = gzip.open(self.filename, 'rb')
+        try:
+            for line in f_archive:
+                if not line.strip():
+                    continue
+                record = cachefile.decode(json.loads(line))
+                if 'config' in record:
+                    self.config = record['config']
+                elif 'output' in record:
+                    outputs[record['output']] = record['text']
+                else:
+                    answer = (record['status'], outputs.get(record['out'], ''), record['time'],
+                              record['timed_out'])
+                    # by host and by command only (the HMC of the replay can be other)
+                    self.answers.setdefault((record['kind'], record['host'], record['cmd']), []).append(answer)
+                    self.answers.setdefault((record['kind'], None, record['cmd']), []).append(answer)
+        finally:
+            f_archive.close()
+
+    def answer(self, kind, host, cmd):
+        ''' Returns (status, output, elapsed, timed_out) of a command. The
+            commands recorded many times are answered in the order of the
+            record, the last answer is repeated after the end.
+        '''
+
+        cmd = self.scrubber.scrub(cmd)
+        key = (kind, host, cmd)
+        if key not in self.answers:
+            key = (kind, None, cmd)
+        if key not in self.answers:
+            self.lock.acquire()
+            try:
+                if cmd not in self.missing:
+                    self.missing.add(cmd)
+                    sys.stderr.write('%s\n' % (missing_output % (cmd)))
+            finally:
+                self.lock.release()
+            return (missing_status, missing_output % (cmd), 0.0, False)
+
+        self.lock.acquire()
+        try:
+            index = self.used.get(key, 0)
+            self.used[key] = index + 1
+        finally:
+            self.lock.release()
+        answers = self.answers[key]
+        return answers[min(index, len(answers) - 1)]
+
+
+class RecordBackend:
+    ''' Backend (see hmc.newBackend) that runs the commands on the backend of
+        config.replay_source and writes them on the archive.
+
+        Args:
+          client (hmc.HMCClient): the client of the host.
+    '''
+
+    def __init__(self, client):
+        import hmc
+        self.client = client
+        self.source = hmc.newBackend(client, config.replay_source)
+        self.recorder = getRecorder()
+
+    def execute(self, cmd, timeout):
+        ''' Run the command. Returns (status, output, timed_out). '''
+
+        start = time.time()
+        status, output, timed_out = self.source.execute(cmd, timeout)
+        self.recorder.record(self.client.kind, self.client.host, cmd, status, output,
+                             time.time() - start, timed_out)
+        return (status, output, timed_out)
+
+
+class ReplayBackend:
+    ''' Backend (see hmc.newBackend) that answers the commands from the
+        archive, with the time of the record or without wait
+        (config.replay_timing).
+
+        Args:
+          client (hmc.HMCClient): the client of the host.
+    '''
+
+    def __init__(self, client):
+        self.client = client
+        self.archive = getArchive()
+
+    def execute(self, cmd, timeout):
+        ''' Run the command. Returns (status, output, timed_out). '''
+
+        status, output, elapsed, timed_out = self.archive.answer(self.client.kind, self.client.host, cmd)
+        if config.replay_timing == 'original':
+            if timeout > 0 and elapsed > timeout:
+                time.sleep(timeout)
+                return (-1, '', True)
+            time.sleep(elapsed)
+        return (status, output, timed_out)
+
+
+def install():
+    ''' Replace the systems, virtual switches and NIM servers of the config
+        by the ones of the archive.
+    '''
+
+    archive = getArchive()
+    for name in ('systems', 'virtual_switches', 'nimservers'):
+        if name in archive.config:
+            setattr(config, name, archive.config[name])
+
+
+# the recorder and the archive are shared by all the modules in the process
+recorder = None
+archive = None
+replay_lock = threading.Lock()
+
+def getRecorder():
+    ''' Returns the shared Recorder. '''
+
+    global recorder
+    replay_lock.acquire()
+    try:
+        if recorder is None:
+            recorder = Recorder()
+        return recorder
+    finally:
+        replay_lock.release()
+
+
+def getArchive():
+    ''' Returns the shared Archive (read on the first call). '''
+
+    global archive
+    replay_lock.acquire()
+    try:
+        if archive is None:
+            archive = Archive()
+        return archive
+    finally:
+        replay_lock.release()
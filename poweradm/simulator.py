@@ -0,0 +1,1223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+PowerAdm
+simulator.py
+
+Copyright (c) 2016 Kairo Araujo
+
+It was created for personal use. There are no guarantees of the author.
+Use at your own risk.
+
+Permission to use, copy, modify, and distribute this software for any
+purpose with or without fee is hereby granted, provided that the above
+copyright notice and this permission notice appear in all copies.
+
+THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+IBM, Power, PowerVM (a.k.a. VIOS) are registered trademarks of IBM Corporation in
+the United States, other countries, or both.
+VMware, vCenter, vCenter Orchestrator are registered trademarks of VWware Inc in the United
+States, other countries, or both.
+'''
+
+# Imports
+###############################################################################################
+import re
+import csv
+import time
+import shlex
+import random
+import threading
+import config
+##############################################################################################
+#
+# HMC, VIOS and NIM simulator
+#
+# A synthetic fleet (frames, VIOS, LPARs with their profiles, the VSCSI and
+# NPIV mappings, FC ports, SEAs and NIM servers) is generated from the config
+# (sim_frames, sim_vios_per_frame, sim_lpars, sim_hmcs and sim_seed) and answers the
+# commands of PowerAdm as the HMC (lssyscfg, lshwres, chhwres, mksyscfg,
+# lpar_netboot, viosvrcmd) and the NIM servers (lsnim, nim, hostent, cat
+# /etc/hosts) would, with the latency of the config (sim_*_latency). The
+# changes (mksyscfg, chhwres, vfcmap, mkbdsp, hostent, nim define/remove) are
+# kept in memory of the process.
+# With many HMCs (sim_hmcs) the frames are split between simhmc01, simhmc02,
+# ... and each HMC only knows its frames.
+#
+# With config.hmc_backend = 'simulator' the HMCClient commands are answered
+# here (hmc.newBackend) and install() replaces the systems, virtual_switches
+# and nimservers of the config by the ones of the fleet. The shell scripts
+# (changes without plan and lsseas) still use ssh.
+##############################################################################################
+
+# virtual switches and VLANs of all the frames
+vswitches = {'VSW-MANAGER-01': [1010, 1011],
+             'VSW-DATA-01': [2100, 2101, 2102, 2103],
+             'VSW-BACKUP-01': [3200]}
+
+# roles and environments used on the LPAR names (ex: dbprd0042)
+lpar_roles = ['app', 'db', 'web', 'sap', 'ora', 'was', 'mq', 'bkp']
+lpar_envs = ['prd', 'hml', 'dev']
+
+# machine type and model of the frames
+frame_model = '8286-42A'
+
+# FC ports (NPIV) of each VIOS
+fc_ports = 4
+
+# attributes of lssyscfg -r lpar and lssyscfg -r prof (in this order)
+lpar_attrs = ['name', 'lpar_id', 'lpar_env', 'state', 'resource_config', 'os_version',
+              'logical_serial_num', 'default_profile', 'curr_profile', 'boot_mode',
+              'lpar_keylock', 'auto_start', 'rmc_state', 'rmc_ipaddr']
+prof_attrs = ['name', 'lpar_name', 'lpar_id', 'lpar_env', 'all_resources', 'min_mem', 'desired_mem',
+              'max_mem', 'mem_mode', 'proc_mode', 'min_proc_units', 'desired_proc_units',
+              'max_proc_units', 'min_procs', 'desired_procs', 'max_procs', 'sharing_mode',
+              'uncap_weight', 'shared_proc_pool_name', 'io_slots', 'max_virtual_slots',
+              'virtual_serial_adapters', 'virtual_scsi_adapters', 'virtual_eth_adapters',
+              'virtual_fc_adapters', 'boot_mode', 'conn_monitoring', 'auto_start']
+
+# lsmap -field names of the NPIV mappings
+npiv_fields = {'name': 'adapter', 'physloc': 'physloc', 'clntid': 'client_id',
+               'clntname': 'client_name', 'clntos': 'client_os', 'status': 'status',
+               'fc name': 'fcs', 'ports logged in': 'ports_logged'}
+
+
+def splitCommands(cmd):
+    ''' Split the commands of a shell line by ';' (out of quotes). '''
+
+    commands = []
+    current = []
+    quote = None
+    for char in cmd:
+        if quote is not None:
+            if char == quote:
+                quote = None
+        elif char in ('"', "'"):
+            quote = char
+        elif char == ';':
+            commands.append(''.join(current))
+            current = []
+            continue
+        current.append(char)
+    commands.append(''.join(current))
+    return [command.strip() for command in commands if command.strip()]
+
+
+def parseOptions(args):
+    ''' Returns {option: [values]} of the arguments of a command
+        (ex: ['-m', 'frame', '-F'] is {'-m': ['frame'], '-F': []}).
+    '''
+
+    options = {}
+    option = None
+    for arg in args:
+        if arg.startswith('-') and not arg[1:].isdigit():
+            option = arg
+            options[option] = []
+        elif option is not None:
+            options[option].append(arg)
+    return options
+
+
+def option(options, name, default=''):
+    ''' Returns the value (str) of an option of parseOptions(). '''
+
+    if name not in options:
+        return default
+    return ' '.join(options[name])
+
+
+def parseAttrs(text):
+    ''' Parse attributes as 'attr=value,"attr=value,value"' to a dict. '''
+
+    attrs = {}
+    for field in csv.reader([text.replace('\\"', '"')], skipinitialspace=True).next():
+        if '=' in field:
+            attr, value = field.split('=', 1)
+            attrs[attr.strip()] = value.strip()
+    return attrs
+
+
+def formatValue(value):
+    ''' Returns the value as HMC: the lists comma separated and the items
+        with comma quoted.
+    '''
+
+    if isinstance(value, list):
+        if not value:
+            return 'none'
+        items = []
+        for item in value:
+            if ',' in item:
+                item = '"%s"' % (item)
+            items.append(item)
+        return ','.join(items)
+    return str(value)
+
+
+def formatAttrs(attrs, names):
+    ''' Returns attr=value,... of the attributes (as lssyscfg without -F). '''
+
+    fields = []
+    for name in names:
+        field = '%s=%s' % (name, formatValue(attrs.get(name, '')))
+        if ',' in field or '"' in field:
+            field = '"%s"' % (field.replace('"', '""'))
+        fields.append(field)
+    return ','.join(fields)
+
+
+def formatFields(attrs, spec):
+    ''' Returns the attributes as -F spec (ex: 'name,state' or 'state:rmc_state'). '''
+
+    parts = re.split(r'(\W+)', spec)
+    multiple = len(parts) > 1
+    line = []
+    for index in range(len(parts)):
+        if index % 2:
+            line.append(parts[index])
+            continue
+        value = formatValue(attrs.get(parts[index], ''))
+        if multiple and ',' in value:
+            value = '"%s"' % (value.replace('"', '""'))
+        line.append(value)
+    return ''.join(line)
+
+
+def parseFilter(filter_spec):
+    ''' Parse a --filter (lpar_names=a,b,profile_names=c) to {attr: [values]}. '''
+
+    filters = {}
+    name = None
+    for value in filter_spec.replace('"', '').split(','):
+        if '=' in value:
+            name, value = value.split('=', 1)
+            name = name.strip()
+            filters[name] = []
+        if name is not None:
+            filters[name].append(value.strip())
+    return filters
+
+
+def adapterNumber(adapter):
+    ''' Returns the number of a device (vhost12 is 12). '''
+
+    return int(re.sub(r'^\D+', '', adapter))
+
+
+def matchFilter(attrs, filter_spec):
+    ''' Returns True if the attributes match the --filter
+        (lpar_names=..., lpar_ids=..., profile_names=...).
+    '''
+
+    for name, values in parseFilter(filter_spec).items():
+        if name == 'lpar_names' and attrs.get('lpar_name', attrs.get('name')) not in values:
+            return False
+        if name == 'lpar_ids' and str(attrs.get('lpar_id')) not in values:
+            return False
+        if name == 'profile_names' and attrs.get('name') not in values:
+            return False
+    return True
+
+
+class Fleet:
+    ''' The synthetic fleet and the commands of the simulator.
+
+        Args:
+          frames (int): number of frames (default config.sim_frames).
+          vios_per_frame (int): 2 (VSCSI, NPIV and network on the same VIOS)
+                                or 4 (default config.sim_vios_per_frame).
+          lpars (int): number of client LPARs (default config.sim_lpars).
+          hmcs (int): number of HMCs (default config.sim_hmcs). With only one
+                      HMC any host answers as the HMC.
+          seed (int): seed of the fleet (default config.sim_seed).
+
+        Attributes:
+          frames (dict): {system: {'name', 'type_model', 'serial_num', 'state', 'hmc',
+                                   'vios': [VIOS names], 'lpars': {lpar_id: LPAR}}}
+                         The LPAR is a dict with the lpar_attrs, the profile
+                         attributes and, on the VIOS, 'vhosts' and 'vfchosts'
+                         ({slot: mapping}), 'ports' and 'seas'.
+          nims (dict): {address: {'name', 'ipnet', 'hosts': {ip: name},
+                                  'machines': [names]}}
+          hmcs (list): the HMCs.
+    '''
+
+    def __init__(self, frames=None, vios_per_frame=None, lpars=None, seed=None, hmcs=None):
+        if frames is None:
+            frames = config.sim_frames
+        if vios_per_frame is None:
+            vios_per_frame = config.sim_vios_per_frame
+        if lpars is None:
+            lpars = config.sim_lpars
+        if seed is None:
+            seed = config.sim_seed
+        if hmcs is None:
+            hmcs = config.sim_hmcs
+        if int(vios_per_frame) not in (2, 4):
+            raise ValueError('the sim_vios_per_frame needs be 2 or 4')
+
+        self.random = random.Random(int(seed))
+        self.jitter = random.Random()
+        self.lock = threading.Lock()
+        self.frames = {}
+        self.nims = {}
+        self.wwpn = 0
+        self.hmcs = []
+        if int(hmcs) > 1:
+            self.hmcs = ['simhmc%02d' % (index + 1) for index in range(int(hmcs))]
+        # HMC of the command running (execute)
+        self.hmc = None
+        self.generate(int(frames), int(vios_per_frame), int(lpars))
+
+    #
+    # Generation of the fleet
+    #
+
+    def newWWPNs(self):
+        ''' Returns a new pair of client WWPNs. '''
+
+        self.wwpn += 2
+        return 'c0507609%08x,c0507609%08x' % (self.wwpn - 2, self.wwpn - 1)
+
+    def newProfile(self, lpar, mem, procs):
+        ''' Add the profile attributes of the memory and CPU to the LPAR. '''
+
+        lpar.update({'all_resources': '0', 'min_mem': str(mem / 2), 'desired_mem': str(mem),
+                     'max_mem': str(mem * 2), 'mem_mode': 'ded', 'proc_mode': 'shared',
+                     'min_proc_units': '0.1', 'desired_proc_units': '%.1f' % (procs * 0.5),
+                     'max_proc_units': str(procs * 2), 'min_procs': '1', 'desired_procs': str(procs),
+                     'max_procs': str(procs * 2), 'sharing_mode': 'uncap', 'uncap_weight': '128',
+                     'shared_proc_pool_name': 'DefaultPool', 'io_slots': 'none',
+                     'max_virtual_slots': '40', 'conn_monitoring': '1',
+                     'virtual_serial_adapters': ['0/server/1/any//any/1', '1/server/1/any//any/1'],
+                     'virtual_scsi_adapters': [], 'virtual_eth_adapters': [],
+                     'virtual_fc_adapters': []})
+
+    def newVIOS(self, frame, vios_id, name, npiv, net):
+        ''' Returns a new VIOS. '''
+
+        vios = {'name': name, 'lpar_id': vios_id, 'lpar_env': 'vioserver', 'state': 'Running',
+                'resource_config': '1', 'os_version': 'VIOS 2.2.6.21', 'logical_serial_num':
+                '%s%s' % (frame['serial_num'], vios_id), 'default_profile': 'default',
+                'curr_profile': 'default', 'boot_mode': 'norm', 'lpar_keylock': 'norm',
+                'auto_start': '1', 'rmc_state': 'active', 'rmc_ipaddr': '10.%s.%s.%s' %
+                (frame['index'] / 250, frame['index'] % 250, vios_id),
+                'vhosts': {}, 'vfchosts': {}, 'disks': 2, 'ports': [], 'seas': [], 'errlog': []}
+        self.newProfile(vios, 8192, 2)
+        vios['max_virtual_slots'] = '65535'
+
+        if npiv:
+            for port in range(fc_ports):
+                vios['ports'].append({'name': 'fcs%s' % (port),
+                                      'physloc': 'U78C9.001.WZS%04d-P1-C%s-T%s' %
+                                      (frame['index'], 2 + vios_id * 2 + port / 2, 1 + port % 2),
+                                      'fabric': 1, 'speed': self.random.choice([8, 16])})
+            # some FC errors (errlog)
+            for error in range(self.random.randint(0, 3)):
+                vios['errlog'].append('%-10s %-10s %s %s %-14s %s' % ('7BFEEA1F', '0410%02d3018' %
+                                      (self.random.randint(10, 28)), 'T', 'H',
+                                      'fcs%s' % (self.random.randrange(fc_ports)), 'LINK ERROR'))
+        if net:
+            # one trunk adapter (ent4...) and one SEA per virtual switch
+            names = sorted(vswitches.keys())
+            for index in range(len(names)):
+                vios['seas'].append({'name': 'ent%s' % (4 + len(names) + index),
+                                     'trunk': 'ent%s' % (4 + index), 'vswitch': names[index],
+                                     'state': ['PRIMARY', 'BACKUP'][vios_id % 2]})
+        return vios
+
+    def addVhost(self, vios, slot, client_id, disks):
+        ''' Add a VSCSI server adapter (vhost) with disks (VTDs) to the VIOS. '''
+
+        vhost = {'adapter': 'vhost%s' % (len(vios['vhosts'])), 'client_id': client_id, 'vtds': []}
+        for disk in range(disks):
+            vhost['vtds'].append(('vtscsi%s' % (vios['disks']), 'hdisk%s' % (vios['disks'])))
+            vios['disks'] += 1
+        vios['vhosts'][str(slot)] = vhost
+        return vhost
+
+    def addVfchost(self, vios, slot, client_id):
+        ''' Add a virtual FC server adapter (vfchost) to the VIOS. '''
+
+        vfchost = {'adapter': 'vfchost%s' % (len(vios['vfchosts'])), 'client_id': client_id,
+                   'fcs': '', 'status': 'NOT_LOGGED_IN'}
+        vios['vfchosts'][str(slot)] = vfchost
+        return vfchost
+
+    def generate(self, frames, vios_per_frame, lpars):
+        ''' Generate the frames, VIOS, LPARs and NIM servers. '''
+
+        for index in range(frames):
+            serial = '21%05d' % (index + 1)
+            name = 'P%03d-%s-SN%s' % (index + 1, frame_model, serial)
+            frame = {'name': name, 'index': index + 1, 'type_model': frame_model, 'serial_num': serial,
+                     'state': 'Operating', 'hmc': None, 'vios': [], 'lpars': {}}
+            if self.hmcs:
+                frame['hmc'] = self.hmcs[index % len(self.hmcs)]
+            for vios_id in range(1, vios_per_frame + 1):
+                vios_name = 'p%03dvio%s' % (index + 1, vios_id)
+                npiv = vios_id <= 2
+                net = vios_per_frame == 2 or vios_id > 2
+                frame['lpars'][vios_id] = self.newVIOS(frame, vios_id, vios_name, npiv, net)
+                frame['vios'].append(vios_name)
+            self.frames[name] = frame
+
+        # the LPAR IDs are unique on the fleet (as PowerAdm makes), with gaps
+        systems = self.systemNames()
+        lpar_id = 9
+        for count in range(lpars):
+            lpar_id += 1
+            if self.random.random() < 0.05:
+                lpar_id += self.random.randint(1, 3)
+            frame = self.frames[systems[count % len(systems)]]
+            name = '%s%s%04d' % (self.random.choice(lpar_roles), self.random.choice(lpar_envs), count + 1)
+            self.generateLPAR(frame, lpar_id, name)
+
+        for index in range(2):
+            address = 'simnim%02d' % (index + 1)
+            nim = {'name': address, 'ipnet': '10.%s.0.' % (200 + index), 'hosts': {}, 'machines': []}
+            for host in range(11, 251):
+                if self.random.random() < 0.6:
+                    nim['hosts']['%s%s' % (nim['ipnet'], host)] = 'nimclient%s%03d' % (index + 1, host)
+            self.nims[address] = nim
+
+    def generateLPAR(self, frame, lpar_id, name):
+        ''' Generate a client LPAR and its mappings on the VIOS of the frame. '''
+
+        running = self.random.random() < 0.9
+        lpar = {'name': name, 'lpar_id': lpar_id, 'lpar_env': 'aixlinux',
+                'state': ['Not Activated', 'Running'][running], 'resource_config': '1',
+                'os_version': 'AIX 7.1 7100-04-03-1642', 'logical_serial_num': '%s%s' %
+                (frame['serial_num'], lpar_id), 'default_profile': 'default', 'curr_profile': 'default',
+                'boot_mode': 'norm', 'lpar_keylock': 'norm', 'auto_start': '0',
+                'rmc_state': ['inactive', 'active'][running and self.random.random() < 0.95],
+                'rmc_ipaddr': ''}
+        self.newProfile(lpar, self.random.choice([4096, 8192, 16384, 32768]),
+                        self.random.choice([1, 2, 4, 8]))
+        vio1 = frame['lpars'][1]
+        vio2 = frame['lpars'][2]
+
+        # two virtual ethernets: manager and data or backup
+        mac = 0x06a100000000 + frame['index'] * 0x100000 + lpar_id * 0x10
+        for slot, vswitch in ((2, 'VSW-MANAGER-01'),
+                              (3, self.random.choice(['VSW-DATA-01', 'VSW-DATA-01', 'VSW-BACKUP-01']))):
+            lpar['virtual_eth_adapters'].append('%s/0/%s//0/0/%s/%012X/all/0' %
+                                                (slot, self.random.choice(vswitches[vswitch]), vswitch,
+                                                 mac + slot))
+
+        # VSCSI (rootvg) on the two VIOS, some without disks mapped
+        if self.random.random() < 0.7:
+            for client_slot, vios, prefix in ((21, vio1, 1), (22, vio2, 2)):
+                disks = self.random.choice([1, 1, 2, 3])
+                if self.random.random() < 0.01:
+                    disks = 0
+                self.addVhost(vios, '%s%s' % (prefix, lpar_id), lpar_id, disks)
+                lpar['virtual_scsi_adapters'].append('%s/client/%s/%s/%s%s/1' %
+                                                     (client_slot, vios['lpar_id'], vios['name'],
+                                                      prefix, lpar_id))
+
+        # NPIV on the two VIOS, some not logged in
+        if self.random.random() < 0.8:
+            port = self.random.randrange(fc_ports)
+            for client_slot, vios, prefix in ((33, vio1, 3), (34, vio2, 4)):
+                vfchost = self.addVfchost(vios, '%s%s' % (prefix, lpar_id), lpar_id)
+                vfchost['fcs'] = 'fcs%s' % (port)
+                if running and self.random.random() < 0.98:
+                    vfchost['status'] = 'LOGGED_IN'
+                lpar['virtual_fc_adapters'].append('%s/client/%s/%s/%s%s/%s/1' %
+                                                   (client_slot, vios['lpar_id'], vios['name'], prefix,
+                                                    lpar_id, self.newWWPNs()))
+
+        frame['lpars'][lpar_id] = lpar
+        return lpar
+
+    #
+    # Fleet informations (to the config)
+    #
+
+    def systemNames(self):
+        ''' Returns the names of the frames (sorted). '''
+
+        return sorted(self.frames.keys())
+
+    def systems(self):
+        ''' Returns the systems as config.systems ({system: [VIOS]}). '''
+
+        systems = {}
+        for name in self.frames.keys():
+            systems[name] = list(self.frames[name]['vios'])
+        return systems
+
+    def nimservers(self):
+        ''' Returns the NIM servers as config.nimservers. '''
+
+        nimservers = {}
+        for address in self.nims.keys():
+            ipnet = self.nims[address]['ipnet']
+            nimservers[address.upper()] = [address, '%s1' % (ipnet), '%s254' % (ipnet), '%s11-250' % (ipnet)]
+        return nimservers
+
+    #
+    # Commands
+    #
+
+    def latency(self, kind, cmd):
+        ''' Returns the latency in seconds of a command line. '''
+
+        if kind == 'nim':
+            latency = float(config.sim_nim_latency)
+        else:
+            latency = float(config.sim_hmc_latency)
+            latency += float(config.sim_vios_latency) * len(re.findall(r'(^|[;\s])viosvrcmd\s', cmd))
+        jitter = float(config.sim_jitter)
+        return max(latency * (1 + self.jitter.uniform(-jitter, jitter)), 0)
+
+    def execute(self, kind, host, cmd):
+        ''' Run a command line (commands separated by ';'). Returns
+            (status, output).
+
+            Args:
+              kind (str): 'hmc' or 'nim'.
+              host (str): the HMC or NIM server.
+              cmd (str): the command line.
+        '''
+
+        if kind == 'nim':
+            handlers = {'lsnim': self.lsnim, 'cat': self.cat, 'hostent': self.hostent,
+                        'nim': self.nim, 'echo': self.echo}
+            if host not in self.nims:
+                return (255, 'ssh: Could not resolve hostname %s: Name or service not known' % (host))
+        else:
+            handlers = {'lssyscfg': self.lssyscfg, 'lshwres': self.lshwres, 'chhwres': self.chhwres,
+                        'mksyscfg': self.mksyscfg, 'chsyscfg': self.chsyscfg,
+                        'lpar_netboot': self.lpar_netboot, 'viosvrcmd': self.viosvrcmd, 'echo': self.echo}
+
+        status = 0
+        outputs = []
+        self.lock.acquire()
+        try:
+            self.hmc = host
+            for command in splitCommands(cmd):
+                try:
+                    # the exit status of the last command
+                    args = shlex.split(command.replace('$?', str(status)))
+                except ValueError:
+                    status, output = (1, 'rbash: syntax error: %s' % (command))
+                else:
+                    if args[:1] == ['sudo']:
+                        args = args[1:]
+                    if not args:
+                        continue
+                    if args[0] not in handlers:
+                        status, output = (127, 'rbash: %s: command not found' % (args[0]))
+                    elif kind == 'nim':
+                        status, output = handlers[args[0]](self.nims[host], args)
+                    else:
+                        status, output = handlers[args[0]](args)
+                if output != '':
+                    outputs.append(output)
+        finally:
+            self.lock.release()
+        return (status, '\n'.join(outputs))
+
+    def echo(self, *args):
+        ''' echo '''
+
+        return (0, ' '.join(args[-1][1:]))
+
+    def managed(self, frame):
+        ''' Returns True if the frame is managed by the HMC of the command. '''
+
+        return frame['hmc'] is None or frame['hmc'] == self.hmc
+
+    def getFrame(self, options):
+        ''' Returns the frame of the -m option (of the HMC) or None. '''
+
+        frame = self.frames.get(option(options, '-m'))
+        if frame is None or not self.managed(frame):
+            return None
+        return frame
+
+    def findLPAR(self, frame, name):
+        ''' Returns the LPAR of the frame with the name (or ID) or None. '''
+
+        for lpar in frame['lpars'].values():
+            if lpar['name'] == name or str(lpar['lpar_id']) == name:
+                return lpar
+        return None
+
+    def noFrame(self, options):
+        ''' The error of a managed system not found. '''
+
+        return (1, 'HSCL8012 The managed system %s was not found.' % (option(options, '-m')))
+
+    def listing(self, records, names, options):
+        ''' Returns (status, output) of a list of records (dict) with the
+            -F and --filter of the options.
+        '''
+
+        lines = []
+        for record in records:
+            if '--filter' in options and not matchFilter(record, option(options, '--filter')):
+                continue
+            if '-F' in options and options['-F']:
+                lines.append(formatFields(record, option(options, '-F')))
+            elif '-F' in options:
+                values = []
+                for name in names:
+                    value = formatValue(record.get(name, ''))
+                    if ',' in value:
+                        value = '"%s"' % (value.replace('"', '""'))
+                    values.append(value)
+                lines.append(','.join(values))
+            else:
+                lines.append(formatAttrs(record, names))
+        if not lines:
+            return (1, 'No results were found.')
+        return (0, '\n'.join(lines))
+
+    def lparList(self, frame):
+        ''' Returns the LPARs of the frame sorted by ID. '''
+
+        lpars = []
+        for lpar_id in sorted(frame['lpars'].keys()):
+            lpars.append(frame['lpars'][lpar_id])
+        return lpars
+
+    def profile(self, frame, lpar):
+        ''' Returns the profile (attributes) of an LPAR. On the VIOS the
+            server adapters are from the mappings.
+        '''
+
+        profile = dict(lpar)
+        profile['name'] = lpar['curr_profile']
+        profile['lpar_name'] = lpar['name']
+        if lpar['lpar_env'] == 'vioserver':
+            vscsi = []
+            for slot in sorted(lpar['vhosts'].keys(), key=int):
+                vscsi.append('%s/server/%s/any/any/1' % (slot, lpar['vhosts'][slot]['client_id']))
+            vfc = []
+            for slot in sorted(lpar['vfchosts'].keys(), key=int):
+                vfc.append('%s/server/%s/any/any//1' % (slot, lpar['vfchosts'][slot]['client_id']))
+            veth = []
+            for sea in lpar['seas']:
+                veth.append('%s/0/%s//1/1/%s/%012X/all/0' % (10 + int(sea['trunk'][3:]),
+                            vswitches[sea['vswitch']][0], sea['vswitch'],
+                            0x06af00000000 + lpar['lpar_id'] * 0x100 + int(sea['trunk'][3:])))
+            profile['virtual_scsi_adapters'] = vscsi
+            profile['virtual_fc_adapters'] = vfc
+            profile['virtual_eth_adapters'] = veth
+        return profile
+
+    def lssyscfg(self, args):
+        ''' lssyscfg -r sys|lpar|prof '''
+
+        options = parseOptions(args)
+        resource = option(options, '-r')
+        if resource == 'sys':
+            records = []
+            for name in self.systemNames():
+                if self.managed(self.frames[name]):
+                    records.append(self.frames[name])
+            return self.listing(records, ['name', 'type_model', 'serial_num', 'state'], options)
+
+        frame = self.getFrame(options)
+        if frame is None:
+            return self.noFrame(options)
+        if resource == 'lpar':
+            return self.listing(self.lparList(frame), lpar_attrs, options)
+        elif resource == 'prof':
+            records = []
+            for lpar in self.lparList(frame):
+                records.append(self.profile(frame, lpar))
+            return self.listing(records, prof_attrs, options)
+        return (1, 'HSCL350B The resource type %s is not valid.' % (resource))
+
+    def lshwres(self, args):
+        ''' lshwres -r virtualio --rsubtype vswitch|scsi|fc|eth --level lpar '''
+
+        options = parseOptions(args)
+        frame = self.getFrame(options)
+        if frame is None:
+            return self.noFrame(options)
+        rsubtype = option(options, '--rsubtype')
+        if option(options, '-r') != 'virtualio':
+            return (1, 'HSCL350B The resource type %s is not supported.' % (option(options, '-r')))
+
+        if rsubtype == 'vswitch':
+            records = []
+            for vswitch in sorted(vswitches.keys()):
+                records.append({'vswitch': vswitch, 'switch_mode': 'VEB',
+                                'vlan_ids': [str(vlan) for vlan in [1] + vswitches[vswitch]]})
+            return self.listing(records, ['vswitch', 'switch_mode', 'vlan_ids'], options)
+
+        attrs = {'scsi': 'virtual_scsi_adapters', 'fc': 'virtual_fc_adapters',
+                 'eth': 'virtual_eth_adapters'}
+        if rsubtype not in attrs:
+            return (1, 'HSCL350B The resource subtype %s is not supported.' % (rsubtype))
+        records = []
+        for lpar in self.lparList(frame):
+            for adapter in self.profile(frame, lpar)[attrs[rsubtype]]:
+                fields = adapter.split('/')
+                record = {'lpar_name': lpar['name'], 'lpar_id': lpar['lpar_id'], 'slot_num': fields[0]}
+                if rsubtype == 'eth':
+                    record.update({'port_vlan_id': fields[2], 'is_trunk': fields[4],
+                                   'vswitch': fields[6], 'mac_addr': fields[7]})
+                else:
+                    record.update({'adapter_type': fields[1], 'remote_lpar_id': fields[2],
+                                   'remote_lpar_name': fields[3], 'remote_slot_num': fields[4]})
+                    if rsubtype == 'fc':
+                        record['wwpns'] = fields[5]
+                records.append(record)
+        names = ['lpar_name', 'lpar_id', 'slot_num', 'adapter_type', 'remote_lpar_id', 'remote_lpar_name',
+                 'remote_slot_num']
+        if rsubtype == 'eth':
+            names = ['lpar_name', 'lpar_id', 'slot_num', 'port_vlan_id', 'is_trunk', 'vswitch', 'mac_addr']
+        elif rsubtype == 'fc':
+            names.append('wwpns')
+        return self.listing(records, names, options)
+
+    def chhwres(self, args):
+        ''' chhwres -r virtualio -o a|r -p VIOS --rsubtype scsi|fc -s slot (server adapters). '''
+
+        options = parseOptions(args)
+        frame = self.getFrame(options)
+        if frame is None:
+            return self.noFrame(options)
+        vios = self.findLPAR(frame, option(options, '-p'))
+        if vios is None:
+            return (1, 'HSCL8011 The partition %s was not found.' % (option(options, '-p')))
+        rsubtype = option(options, '--rsubtype')
+        slot = option(options, '-s')
+        attrs = parseAttrs(option(options, '-a'))
+
+        if rsubtype not in ('scsi', 'fc') or 'vhosts' not in vios:
+            return (0, '')
+        mappings = vios[{'scsi': 'vhosts', 'fc': 'vfchosts'}[rsubtype]]
+        if option(options, '-o') == 'r':
+            if slot not in mappings:
+                return (1, 'HSCL2928 The virtual slot %s has no adapter.' % (slot))
+            del mappings[slot]
+            return (0, '')
+
+        if slot in vios['vhosts'] or slot in vios['vfchosts']:
+            return (1, 'HSCL294C The virtual slot number %s is already in use.' % (slot))
+        client_id = attrs.get('remote_lpar_id', '')
+        if client_id in ('', 'any'):
+            client = self.findLPAR(frame, attrs.get('remote_lpar_name', ''))
+            client_id = ''
+            if client is not None:
+                client_id = client['lpar_id']
+        if rsubtype == 'scsi':
+            self.addVhost(vios, slot, client_id, 0)
+        else:
+            self.addVfchost(vios, slot, client_id)
+        return (0, '')
+
+    def mksyscfg(self, args):
+        ''' mksyscfg -r lpar -i attrs (new LPAR) and mksyscfg -r prof -o save. '''
+
+        options = parseOptions(args)
+        frame = self.getFrame(options)
+        if frame is None:
+            return self.noFrame(options)
+        if option(options, '-r') != 'lpar':
+            return (0, '')
+
+        attrs = parseAttrs(option(options, '-i'))
+        name = attrs.get('name', '')
+        lpar_id = attrs.get('lpar_id', '')
+        if not name or not lpar_id.isdigit():
+            return (1, 'HSCL3019 The name and lpar_id attributes are required.')
+        if int(lpar_id) in frame['lpars'] or self.findLPAR(frame, name) is not None:
+            return (1, 'HSCLA25A The partition name or ID %s is already in use.' % (lpar_id))
+
+        lpar = {'name': name, 'lpar_id': int(lpar_id), 'lpar_env': attrs.get('lpar_env', 'aixlinux'),
+                'state': 'Not Activated', 'resource_config': '1', 'os_version': 'Unknown',
+                'logical_serial_num': '%s%s' % (frame['serial_num'], lpar_id),
+                'default_profile': attrs.get('profile_name', 'default'),
+                'curr_profile': attrs.get('profile_name', 'default'), 'boot_mode': 'norm',
+                'lpar_keylock': 'norm', 'auto_start': '0', 'rmc_state': 'inactive', 'rmc_ipaddr': ''}
+        self.newProfile(lpar, int(attrs.get('desired_mem', '1024')), int(attrs.get('desired_procs', '1')))
+        for attr in attrs.keys():
+            if attr in prof_attrs and attr not in ('name', 'lpar_name', 'lpar_id'):
+                lpar[attr] = attrs[attr]
+        for attr in ('virtual_scsi_adapters', 'virtual_eth_adapters', 'virtual_fc_adapters'):
+            adapters = []
+            if isinstance(lpar[attr], str):
+                for adapter in csv.reader([lpar[attr]]).next():
+                    fields = adapter.split('/')
+                    # the HMC makes the WWPNs of the virtual FC
+                    if attr == 'virtual_fc_adapters' and len(fields) > 5 and fields[5] == '':
+                        fields[5] = self.newWWPNs()
+                    adapters.append('/'.join(fields))
+                lpar[attr] = adapters
+        frame['lpars'][int(lpar_id)] = lpar
+        return (0, '')
+
+    def chsyscfg(self, args):
+        ''' chsyscfg (accepted, no changes). '''
+
+        options = parseOptions(args)
+        if self.getFrame(options) is None:
+            return self.noFrame(options)
+        return (0, '')
+
+    def lpar_netboot(self, args):
+        ''' lpar_netboot -M ... partition profile system (the MAC of the
+            virtual ethernet C10-T1) and lpar_netboot -m MAC ... (boot).
+        '''
+
+        if len(args) < 4:
+            return (1, 'lpar_netboot: the partition, profile and managed system are required.')
+        frame = self.frames.get(args[-1])
+        if frame is None or not self.managed(frame):
+            return (1, 'HSCL8012 The managed system %s was not found.' % (args[-1]))
+        lpar = self.findLPAR(frame, args[-3])
+        if lpar is None:
+            return (1, 'HSCL8011 The partition %s was not found.' % (args[-3]))
+        if '-M' in args:
+            return (0, '# Connecting to %s\n# Getting adapter location codes.\n'
+                       '# Type\t Location Code\t MAC Address\t Full Path Name\n'
+                       'ent U%s.%s-V%s-C10-T1 %s /vdevice/l-lan@3000000a' %
+                    (args[-3], frame['type_model'].replace('-', '.'), frame['serial_num'], lpar['lpar_id'],
+                     'fa%010x' % (lpar['lpar_id'])))
+        lpar['state'] = 'Running'
+        return (0, '# Connecting to %s\n# Booting.\n# bootp sent over network.\n'
+                   '# Network boot proceeding, lpar_netboot is exiting.' % (args[-3]))
+
+    #
+    # VIOS commands (viosvrcmd)
+    #
+
+    def viosvrcmd(self, args):
+        ''' viosvrcmd -m frame -p VIOS -c 'command' '''
+
+        options = parseOptions(args)
+        frame = self.getFrame(options)
+        if frame is None:
+            return self.noFrame(options)
+        vios = self.findLPAR(frame, option(options, '-p'))
+        if vios is None or vios['lpar_env'] != 'vioserver':
+            return (1, 'HSCL8011 The partition %s was not found.' % (option(options, '-p')))
+        try:
+            vios_args = shlex.split(option(options, '-c'))
+        except ValueError:
+            return (1, 'rksh: syntax error')
+        if not vios_args:
+            return (1, 'HSCL2970 The -c parameter is required.')
+
+        handlers = {'lsmap': self.lsmap, 'lsnports': self.lsnports, 'errlog': self.errlog,
+                    'lsdev': self.lsdev, 'fcstat': self.fcstat, 'entstat': self.entstat,
+                    'cfgdev': self.cfgdev, 'vfcmap': self.vfcmap, 'mkbdsp': self.mkbdsp,
+                    'ioslevel': self.ioslevel}
+        if vios_args[0] not in handlers:
+            return (1, 'rksh: %s:  not found.' % (vios_args[0]))
+        return handlers[vios_args[0]](frame, vios, vios_args)
+
+    def physloc(self, frame, vios, slot):
+        ''' Returns the physloc of a virtual slot (U8286.42A.2100001-V1-C1010). '''
+
+        return 'U%s.%s-V%s-C%s' % (frame['type_model'].replace('-', '.'), frame['serial_num'],
+                                   vios['lpar_id'], slot)
+
+    def vfcRecord(self, frame, vios, slot):
+        ''' Returns the lsmap -npiv fields of a vfchost. '''
+
+        vfchost = vios['vfchosts'][slot]
+        client = frame['lpars'].get(vfchost['client_id'])
+        record = {'adapter': vfchost['adapter'], 'physloc': self.physloc(frame, vios, slot),
+                  'client_id': '', 'client_name': '', 'client_os': '', 'status': vfchost['status'],
+                  'fcs': vfchost['fcs'], 'fc_loc': '', 'ports_logged': '0', 'flags': '4<NOT_LOGGED>',
+                  'client_fc': '', 'client_drc': ''}
+        for port in vios['ports']:
+            if port['name'] == vfchost['fcs']:
+                record['fc_loc'] = port['physloc']
+        if vfchost['status'] == 'LOGGED_IN' and client is not None:
+            client_slot = ''
+            for adapter in client['virtual_fc_adapters']:
+                if adapter.split('/')[4] == slot:
+                    client_slot = adapter.split('/')[0]
+            record.update({'client_id': str(client['lpar_id']), 'client_name': client['name'],
+                           'client_os': 'AIX', 'ports_logged': '2', 'flags': 'a<LOGGED_IN,STRIP_MERGE>',
+                           'client_fc': 'fcs%s' % (int(client_slot or 33) - 33),
+                           'client_drc': 'U%s.%s-V%s-C%s' % (frame['type_model'].replace('-', '.'),
+                                                            frame['serial_num'], client['lpar_id'],
+                                                            client_slot)})
+        return record
+
+    def lsmap(self, frame, vios, args):
+        ''' lsmap -all | -vadapter, with -npiv, -field and -fmt. '''
+
+        options = parseOptions(args)
+        npiv = '-npiv' in options
+        mappings = vios[['vhosts', 'vfchosts'][npiv]]
+        slots = sorted(mappings.keys(), key=lambda slot: adapterNumber(mappings[slot]['adapter']))
+        if '-vadapter' in options:
+            slots = [slot for slot in slots if mappings[slot]['adapter'] == option(options, '-vadapter')]
+            if not slots:
+                return (1, 'Device "%s" is not a Server Virtual %s Adapter (SVSA).' %
+                        (option(options, '-vadapter'), ['SCSI', 'FC'][npiv]))
+
+        # -field/-fmt (only NPIV)
+        if npiv and '-field' in options:
+            delimiter = option(options, '-fmt', ' ')
+            lines = []
+            for slot in slots:
+                record = self.vfcRecord(frame, vios, slot)
+                values = []
+                for field in options['-field']:
+                    values.append(record.get(npiv_fields.get(field.lower(), ''), ''))
+                lines.append(delimiter.join(values))
+            return (0, '\n'.join(lines))
+
+        lines = []
+        if npiv:
+            for slot in slots:
+                record = self.vfcRecord(frame, vios, slot)
+                lines.extend(['Name          Physloc                            ClntID ClntName       ClntOS',
+                              '------------- ---------------------------------- ------ -------------- -------',
+                              '%-13s %-34s %6s %-14s %s' % (record['adapter'], record['physloc'],
+                                                            record['client_id'], record['client_name'],
+                                                            record['client_os']),
+                              '',
+                              'Status:%s' % (record['status']),
+                              'FC name:%-24sFC loc code:%s' % (record['fcs'], record['fc_loc']),
+                              'Ports logged in:%s' % (record['ports_logged']),
+                              'Flags:%s' % (record['flags']),
+                              'VFC client name:%-16sVFC client DRC:%s' % (record['client_fc'],
+                                                                          record['client_drc']),
+                              ''])
+        else:
+            for slot in slots:
+                vhost = mappings[slot]
+                lines.extend(['SVSA            Physloc                                      '
+                              'Client Partition ID',
+                              '--------------- -------------------------------------------- '
+                              '------------------',
+                              '%-15s %-44s 0x%08x' % (vhost['adapter'], self.physloc(frame, vios, slot),
+                                                      int(vhost['client_id'] or 0)),
+                              ''])
+                if not vhost['vtds']:
+                    lines.extend(['VTD                   NO VIRTUAL TARGET DEVICE FOUND', ''])
+                for lun in range(len(vhost['vtds'])):
+                    vtd, disk = vhost['vtds'][lun]
+                    lines.extend(['VTD                   %s' % (vtd),
+                                  'Status                Available',
+                                  'LUN                   0x%x000000000000' % (0x8100 + lun),
+                                  'Backing device        %s' % (disk),
+                                  'Physloc               U78C9.001.WZS%04d-P1-C2-T1-W500507680B2156%02d-L%s' %
+                                  (frame['index'], vios['lpar_id'], lun),
+                                  'Mirrored              false',
+                                  ''])
+        return (0, '\n'.join(lines).rstrip('\n'))
+
+    def lsnports(self, frame, vios, args):
+        ''' lsnports '''
+
+        lines = ['%-16s %-27s %6s %6s %6s %6s %6s' % ('name', 'physloc', 'fabric', 'tports', 'aports',
+                                                    'swwpns', 'awwpns')]
+        for port in vios['ports']:
+            clients = 0
+            for vfchost in vios['vfchosts'].values():
+                if vfchost['fcs'] == port['name']:
+                    clients += 1
+            lines.append('%-16s %-27s %6s %6s %6s %6s %6s' % (port['name'], port['physloc'], port['fabric'],
+                         64, max(64 - clients, 0), 2048, max(2048 - clients * 2, 0)))
+        if len(lines) == 1:
+            return (0, '')
+        return (0, '\n'.join(lines))
+
+    def errlog(self, frame, vios, args):
+        ''' errlog '''
+
+        lines = ['IDENTIFIER TIMESTAMP  T C RESOURCE_NAME  DESCRIPTION'] + vios['errlog']
+        return (0, '\n'.join(lines))
+
+    def lsdev(self, frame, vios, args):
+        ''' lsdev -dev X -child | -attr attach | -vpd and lsdev -type adapter. '''
+
+        options = parseOptions(args)
+        device = option(options, '-dev')
+        if option(options, '-type') == 'adapter':
+            lines = ['name             status      description']
+            for index in range(4):
+                lines.append('%-16s Available   4-Port Gigabit Ethernet PCI-Express Adapter '
+                             '(e414571614102004)' % ('ent%s' % (index)))
+            for sea in vios['seas']:
+                lines.append('%-16s Available   Virtual I/O Ethernet Adapter (l-lan)' % (sea['trunk']))
+            for sea in vios['seas']:
+                lines.append('%-16s Available   Shared Ethernet Adapter' % (sea['name']))
+            for port in vios['ports']:
+                lines.append('%-16s Available   8Gb PCI Express Dual Port FC Adapter '
+                             '(df1000f114108a03)' % (port['name']))
+            for vhost in sorted(vios['vhosts'].values(), key=lambda vhost: adapterNumber(vhost['adapter'])):
+                lines.append('%-16s Available   Virtual SCSI Server Adapter' % (vhost['adapter']))
+            for vfchost in sorted(vios['vfchosts'].values(),
+                                  key=lambda vfchost: adapterNumber(vfchost['adapter'])):
+                lines.append('%-16s Available   Virtual FC Server Adapter' % (vfchost['adapter']))
+            return (0, '\n'.join(lines))
+
+        ports = [port['name'] for port in vios['ports']]
+        if device.startswith('fscsi') and device.replace('fscsi', 'fcs', 1) in ports:
+            if option(options, '-attr') == 'attach':
+                return (0, 'value\n\nswitch')
+            return (0, 'attribute     value    description                           user_settable\n\n'
+                       'attach        switch   How this adapter is CONNECTED         False\n'
+                       'dyntrk        yes      Dynamic Tracking of FC Devices        True\n'
+                       'fc_err_recov  fast_fail FC Fabric Event Error RECOVERY Policy True')
+        if device not in ports:
+            return (1, 'Some error messages may contain invalid information\n'
+                       'for the Virtual I/O Server environment.\n\n'
+                       'Method error (/usr/lib/methods/showled):\n'
+                       '        0514-047 Cannot access a device. %s' % (device))
+        if '-child' in options:
+            index = device[3:]
+            return (0, 'name             status      description\n'
+                       '%-16s Defined     Fibre Channel Network Protocol Device\n'
+                       '%-16s Available   FC SCSI I/O Controller Protocol Device' %
+                       ('fcnet%s' % (index), 'fscsi%s' % (index)))
+        if '-vpd' in options:
+            return (0, '  %-16s U78C9.001.WZS%04d-P1-C2-T1  8Gb PCI Express Dual Port FC Adapter\n\n'
+                       '        Part Number.................00E0806\n'
+                       '        Serial Number...............1A4080061B\n'
+                       '        Network Address.............%s\n'
+                       '        ROS Level and ID............027820B7' %
+                       (device, frame['index'], self.portWWPN(frame, vios, device)))
+        return (0, 'attribute     value    description                           user_settable')
+
+    def portWWPN(self, frame, vios, device):
+        ''' Returns the WWPN of a FC port. '''
+
+        return '10000090FA%02X%02X%02X' % (frame['index'] % 256, vios['lpar_id'], int(device[3:]))
+
+    def fcstat(self, frame, vios, args):
+        ''' fcstat [-e] fcsN '''
+
+        device = args[-1]
+        port = None
+        for vios_port in vios['ports']:
+            if vios_port['name'] == device:
+                port = vios_port
+        if port is None:
+            return (1, 'Error accessing ODM\nDevice %s not found' % (device))
+
+        lines = ['', 'FIBRE CHANNEL STATISTICS REPORT: %s' % (device), '',
+                 'Device Type: 8Gb PCI Express Dual Port FC Adapter (df1000f114108a03)',
+                 'Serial Number: 1A4080061B',
+                 'World Wide Node Name: 0x20000090FA%s' % (self.portWWPN(frame, vios, device)[10:]),
+                 'World Wide Port Name: 0x%s' % (self.portWWPN(frame, vios, device)),
+                 '', 'FC-4 TYPES:',
+                 '  Supported: 0x0000012000000000000000000000000000000000000000000000000000000000',
+                 '  Active:    0x0000010000000000000000000000000000000000000000000000000000000000',
+                 'Class of Service: 3',
+                 'Port Speed (supported): %s GBIT' % (port['speed']),
+                 'Port Speed (running):   8 GBIT',
+                 'Port FC ID: 0x%06x' % (0x010000 + int(device[3:])),
+                 'Port Type: Fabric',
+                 'Attention Type:   Link Up',
+                 'Topology:  Point to Point or Fabric']
+        if '-e' in args:
+            lines.extend(['', 'Driver Statistics',
+                          '  Number of interrupts:   %s' % (self.random.randint(1000, 90000000)),
+                          '  Number of spurious interrupts:   0',
+                          'Elastic Buffer Errors: 0'])
+        return (0, '\n'.join(lines))
+
+    def entstat(self, frame, vios, args):
+        ''' entstat -all entN (SEA) '''
+
+        device = args[-1]
+        for sea in vios['seas']:
+            if sea['name'] == device:
+                lines = ['-------------------------------------------------------------',
+                         'ETHERNET STATISTICS (%s) :' % (device),
+                         'Device Type: Shared Ethernet Adapter',
+                         'Hardware Address: 00:14:5e:%02x:%02x:%02x' % (frame['index'] % 256, vios['lpar_id'],
+                                                                       int(device[3:])),
+                         '',
+                         'Shared Ethernet Adapter Specific Statistics:',
+                         '---------------------------------------------',
+                         'Number of adapters: 2',
+                         'SEA Flags: 00000009',
+                         '        < THREAD >',
+                         '        < LARGESEND >',
+                         'VLAN Ids :',
+                         '    %s: %s' % (sea['trunk'], ' '.join([str(vlan) for vlan in vswitches[sea['vswitch']]])),
+                         'Real Side Statistics:',
+                         '  Packets received: %s' % (self.random.randint(1000, 900000000)),
+                         '',
+                         'Virtual I/O Ethernet Adapter (l-lan) Specific Statistics:',
+                         '---------------------------------------------------------',
+                         'Port VLAN ID:     1',
+                         'Switch ID: %s' % (sea['vswitch']),
+                         'High Availability Statistics:',
+                         '    Control Channel PVID: 99',
+                         '    State: %s' % (sea['state'])]
+                return (0, '\n'.join(lines))
+        return (0, '-------------------------------------------------------------\n'
+                   'ETHERNET STATISTICS (%s) :\n'
+                   'Device Type: 4-Port Gigabit Ethernet PCI-Express Adapter (e414571614102004)' % (device))
+
+    def cfgdev(self, frame, vios, args):
+        ''' cfgdev '''
+
+        return (0, '')
+
+    def ioslevel(self, frame, vios, args):
+        ''' ioslevel '''
+
+        return (0, vios['os_version'].split()[-1])
+
+    def vfcmap(self, frame, vios, args):
+        ''' vfcmap -vadapter vfchostN -fcp fcsN '''
+
+        options = parseOptions(args)
+        for vfchost in vios['vfchosts'].values():
+            if vfchost['adapter'] == option(options, '-vadapter'):
+                if option(options, '-fcp') not in [port['name'] for port in vios['ports']]:
+                    return (1, 'The physical FC adapter %s was not found.' % (option(options, '-fcp')))
+                vfchost['fcs'] = option(options, '-fcp')
+                return (0, '')
+        return (1, 'Device "%s" is not a Server Virtual FC Adapter (SVFC).' % (option(options, '-vadapter')))
+
+    def mkbdsp(self, frame, vios, args):
+        ''' mkbdsp -clustername C -sp SP SIZE -bd NAME -vadapter vhostN '''
+
+        options = parseOptions(args)
+        for vhost in vios['vhosts'].values():
+            if vhost['adapter'] == option(options, '-vadapter'):
+                vhost['vtds'].append(('vtscsi%s' % (vios['disks']), option(options, '-bd')))
+                vios['disks'] += 1
+                return (0, 'Lu Name:%s\nLu Udid:%032x\n\nAssigning logical unit \'%s\' as a backing device.\n\n'
+                           'VTD:vtscsi%s' % (option(options, '-bd'), vios['disks'], option(options, '-bd'),
+                                             vios['disks'] - 1))
+        return (1, 'Device "%s" is not a Server Virtual SCSI Adapter (SVSA).' % (option(options, '-vadapter')))
+
+    #
+    # NIM commands
+    #
+
+    def lsnim(self, nim, args):
+        ''' lsnim [-t type] '''
+
+        options = parseOptions(args)
+        objects = [('master', 'machines', 'master'), ('boot', 'resources', 'boot'),
+                   ('nim_script', 'resources', 'nim_script'),
+                   ('net_%s0' % (nim['ipnet'].replace('.', '_')), 'networks', 'ent')]
+        if config.nim_bosinst_data_res:
+            objects.append((config.nim_bosinst_data_res, 'resources', 'bosinst_data'))
+        for version in sorted(config.nim_os_deploy.keys()):
+            objects.append((config.nim_os_deploy[version][0], 'resources', config.nim_deploy_mode))
+            objects.append((config.nim_os_deploy[version][1], 'resources', 'spot'))
+        for machine in nim['machines']:
+            objects.append((machine, 'machines', 'standalone'))
+
+        lines = []
+        for name, nim_class, nim_type in objects:
+            if '-t' not in options or option(options, '-t') == nim_type:
+                lines.append('%-32s %-16s %s' % (name, nim_class, nim_type))
+        return (0, '\n'.join(lines))
+
+    def cat(self, nim, args):
+        ''' cat /etc/hosts '''
+
+        if args[1:] != ['/etc/hosts']:
+            return (2, 'cat: 0652-050 Cannot open %s.' % (' '.join(args[1:])))
+        lines = ['127.0.0.1               loopback localhost', '%s1               %s' %
+                 (nim['ipnet'], nim['name'])]
+        for ip in sorted(nim['hosts'].keys(), key=lambda ip: int(ip.split('.')[-1])):
+            lines.append('%-23s %s' % (ip, nim['hosts'][ip]))
+        return (0, '\n'.join(lines))
+
+    def hostent(self, nim, args):
+        ''' hostent -a IP -h name and hostent -d IP '''
+
+        options = parseOptions(args)
+        if '-d' in options:
+            if nim['hosts'].pop(option(options, '-d'), None) is None:
+                return (1, '0821-224 hostent: The address %s is not in the hosts file.' % (option(options, '-d')))
+            return (0, '')
+        ip = option(options, '-a')
+        if ip in nim['hosts']:
+            return (1, '0821-223 hostent: The address %s is already in the hosts file.' % (ip))
+        nim['hosts'][ip] = option(options, '-h')
+        return (0, '')
+
+    def nim(self, nim, args):
+        ''' nim -o define|bos_inst|reset|deallocate|remove ... (define adds the
+            machine and remove removes it).
+        '''
+
+        options = parseOptions(args)
+        operation = option(options, '-o', option(options, '-Fo')).split()[:1]
+        if operation == ['define']:
+            nim['machines'].append(args[-1])
+        elif operation == ['remove']:
+            if args[-1] not in nim['machines']:
+                return (1, '0042-053 nim: there is no NIM object named "%s"' % (args[-1]))
+            nim['machines'].remove(args[-1])
+        return (0, '')
+
+
+class Backend:
+    ''' Backend (see hmc.newBackend) that answers the commands of a client
+        from the shared Fleet, with the latency of the config.
+
+        Args:
+          client (hmc.HMCClient): the client of the host.
+    '''
+
+    def __init__(self, client):
+        self.client = client
+        self.fleet = get()
+
+    def execute(self, cmd, timeout):
+        ''' Run the command. Returns (status, output, timed_out). '''
+
+        latency = self.fleet.latency(self.client.kind, cmd)
+        if timeout > 0 and latency > timeout:
+            time.sleep(timeout)
+            return (-1, '', True)
+        status, output = self.fleet.execute(self.client.kind, self.client.host, cmd)
+        time.sleep(latency)
+        return (status, output, False)
+
+
+def install():
+    ''' Replace the systems, virtual switches, NIM servers (and the HMCs if
+        many) of the config by the ones of the shared Fleet.
+    '''
+
+    fleet = get()
+    if fleet.hmcs:
+        config.hmcserver = fleet.hmcs[0]
+        config.hmcservers = fleet.hmcs[1:]
+    config.systems = fleet.systems()
+    config.virtual_switches = sorted(vswitches.keys())
+    config.nimservers = fleet.nimservers()
+
+
+# the fleet is shared by all the modules in the process
+fleet = None
+fleet_lock = threading.Lock()
+
+def get():
+    ''' Returns the shared Fleet (generated on the first call). '''
+
+    global fleet
+    fleet_lock.acquire()
+    try:
+        if fleet is None:
+            fleet = Fleet()
+        return fleet
+    finally:
+        fleet_lock.release()
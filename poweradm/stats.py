@@ -0,0 +1,375 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+PowerAdm
+stats.py
+
+Copyright (c) 2016 Kairo Araujo
+
+It was created for personal use. There are no guarantees of the author.
+Use at your own risk.
+
+Permission to use, copy, modify, and distribute this software for any
+purpose with or without fee is hereby granted, provided that the above
+copyright notice and this permission notice appear in all copies.
+
+THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+IBM, Power, PowerVM (a.k.a. VIOS) are registered trademarks of IBM Corporation in
+the United States, other countries, or both.
+VMware, vCenter, vCenter Orchestrator are registered trademarks of VWware Inc in the United
+States, other countries, or both.
+'''
+
+# Imports
+###############################################################################################
+import os
+import re
+import sys
+import time
+import json
+import fcntl
+import tempfile
+import threading
+import config
+import cachefile
+##############################################################################################
+#
+# Command statistics
+#
+# All the commands to HMC, VIOS (viosvrcmd) and NIM are recorded here
+# (record()) with the time and the bytes returned. The statistics are kept
+# by command verb, HMC (or NIM server), frame and VIOS, with a histogram of
+# the latency, and added to data/stats.json at the end of each operation.
+#
+# The top level operations (mkID, tblpar, change, ...) are measured by
+# Operation: the commands of the thread of the operation (and of the
+# threads started by parallel.pmap, changeplan and the cache updates) are
+# counted on it and a summary is printed (stderr) at the end.
+##############################################################################################
+
+# upper limit (seconds) of each bucket of the histograms
+buckets = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300]
+
+# dimensions of the statistics
+dimensions = ['verb', 'target', 'frame', 'vios']
+
+re_frame = re.compile(r'-m\s+(\S+)')
+re_vios = re.compile(r'viosvrcmd\s.*-p\s+(\S+)')
+re_vios_cmd = re.compile(r"-c\s+['\"]+([^\s'\"]+)")
+
+
+def describe(cmd):
+    ''' Returns (verb, frame, vios) of a command. The verb of viosvrcmd
+        is 'viosvrcmd <VIOS command>'. Batches (many commands with ';') are
+        described by the first command.
+    '''
+
+    first = cmd.split(';')[0].strip()
+    if first.startswith('echo ') and ';' in cmd:
+        first = cmd.split(';')[1].strip()
+    words = first.split()
+    if words[:1] == ['sudo']:
+        words = words[1:]
+    if not words:
+        return ('', '', '')
+    verb = words[0]
+
+    frame = ''
+    vios = ''
+    match = re_frame.search(first)
+    if match is not None:
+        frame = match.group(1)
+    match = re_vios.search(first)
+    if match is not None:
+        vios = match.group(1)
+        match = re_vios_cmd.search(first)
+        if match is not None:
+            verb = '%s %s' % (verb, match.group(1))
+    if first != cmd.strip():
+        verb = '%s (batch)' % (verb)
+    return (verb, frame, vios)
+
+
+def newAggregate():
+    ''' Returns an empty aggregate of commands. '''
+
+    return {'count': 0, 'errors': 0, 'time': 0.0, 'max': 0.0, 'bytes': 0,
+            'histogram': [0] * (len(buckets) + 1)}
+
+
+def addAggregate(aggregate, count, errors, elapsed, max_elapsed, nbytes, histogram):
+    ''' Add values to an aggregate. '''
+
+    aggregate['count'] += count
+    aggregate['errors'] += errors
+    aggregate['time'] += elapsed
+    aggregate['max'] = max(aggregate['max'], max_elapsed)
+    aggregate['bytes'] += nbytes
+    for index in range(len(histogram)):
+        aggregate['histogram'][index] += histogram[index]
+
+
+def bucket(elapsed):
+    ''' Returns the index of the histogram bucket of the elapsed time. '''
+
+    for index in range(len(buckets)):
+        if elapsed <= buckets[index]:
+            return index
+    return len(buckets)
+
+
+class Operation:
+    ''' A top level operation (mkID, tblpar, change, ...).
+
+        Args:
+          name (str): the name of the operation.
+          summary (bool): print the summary at end() (config.stats_summary).
+    '''
+
+    def __init__(self, name, summary=None):
+        if summary is None:
+            summary = config.stats_summary == 'enable'
+        self.name = name
+        self.summary = summary
+        self.start = time.time()
+        self.calls = {}
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.parent = current()
+        setCurrent(self)
+
+    def add(self, verb, elapsed, nbytes=0):
+        ''' Count a command (and the bytes returned) on the operation. '''
+
+        self.lock.acquire()
+        try:
+            count, total = self.calls.get(verb, (0, 0.0))
+            self.calls[verb] = (count + 1, total + elapsed)
+            self.bytes += nbytes
+        finally:
+            self.lock.release()
+
+    def end(self):
+        ''' End the operation: print the summary and save the statistics. '''
+
+        elapsed = time.time() - self.start
+        setCurrent(self.parent)
+
+        count = 0
+        total = 0.0
+        for verb_count, verb_total in self.calls.values():
+            count += verb_count
+            total += verb_total
+
+        if self.summary:
+            # the verbs with more time first
+            verbs = []
+            for verb in sorted(self.calls.keys(), key=lambda verb: -self.calls[verb][1]):
+                verbs.append('%s %s/%.2fs' % (verb, self.calls[verb][0], self.calls[verb][1]))
+            detail = ''
+            if verbs:
+                detail = ' (%s)' % (', '.join(verbs))
+            sys.stderr.write('[%s] %s commands, %.2fs on commands, %.2fs total%s\n' %
+                             (self.name, count, total, elapsed, detail))
+
+        get().operation(self.name, elapsed, count, total)
+        get().save()
+
+
+# operation of each thread
+local = threading.local()
+
+# other values of the thread propagated by bind(): [(threading.local, attribute)]
+# (ex: the output captured by the API daemon)
+thread_values = []
+
+def current():
+    ''' Returns the Operation of this thread or None. '''
+
+    return getattr(local, 'operation', None)
+
+
+def setCurrent(operation):
+    ''' Set the Operation of this thread. '''
+
+    local.operation = operation
+
+
+def bind(function):
+    ''' Returns the function running with the Operation of this thread (to
+        run it on other threads).
+    '''
+
+    operation = current()
+    values = [getattr(thread_local, attr, None) for thread_local, attr in thread_values]
+    def bound(*args, **kw):
+        old = current()
+        old_values = [getattr(thread_local, attr, None) for thread_local, attr in thread_values]
+        setCurrent(operation)
+        for (thread_local, attr), value in zip(thread_values, values):
+            setattr(thread_local, attr, value)
+        try:
+            return function(*args, **kw)
+        finally:
+            setCurrent(old)
+            for (thread_local, attr), value in zip(thread_values, old_values):
+                setattr(thread_local, attr, value)
+    return bound
+
+
+class Stats:
+    ''' Statistics of the commands of this process, added to the file on save().
+
+        Args:
+          filename (str): the statistics file (default data/stats.json).
+    '''
+
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = '%s/poweradm/data/stats.json' % (config.pahome)
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        ''' Clean the statistics not saved. '''
+
+        self.commands = {}
+        for dimension in dimensions:
+            self.commands[dimension] = {}
+        self.operations = {}
+
+    def record(self, kind, target, cmd, elapsed, nbytes=0, status=0):
+        ''' Record a command.
+
+            Args:
+              kind (str): 'hmc' or 'nim'.
+              target (str): the HMC or NIM server.
+              cmd (str): the command.
+              elapsed (float): time in seconds.
+              nbytes (int): bytes returned.
+              status (int): exit status.
+        '''
+
+        verb, frame, vios = describe(cmd)
+        if kind != 'hmc':
+            verb = '%s %s' % (kind, verb)
+        keys = {'verb': verb, 'target': target, 'frame': frame, 'vios': vios}
+
+        histogram = [0] * (len(buckets) + 1)
+        histogram[bucket(elapsed)] = 1
+        self.lock.acquire()
+        try:
+            for dimension in dimensions:
+                if keys[dimension] == '':
+                    continue
+                aggregate = self.commands[dimension].setdefault(keys[dimension], newAggregate())
+                addAggregate(aggregate, 1, int(status != 0), elapsed, elapsed, nbytes, histogram)
+        finally:
+            self.lock.release()
+
+        # the command is counted on the operation and on its parents
+        operation = current()
+        while operation is not None:
+            operation.add(verb, elapsed, nbytes)
+            operation = operation.parent
+
+    def operation(self, name, elapsed, count, total):
+        ''' Record an operation. '''
+
+        self.lock.acquire()
+        try:
+            aggregate = self.operations.setdefault(name, {'count': 0, 'time': 0.0, 'commands': 0,
+                                                          'commands_time': 0.0})
+            aggregate['count'] += 1
+            aggregate['time'] += elapsed
+            aggregate['commands'] += count
+            aggregate['commands_time'] += total
+        finally:
+            self.lock.release()
+
+    def load(self):
+        ''' Returns the statistics of the file. '''
+
+        try:
+            f_stats = open(self.filename, 'r')
+            try:
+                return cachefile.decode(json.load(f_stats))
+            finally:
+                f_stats.close()
+        except (IOError, ValueError):
+            saved = {'since': time.time(), 'commands': {}, 'operations': {}}
+            for dimension in dimensions:
+                saved['commands'][dimension] = {}
+            return saved
+
+    def save(self):
+        ''' Add the statistics of this process to the file (with lock, many
+            processes can save) and clean them.
+        '''
+
+        if config.stats != 'enable':
+            return
+
+        self.lock.acquire()
+        try:
+            f_lock = open('%s.lock' % (self.filename), 'a')
+            fcntl.flock(f_lock.fileno(), fcntl.LOCK_EX)
+            try:
+                saved = self.load()
+                for dimension in dimensions:
+                    for key, aggregate in self.commands[dimension].items():
+                        addAggregate(saved['commands'][dimension].setdefault(key, newAggregate()),
+                                     aggregate['count'], aggregate['errors'], aggregate['time'],
+                                     aggregate['max'], aggregate['bytes'], aggregate['histogram'])
+                for name, aggregate in self.operations.items():
+                    saved_aggregate = saved['operations'].setdefault(name, {'count': 0, 'time': 0.0,
+                                                                            'commands': 0, 'commands_time': 0.0})
+                    for field in aggregate.keys():
+                        saved_aggregate[field] += aggregate[field]
+                saved['time'] = time.time()
+
+                fd, tmp_file = tempfile.mkstemp(prefix='.stats.', dir=os.path.dirname(self.filename))
+                f_stats = os.fdopen(fd, 'w')
+                json.dump(saved, f_stats, indent=1, sort_keys=True)
+                f_stats.close()
+                os.rename(tmp_file, self.filename)
+            finally:
+                fcntl.flock(f_lock.fileno(), fcntl.LOCK_UN)
+                f_lock.close()
+            self.reset()
+        except (IOError, OSError):
+            # the statistics can't stop the PowerAdm
+            pass
+        finally:
+            self.lock.release()
+
+
+def record(kind, target, cmd, elapsed, nbytes=0, status=0):
+    ''' Record a command on the shared Stats (see Stats.record). '''
+
+    get().record(kind, target, cmd, elapsed, nbytes, status)
+
+
+# the statistics are shared by all the modules in the process
+stats = None
+stats_lock = threading.Lock()
+
+def get():
+    ''' Returns the shared Stats. '''
+
+    global stats
+    stats_lock.acquire()
+    try:
+        if stats is None:
+            stats = Stats()
+        return stats
+    finally:
+        stats_lock.release()
@@ -35,6 +35,7 @@ import globalvar
 import systemvios
 import config
 import lsnpivs
+import hmc
 ##############################################################################################
 
 class TBEnv:
@@ -56,14 +57,14 @@ class TBEnv:
         print ('# \033[94m %s \033[1;00m - Check SEA configuration and state' % netvios1)
         print ('\033[94m#\033[1;00m' * 80)
 
-        os.system("ksh %s/poweradm/tools/lsseas -c %s %s %s all" % (config.pahome, config.hmcserver, system, netvios1))
+        os.system("ksh %s/poweradm/tools/lsseas -c %s %s %s all" % (config.pahome, hmc.route(system), system, netvios1))
 
   	print ('\n\n')
 	print ('\033[94m#\033[1;00m' * 80)
         print ('# \033[94m %s \033[1;00m - Check SEA configuration and state' % netvios2)
         print ('\033[94m#\033[1;00m' * 80)
 
-        os.system("ksh %s/poweradm/tools/lsseas -c %s %s %s all" % (config.pahome, config.hmcserver, system, netvios2))
+        os.system("ksh %s/poweradm/tools/lsseas -c %s %s %s all" % (config.pahome, hmc.route(system), system, netvios2))
 
     def lsnpivs(self):
         ''' Text menu to select system and run lsnpivs (NPIV Troubleshooting). '''
@@ -76,12 +77,15 @@ class TBEnv:
         vios1 = vios.getVio1()
         vios2 = vios.getVio2()
 
+        # collect the two VIOS at the same time
+        npiv_vios1, npiv_vios2 = lsnpivs.collectVIOS(hmc.route(system), system, [vios1, vios2], 'all')
+
   	print ('\n\n')
 	print ('\033[94m#\033[1;00m' * 80)
         print ('# \033[94m %s \033[1;00m - Check NPIV configuration and state' % vios1)
         print ('\033[94m#\033[1;00m' * 80)
 
-	lsnpivs.run(config.hmcserver, system, vios1, 'all')
+	lsnpivs.render(npiv_vios1)
 
   	print ('\n\n')
 	print ('\033[94m#\033[1;00m' * 80)
@@ -89,7 +93,7 @@ class TBEnv:
         print ('\033[94m#\033[1;00m' * 80)
 
 
-	lsnpivs.run(config.hmcserver, system, vios2, 'all')
+	lsnpivs.render(npiv_vios2)
 
 
 
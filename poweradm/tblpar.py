@@ -25,342 +25,432 @@
  IBM, PowerVM (a.k.a. vios) are registered trademarks of IBM Corporation in
  the United States, other countries, or both.
 '''
+
 # Imports
 ###############################################################################################
-import time
-import os
-import commands
-import globalvar
+import subprocess
+import threading
 import systemvios
 import config
 import lsnpivs
+import hmc
+import viosmap
+import lparindex
+import parallel
+import stats
+##############################################################################################
+#
+# LPAR troubleshooting
+#
+# Each LPAR is diagnosed by an LPARDiagnostics, without globals or temporary
+# files: the sections (info, vscsi, vfc and vnet) are tasks that return
+# their output and run at the same time (they use different VIOS commands).
+# The vhosts and vfchosts of all the adapters come from one snapshot of the
+# mappings of each VIOS (lsmap -all and lsmap -all -npiv in one command).
+# Many LPARs can be diagnosed at once (diagnose()) on a bounded pool, a pool
+# per HMC, and the outputs are printed at the end in the order of the LPARs
+# and sections.
 ##############################################################################################
 
-# get all systems available in config
-list_system = systemvios.SystemVios()
-systems = list_system.getSystemList()
+# sections of each troubleshooting option (in the order of the output)
+tb_sections = {'all': ['info', 'vscsi', 'vfc', 'vnet'],
+               'info': ['info'],
+               'vscsi': ['info', 'vscsi'],
+               'vfc': ['info', 'vfc'],
+               'vnet': ['info', 'vnet']}
+
+# SEA not found to the VLAN
+sea_not_found = '\033[33mnot found\033[1;00m'
 
 
-def vscsi():
-    ''' Execute virtual SCSI troubleshooting for LPAR '''
+class LPARDiagnostics:
+    ''' Troubleshooting of an LPAR. The sections can run at the same time.
+
+        Args:
+          system (str): the system name (frame).
+          lpar_id (str): the LPAR ID.
+          lpar (dict): the LPAR found (lparindex), with 'profiles'.
+    '''
 
-    print "\n\033[94mSCSI\033[1;00m"
-    print "\033[94m----\033[1;00m"
+    def __init__(self, system, lpar_id, lpar):
+        self.system = system
+        self.lpar_id = lpar_id
+        self.lpar = lpar
+        self.profile = '\n'.join(lpar['profiles'])
+        self.client = hmc.getSystem(system)
+        self.outputs = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def once(self, key, function, *args):
+        ''' Returns function(*args), executed only once by the LPAR for the
+            key (the sections and adapters use the same output). Different
+            keys run at the same time.
+        '''
+
+        self.lock.acquire()
+        try:
+            key_lock = self.locks.setdefault(key, threading.Lock())
+        finally:
+            self.lock.release()
+
+        key_lock.acquire()
+        try:
+            if key not in self.outputs:
+                self.outputs[key] = function(*args)
+            return self.outputs[key]
+        finally:
+            key_lock.release()
+
+    def viosCmd(self, vios, vios_cmd):
+        ''' Returns the output of a VIOS command. '''
+
+        return self.once(('cmd', vios, vios_cmd), self.client.viosvrcmd, self.system, vios, vios_cmd)
+
+    def snapshot(self, vios):
+        ''' Returns the mappings of the server adapters of a VIOS
+            ({'vscsi': mappings, 'vfc': mappings}, see viosmap.parseMappings()),
+            collected with one command (lsmap -all and lsmap -all -npiv) for
+            all the adapters of the LPAR.
+        '''
+
+        return self.once(('snapshot', vios), viosmap.get(self.system, vios, self.client.host).refresh)
+
+    def section(self, name):
+        ''' Run a section (info, vscsi, vfc or vnet). Returns the output. '''
+
+        try:
+            return '\n'.join(getattr(self, name)())
+        except Exception, error:
+            # a section with error doesn't stop the others
+            return "\n\033[31mERROR on %s of LPAR %s: %s\033[1;00m" % (name, self.lpar_id, error)
+
+    def vscsi(self):
+        ''' Execute virtual SCSI troubleshooting for LPAR '''
+
+        out = []
+        out.append("\n\033[94mSCSI\033[1;00m")
+        out.append("\033[94m----\033[1;00m")
+
+        # get the information from profile with somes splits.
+        lpardata = self.profile.split('virtual_scsi_adapters')
+        lpardata_spl1 = lpardata[1].split('=')
+        lpardata_spl2 = lpardata_spl1[1].split('",')
+        lpar_vscsi = lpardata_spl2[0].split(',')
+        # verify if virtual scsi exists, if not output is a simple none,
+        # if exists get all informations
+        if lpar_vscsi[0] == 'none':
+            out.append(lpar_vscsi[0])
+            return out
 
-    # get the information from find_lpar with somes splits.
-    lpardata = find_lpar.split('virtual_scsi_adapters')
-    lpardata_spl1 = lpardata[1].split('=')
-    lpardata_spl2 = lpardata_spl1[1].split('",')
-    lpardata_spl3 = lpardata_spl2[0].split(',')
-    lpar_vscsi = lpardata_spl3
-    # verify if virtual scsi exists, if not output is a simple none,
-    # if exists get all informations
-    if lpar_vscsi[0] == 'none':
-        print lpar_vscsi[0]
-    else:
         # looping for all scsi
         for l_lpar_vscsi in lpar_vscsi:
             # specific case with one scsi
             if l_lpar_vscsi.startswith('"'):
                 break
             scsi_configs = l_lpar_vscsi.split('/')
-            print "+ C%s" % scsi_configs[0]
-            print "`.... VIOS: %s" % scsi_configs[3]
-            print "`.... VIOS adapter ID: %s" % scsi_configs[4]
-
-            # get vhost on VIOS
-    	    vhost = commands.getoutput("ssh -l poweradm %s viosvrcmd -m %s "
-                "-p %s -c \"\'lsmap -all\'\" | grep 'C%s ' | awk '{ print $1 }'" %
-                (config.hmcserver, system, scsi_configs[3], scsi_configs[4]))
-    	    print "`.... vhost: %s" % vhost
-
-            # get informations on vhost on VIOS and save on temporaly file
-    	    os.system("ssh -l poweradm %s viosvrcmd -m %s "
-                "-p %s -c \"\'lsmap -vadapter %s\'\" > /tmp/%s.lsmap.%s" %
-                (config.hmcserver, system, scsi_configs[3], vhost, system, lpar_id))
-
-            # open temp file to get VTD informations
-    	    with open("/tmp/%s.lsmap.%s" % (system, lpar_id )) as lsmap:
-     	        vtd_list = []
-                for l_lsmap in lsmap:
-                    if l_lsmap.startswith( 'VTD' ):
-                        new_vtd = l_lsmap.split()
-                        if new_vtd[1] == 'NO':
-                            break
-                        vtd_list.append(new_vtd[1])
-                if len(vtd_list) != 0:
-                    print "`.... VTD allocated list: %s " % (', '.join(vtd_list))
-                else:
-                    print "`.... VTD allocated list: none"
-
-            # open temp file to get Backing device informations
-    	    with open("/tmp/%s.lsmap.%s" % (system, lpar_id)) as lsmap:
-
-                backing_device_list = []
-                for l_lsmap in lsmap:
-
-                    if l_lsmap.startswith( 'Backing' ):
-                        new_backing_device = l_lsmap.split()
-
-                        # if Backing device is empty (as a vtopt) dont't try add on array
-                        if len(new_backing_device) > 2:
-                            backing_device_list.append(new_backing_device[2])
-
-                    # if Backing Device is empty without devices print none or the list
-                if len(backing_device_list) != 0:
-                    print "`.... Backing Device allocated list: %s \n" % (', '.join(backing_device_list))
-                else:
-                    print "`.... Backing Device allocated list: none\n"
-
-def vfc():
-    ''' Execute the virtual FC troubleshooting '''
-
-    print "\n\033[94mNPIV\033[1;00m"
-    print "\033[94m----\033[1;00m"
-
-
-    # get the information from find_lpar with somes splits.
-    lpardata = find_lpar.split('virtual_fc_adapters')
-    lpardata_spl1 = lpardata[1].split('"""')
-    lpardata_spl2 = lpardata_spl1[0].split('=""')
-    try:
-        lpar_fcs = lpardata_spl2[1].split('"",""')
-    except(IndexError):
-        print "LPAR withtout FC/HBA"
-        exit()
-    len_lpar_fcs = len(lpar_fcs)-1
-    count = 0
-    # check all fcs existent on LPAR
-    while count <= len_lpar_fcs:
-        fcs_configs = lpar_fcs[count].split('/')
-        print "+ C%s" % fcs_configs[0]
-        print "`.... WWNS (active,inactive): %s" % fcs_configs[5]
-        print "`.... VIOS: %s" % fcs_configs[3]
-        print "`.... VIOS adapter ID: %s" % fcs_configs[4]
-
-        # get the vfchost on VIOS
-        vfchost = commands.getoutput("ssh -l poweradm %s viosvrcmd -m %s "
-                "-p %s -c \"\'lsmap -all -npiv\'\" | grep 'C%s ' | awk '{ print $1 }'" %
-                (config.hmcserver, system, fcs_configs[3], fcs_configs[4]))
-
-        # get the vfchost informations on VIOS and put on temp file
-        print "`.... vfchost: %s" % vfchost
-        os.system("ssh -l poweradm %s viosvrcmd -m %s "
-                "-p %s -c \"\'lsmap -npiv -vadapter %s\'\" > /tmp/%s.lsmap.npiv.%s" %
-                (config.hmcserver, system, fcs_configs[3], vfchost, system, lpar_id))
-
-        # open the temp file with vfchost informations
-        with open("/tmp/%s.lsmap.npiv.%s" % (system, lpar_id)) as lsmap_npiv:
-            for l_lsmap_npiv in lsmap_npiv:
-                if l_lsmap_npiv.startswith('Status'):
-                    fc_status = l_lsmap_npiv.split(':')
-                    if fc_status[1] == 'LOGGED_IN\n':
-                        fc_status = ("\033[32m%s\033[1;00m" % fc_status[1].replace('\n',''))
-                    else:
-                        fc_status = ("\033[31m%s\033[1;00m" % fc_status[1].replace('\n',''))
-
-                # get the fcp (physical FC) used by LPAR
-                elif l_lsmap_npiv.startswith('FC name'):
-                    l_lsmap_npiv_spl1 = l_lsmap_npiv.split()
-                    fcp = l_lsmap_npiv_spl1[1].split(':')
-                    # if empty put none
-                    if fcp[1] == '':
-                        fcp[1] = ("\033[31mnone\033[1;00m")
-                # get number of paths for this vfchost
-                elif l_lsmap_npiv.startswith('Ports logged in'):
-                    num_ports_logged = l_lsmap_npiv.split(':')
-                    num_ports_logged =  num_ports_logged[1].replace('\n','')
+            out.append("+ C%s" % scsi_configs[0])
+            out.append("`.... VIOS: %s" % scsi_configs[3])
+            out.append("`.... VIOS adapter ID: %s" % scsi_configs[4])
+
+            # get vhost on VIOS (the snapshot of the mappings of the VIOS)
+            mapping = self.snapshot(scsi_configs[3])['vscsi'].get(scsi_configs[4])
+            if mapping is None:
+                mapping = {'adapter': '', 'vtds': []}
+            out.append("`.... vhost: %s" % mapping['adapter'])
+
+            # VTD informations
+            vtd_list = [vtd['vtd'] for vtd in mapping['vtds']]
+            if len(vtd_list) != 0:
+                out.append("`.... VTD allocated list: %s " % (', '.join(vtd_list)))
+            else:
+                out.append("`.... VTD allocated list: none")
+
+            # Backing device informations
+            # if Backing device is empty (as a vtopt) dont't try add on array
+            backing_device_list = [vtd['backing'] for vtd in mapping['vtds'] if vtd['backing']]
+
+            # if Backing Device is empty without devices print none or the list
+            if len(backing_device_list) != 0:
+                out.append("`.... Backing Device allocated list: %s \n" % (', '.join(backing_device_list)))
+            else:
+                out.append("`.... Backing Device allocated list: none\n")
+
+        return out
+
+    def vfc(self):
+        ''' Execute the virtual FC troubleshooting '''
+
+        out = []
+        out.append("\n\033[94mNPIV\033[1;00m")
+        out.append("\033[94m----\033[1;00m")
+
+        # get the information from profile with somes splits.
+        lpardata = self.profile.split('virtual_fc_adapters')
+        lpardata_spl1 = lpardata[1].split('"""')
+        lpardata_spl2 = lpardata_spl1[0].split('=""')
+        try:
+            lpar_fcs = lpardata_spl2[1].split('"",""')
+        except(IndexError):
+            out.append("LPAR withtout FC/HBA")
+            return out
+
+        # check all fcs existent on LPAR
+        for lpar_fc in lpar_fcs:
+            fcs_configs = lpar_fc.split('/')
+            out.append("+ C%s" % fcs_configs[0])
+            out.append("`.... WWNS (active,inactive): %s" % fcs_configs[5])
+            out.append("`.... VIOS: %s" % fcs_configs[3])
+            out.append("`.... VIOS adapter ID: %s" % fcs_configs[4])
+
+            # get the vfchost on VIOS (the snapshot of the mappings of the VIOS)
+            mapping = self.snapshot(fcs_configs[3])['vfc'].get(fcs_configs[4])
+            if mapping is None:
+                mapping = {'adapter': '', 'status': 'unknown', 'fc_name': '', 'ports_logged': ''}
+            out.append("`.... vfchost: %s" % mapping['adapter'])
+
+            # the vfchost status
+            if mapping['status'] == 'LOGGED_IN':
+                fc_status = ("\033[32m%s\033[1;00m" % mapping['status'])
+            else:
+                fc_status = ("\033[31m%s\033[1;00m" % mapping['status'])
+
+            # get the fcp (physical FC) used by LPAR, if empty put none
+            fcp = ['FC name', mapping['fc_name'] or "\033[31mnone\033[1;00m"]
+            # get number of paths for this vfchost
+            num_ports_logged = mapping['ports_logged']
 
             # output informations
-            print "`.... VIOS Physical Adapter: %s" % fcp[1]
-            print "`.... Client FC status %s" % fc_status
-            print "`.... Number of ports logged in: %s" % num_ports_logged
+            out.append("`.... VIOS Physical Adapter: %s" % fcp[1])
+            out.append("`.... Client FC status %s" % fc_status)
+            out.append("`.... Number of ports logged in: %s" % num_ports_logged)
 
-            print "\n\033[94mVerify NPIV state\033[1;00m"
-            print "\033[94m------ ---- -----\033[1;00m"
-            print ("Checking the NPIV \033[36m%s\033[1;00m state on VIO \033[36m%s\033[1;00m" %
-                  (fcp[1], fcs_configs[3]))
+            out.append("\n\033[94mVerify NPIV state\033[1;00m")
+            out.append("\033[94m------ ---- -----\033[1;00m")
+            out.append("Checking the NPIV \033[36m%s\033[1;00m state on VIO \033[36m%s\033[1;00m" %
+                       (fcp[1], fcs_configs[3]))
 
             # run lsnpiv on specific NPIV interface
             if fcp[1] != '\033[31mnone\033[1;00m':
-                 lsnpivs.run(config.hmcserver, system, fcs_configs[3], fcp[1])
-
+                lsnpivs.render(lsnpivs.collect(self.client.host, self.system, fcs_configs[3], fcp[1]),
+                               out.append)
             else:
-                 print ("\n\033[31mDon't have connection to NPIV on VIO \033[36m%s\033[1;00m\n" % (fcs_configs[3]))
-        count += 1
-
-def vnet():
-    ''' Execute virtual Network troubleshooting for LPAR '''
-
-    print "\n\033[94mNetwork\033[1;00m"
-    print "\033[94m-------\033[1;00m\n"
-
-    # get the ethernet configurations
-    # it's necessary some splits here
-    lpardata = find_lpar.split('virtual_eth_adapters')
-    lpardata_spl1 = lpardata[1].split('=')
-    lpardata_spl2 =  lpardata_spl1[1].split('",')
-    lpar_eths = lpardata_spl2[0].split(',')
-    vsw = '' # it's used to check if is the same VSW, if it's don't print again the SEA status, unecessary.
-    # looping to get ethernet informations
-    for l_lpar_eths in lpar_eths:
-        # lpar with one ethernet, with fc and scsi the second valus is "virtual_fc_adapters
-        if l_lpar_eths.startswith('"'):
-            break
-        eth_configs = l_lpar_eths.split('/')
-
-        print "+ C%s" % eth_configs[0]
-        print "`.... VLAN: %s" % eth_configs[2]
-        print "`.... VIRTUAL SWITCH: %s" % eth_configs[6]
+                out.append("\n\033[31mDon't have connection to NPIV on VIO \033[36m%s\033[1;00m\n" %
+                           (fcs_configs[3]))
+
+        return out
+
+    def lsseas(self, vios, sea):
+        ''' Returns the output of the lsseas (SEA status) of a SEA. '''
+
+        try:
+            proc = subprocess.Popen(['ksh', '%s/poweradm/tools/lsseas' % (config.pahome), '-c',
+                                     self.client.host, self.system, vios, sea],
+                                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        except OSError, error:
+            return 'lsseas: %s' % (error)
+        return proc.communicate()[0].rstrip('\n')
+
+    def vnet(self):
+        ''' Execute virtual Network troubleshooting for LPAR '''
+
+        out = []
+        out.append("\n\033[94mNetwork\033[1;00m")
+        out.append("\033[94m-------\033[1;00m\n")
+
+        # get the ethernet configurations
+        # it's necessary some splits here
+        lpardata = self.profile.split('virtual_eth_adapters')
+        lpardata_spl1 = lpardata[1].split('=')
+        lpardata_spl2 = lpardata_spl1[1].split('",')
+        lpar_eths = lpardata_spl2[0].split(',')
+        vsw = '' # it's used to check if is the same VSW, if it's don't print again the SEA status, unecessary.
         net_vio = systemvios.SystemVios()
-        # sea array
-        seas = []
-        # looping to get SEAS on the VIOS
-        for l_net_vios in (net_vio.returnNetVio1(system), net_vio.returnNetVio2(system)):
-            find_sea_vio = commands.getoutput("ssh -l poweradm %s viosvrcmd -m %s -p %s "
-                           "-c \"\'lsdev -type adapter\'\" | grep \'Shared Ethernet Adapter\' | awk \'{ print $1 }\'" %
-                           (config.hmcserver, system, l_net_vios))
-            # looping to check de VSW and VLAN on SEA
-            find_sea_vio_data = find_sea_vio.split()
-            for l_find_sea_vio in find_sea_vio_data:
-                find_vsw = commands.getoutput("ssh -l poweradm %s viosvrcmd -m %s "
-                        "-p %s -c \"\'entstat -all %s\'\" | grep -E \'%s|^    ent\'" %
-                        (config.hmcserver, system, l_net_vios, l_find_sea_vio, eth_configs[6]))
-                # found sea add in seas list
-                if eth_configs[2] in find_vsw:
-                    seas.append(l_find_sea_vio)
-
-
-        print ("`.... VIOS(SEA): %s(%s), %s(%s)\n" % (net_vio.returnNetVio1(system), seas[0], net_vio.returnNetVio2(system), seas[1]))
-
-        print "\033[94mSEA status\033[1;00m"
-        print "\033[94m--- ------\033[1;00m\n"
-
-        # use the lsseas to check SEA status
-        if vsw != eth_configs[6]:
-
-            print ("Checking the \033[36m%s\033[1;00m on VIOS \033[36m%s\033[1;00m ...\n" % ( seas[0], net_vio.returnNetVio1(system)))
-
-	    if seas[0] == '\033[33mnot found\033[1;00m':
-	        print ('Please check maanual, I cant found the specific SEA for VLAN')
-            else:
-                os.system ("ksh %s/poweradm/tools/lsseas -c %s %s %s %s" %
-                        (config.pahome, config.hmcserver, system, net_vio.returnNetVio1(system), seas[0]))
-
-            print ("\nChecking the \033[36m%s\033[1;00m on VIOS \033[36m%s\033[1;00m ...\n" % ( seas[1], net_vio.returnNetVio2(system)))
+        net_vios = [net_vio.returnNetVio1(self.system), net_vio.returnNetVio2(self.system)]
 
-	    if seas[1] == '\033[33mnot found\033[1;00m':
-	        print ('Please check maanual, I cant found the specific SEA for VLAN')
+        # looping to get ethernet informations
+        for l_lpar_eths in lpar_eths:
+            # lpar with one ethernet, with fc and scsi the second valus is "virtual_fc_adapters
+            if l_lpar_eths.startswith('"'):
+                break
+            eth_configs = l_lpar_eths.split('/')
+
+            out.append("+ C%s" % eth_configs[0])
+            out.append("`.... VLAN: %s" % eth_configs[2])
+            out.append("`.... VIRTUAL SWITCH: %s" % eth_configs[6])
+
+            # SEA of the VLAN on each network VIOS
+            seas = []
+            for l_net_vios in net_vios:
+                sea = sea_not_found
+                for l_lsdev in self.viosCmd(l_net_vios, 'lsdev -type adapter').split('\n'):
+                    if 'Shared Ethernet Adapter' not in l_lsdev:
+                        continue
+                    l_find_sea_vio = l_lsdev.split()[0]
+                    # check de VSW and VLAN on SEA
+                    find_vsw = []
+                    for l_entstat in self.viosCmd(l_net_vios, 'entstat -all %s' % l_find_sea_vio).split('\n'):
+                        if eth_configs[6] in l_entstat or l_entstat.startswith('    ent'):
+                            find_vsw.append(l_entstat)
+                    if eth_configs[2] in '\n'.join(find_vsw):
+                        sea = l_find_sea_vio
+                        break
+                seas.append(sea)
+
+            out.append("`.... VIOS(SEA): %s(%s), %s(%s)\n" % (net_vios[0], seas[0], net_vios[1], seas[1]))
+
+            out.append("\033[94mSEA status\033[1;00m")
+            out.append("\033[94m--- ------\033[1;00m\n")
+
+            # use the lsseas to check SEA status
+            if vsw != eth_configs[6]:
+                for index in range(2):
+                    out.append("%sChecking the \033[36m%s\033[1;00m on VIOS \033[36m%s\033[1;00m ...\n" %
+                               (['', '\n'][index], seas[index], net_vios[index]))
+                    if seas[index] == sea_not_found:
+                        out.append('Please check maanual, I cant found the specific SEA for VLAN')
+                    else:
+                        out.append(self.lsseas(net_vios[index], seas[index]))
+                out.append("\n")
             else:
-                os.system ("ksh %s/poweradm/tools/lsseas -c %s %s %s %s" %
-                        (config.pahome, config.hmcserver, system, net_vio.returnNetVio2(system), seas[1]))
+                out.append("\n This SEA has the same configuration of the last adapter.\n")
+            vsw = eth_configs[6]
 
-            print ("\n")
+        return out
+
+    def info(self):
+        ''' Get basic informations of LPAR '''
+
+        out = []
+        lpar_name = self.lpar['name']
+        lpar_id = self.lpar_id
+        sharing_mode = lpar_ent_cpu = min_proc_units = max_proc_units = ''
+        desired_procs = min_procs = max_procs = desired_mem = max_mem = min_mem = ''
+
+        # get some informations about lpar
+        for l_lpardata in self.profile.split(','):
+            lpar_info = l_lpardata.split('=')
+
+            # lpar name
+            if lpar_info[0] == 'lpar_name':
+                lpar_name = lpar_info[1]
+
+            # lpar id
+            elif lpar_info[0] == 'lpar_id':
+                lpar_id = lpar_info[1]
+
+            # sharing mode of cpu (capped/uncapped)
+            elif lpar_info[0] == 'sharing_mode':
+                sharing_mode = lpar_info[1]
+
+            # entitled cpu
+            elif lpar_info[0] == 'desired_proc_units':
+                lpar_ent_cpu = lpar_info[1]
+            elif lpar_info[0] == 'min_proc_units':
+                min_proc_units = lpar_info[1]
+            elif lpar_info[0] == 'max_proc_units':
+                max_proc_units = lpar_info[1]
+
+            # virtual processor
+            elif lpar_info[0] == 'desired_procs':
+                desired_procs = lpar_info[1]
+            elif lpar_info[0] == 'min_procs':
+                min_procs = lpar_info[1]
+            elif lpar_info[0] == 'max_procs':
+                max_procs = lpar_info[1]
+
+            # memory
+            elif lpar_info[0] == 'desired_mem':
+                desired_mem = lpar_info[1]
+            elif lpar_info[0] == 'max_mem':
+                max_mem = lpar_info[1]
+            elif lpar_info[0] == 'min_mem':
+                min_mem = lpar_info[1]
+
+        lpar_status_data = self.client.getoutput("lssyscfg -m %s -r lpar -F state:rmc_state:boot_mode:curr_profile "
+                                                 "--filter lpar_names=%s" % (self.system, lpar_name))
+
+        lpar_status = (lpar_status_data.split(':') + ['', '', '', ''])[:4]
+        # lpar status
+        lpar_state = lpar_status[0]
+
+        if lpar_state == 'Running':
+            lpar_state = ("\033[32m%s\033[1;00m" % lpar_state)
+        else:
+            lpar_state = ("\033[31m%s\033[1;00m" % lpar_state)
+        lpar_rmc = lpar_status[1]
 
+        # lpar hmc(dlpar) satus
+        if lpar_rmc == 'active':
+            lpar_rmc = ("\033[32m%s\033[1;00m" % lpar_rmc)
         else:
-            print ("\n This SEA has the same configuration of the last adapter.\n")
-            vsw = eth_configs[6]
+            lpar_rmc = ("\033[31m%s\033[1;00m" % lpar_rmc)
 
+        # lpar boot mode
+        lpar_boot_mode = lpar_status[2]
+        if lpar_boot_mode == 'norm':
+            lpar_boot_mode = ("\033[32mNormal\033[1;00m")
+        else:
+            lpar_boot_mode = ("\033[31m%s\033[1;00m" % lpar_boot_mode)
 
-def info():
-    ''' Get basic informations of LPAR '''
-
-    # get some informations about lpar
-    lpardata = find_lpar.split(',')
-    for l_lpardata in lpardata:
-        lpar_info = l_lpardata.split('=')
-
-        # lpar name
-        if lpar_info[0] in ('lpar_name'):
-    	    lpar_name = lpar_info[1]
-
-	# lpar id
-	if lpar_info[0] in ('lpar_id'):
-            lpar_id = lpar_info[1]
-
-        # sharing mode of cpu (capped/uncapped)
-        if lpar_info[0] in ('sharing_mode'):
-            sharing_mode = lpar_info[1]
-
-        # entitled cpu
-        elif lpar_info[0] in ('desired_proc_units'):
-        	lpar_ent_cpu = lpar_info[1]
-        elif lpar_info[0] in ('min_proc_units'):
-        	min_proc_units = lpar_info[1]
-        elif lpar_info[0] in ('max_proc_units'):
-        	max_proc_units = lpar_info[1]
-
-        # virtual processor
-        elif lpar_info[0] in ('desired_procs'):
-        	desired_procs = lpar_info[1]
-        elif lpar_info[0] in ('min_procs'):
-        	min_procs = lpar_info[1]
-        elif lpar_info[0] in ('max_procs'):
-        	max_procs = lpar_info[1]
-
-        # memory
-        elif lpar_info[0] in ('desired_mem'):
-        	desired_mem = lpar_info[1]
-        elif lpar_info[0] in ('max_mem'):
-        	max_mem = lpar_info[1]
-        elif lpar_info[0] in ('min_mem'):
-        	min_mem = lpar_info[1]
-
-        # vscsi
-        elif lpar_info[0] in ('virtual_scsi_adapters'):
-        	virtual_scsi_adapters = lpar_info[1]
-
-    lpar_status_data = commands.getoutput("ssh -l poweradm %s lssyscfg -m %s -r lpar -F state:rmc_state:boot_mode:curr_profile --filter lpar_names=%s" %
-            (config.hmcserver, system, lpar_name))
-
-    lpar_status = lpar_status_data.split(':')
-    # lpar status
-    lpar_state = lpar_status[0]
-
-    if lpar_state == 'Running':
-        lpar_state = ("\033[32m%s\033[1;00m" % lpar_state)
-    else:
-        lpar_state = ("\033[31m%s\033[1;00m" % lpar_state)
-    lpar_rmc = lpar_status[1]
-
-    # lpar hmc(dlpar) satus
-    if lpar_rmc == 'active':
-        lpar_rmc = ("\033[32m%s\033[1;00m" % lpar_rmc)
-    else:
-        lpar_rmc = ("\033[31m%s\033[1;00m" % lpar_rmc)
-
-    # lpar boot mode
-    lpar_boot_mode = lpar_status[2]
-    if lpar_boot_mode == 'norm':
-        lpar_boot_mode = ("\033[32mNormal\033[1;00m")
-    else:
-        lpar_boot_mode = ("\033[31m%s\033[1;00m" % lpar_boot_mode)
-
-    lpar_curr_profile = lpar_status[3]
-
-    print "\n\n"
-    print "\033[94m#\033[1;00m" * 84
-    print ("\033[94m# LPAR NAME: %s - ID: %s - getting LPAR information and state\033[1;00m" % (lpar_name, lpar_id))
-    print "\033[94m#\033[1;00m" * 84
-
-    print ("\n+ LPAR NAME: %s\t| Current Profile: %s\n+ Host Server: %s" % (lpar_name, lpar_curr_profile, system))
-    print ("+ LPAR Status")
-    print ("`.... Current Status: %s\n`.... RMC Status (DLPAR): %s\n`.... Boot Mode: %s\n" % (lpar_state, lpar_rmc, lpar_boot_mode))
-
-    print "\033[94mConfiguration\033[1;00m"
-    print "\033[94m-\033[1;00m" * 84
-
-    print "+ ID: %s\n" % lpar_id
-    print "+ CPU Sharing Mode: %s\n" % sharing_mode
-    print "+ Virtual CPU: %s" % desired_procs
-    print "`.... Min Virtual CPU (DLPAR): %s" % min_procs
-    print "`.... Max Virtual CPU (DLPAR): %s\n" % max_procs
-    print "+ Entitled CPU: %s " % lpar_ent_cpu
-    print "`.... Min Entitled CPU (DLPAR): %s" % min_proc_units
-    print "`.... Max Entitled CPU (DLPAR): %s\n" % max_proc_units
-    print "+ Memory: %s " % desired_mem
-    print "`.... Min Memory (DLPAR): %s" % min_mem
-    print "`.... Max Memory (DLPAR): %s\n" % max_mem
+        lpar_curr_profile = lpar_status[3]
+
+        out.append("\n\n")
+        out.append("\033[94m#\033[1;00m" * 84)
+        out.append("\033[94m# LPAR NAME: %s - ID: %s - getting LPAR information and state\033[1;00m" %
+                   (lpar_name, lpar_id))
+        out.append("\033[94m#\033[1;00m" * 84)
+
+        out.append("\n+ LPAR NAME: %s\t| Current Profile: %s\n+ Host Server: %s" %
+                   (lpar_name, lpar_curr_profile, self.system))
+        out.append("+ LPAR Status")
+        out.append("`.... Current Status: %s\n`.... RMC Status (DLPAR): %s\n`.... Boot Mode: %s\n" %
+                   (lpar_state, lpar_rmc, lpar_boot_mode))
+
+        out.append("\033[94mConfiguration\033[1;00m")
+        out.append("\033[94m-\033[1;00m" * 84)
+
+        out.append("+ ID: %s\n" % lpar_id)
+        out.append("+ CPU Sharing Mode: %s\n" % sharing_mode)
+        out.append("+ Virtual CPU: %s" % desired_procs)
+        out.append("`.... Min Virtual CPU (DLPAR): %s" % min_procs)
+        out.append("`.... Max Virtual CPU (DLPAR): %s\n" % max_procs)
+        out.append("+ Entitled CPU: %s " % lpar_ent_cpu)
+        out.append("`.... Min Entitled CPU (DLPAR): %s" % min_proc_units)
+        out.append("`.... Max Entitled CPU (DLPAR): %s\n" % max_proc_units)
+        out.append("+ Memory: %s " % desired_mem)
+        out.append("`.... Min Memory (DLPAR): %s" % min_mem)
+        out.append("`.... Max Memory (DLPAR): %s\n" % max_mem)
+
+        return out
+
+
+def diagnose(lpars, tb_option, threads=None):
+    ''' Diagnose many LPARs at the same time.
+
+        Args:
+          lpars (list): the LPARs as (system, lpar_id, LPAR with 'profiles').
+          tb_option (str): the troubleshooting option (see run()).
+          threads (int): max number of sections running at the same time on
+                         each HMC (default config.max_threads).
+
+        Returns the list of outputs (str), one per LPAR in the same order.
+    '''
+
+    tasks = []
+    for position in range(len(lpars)):
+        diagnostics = LPARDiagnostics(*lpars[position])
+        for name in tb_sections[tb_option]:
+            tasks.append((position, diagnostics, name))
+
+    def run_section(task):
+        return task[1].section(task[2])
+
+    outputs = [[] for lpar in lpars]
+    for task, output in zip(tasks, parallel.pmap(run_section, tasks, threads,
+                                                 key=lambda task: task[1].client.host)):
+        outputs[task[0]].append(output)
+    return ['\n'.join(output) for output in outputs]
 
 
 def run(lpar_search, search_type, tb_option):
@@ -368,7 +458,7 @@ def run(lpar_search, search_type, tb_option):
 
         Args:
           lpar_search (str): LPAR id or part of name. If ID arg search_type needs 'by_id', if a part of name
-                             needs 'by_str'.
+                             needs 'by_str'. Many IDs can be separated by comma.
           search_type (str): 'by_id' or 'by_str' is used in combination with arg lpar_search.
           tb_option (str): troubleshooting options are:
                 info: for basic informations about LPAR
@@ -378,93 +468,59 @@ def run(lpar_search, search_type, tb_option):
                 all: for info, vnet, vfc and vscsi.
     '''
 
-    global find_lpar, system, lpar_id
-    lpar_id = lpar_search
+    lpar_index = lparindex.get()
+    lpars = []
 
-    # find lpar by the ID
+    # find lpar by the ID (the LPAR index has the frame of the ID)
     if search_type == 'by_id':
-        # looping in the all systems
-    	for system in systems:
-            find_lpar = commands.getoutput('ssh -l poweradm %s lssyscfg -r prof -m %s --filter lpar_ids=%s' %
-                        (config.hmcserver, system, lpar_search))
-            # search
-            if ("lpar_id=%s" % lpar_search) in find_lpar:
-                break
-        if ('HSCL8011 The partition ID "%s" was not found.' % lpar_search) == find_lpar:
-            print "\n\nLPAR not found."
+        lpar_ids = [lpar_id.strip() for lpar_id in str(lpar_search).split(',') if lpar_id.strip()]
+        lpar_index.ensure()
+        for lpar_id, found in zip(lpar_ids, parallel.pmap(lpar_index.findID, lpar_ids)):
+            if len(found) == 0:
+                print "\n\nLPAR %s not found." % (lpar_id)
+            else:
+                lpars.append(found[0])
+        if len(lpars) == 0:
             exit()
 
     # find lpar by the string
     elif search_type == 'by_str':
-        # looping in the all systems
-    	for system in systems:
-            # put results on temp file
-            find_lpar = os.system("ssh -l poweradm %s lssyscfg -r prof -m %s -F lpar_name | grep -i %s >> /tmp/search.%s" %
-	                              (config.hmcserver, system, lpar_search, globalvar.timestr))
-        # open temp file
-        with open('/tmp/search.%s' % (globalvar.timestr)) as search_lpar_str:
-            lpar_count = 0 # number of lpars
-            lpar_list = [] # list of lpars
-            print ("\n\n[LPAR with %s in the name]" % lpar_search)
-
-            # list of LPARs
-            for l_search_lpar_str in search_lpar_str:
-                l_search_lpar_str = l_search_lpar_str.replace('\n','')
-
-                # if LPAR is moved using LPM the lpar is listed duplicated
-                if (len(lpar_list) == 0 ) or (lpar_list[-1] != l_search_lpar_str):
-                    print ("%s.\t%s" % (lpar_count, l_search_lpar_str))
-                    lpar_list.append(l_search_lpar_str)
-                    lpar_count += 1
-
-            # check if found one lpar at least
-            if len(lpar_list) == 0:
-                print "\nNot found LPAR with %s.\n" % lpar_search
-                exit()
-
-            # select lpar (test if number is out of index)
-            while True:
-		try:
-		    lpar_option = int(raw_input("\nPlease select the LPAR: "))
-                    lpar_search = lpar_list[lpar_option]
-                    break
-                except(IndexError):
-                    print('\tERROR: Select an existing option between 0 and %s.' % (len(lpar_list)-1))
-
-                # get data of LPAR chosen
-            for system in systems:
-                find_lpar = commands.getoutput('ssh -l poweradm %s lssyscfg -r prof -m %s --filter lpar_names=%s' %
-                            (config.hmcserver, system, lpar_search))
-                if ("lpar_name=%s" % lpar_search) in find_lpar:
-		    break
-
-
-    # get the vios, not used yet :P
-    npiv_vios = systemvios.SystemVios()
-    npiv_vios_list = [npiv_vios.returnVio1(system), npiv_vios.returnVio2(system)]
-
-    # run all checks (vscsi, vfc and vnet)
-    if tb_option == 'all':
-	info()
-        vscsi()
-        vfc()
-        vnet()
-
-    # run info check
-    if tb_option == 'info':
-	info()
-
-    # run vscsi check
-    elif tb_option == 'vscsi':
-	info()
-        vscsi()
-
-    # run vfc check
-    elif tb_option == 'vfc':
-	info()
-        vfc()
-    # run fc check
-    elif tb_option == 'vnet':
-	info()
-        vnet()
+        # the names are searched on the LPAR index (exact, prefix, substring
+        # and similar names), each LPAR with its frame
+        found = lpar_index.findName(lpar_search)
+        print ("\n\n[LPAR with %s in the name]" % lpar_search)
+
+        # list of LPARs
+        lpar_count = 0 # number of lpars
+        for l_system, l_lpar_id, l_lpar in found:
+            print ("%s.\t%s\t(%s, %s)" % (lpar_count, l_lpar['name'], l_system, l_lpar['match']))
+            lpar_count += 1
+
+        # check if found one lpar at least
+        if len(found) == 0:
+            print "\nNot found LPAR with %s.\n" % lpar_search
+            exit()
 
+        # select lpar (test if number is out of index)
+        while True:
+            try:
+                lpar_option = int(raw_input("\nPlease select the LPAR: "))
+                system, lpar_id, lpar = found[lpar_option]
+                break
+            except(IndexError, ValueError):
+                print('\tERROR: Select an existing option between 0 and %s.' % (len(found)-1))
+
+        # the profiles only of the frame of the LPAR chosen
+        lpar = lpar_index.lpar(system, lpar_id, lpar)
+        if lpar is None:
+            print "\n\nLPAR not found on %s." % (system)
+            exit()
+        lpars.append((system, lpar_id, lpar))
+
+    # the commands of the troubleshooting are counted from here
+    operation = stats.Operation('tblpar %s' % (tb_option))
+    try:
+        for output in diagnose(lpars, tb_option):
+            print output
+    finally:
+        operation.end()
@@ -32,6 +32,7 @@ import os
 import globalvar
 import tbenv
 import tblpar
+import healthcheck
 import fields
 ##############################################################################################
 
@@ -42,7 +43,8 @@ def main():
     patb = raw_input("\n[Troubleshooting options]\n\n"
                   "Select an option\n\n"
                   "1. Verify environment.\n"
-                  "2. Verify specific LPAR.\n\n"
+                  "2. Verify specific LPAR.\n"
+                  "3. Health check of many LPARs (vSCSI, vFC and vNetwork).\n\n"
                   "Please choose an option: ")
 
     # environment menu
@@ -69,7 +71,7 @@ def main():
 				                "Please choose an option: ")
         # LPAR by ID
         if type_search == '1':
-	        lpar_search = raw_input("\nLPAR ID: ")
+	        lpar_search = raw_input("\nLPAR ID (many IDs separated by comma): ")
 	        search_type = 'by_id'
 
         # LPAR by name
@@ -110,3 +112,11 @@ def main():
         elif tblpar_option == '5':
             tblpar.run(lpar_search, search_type, 'vnet')
 
+    # health check of many LPARs or of a frame
+    if patb == '3':
+        lpar_search = raw_input("\n[Health check]\n\n"
+                                "LPAR IDs or names separated by comma (empty to check a frame): ")
+        if lpar_search.strip():
+            healthcheck.main(['healthcheck', lpar_search])
+        else:
+            healthcheck.main(['healthcheck', '-frame', raw_input("Frame: ").strip()])
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+PowerAdm
+viosmap.py
+
+Copyright (c) 2016 Kairo Araujo
+
+It was created for personal use. There are no guarantees of the author.
+Use at your own risk.
+
+Permission to use, copy, modify, and distribute this software for any
+purpose with or without fee is hereby granted, provided that the above
+copyright notice and this permission notice appear in all copies.
+
+THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+IBM, Power, PowerVM (a.k.a. VIOS) are registered trademarks of IBM Corporation
+in the United States, other countries, or both.
+VMware, vCenter, vCenter Orchestrator are registered trademarks of VWware Inc
+in the United States, other countries, or both.
+'''
+
+# Imports
+###############################################################################
+import re
+import time
+import threading
+import config
+import hmc
+###############################################################################
+
+# lsmap command for each type of device
+lsmap_cmds = {'vscsi': 'lsmap -all',
+              'vfc': 'lsmap -all -npiv'}
+
+# the slot on the physloc (U8205.E6D.06A07AT-V1-C111)
+re_slot = re.compile(r'-C(\d+)\s')
+
+
+def parseSlots(lsmap_output):
+    ''' Parse the output of lsmap -all or lsmap -all -npiv.
+
+        Returns a dict with the slot number (str) as key and the server
+        adapter name (vhost/vfchost) as value.
+    '''
+
+    slots = {}
+    for l_lsmap in lsmap_output.split('\n'):
+        slot = re_slot.search(l_lsmap)
+        if slot is None:
+            continue
+        adapter = ''
+        if not l_lsmap[:1].isspace():
+            adapter = l_lsmap.split()[0]
+        slots[slot.group(1)] = adapter
+    return slots
+
+
+def parseMappings(dev_type, lsmap_output):
+    ''' Parse the output of lsmap -all (vscsi) or lsmap -all -npiv (vfc).
+
+        Returns a dict with the slot number (str) as key and the mapping of
+        the server adapter as value:
+          vscsi: {'adapter', 'slot', 'client_id', 'vtds': [{'vtd', 'status', 'backing'}]}
+          vfc: {'adapter', 'slot', 'client_id', 'client_name', 'status', 'fc_name',
+                'ports_logged'}
+    '''
+
+    mappings = {}
+    mapping = None
+    for l_lsmap in lsmap_output.split('\n'):
+        slot = re_slot.search(l_lsmap)
+        if slot is not None and not l_lsmap[:1].isspace():
+            # header of a server adapter (vhost/vfchost)
+            words = l_lsmap.split()
+            mapping = {'adapter': words[0], 'slot': slot.group(1), 'client_id': ''}
+            client = l_lsmap[slot.end():].split()
+            if dev_type == 'vscsi':
+                if client and client[0].startswith('0x'):
+                    mapping['client_id'] = str(int(client[0], 16))
+                mapping['vtds'] = []
+            else:
+                if client and client[0].isdigit():
+                    mapping['client_id'] = client[0]
+                mapping.update({'client_name': ' '.join(client[1:2]), 'status': '', 'fc_name': '',
+                                'ports_logged': ''})
+            mappings[mapping['slot']] = mapping
+            continue
+        if mapping is None:
+            continue
+
+        if dev_type == 'vscsi':
+            if l_lsmap.startswith('VTD'):
+                vtd = l_lsmap[3:].strip()
+                if vtd != 'NO VIRTUAL TARGET DEVICE FOUND':
+                    mapping['vtds'].append({'vtd': vtd, 'status': '', 'backing': ''})
+            elif mapping['vtds'] and l_lsmap.startswith('Status'):
+                mapping['vtds'][-1]['status'] = l_lsmap[6:].strip()
+            elif mapping['vtds'] and l_lsmap.startswith('Backing device'):
+                mapping['vtds'][-1]['backing'] = l_lsmap[14:].strip()
+        else:
+            if l_lsmap.startswith('Status:'):
+                mapping['status'] = l_lsmap.split(':', 1)[1].strip()
+            elif l_lsmap.startswith('FC name:'):
+                mapping['fc_name'] = (l_lsmap.split(':', 1)[1].split() + [''])[0]
+                if mapping['fc_name'].startswith('FC'):
+                    # FC name empty (only the FC loc code)
+                    mapping['fc_name'] = ''
+            elif l_lsmap.startswith('Ports logged in:'):
+                mapping['ports_logged'] = l_lsmap.split(':', 1)[1].strip()
+    return mappings
+
+
+class VIOSMap:
+    ''' Index of the virtual server adapters (vhost/vfchost) slots of a VIOS
+        and snapshot of their mappings (see parseMappings()).
+
+        The lsmap is collected once per device type (again after
+        config.viosmap_cache_time seconds) and all the checks and the
+        mappings of the adapters are done in the index.
+
+        Args:
+          system (str): the system name (frame).
+          vios (str): the VIOS name (the same name on HMC).
+          hmc_server (str): HMC address (default config.hmcserver).
+    '''
+
+    def __init__(self, system, vios, hmc_server=None):
+        self.system = system
+        self.vios = vios
+        self.hmc_server = hmc_server
+        self.slots = {}
+        self.mappings = {}
+        self.collected = {}
+        self.lock = threading.Lock()
+
+    def load(self, dev_type, lsmap_output):
+        ''' Load the index and the mappings of dev_type from an lsmap output
+            (use it with the lock).
+        '''
+
+        self.slots[dev_type] = parseSlots(lsmap_output)
+        self.mappings[dev_type] = parseMappings(dev_type, lsmap_output)
+        self.collected[dev_type] = time.time()
+
+    def collect(self, dev_type):
+        ''' Collect the lsmap of dev_type if not collected yet or older than
+            config.viosmap_cache_time (use it with the lock).
+        '''
+
+        if dev_type not in lsmap_cmds:
+            raise ValueError('the dev_type needs be vscsi or vfc')
+
+        if (dev_type not in self.slots or
+                time.time() - self.collected[dev_type] > int(config.viosmap_cache_time)):
+            self.load(dev_type, hmc.get(self.hmc_server).viosvrcmd(self.system, self.vios,
+                                                                   lsmap_cmds[dev_type]))
+
+    def getSlots(self, dev_type):
+        ''' Returns the slots index of dev_type (vscsi or vfc). '''
+
+        self.lock.acquire()
+        try:
+            self.collect(dev_type)
+            return self.slots[dev_type]
+        finally:
+            self.lock.release()
+
+    def getMappings(self, dev_type):
+        ''' Returns the mappings of dev_type (vscsi or vfc) by slot. '''
+
+        self.lock.acquire()
+        try:
+            self.collect(dev_type)
+            return self.mappings[dev_type]
+        finally:
+            self.lock.release()
+
+    def setSlots(self, dev_type, lsmap_output):
+        ''' Load the slots index of dev_type from an lsmap output already collected. '''
+
+        self.lock.acquire()
+        try:
+            self.load(dev_type, lsmap_output)
+        finally:
+            self.lock.release()
+
+    def refresh(self, dev_types=None):
+        ''' Collect the lsmap of the dev_types (default vscsi and vfc) again,
+            all of them in one command. Returns {dev_type: mappings}.
+        '''
+
+        if dev_types is None:
+            dev_types = sorted(lsmap_cmds.keys())
+        for dev_type in dev_types:
+            if dev_type not in lsmap_cmds:
+                raise ValueError('the dev_type needs be vscsi or vfc')
+
+        outputs = hmc.get(self.hmc_server).viosvrcmdBatch(self.system, self.vios,
+                                                          [lsmap_cmds[dev_type] for dev_type in dev_types])
+        snapshot = {}
+        self.lock.acquire()
+        try:
+            for dev_type, lsmap_output in zip(dev_types, outputs):
+                self.load(dev_type, lsmap_output)
+                snapshot[dev_type] = self.mappings[dev_type]
+        finally:
+            self.lock.release()
+        return snapshot
+
+    def isUsed(self, dev_type, dev_id):
+        ''' Returns True if the ID is used by some server adapter.
+
+            PowerAdm creates the server adapters with the slot 1<ID> and
+            2<ID> (vscsi) and 3<ID> and 4<ID> (vfc), so all of them are
+            checked.
+        '''
+
+        slots = self.getSlots(dev_type)
+        for prefix in ('1', '2', '3', '4'):
+            if ('%s%s' % (prefix, dev_id)) in slots:
+                return True
+        return False
+
+    def adapter(self, dev_type, slot):
+        ''' Returns the server adapter (vhost/vfchost) of the slot or '' if not exists. '''
+
+        return self.getSlots(dev_type).get(str(slot), '')
+
+    def mapping(self, dev_type, slot):
+        ''' Returns the mapping of the server adapter of the slot or None if not exists. '''
+
+        return self.getMappings(dev_type).get(str(slot))
+
+
+# the maps are shared by all the modules in the process
+maps = {}
+maps_lock = threading.Lock()
+
+def get(system, vios, hmc_server=None):
+    ''' Returns the shared VIOSMap of a VIOS (default on the HMC of the system). '''
+
+    if hmc_server is None:
+        hmc_server = hmc.route(system)
+
+    maps_lock.acquire()
+    try:
+        if (hmc_server, system, vios) not in maps:
+            maps[(hmc_server, system, vios)] = VIOSMap(system, vios, hmc_server)
+        return maps[(hmc_server, system, vios)]
+    finally:
+        maps_lock.release()
+
+
+def invalidate(system=None):
+    ''' Drop the VIOSMaps of a system (default all), the lsmap is collected
+        again on the next use (after a change on the VIOS).
+    '''
+
+    maps_lock.acquire()
+    try:
+        for key in list(maps.keys()):
+            if system is None or key[1] == system:
+                del maps[key]
+    finally:
+        maps_lock.release()
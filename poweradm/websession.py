@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+PowerAdm
+websession.py
+
+Copyright (c) 2016 Kairo Araujo
+
+It was created for personal use. There are no guarantees of the author.
+Use at your own risk.
+
+Permission to use, copy, modify, and distribute this software for any
+purpose with or without fee is hereby granted, provided that the above
+copyright notice and this permission notice appear in all copies.
+
+THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR
+ANY SPECIAL, DIRECT, INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES
+WHATSOEVER RESULTING FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN
+ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF
+OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+IBM, Power, PowerVM (a.k.a. VIOS) are registered trademarks of IBM Corporation in
+the United States, other countries, or both.
+VMware, vCenter, vCenter Orchestrator are registered trademarks of VWware Inc in the United
+States, other countries, or both.
+'''
+
+# Imports
+###############################################################################################
+import os
+import time
+import threading
+import config
+##############################################################################################
+#
+# Web sessions
+#
+# The web interface keeps the state of the LPAR wizard (change, psystem,
+# vio1, npiv_vio1, ...) on the server, one session per browser (cookie
+# poweradm_session), so the operators don't overwrite each other's LPAR.
+##############################################################################################
+
+# name of the cookie with the session ID
+cookie_name = 'poweradm_session'
+
+
+class SessionStore:
+    ''' Sessions of the web interface (in memory, shared by the threads).
+
+        Args:
+          timeout (int): seconds without access to expire a session
+                         (default config.web_session_time).
+    '''
+
+    def __init__(self, timeout=None):
+        if timeout is None:
+            timeout = int(config.web_session_time)
+        self.timeout = timeout
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def newID(self):
+        ''' Returns a new random session ID. '''
+
+        return os.urandom(16).encode('hex')
+
+    def get(self, session_id):
+        ''' Returns (session_id, session): the session of the ID or a new
+            session (with a new ID) if the ID doesn't exist or expired.
+        '''
+
+        now = time.time()
+        self.lock.acquire()
+        try:
+            # the expired sessions are removed
+            for old_id in self.sessions.keys():
+                if now - self.sessions[old_id][0] > self.timeout:
+                    del self.sessions[old_id]
+
+            if session_id not in self.sessions:
+                session_id = self.newID()
+                self.sessions[session_id] = (now, {})
+            session = self.sessions[session_id][1]
+            self.sessions[session_id] = (now, session)
+            return (session_id, session)
+        finally:
+            self.lock.release()
+
+
+# the sessions are shared by all the threads of the web interface
+store = None
+store_lock = threading.Lock()
+
+def get():
+    ''' Returns the shared SessionStore. '''
+
+    global store
+    store_lock.acquire()
+    try:
+        if store is None:
+            store = SessionStore()
+        return store
+    finally:
+        store_lock.release()
@@ -35,7 +35,14 @@ import poweradm.globalvar
 import poweradm.config
 import poweradm.npiv
 import poweradm.newid
+import poweradm.jobs
+import poweradm.websession
+import os
+import time
 import commands
+import threading
+import SocketServer
+import wsgiref.simple_server
 from www.bottle import *
 
 # global variables from the classes and functions of poweradm
@@ -50,11 +57,41 @@ storage_pools = poweradm.config.storage_pools
 npivs = poweradm.npiv.NPIV()
 system_vio = poweradm.systemvios.SystemVios()
 freeid = poweradm.newid.NewID()
+web_mode = poweradm.config.web_mode.lower()
+web_server = poweradm.config.web_server
+# the change files are written one at time (see lpar_config_finish)
+change_lock = threading.Lock()
+
+def session():
+    ''' Returns the session (dict) of the browser, a new session sets the cookie. '''
+
+    # import websession of poweradm (poweradm is the index page function here)
+    import poweradm.websession
+
+    cookie_name = poweradm.websession.cookie_name
+    session_id, wizard = poweradm.websession.get().get(request.get_cookie(cookie_name))
+    if session_id != request.get_cookie(cookie_name):
+        response.set_cookie(cookie_name, session_id, path='/', httponly=True)
+    return wizard
+
+
+class ThreadingWSGIServer(SocketServer.ThreadingMixIn, wsgiref.simple_server.WSGIServer):
+    daemon_threads = True
 
-@route('<filename:path>')
-def server_static(filename):
-    """ This is for static files """
-    return static_file(filename, root='www/static/')
+
+class ThreadedServer(ServerAdapter):
+    ''' wsgiref server with one thread per request (the output of the jobs
+        is streamed, so a request can be open during the whole job).
+    '''
+
+    def run(self, handler):
+        class QuietHandler(wsgiref.simple_server.WSGIRequestHandler):
+            def log_request(*args, **kw):
+                pass
+        server = wsgiref.simple_server.make_server(self.host, self.port, handler,
+                                                   server_class=ThreadingWSGIServer,
+                                                   handler_class=QuietHandler)
+        server.serve_forever()
 
 @route('/')
 def poweradm():
@@ -79,23 +116,21 @@ def lpar_config_sys_net():
         - Network options
     '''
 
-    # global variables of this page
-    global change, prefix, lparname, lparentcpu, lparvcpu, lparmem
+    # the wizard variables are kept on the session of the browser
+    wizard = session()
 
     # colect the GET request variables
-    change     = request.GET.get('change','')
-    prefix     = request.GET.get('prefix','')
-    lparname   = request.GET.get('lparname','')
-    lparentcpu = float(request.GET.get('lparentcpu',''))
-    lparvcpu   = int(request.GET.get('lparvcpu',''))
-    lparmem    = int(request.GET.get('lparmem',''))
+    wizard['change']     = request.GET.get('change','')
+    wizard['prefix']     = request.GET.get('prefix','')
+    wizard['lparname']   = request.GET.get('lparname','')
+    wizard['lparentcpu'] = float(request.GET.get('lparentcpu',''))
+    wizard['lparvcpu']   = int(request.GET.get('lparvcpu',''))
+    wizard['lparmem']    = int(request.GET.get('lparmem',''))
 
     # output with the variables
     output = template('www/lpar_config_sys_net', version=version,
-             change=change, prefix=prefix, lparname=lparname, lparentcpu=lparentcpu,
-             lparvcpu=lparvcpu, lparmem=lparmem, psystems=psystems, active_ssp=active_ssp,
-             storage_pools=storage_pools,
-             enable_nim_deploy=enable_nim_deploy, virtual_switches=virtual_switches)
+             psystems=psystems, active_ssp=active_ssp, storage_pools=storage_pools,
+             enable_nim_deploy=enable_nim_deploy, virtual_switches=virtual_switches, **wizard)
     return output
 
 @route('/lpar_config_npiv', method='GET')
@@ -108,107 +143,54 @@ def lpar_config_npiv():
         - Select NPIV configurations
     '''
 
-    # global variables of this page
-    global nim_deploy, vsw_deploy, vlan_deploy, psystem, vscsi, add_disk, disk_size
-    global net_length, stgpool, net_vlan1, net_vlan2_1, net_vlan2_2, net_vlan3_1, net_vlan3_2
-    global net_vlan3_3, net_vsw1, net_vsw2_1, net_vsw2_2, net_vsw3_1, net_vsw3_2, net_vsw3_3
-    global vio1, vio2
+    # the wizard variables are kept on the session of the browser
+    wizard = session()
 
     # colect the GET request variables
-    nim_deploy  = request.GET.get('nim_deploy','')
-    vsw_deploy  = request.GET.get('vsw_deploy','')
-    vlan_deploy = request.GET.get('vlan_deploy','')
-    psystem     = request.GET.get('psystem','')
-    vscsi       = request.GET.get('vscsi','')
-    add_disk    = request.GET.get('add_disk','')
-    disk_size   = request.GET.get('disk_size','')
-    stgpool     = request.GET.get('stgpool','')
-    net_length  = request.GET.get('net_length','')
+    wizard['nim_deploy']  = request.GET.get('nim_deploy','')
+    wizard['vsw_deploy']  = request.GET.get('vsw_deploy','')
+    wizard['vlan_deploy'] = request.GET.get('vlan_deploy','')
+    wizard['psystem']     = request.GET.get('psystem','')
+    wizard['vscsi']       = request.GET.get('vscsi','')
+    wizard['add_disk']    = request.GET.get('add_disk','')
+    wizard['disk_size']   = request.GET.get('disk_size','')
+    wizard['stgpool']     = request.GET.get('stgpool','')
+    wizard['net_length']  = request.GET.get('net_length','')
 
     # if nim_deploy is not selected, the vsw_deploy and vlan_deploy is null
-    if nim_deploy == 'n':
-        vsw_deploy = 'null'
-        vlan_deploy = 'null'
+    if wizard['nim_deploy'] == 'n':
+        wizard['vsw_deploy'] = 'null'
+        wizard['vlan_deploy'] = 'null'
 
     # if add_disk is different of yes, the disk size is 0 and stgpool is null
-    if add_disk != 'y':
-        disk_size = '0'
-        stgpool = 'null'
-
-    # if number of ethernets is 1
-    if net_length == '1':
-        net_vlan1   = request.GET.get('net_vlan1','')
-        net_vlan2_1 = 'null'
-        net_vlan2_2 = 'null'
-        net_vlan3_1 = 'null'
-        net_vlan3_2 = 'null'
-        net_vlan3_3 = 'null'
-        net_vsw1    = request.GET.get('net_vsw1','')
-        net_vsw2_1  = 'null'
-        net_vsw2_2  = 'null'
-        net_vsw3_1  = 'null'
-        net_vsw3_2  = 'null'
-        net_vsw3_3  = 'null'
-
-    # if number of ethernets is 2
-    elif net_length == '2':
-        net_vlan1   = 'null'
-        net_vlan2_1 = request.GET.get('net_vlan2_1','')
-        net_vlan2_2 = request.GET.get('net_vlan2_2','')
-        net_vlan3_1 = 'null'
-        net_vlan3_2 = 'null'
-        net_vlan3_3 = 'null'
-        net_vsw1    = 'null'
-        net_vsw2_1  = request.GET.get('net_vsw2_1','')
-        net_vsw2_2  = request.GET.get('net_vsw2_2','')
-        net_vsw3_1  = 'null'
-        net_vsw3_2  = 'null'
-        net_vsw3_3  = 'null'
-
-    # if number of ethernets is 3
-    elif net_length == '3':
-        net_vlan1   = 'null'
-        net_vlan2_1 = 'null'
-        net_vlan2_2 = 'null'
-        net_vlan3_1 = request.GET.get('net_vlan3_1','')
-        net_vlan3_2 = request.GET.get('net_vlan3_2','')
-        net_vlan3_3 = request.GET.get('net_vlan3_3','')
-        net_vsw1    = 'null'
-        net_vsw3_1  = request.GET.get('net_vsw3_1','')
-        net_vsw3_2  = request.GET.get('net_vsw3_2','')
-        net_vsw3_3  = request.GET.get('net_vsw3_3','')
-        net_vsw2_1  = 'null'
-        net_vsw2_2  = 'null'
-
-    # get informations about VIOs
-    npiv_vio1 = npivs.printFCVIO(psystem, 'vio1')
-    npiv_vio2 = npivs.printFCVIO(psystem, 'vio2')
-    vio1 = system_vio.returnVio1(psystem)
-    vio2 = system_vio.returnVio2(psystem)
-
-    if os.path.isfile('%s/npiv/%s-%s' % ( poweradm.config.pahome, psystem, vio1)):
-        vio1_lsnports = commands.getoutput('cat %s/npiv/%s-%s' % ( poweradm.config.pahome, psystem, vio1))
-    else:
-        vio1_lsnports = ""
-
-    if os.path.isfile('%s/npiv/%s-%s' % ( poweradm.config.pahome, psystem, vio1)):
-        vio2_lsnports = commands.getoutput('cat %s/npiv/%s-%s' % ( poweradm.config.pahome, psystem, vio2))
-    else:
-        vio2_lsnports = ""
+    if wizard['add_disk'] != 'y':
+        wizard['disk_size'] = '0'
+        wizard['stgpool'] = 'null'
+
+    # the VLANs and virtual switches of the number of ethernets (1, 2 or 3),
+    #the others are null
+    nets = {'1': ['net_vlan1', 'net_vsw1'],
+            '2': ['net_vlan2_1', 'net_vlan2_2', 'net_vsw2_1', 'net_vsw2_2'],
+            '3': ['net_vlan3_1', 'net_vlan3_2', 'net_vlan3_3', 'net_vsw3_1', 'net_vsw3_2', 'net_vsw3_3']}
+    for net_length in nets.keys():
+        for net in nets[net_length]:
+            if net_length == wizard['net_length']:
+                wizard[net] = request.GET.get(net,'')
+            else:
+                wizard[net] = 'null'
+
+    # get informations about VIOs (ports and notes)
+    npiv_vio1_ports = npivs.ports(wizard['psystem'], 'vio1')
+    npiv_vio2_ports = npivs.ports(wizard['psystem'], 'vio2')
+    wizard['vio1'] = npiv_vio1_ports['vios']
+    wizard['vio2'] = npiv_vio2_ports['vios']
 
     # output with the variables
     output = template('www/lpar_config_npiv', version=version,
-             change=change, prefix=prefix, lparname=lparname, lparentcpu=lparentcpu,
-             lparvcpu=lparvcpu, lparmem=lparmem, psystem=psystem, active_ssp=active_ssp,
-             storage_pools=storage_pools, vsw_deploy=vsw_deploy, vlan_deploy=vlan_deploy,
-             enable_nim_deploy=enable_nim_deploy, virtual_switches=virtual_switches, vscsi=vscsi,
-             add_disk=add_disk, disk_size=disk_size, net_length=net_length, stgpool=stgpool,
-             nim_deploy=nim_deploy, net_vlan1=net_vlan1, net_vlan2_1=net_vlan2_1,
-             net_vlan2_2=net_vlan2_2, net_vlan3_1=net_vlan3_1, net_vlan3_2=net_vlan3_2,
-             net_vlan3_3=net_vlan3_3, net_vsw1=net_vsw1, net_vsw2_1=net_vsw2_1,
-             net_vsw2_2=net_vsw2_2, net_vsw3_1=net_vsw3_1, net_vsw3_2=net_vsw3_2,
-             net_vsw3_3=net_vsw3_3, npiv_vio1=npiv_vio1, npiv_vio2=npiv_vio2, vio1=vio1,
-             vio1_lsnports=vio1_lsnports, vio2_lsnports=vio2_lsnports, vio2=vio2)
+             active_ssp=active_ssp, storage_pools=storage_pools,
+             enable_nim_deploy=enable_nim_deploy, virtual_switches=virtual_switches,
+             npiv_vio1_ports=npiv_vio1_ports['ports'], npiv_vio2_ports=npiv_vio2_ports['ports'],
+             vio1_lsnports=npiv_vio1_ports['notes'], vio2_lsnports=npiv_vio2_ports['notes'], **wizard)
 
     return output
 
@@ -216,33 +198,24 @@ def lpar_config_npiv():
 @route('/lpar_config_validate', method='GET')
 def lpar_config_validate():
 
-    # global variables of this page
-    global npiv_vio1, npiv_vio2, vfc
+    # the wizard variables are kept on the session of the browser
+    wizard = session()
 
     # get the GET request
-    vfc = request.GET.get('vfc','')
+    wizard['vfc'] = request.GET.get('vfc','')
 
     # if vfc is no the npiv_vio1 and npiv2 is 'none'
-    if vfc == "n":
-        npiv_vio1 = 'none'
-        npiv_vio2 = 'none'
+    if wizard['vfc'] == "n":
+        wizard['npiv_vio1'] = 'none'
+        wizard['npiv_vio2'] = 'none'
     else:
-        npiv_vio1 = request.GET.get('npiv_vio1','')
-        npiv_vio2 = request.GET.get('npiv_vio2','')
+        wizard['npiv_vio1'] = request.GET.get('npiv_vio1','')
+        wizard['npiv_vio2'] = request.GET.get('npiv_vio2','')
 
     # output with the variables
     output = template('www/lpar_config_validate', version=version,
-             change=change, prefix=prefix, lparname=lparname, lparentcpu=lparentcpu,
-             lparvcpu=lparvcpu, lparmem=lparmem, psystem=psystem, active_ssp=active_ssp,
-             storage_pools=storage_pools, vsw_deploy=vsw_deploy, vlan_deploy=vlan_deploy,
-             enable_nim_deploy=enable_nim_deploy, virtual_switches=virtual_switches, vscsi=vscsi,
-             add_disk=add_disk, disk_size=disk_size, net_length=net_length, stgpool=stgpool,
-             nim_deploy=nim_deploy, net_vlan1=net_vlan1, net_vlan2_1=net_vlan2_1,
-             net_vlan2_2=net_vlan2_2, net_vlan3_1=net_vlan3_1, net_vlan3_2=net_vlan3_2,
-             net_vlan3_3=net_vlan3_3, net_vsw1=net_vsw1, net_vsw2_1=net_vsw2_1,
-             net_vsw2_2=net_vsw2_2, net_vsw3_1=net_vsw3_1, net_vsw3_2=net_vsw3_2,
-             net_vsw3_3=net_vsw3_3, npiv_vio1=npiv_vio1, npiv_vio2=npiv_vio2, vio1=vio1,
-             vfc=vfc, vio2=vio2)
+             active_ssp=active_ssp, storage_pools=storage_pools,
+             enable_nim_deploy=enable_nim_deploy, virtual_switches=virtual_switches, **wizard)
 
     return output
 
@@ -252,111 +225,95 @@ def lpar_config_finish():
     # import classes/functions of the poweradm
     import poweradm.mklparconf
     import poweradm.execchange
+    import poweradm.hmc
 
-    # global variables of this page
-    global configlpar, createlpar, lpar_count, lparid, veth, veth_final
+    # the wizard variables are kept on the session of the browser
+    wizard = session()
+    if 'vfc' not in wizard:
+        abort(400, 'The LPAR configuration was not found. Start it again.')
 
     # get variables GET request
     configlpar = request.GET.get('configlpar','')
     createlpar = request.GET.get('createlpar','')
 
-    # get the next free id
-    lparid = freeid.mkID()
+    # the VLAN and virtual switch of the deploy (if NIM deploy) and the final
+    #VLANs and virtual switches
+    if wizard['net_length'] == '1':
+        nets = [(wizard['net_vlan1'], wizard['net_vsw1'])]
+    elif wizard['net_length'] == '2':
+        nets = [(wizard['net_vlan2_1'], wizard['net_vsw2_1']), (wizard['net_vlan2_2'], wizard['net_vsw2_2'])]
+    else:
+        nets = [(wizard['net_vlan3_1'], wizard['net_vsw3_1']), (wizard['net_vlan3_2'], wizard['net_vsw3_2']),
+                (wizard['net_vlan3_3'], wizard['net_vsw3_3'])]
 
     # convert the ethernets for makelpar function
-    if nim_deploy == 'y':
-        if net_length == '1':
-            veth = ("10/0/%s//0/0/%s" % (vlan_deploy, vsw_deploy))
-            veth_final = ("10/0/%s//0/0/%s" % (net_vlan1, net_vsw1))
-        elif net_length == '2':
-            veth = ("10/0/%s//0/0/%s,11/0/%s//0/0/%s" % (vlan_deploy, vsw_deploy,
-                    net_vlan2_2,net_vsw2_2))
-            veth_final = ("10/0/%s//0/0/%s,11/0/%s//0/0/%s" % (net_vlan2_1, net_vsw2_1,
-                          net_vlan2_2, net_vsw2_2))
-        elif net_length == '3':
-            veth = ("10/0/%s//0/0/%s,11/0/%s//0/0/%s,12/0/%s//0/0/%s" %
-                    (vlan_deploy, vsw_deploy, net_vlan3_2, net_vsw3_2, net_vlan3_3, net_vsw3_3))
-            veth_final = ("10/0/%s//0/0/%s,11/0/%s//0/0/%s,12/0/%s//0/0/%s" %
-                    (net_vlan3_1, net_vsw3_1, net_vlan3_2, net_vsw3_2, net_vlan3_3, net_vsw3_3))
-    else:
-        if net_length == '1':
-            veth = ("10/0/%s//0/0/%s" % (net_vlan1, net_vsw1))
-            veth_final = veth
-        elif net_length == '2':
-            veth = ("10/0/%s//0/0/%s,11/0/%s//0/0/%s" % (net_vlan2_1, net_vsw2_1,
-                    net_vlan2_2, net_vsw2_2))
-            veth_final = veth
-        elif net_length == '3':
-            veth = ("10/0/%s//0/0/%s,11/0/%s//0/0/%s,12/0/%s//0/0/%s" %
-                    (net_vlan3_1, net_vsw3_1, net_vlan3_2, net_vsw3_2, net_vlan3_3, net_vsw3_3))
-            veth_final = veth
+    veth_final = ','.join(['%s/0/%s//0/0/%s' % (10 + net, nets[net][0], nets[net][1])
+                           for net in range(len(nets))])
+    if wizard['nim_deploy'] == 'y':
+        nets[0] = (wizard['vlan_deploy'], wizard['vsw_deploy'])
+    veth = ','.join(['%s/0/%s//0/0/%s' % (10 + net, nets[net][0], nets[net][1])
+                     for net in range(len(nets))])
 
     # if configlpar is OK create the file
     if configlpar == 'yes':
 
-        # create LPAR using function poweradm.mklparconf
-        newchange = poweradm.mklparconf.MakeLPARConf(change, prefix, lparname, lparid,
-                nim_deploy, lparmem, lparentcpu, lparvcpu, vscsi, add_disk, stgpool,
-                disk_size, vfc, npiv_vio1, npiv_vio2, veth, veth_final, psystem, vio1, vio2)
-
-        # write reader
-        newchange.headerchange()
-
-        # write the file
-        newchange.writechange()
-
-        # close the file
-        newchange.closechange()
+        # get the next free id
+        lparid = freeid.mkID()
 
-        # colect file created
-        change_file = newchange.returnChange()
-
-        # if create createlpar is yes, run the creation.
+        # create LPAR using function poweradm.mklparconf
+        newchange = poweradm.mklparconf.MakeLPARConf(wizard['change'], wizard['prefix'],
+                wizard['lparname'], lparid, wizard['nim_deploy'], wizard['lparmem'],
+                wizard['lparentcpu'], wizard['lparvcpu'], wizard['vscsi'], wizard['add_disk'],
+                wizard['stgpool'], wizard['disk_size'], wizard['vfc'], wizard['npiv_vio1'],
+                wizard['npiv_vio2'], veth, veth_final, wizard['psystem'], wizard['vio1'], wizard['vio2'])
+
+        # the file is <change>_<time>.sh: the time of this request, not
+        #used by other change file with the same name
+        change_lock.acquire()
+        try:
+            poweradm.globalvar.setTimestr(time.strftime("%m%d%Y-%H%M%S"))
+            while os.path.exists('%s/poweradm/changes/%s_%s.sh' % (poweradm.config.pahome, wizard['change'],
+                                                                    poweradm.globalvar.getTimestr())):
+                time.sleep(1)
+                poweradm.globalvar.setTimestr(time.strftime("%m%d%Y-%H%M%S"))
+
+            # write reader
+            newchange.headerchange()
+
+            # write the file
+            newchange.writechange()
+
+            # close the file
+            newchange.closechange()
+
+            # colect file created
+            change_file = newchange.returnChange()
+        finally:
+            poweradm.globalvar.setTimestr(None)
+            change_lock.release()
+
+        # if create createlpar is yes, submit the creation as a job, the
+        #output is showed by /jobs/<job_id>/output.
         if createlpar == 'yes':
-            mkchange = poweradm.execchange.Exe(change_file)
-            mklog = mkchange.runChange()
+            mklog = poweradm.jobs.get().submit('change', {'changefile': change_file},
+                                               ['hmc:%s' % (poweradm.hmc.route(wizard['psystem']))])
         else:
             mklog = 'none'
 
-        # output with the variables
-        output = template('www/lpar_finish', version=version,
-                change=change, prefix=prefix, lparname=lparname, lparentcpu=lparentcpu,
-                lparvcpu=lparvcpu, lparmem=lparmem, psystem=psystem, active_ssp=active_ssp,
-                storage_pools=storage_pools, vsw_deploy=vsw_deploy, vlan_deploy=vlan_deploy,
-                enable_nim_deploy=enable_nim_deploy, virtual_switches=virtual_switches, vscsi=vscsi,
-                add_disk=add_disk, disk_size=disk_size, net_length=net_length, stgpool=stgpool,
-                nim_deploy=nim_deploy, net_vlan1=net_vlan1, net_vlan2_1=net_vlan2_1,
-                net_vlan2_2=net_vlan2_2, net_vlan3_1=net_vlan3_1, net_vlan3_2=net_vlan3_2,
-                net_vlan3_3=net_vlan3_3, net_vsw1=net_vsw1, net_vsw2_1=net_vsw2_1,
-                net_vsw2_2=net_vsw2_2, net_vsw3_1=net_vsw3_1, net_vsw3_2=net_vsw3_2,
-                net_vsw3_3=net_vsw3_3, npiv_vio1=npiv_vio1, npiv_vio2=npiv_vio2, vio1=vio1,
-                vfc=vfc, vio2=vio2, change_file=change_file, configlpar=configlpar,
-                createlpar=createlpar, mklog=mklog)
-
-        return output
-
     else:
     # if is not, just change_file and mklog is none and go to the page out.
 
         change_file = 'none'
         mklog = 'none'
 
-        # output with the variables
-        output = template('www/lpar_finish', version=version,
-                change=change, prefix=prefix, lparname=lparname, lparentcpu=lparentcpu,
-                lparvcpu=lparvcpu, lparmem=lparmem, psystem=psystem, active_ssp=active_ssp,
-                storage_pools=storage_pools, vsw_deploy=vsw_deploy, vlan_deploy=vlan_deploy,
-                enable_nim_deploy=enable_nim_deploy, virtual_switches=virtual_switches, vscsi=vscsi,
-                add_disk=add_disk, disk_size=disk_size, net_length=net_length, stgpool=stgpool,
-                nim_deploy=nim_deploy, net_vlan1=net_vlan1, net_vlan2_1=net_vlan2_1,
-                net_vlan2_2=net_vlan2_2, net_vlan3_1=net_vlan3_1, net_vlan3_2=net_vlan3_2,
-                net_vlan3_3=net_vlan3_3, net_vsw1=net_vsw1, net_vsw2_1=net_vsw2_1,
-                net_vsw2_2=net_vsw2_2, net_vsw3_1=net_vsw3_1, net_vsw3_2=net_vsw3_2,
-                net_vsw3_3=net_vsw3_3, npiv_vio1=npiv_vio1, npiv_vio2=npiv_vio2, vio1=vio1,
-                vfc=vfc, vio2=vio2, change_file=change_file, configlpar=configlpar,
-                createlpar=createlpar, mklog=mklog)
-
-        return output
+    # output with the variables
+    output = template('www/lpar_finish', version=version,
+            active_ssp=active_ssp, storage_pools=storage_pools,
+            enable_nim_deploy=enable_nim_deploy, virtual_switches=virtual_switches,
+            change_file=change_file, configlpar=configlpar,
+            createlpar=createlpar, mklog=mklog, **wizard)
+
+    return output
 
 @route('/lpar_exec')
 def lpar_exec():
@@ -379,19 +336,23 @@ def lpar_do():
     # import config and execchange of poweradm
     import poweradm.config
     import poweradm.execchange
-
-    # global variables from this page
-    global change_file, exec_lpar
+    import poweradm.changeplan
 
     change_file = request.GET.get('change_file','')
     exec_lpar   = request.GET.get('exec_lpar','')
     pahome      = poweradm.config.pahome
 
-    # if exec_lpar is yes, execute the file creation
+    # if exec_lpar is yes, submit the file creation as a job, the output
+    #is showed by /jobs/<job_id>/output.
     if exec_lpar == 'yes':
-        mkchange = poweradm.execchange.Exe('%s/poweradm/changes/%s' %
-                (pahome, change_file))
-        mklog = mkchange.runChange()
+        changefile = '%s/poweradm/changes/%s' % (pahome, os.path.basename(change_file))
+        # the change runs on the HMC of its frame
+        hmc_server = poweradm.config.hmcserver
+        if os.path.isfile(changefile):
+            plan = poweradm.changeplan.load(changefile)
+            if plan is not None:
+                hmc_server = plan.hmc_server
+        mklog = poweradm.jobs.get().submit('change', {'changefile': changefile}, ['hmc:%s' % (hmc_server)])
     else:
         mklog = 'none'
 
@@ -401,6 +362,148 @@ def lpar_do():
 
     return output
 
+@route('/jobs', method='GET')
+def jobs_list():
+    ''' Jobs (JSON). '''
+
+    import poweradm.jobs
+
+    return {'jobs': poweradm.jobs.get().list()}
+
+@route('/jobs/<job_id:int>', method='GET')
+def jobs_status(job_id):
+    ''' Status and progress of a job (JSON). '''
+
+    import poweradm.jobs
+
+    job = poweradm.jobs.get().get(job_id)
+    if job is None:
+        abort(404, 'The job %s does not exist.' % (job_id))
+    return job.toDict()
+
+@route('/jobs/<job_id:int>/cancel', method='POST')
+def jobs_cancel(job_id):
+    ''' Cancel a job (JSON). '''
+
+    import poweradm.jobs
+
+    return {'job_id': job_id, 'cancelled': poweradm.jobs.get().cancel(job_id)}
+
+@route('/jobs/<job_id:int>/stream', method='GET')
+def jobs_stream(job_id):
+    ''' Output of a job (server-sent events). '''
+
+    import poweradm.jobs
+
+    job = poweradm.jobs.get().get(job_id)
+    if job is None:
+        abort(404, 'The job %s does not exist.' % (job_id))
+
+    response.content_type = 'text/event-stream'
+    response.set_header('Cache-Control', 'no-cache')
+
+    def events():
+        position = 0
+        while True:
+            lines, skipped, position, finished = job.stream.read(position, 15)
+            if skipped:
+                yield 'data: ... %s lines skipped ...\n\n' % (skipped)
+            for line in lines:
+                yield 'data: %s\n\n' % (line)
+            if finished and not lines:
+                yield 'event: end\ndata: %s\n\n' % (job.state)
+                break
+            if not lines:
+                # keep the connection alive
+                yield ': \n\n'
+
+    return events()
+
+@route('/jobs/<job_id:int>/output', method='GET')
+def jobs_output(job_id):
+    ''' Output of a job from the line position (JSON), returns at once. '''
+
+    import poweradm.jobs
+
+    job = poweradm.jobs.get().get(job_id)
+    if job is None:
+        abort(404, 'The job %s does not exist.' % (job_id))
+
+    try:
+        position = max(0, int(request.GET.get('position', '0')))
+    except ValueError:
+        abort(400, 'The position needs be a number.')
+
+    lines, skipped, position, finished = job.stream.read(position, 0)
+    return {'job_id': job_id, 'lines': lines, 'skipped': skipped, 'position': position,
+            'finished': finished, 'state': job.state}
+
+@route('/stats')
+def stats_page():
+    ''' Statistics of the HMC, VIOS and NIM commands. '''
+
+    import poweradm.stats
+
+    # the statistics of this process are added to the file before
+    poweradm.stats.get().save()
+    output = template('www/stats', version=version, stats=poweradm.stats.get().load(),
+                      dimensions=poweradm.stats.dimensions, buckets=poweradm.stats.buckets)
+    return output
+
+@route('/stats.json')
+def stats_json():
+    ''' Statistics of the HMC, VIOS and NIM commands (JSON). '''
+
+    import poweradm.stats
+
+    poweradm.stats.get().save()
+    return poweradm.stats.get().load()
+
+@route('/healthcheck', method='GET')
+def healthcheck():
+    ''' Health check of many LPARs (IDs or names) or of all the LPARs of a frame. '''
+
+    import poweradm.healthcheck
+
+    lpars = request.GET.get('lpars', '').strip()
+    frame = request.GET.get('frame', '')
+    checks = request.GET.getall('checks') or poweradm.healthcheck.check_names
+
+    report = None
+    error = ''
+    if lpars or frame:
+        args = ['-checks', ','.join(checks)]
+        if frame:
+            args.extend(['-frame', frame])
+        try:
+            items, frames, checks = poweradm.healthcheck.parseArgs(args + lpars.split())
+            report = poweradm.healthcheck.run(items, frames, checks)
+        except(ValueError), value_error:
+            error = str(value_error)
+
+    output = template('www/healthcheck', version=version, psystems=sorted(psystems), lpars=lpars,
+                      frame=frame, checks=checks, check_names=poweradm.healthcheck.check_names,
+                      report=report, error=error)
+    return output
+
+@route('/healthcheck.json', method='GET')
+def healthcheck_json():
+    ''' Health check (JSON): /healthcheck.json?lpars=10,11&frame=SYSTEM&checks=vfc '''
+
+    import poweradm.healthcheck
+
+    args = []
+    if request.GET.get('checks'):
+        args.extend(['-checks', request.GET.get('checks')])
+    if request.GET.get('frame'):
+        args.extend(['-frame', request.GET.get('frame')])
+    try:
+        items, frames, checks = poweradm.healthcheck.parseArgs(args + request.GET.get('lpars', '').split())
+    except(ValueError), value_error:
+        response.status = 400
+        return {'error': str(value_error)}
+    return poweradm.healthcheck.run(items, frames, checks)
+
 @route('/deploy')
 def deploy():
 
@@ -431,7 +534,7 @@ def deploy_do():
     # import NIM Class from PowerAdm
     import poweradm.nim
     import poweradm.config
-    import poweradm.mkosdeploy
+    import poweradm.hmc
 
     deploy_file = request.GET.get('deploy_file', '')
     os_version  = request.GET.get('os_version', '')
@@ -472,12 +575,17 @@ def deploy_do():
            lparvlans, nim_file, nim_cfg_ver, nim_cfg_spot, nim_cfg_mksysbspot,
            nim_address, nim_ipstart, nim_ipend, nim_ipnet, nim_server,
            nim_ipdeploy, deploy_lpar)
-    deploy_os = poweradm.mkosdeploy.MakeNIMDeploy(lparprefix, lparname, lparframe,
-            lparvlans, nim_file, nim_cfg_ver, nim_cfg_spot, nim_cfg_mksysbspot,
-            nim_address, nim_ipstart, nim_ipend, nim_ipnet, nim_server,
-            nim_ipdeploy, deploy_lpar)
-
-    mklog = deploy_os.createNIMDeploy()
+    # the deploy runs as a job, the output is showed by /jobs/<job_id>/output
+    if deploy_lpar == 'y':
+        mklog = poweradm.jobs.get().submit('deploy', {'lparprefix': lparprefix, 'lparname': lparname,
+                'lparframe': lparframe, 'lparvlans': lparvlans, 'nim_file': nim_file,
+                'nim_cfg_ver': nim_cfg_ver, 'nim_cfg_spot': nim_cfg_spot,
+                'nim_cfg_mksysbspot': nim_cfg_mksysbspot, 'nim_address': nim_address,
+                'nim_ipstart': nim_ipstart, 'nim_ipend': nim_ipend, 'nim_ipnet': nim_ipnet,
+                'nim_server': nim_server, 'nim_ipdeploy': nim_ipdeploy, 'deploy': deploy_lpar},
+                ['hmc:%s' % (poweradm.hmc.route(lparframe)), 'nim:%s' % (nim_address)])
+    else:
+        mklog = 'none'
 
     output = template('www/deploy_do', version=version, deploy_lpar=deploy_lpar,
             deploy_file=deploy_file, lparframe=lparframe, os_version=os_version,
@@ -488,6 +596,12 @@ def deploy_do():
 
 
 
+# the static files route matches any path, so it is the last one
+@route('<filename:path>')
+def server_static(filename):
+    """ This is for static files """
+    return static_file(filename, root='www/static/')
+
 @error(403)
 def mistake403(code):
     return 'There is a mistake in your url!'
@@ -496,7 +610,19 @@ def mistake403(code):
 def mistake404(code):
     return 'Sorry, this page does not exist!'
 
-debug(True)
-run(host=web_address,
-    port=web_port,
-    reloader=True)
+if web_mode == 'production':
+    # threaded server (or other server supported by bottle), without
+    #debug and reloader
+    if web_server == 'threaded':
+        web_server = ThreadedServer
+    run(server=web_server,
+        host=web_address,
+        port=int(web_port))
+else:
+    # debug and reloader, also on the threaded server because the streams
+    #of the jobs output would block the other requests
+    debug(True)
+    run(server=ThreadedServer,
+        host=web_address,
+        port=int(web_port),
+        reloader=True)
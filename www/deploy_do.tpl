@@ -26,10 +26,34 @@
     <p></p>
     <p>Server file: {{deploy_file}}</p>
 
-    <b><p>The LPAR Deployed.</p></b>
-    <p>Creation LOG:</p>
-    % for log_line in mklog.splitlines():
-        <div>{{log_line}}</div>
+    <b><p>The LPAR deploy is running.</p></b>
+    <p>Deploy LOG (job {{mklog}}):</p>
+    % if mklog != 'none':
+        <pre id="mklog"></pre>
+        <button onclick="fetch('/jobs/{{mklog}}/cancel', {method: 'POST'})">Cancel</button>
+        <script>
+        var position = 0;
+        function poll() {
+            fetch('/jobs/{{mklog}}/output?position=' + position).then(function(response) {
+                return response.json();
+            }).then(function(job) {
+                var mklog = document.getElementById('mklog');
+                if (job.skipped) {
+                    mklog.textContent += '... ' + job.skipped + ' lines skipped ...\n';
+                }
+                for (var i = 0; i < job.lines.length; i++) {
+                    mklog.textContent += job.lines[i] + '\n';
+                }
+                position = job.position;
+                if (job.finished && !job.lines.length) {
+                    mklog.textContent += 'Job ' + job.state + '\n';
+                } else {
+                    setTimeout(poll, job.lines.length ? 0 : 1000);
+                }
+            });
+        }
+        poll();
+        </script>
     %end
 
     <b><p>Please finish the OS installation.</p></b>
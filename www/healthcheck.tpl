@@ -0,0 +1,116 @@
+<!DOCTYPE html>
+<HTML>
+<HEAD>
+<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">
+<LINK REL="stylesheet" TYPE="text/css" HREF="site.css">
+<link rel="icon" type="image/png" href="/favicon.png">
+</HEAD>
+<BODY>
+
+<DIV CLASS="header" ID="header">
+<H1>PowerAdm - IBM Power/PowerVM Administration tool</H1>
+<H2>Web Interface</H2>
+</DIV>
+
+<DIV CLASS="body" ID="body">
+<P>[ PowerAdm Adm ]</P>
+<P>[ Version: {{ version }} - © 2014, 2015 Kairo Araujo - BSD License ]</P>
+<P></P>
+<P><A HREF="/">Back to home</A></P>
+<P></P>
+
+<form action="/healthcheck" class="form-horizontal" method="GET">
+<fieldset>
+<legend>Health check</legend>
+
+<div class="control-group">
+    <b><label class="control-label" for="lpars">LPAR IDs or names (separated by comma or space):</label></b>
+    <div class="controls">
+        <input id="lpars" name="lpars" type="text" value="{{lpars}}" class="input-xlarge">
+    </div>
+</div>
+<p></p>
+<div class="control-group">
+    <b><label class="control-label" for="frame">And/or all the LPARs of the frame:</label></b>
+    <div class="controls">
+        <select id="frame" name="frame" class="input-xlarge">
+            <option value="">(none)</option>
+            %for psystem in psystems:
+                <option {{'selected' if psystem == frame else ''}}>{{psystem}}</option>
+            %end
+        </select>
+    </div>
+</div>
+<p></p>
+<div class="control-group">
+    <b><label class="control-label">Checks:</label></b>
+    <div class="controls">
+        %for check in check_names:
+            <input type="checkbox" name="checks" value="{{check}}" {{'checked' if check in checks else ''}}>{{check}}
+        %end
+    </div>
+</div>
+<p></p>
+<div class="control-group">
+    <div class="controls">
+        <button id="check" name="check" class="btn btn-primary">CHECK</button>
+    </div>
+</div>
+</fieldset>
+</form>
+
+% if error:
+<P><b>ERROR:</b> {{error}}</P>
+% end
+
+% if report is not None:
+<P></P>
+<fieldset>
+<legend>Report</legend>
+<P>{{len(report['lpars'])}} LPARs and {{len(report['vios'])}} VIOS checked in {{'%.2f' % report['time']}}s,
+{{len(report['failures'])}} failures.</P>
+% if report['not_found']:
+<P>Not found: {{', '.join(report['not_found'])}}</P>
+% end
+% if report['vios_errors']:
+<P>VIOS not collected (their adapters were not checked):</P>
+<table>
+<tr><th>System</th><th>VIOS</th><th>Problem</th><th>Detail</th></tr>
+% for vios_error in report['vios_errors']:
+    <tr><td>{{vios_error['system']}}</td><td>{{vios_error['vios']}}</td>
+    <td>{{vios_error['problem']}}</td><td>{{vios_error['detail']}}</td></tr>
+% end
+</table>
+<P></P>
+% end
+% if report['failures'] or report['vios_errors']:
+<table>
+<tr><th>Problem</th><th>Failures</th></tr>
+% for problem in sorted(report['problems'].keys(), key=lambda problem: -report['problems'][problem]):
+    <tr><td>{{problem}}</td><td>{{report['problems'][problem]}}</td></tr>
+% end
+</table>
+<P></P>
+% end
+% if report['failures']:
+<table>
+<tr><th>System</th><th>LPAR</th><th>ID</th><th>Check</th><th>Adapter</th><th>VIOS</th><th>Problem</th><th>Detail</th></tr>
+% for failure in sorted(report['failures'], key=lambda failure: (failure['system'], int(failure['lpar_id']))):
+    <tr><td>{{failure['system']}}</td><td>{{failure['name']}}</td><td>{{failure['lpar_id']}}</td>
+    <td>{{failure['check']}}</td><td>{{failure['adapter']}}</td><td>{{failure['vios']}}</td>
+    <td>{{failure['problem']}}</td><td>{{failure['detail']}}</td></tr>
+% end
+</table>
+% elif not report['vios_errors']:
+<P>No failures found.</P>
+% end
+</fieldset>
+% end
+
+<P></P>
+<P><A HREF="/">Back to home</A></P>
+<P></P>
+
+</DIV>
+</BODY>
+</HTML>
@@ -22,6 +22,8 @@
 <LI><A HREF=/lpar_config>LPAR configuration.</A>
 <LI><A HREF=/lpar_exec>Execute the LPAR creation.</A>
 <LI><A HREF=/deploy>Deploy OS on an existing LPAR.</A>
+<LI><A HREF=/healthcheck>Health check of many LPARs (vSCSI, vFC and vNetwork).</A>
+<LI><A HREF=/stats>HMC, VIOS and NIM commands statistics.</A>
 <!--<LI>Clear NIM OS deploy configs. in the future -->
 <P> The function troubleshooting works only in the shell interface.</P>
 <P> ** IMPORTANT ** Form validation working only with browser <A HREF="http://www.google.com/chrome/">Google Chrome.</A>
@@ -107,15 +107,15 @@ function hide_form_vfc() {
         <b><label class="control-label" for="">Select the NPIV FC of {{vio1}}</label></b>
         <div class="controls">
             <select id="npiv_vio1" name="npiv_vio1" class="input-xlarge">
-                %for fcs in npiv_vio1:
-                    <option>{{fcs}}</option>
+                %for port in npiv_vio1_ports:
+                    <option value="{{port['name']}}">{{port['name']}} (fabric: {{port['fabric']}}, available ports: {{port['aports']}}/{{port['tports']}})</option>
                 %end
             </select>
         </div>
     </div>
     <div class="control-group">
-        % if vio1_lsnports != "":
-            <p>NPIV notes from {{vio1}}:</p>
+        % if vio2_lsnports != "":
+            <p>NPIV notes from {{vio2}}:</p>
             % for lines in vio2_lsnports.splitlines():
                 <div>{{lines}}</div>
             % end
@@ -124,8 +124,8 @@ function hide_form_vfc() {
         <b><label class="control-label" for="">Select the NPIV FC of {{vio2}} </label></b>
         <div class="controls">
             <select id="npiv_vio2" name="npiv_vio2" class="input-xlarge">
-                %for fcs in npiv_vio2:
-                    <option>{{fcs}}</option> 
+                %for port in npiv_vio2_ports:
+                    <option value="{{port['name']}}">{{port['name']}} (fabric: {{port['fabric']}}, available ports: {{port['aports']}}/{{port['tports']}})</option> 
                 %end
             </select>
         </div>
@@ -32,12 +32,34 @@
 %end
 
 %if createlpar == 'yes':
-    <b><p>The LPAR was created.</p></b>
-    <p>Creation LOG:</p>
+    <b><p>The LPAR creation is running.</p></b>
+    <p>Creation LOG (job {{mklog}}):</p>
     % if mklog != 'none':
-        % for log_line in mklog.splitlines():
-            <div>{{log_line}}</div>
-        %end
+        <pre id="mklog"></pre>
+        <button onclick="fetch('/jobs/{{mklog}}/cancel', {method: 'POST'})">Cancel</button>
+        <script>
+        var position = 0;
+        function poll() {
+            fetch('/jobs/{{mklog}}/output?position=' + position).then(function(response) {
+                return response.json();
+            }).then(function(job) {
+                var mklog = document.getElementById('mklog');
+                if (job.skipped) {
+                    mklog.textContent += '... ' + job.skipped + ' lines skipped ...\n';
+                }
+                for (var i = 0; i < job.lines.length; i++) {
+                    mklog.textContent += job.lines[i] + '\n';
+                }
+                position = job.position;
+                if (job.finished && !job.lines.length) {
+                    mklog.textContent += 'Job ' + job.state + '\n';
+                } else {
+                    setTimeout(poll, job.lines.length ? 0 : 1000);
+                }
+            });
+        }
+        poll();
+        </script>
     %end
     <p>See bellow the final config.</p>
 %end
@@ -0,0 +1,69 @@
+<!DOCTYPE html>
+<HTML>
+<HEAD>
+<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">
+<LINK REL="stylesheet" TYPE="text/css" HREF="site.css">
+<link rel="icon" type="image/png" href="/favicon.png">
+</HEAD>
+<BODY>
+
+<DIV CLASS="header" ID="header">
+<H1>PowerAdm - IBM Power/PowerVM Administration tool</H1>
+<H2>Web Interface</H2>
+</DIV>
+
+<DIV CLASS="body" ID="body">
+<P>[ PowerAdm Adm ]</P>
+<P>[ Version: {{ version }} - © 2014, 2015 Kairo Araujo - BSD License ]</P>
+<P>[ PowerAdm Adm ]</P>
+<P>[ Version: {{ version }} - © 2014, 2015 Kairo Araujo - BSD License ]</P>
+<P></P>
+<P><A HREF="/">Back to home</A> | <A HREF="/stats.json">JSON</A></P>
+<P></P>
+
+<fieldset>
+<legend>Operations</legend>
+<table>
+<tr><th>Operation</th><th>Count</th><th>Avg time (s)</th><th>Avg commands</th><th>Avg time on commands (s)</th></tr>
+% for name in sorted(stats['operations'].keys()):
+    % operation = stats['operations'][name]
+    <tr><td>{{name}}</td><td>{{operation['count']}}</td>
+    <td>{{'%.2f' % (operation['time'] / operation['count'])}}</td>
+    <td>{{'%.1f' % (float(operation['commands']) / operation['count'])}}</td>
+    <td>{{'%.2f' % (operation['commands_time'] / operation['count'])}}</td></tr>
+%end
+</table>
+</fieldset>
+
+% for dimension in dimensions:
+<P></P>
+<fieldset>
+<legend>Commands by {{dimension}}</legend>
+<table>
+<tr><th>{{dimension}}</th><th>Count</th><th>Errors</th><th>Avg (s)</th><th>Max (s)</th><th>Total (s)</th><th>Bytes</th>
+% for limit in buckets:
+    <th>&lt;= {{limit}}s</th>
+%end
+<th>&gt; {{buckets[-1]}}s</th></tr>
+% commands = stats['commands'][dimension]
+% for key in sorted(commands.keys(), key=lambda key: -commands[key]['time']):
+    % aggregate = commands[key]
+    <tr><td>{{key}}</td><td>{{aggregate['count']}}</td><td>{{aggregate['errors']}}</td>
+    <td>{{'%.2f' % (aggregate['time'] / aggregate['count'])}}</td><td>{{'%.2f' % aggregate['max']}}</td>
+    <td>{{'%.2f' % aggregate['time']}}</td><td>{{aggregate['bytes']}}</td>
+    % for count in aggregate['histogram']:
+        <td>{{count}}</td>
+    %end
+    </tr>
+%end
+</table>
+</fieldset>
+%end
+
+<P></P>
+<P><A HREF="/">Back to home</A></P>
+<P></P>
+
+</DIV>
+</BODY>
+</HTML>